@@ -1,65 +1,151 @@
 import os
 import json
+import hashlib
 import requests
-from datetime import datetime, timedelta
 from django.db import models
 from django.conf import settings
-from sales.models import Sale, SaleItem
+from sales.models import NET_AMOUNT, Sale, SaleItem
 from inventory.models import Product
-from payments.models import Expense
+from .facts import refresh_open_day, refresh_sales_facts
+from .models import AISummaryCache, CategoryDailyExpenses, DailySummary, ProductDailySales
 
 class BusinessAIAnalyzer:
     def __init__(self):
         self.api_key = os.getenv('GROK_API_KEY', '')
         self.api_url = "https://api.x.ai/v1/chat/completions"
     
-    def generate_daily_summary(self, business, date):
-        """Generate AI summary for a business day"""
+    def generate_daily_summary(self, business, date, force=False):
+        """Generate AI summary for a business day, reusing cached output when the metrics are unchanged"""
+        data = self.collect_metrics(business, date)
+        fingerprint = self.fingerprint(data)
         
-        # Get day's data
-        start_date = datetime.combine(date, datetime.min.time())
-        end_date = start_date + timedelta(days=1)
+        # Serve identical or near-identical inputs from the cache
+        if not force:
+            cached = self._find_cached(business, date, fingerprint, data)
+            if cached:
+                cached.hit_count = models.F('hit_count') + 1
+                cached.save(update_fields=['hit_count'])
+                return {
+                    'ai_summary': cached.ai_summary,
+                    'insights': cached.insights,
+                    'recommendations': cached.recommendations,
+                    'cached': True,
+                }
+        
+        result = self._call_model(data)
+        
+        # Only cache real model output so a failed call is retried next time
+        if not result.get('fallback'):
+            AISummaryCache.objects.update_or_create(
+                business=business,
+                fingerprint=fingerprint,
+                defaults={
+                    'date': date,
+                    'metrics': data,
+                    'ai_summary': result['ai_summary'],
+                    'insights': result['insights'],
+                    'recommendations': result['recommendations'],
+                }
+            )
+        
+        result['cached'] = False
+        return result
+    
+    def collect_metrics(self, business, date):
+        """Prepare the metrics dict the summary is generated from"""
+        # Get the business-local day's data
+        start_date, end_date = business.day_bounds(date)
         
         sales = Sale.objects.filter(
             business=business,
-            created_at__range=[start_date, end_date],
+            created_at__gte=start_date,
+            created_at__lt=end_date,
             status='completed'
         )
         
-        expenses = Expense.objects.filter(
-            business=business,
-            created_at__range=[start_date, end_date]
-        )
+        # Expenses by category from the category-day aggregates
+        expense_categories = list(CategoryDailyExpenses.objects.filter(
+            business=business, date=date
+        ).order_by('category').values('category', total=models.F('amount')))
         
-        low_stock = Product.objects.filter(
-            business=business,
-            current_stock__lte=models.F('minimum_stock')
-        )
+        low_stock = Product.objects.filter(business=business).exclude(stock_state='ok')
         
-        # Calculate GROSS profit (sales - cost of goods sold)
-        gross_profit = 0
-        for sale in sales:
-            for item in sale.items.all():
-                gross_profit += (item.unit_price - item.cost_price) * item.quantity
+        # Product-level figures come from the day's sales facts. A closed day's are final; an
+        # open day's are rebuilt first so they are current (today at most once per refresh interval)
+        if date == business.local_today():
+            refresh_open_day(business)
+        elif not DailySummary.objects.filter(business=business, date=date, closed_at__isnull=False).exists():
+            refresh_sales_facts(business, date)
+        product_facts = ProductDailySales.objects.filter(business=business, date=date)
+        
+        # Sales totals and GROSS profit (sales - cost of goods sold) in one query over Sale
+        totals = sales.aggregate(
+            total=models.Sum(NET_AMOUNT),
+            count=models.Count('id'),
+            avg=models.Avg(NET_AMOUNT),
+            gross_profit=models.Sum('gross_profit'),
+        )
         
         # Prepare data
         data = {
             'date': date.isoformat(),
-            'total_sales': float(sales.aggregate(total=models.Sum('total_amount'))['total'] or 0),
-            'total_transactions': sales.count(),
-            'average_sale': float(sales.aggregate(avg=models.Avg('total_amount'))['avg'] or 0),
-            'gross_profit': float(gross_profit),
-            'total_expenses': float(expenses.aggregate(total=models.Sum('amount'))['total'] or 0),
+            'total_sales': float(totals['total'] or 0),
+            'total_transactions': totals['count'],
+            'average_sale': float(totals['avg'] or 0),
+            'gross_profit': float(totals['gross_profit'] or 0),
+            'total_expenses': float(sum(row['total'] for row in expense_categories)),
             'low_stock_count': low_stock.count(),
-            'top_products': list(sales.values('items__product__name').annotate(
-                total_quantity=models.Sum('items__quantity')
-            ).order_by('-total_quantity')[:5]),
-            'expense_categories': list(expenses.values('category').annotate(
-                total=models.Sum('amount')
-            ))
+            'top_products': list(product_facts.order_by('-quantity', 'product_name').values(
+                'product_name', total_quantity=models.F('quantity')
+            )[:5]),
+            'expense_categories': expense_categories,
         }
         
-        # Generate AI summary via direct API call
+        # Normalise to plain JSON types so the dict hashes and stores consistently
+        return json.loads(json.dumps(data, default=float))
+    
+    def fingerprint(self, data):
+        """Stable SHA-256 fingerprint of a metrics dict"""
+        encoded = json.dumps(data, sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+    
+    def _find_cached(self, business, date, fingerprint, data):
+        """Return a cache entry for identical metrics, or the latest one still within tolerance"""
+        cached = AISummaryCache.objects.filter(business=business, fingerprint=fingerprint).first()
+        if cached:
+            return cached
+        
+        latest = AISummaryCache.objects.filter(business=business, date=date).first()
+        if latest and self._within_tolerance(latest.metrics, data):
+            return latest
+        return None
+    
+    def _within_tolerance(self, previous, current):
+        """Check whether metrics moved less than the configured relative tolerance"""
+        tolerance = settings.AI_CONFIG.get('cache_tolerance', 0)
+        if tolerance <= 0:
+            return False
+        
+        # Counts and product rankings must match exactly
+        for key in ('total_transactions', 'low_stock_count'):
+            if previous.get(key) != current.get(key):
+                return False
+        previous_top = [p.get('product_name') for p in previous.get('top_products', [])]
+        current_top = [p.get('product_name') for p in current.get('top_products', [])]
+        if previous_top != current_top:
+            return False
+        
+        # Money values may drift within the tolerance
+        for key in ('total_sales', 'average_sale', 'gross_profit', 'total_expenses'):
+            old_value = previous.get(key) or 0
+            new_value = current.get(key) or 0
+            baseline = max(abs(old_value), abs(new_value))
+            if baseline and abs(new_value - old_value) / baseline > tolerance:
+                return False
+        return True
+    
+    def _call_model(self, data):
+        """Generate AI summary via direct API call"""
         prompt = self._create_prompt(data)
         
         try:
@@ -92,7 +178,7 @@ class BusinessAIAnalyzer:
                 'insights': insights,
                 'recommendations': self._generate_recommendations(data, insights)
             }
-            
+        
         except Exception as e:
             print(f"Grok API error: {e}")
             # Fallback
@@ -165,6 +251,7 @@ class BusinessAIAnalyzer:
         net_profit = data['gross_profit'] - data['total_expenses']
         
         return {
+            'fallback': True,
             'ai_summary': f"On {data['date']}, your business made KES {data['total_sales']:.2f} in sales "
                          f"across {data['total_transactions']} transactions. Gross profit was KES {data['gross_profit']:.2f}. "
                          f"After expenses of KES {data['total_expenses']:.2f}, net profit was KES {net_profit:.2f}. "
@@ -0,0 +1,195 @@
+import io
+from datetime import timedelta
+import numpy as np
+from scipy import sparse
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from .models import ProductAssociation
+
+# Market-basket mining. Each chunk of sales becomes a sparse binary sale x product
+# incidence matrix X; X.T @ X adds that chunk's co-occurrence counts. Chunks are read
+# from the database one at a time, keyset-paged on sale id, so memory is bounded by
+# one chunk plus the sparse counts however long the window is.
+
+def load_baskets(business, since, chunk_sales):
+    """Yield (sale_id, product_id) arrays for the business's completed sales since `since`,
+    at most chunk_sales whole baskets at a time"""
+    from sales.models import Sale, SaleItem
+    
+    sales = Sale.objects.filter(business=business, created_at__gte=since, status='completed').order_by('id')
+    last_id = 0
+    while True:
+        ids = list(sales.filter(id__gt=last_id).values_list('id', flat=True)[:chunk_sales])
+        if not ids:
+            return
+        last_id = ids[-1]
+        
+        # The chunk's sales are exactly the window's sales in [first, last] id
+        items = SaleItem.objects.filter(
+            sale__business=business,
+            sale__created_at__gte=since,
+            sale__status='completed',
+            sale__gte=ids[0],
+            sale__lte=last_id,
+            product_id__isnull=False
+        ).order_by().values_list('sale_id', 'product_id')
+        if connection.vendor == 'postgresql':
+            # One COPY parsed by numpy: no per-row tuples are built
+            sql, params = items.query.sql_with_params()
+            buffer = io.BytesIO()
+            with connection.cursor() as cursor:
+                select = cursor.cursor.mogrify(sql, params).decode()
+                cursor.cursor.copy_expert(f'COPY ({select}) TO STDOUT', buffer)
+            pairs = np.fromstring(buffer.getvalue(), dtype=np.int64, sep=' ').reshape(-1, 2)
+        else:
+            pairs = np.array(list(items), dtype=np.int64).reshape(-1, 2)
+        yield pairs[:, 0], pairs[:, 1]
+
+def count_cooccurrence(chunks, product_ids):
+    """Accumulate (co-occurrence matrix, per-product basket counts, basket total) over chunks"""
+    n = len(product_ids)
+    cooccurrence = sparse.csr_matrix((n, n), dtype=np.int64)
+    item_counts = np.zeros(n, dtype=np.int64)
+    baskets = 0
+    
+    for sale_ids, item_product_ids in chunks:
+        columns = np.searchsorted(product_ids, item_product_ids)
+        known = (columns < n) & (product_ids[np.minimum(columns, n - 1)] == item_product_ids)
+        basket_keys, rows = np.unique(sale_ids[known], return_inverse=True)
+        
+        incidence = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.int64), (rows, columns[known])),
+            shape=(len(basket_keys), n)
+        )
+        incidence.data[:] = 1  # Two lines of the same product are still one basket
+        
+        cooccurrence = cooccurrence + (incidence.T @ incidence).tocsr()
+        item_counts += np.asarray(incidence.sum(axis=0)).ravel()
+        baskets += len(basket_keys)
+    
+    return cooccurrence, item_counts, baskets
+
+def top_associations(cooccurrence, item_counts, baskets, top_k, min_support):
+    """Per-product top-k partners by lift, as parallel arrays (product, partner, rank, support, conf, lift)"""
+    pairs = sparse.triu(cooccurrence, k=1).tocoo()  # Each unordered pair once
+    keep = pairs.data >= min_support
+    a, b, support = pairs.row[keep], pairs.col[keep], pairs.data[keep]
+    
+    # Both directions: A -> B and B -> A have the same lift but different confidence
+    product = np.concatenate([a, b])
+    partner = np.concatenate([b, a])
+    support = np.concatenate([support, support]).astype(np.float64)
+    confidence = support / item_counts[product]
+    lift = confidence * baskets / item_counts[partner]
+    
+    # Sort by product, then strongest first; rank within each product's run
+    order = np.lexsort((-support, -lift, product))
+    product, partner, support, confidence, lift = (
+        values[order] for values in (product, partner, support, confidence, lift)
+    )
+    starts = np.r_[0, np.flatnonzero(np.diff(product)) + 1]
+    run_lengths = np.diff(np.r_[starts, len(product)])
+    rank = np.arange(len(product)) - np.repeat(starts, run_lengths)
+    top = rank < top_k
+    
+    return (product[top], partner[top], rank[top], support[top].astype(np.int64),
+            confidence[top], lift[top])
+
+def mine_associations(business, window_days=None, top_k=None, min_support=None, chunk_sales=None):
+    """Rebuild a business's ProductAssociation rows from recent baskets; returns rows written"""
+    from inventory.models import Product
+    
+    config = settings.BASKET_CONFIG
+    window_days = window_days or config['window_days']
+    top_k = top_k or config['top_k']
+    min_support = min_support or config['min_support']
+    chunk_sales = chunk_sales or config['chunk_sales']
+    
+    since = timezone.now() - timedelta(days=window_days)
+    product_ids = np.fromiter(
+        Product.objects.filter(business=business).order_by('id').values_list('id', flat=True),
+        dtype=np.int64
+    )
+    if not len(product_ids):
+        return 0
+    cooccurrence, item_counts, baskets = count_cooccurrence(load_baskets(business, since, chunk_sales), product_ids)
+    product, partner, rank, support, confidence, lift = top_associations(
+        cooccurrence, item_counts, baskets, top_k, min_support
+    )
+    
+    computed_at = timezone.now()
+    columns = {
+        'product_id': product_ids[product],
+        'associated_product_id': product_ids[partner],
+        'rank': rank,
+        'support': support,
+        'confidence': np.round(confidence, 4),
+        'lift': np.round(lift, 4),
+    }
+    with transaction.atomic():
+        ProductAssociation.objects.filter(business=business).delete()
+        if connection.vendor == 'postgresql':
+            _unnest_insert(business, columns, computed_at)
+        else:
+            ProductAssociation.objects.bulk_create(
+                [
+                    ProductAssociation(business=business, computed_at=computed_at,
+                                       **{name: values[i].item() for name, values in columns.items()})
+                    for i in range(len(rank))
+                ],
+                batch_size=5000
+            )
+    return len(rank)
+
+# Columns written by the unnest insert, with their SQL array types
+ASSOCIATION_COLUMNS = [
+    ('product_id', 'bigint'), ('associated_product_id', 'bigint'), ('rank', 'integer'),
+    ('support', 'integer'), ('confidence', 'double precision'), ('lift', 'double precision'),
+]
+
+def _unnest_insert(business, columns, computed_at):
+    """One INSERT ... SELECT FROM unnest(arrays) instead of a model instance per row"""
+    table = ProductAssociation._meta.db_table
+    names = [name for name, _ in ASSOCIATION_COLUMNS]
+    arrays = ', '.join(f'%s::{sql_type}[]' for _, sql_type in ASSOCIATION_COLUMNS)
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            INSERT INTO {table} ({', '.join(names)}, business_id, computed_at)
+            SELECT *, %s, %s FROM unnest({arrays})
+        """, [business.id, computed_at, *('{' + ','.join(map(str, columns[name].tolist())) + '}' for name in names)])
+
+def suggestions_for_cart(business, product_ids, limit=5):
+    """Upsell products for a cart: strongest association per partner, excluding the cart itself"""
+    rows = ProductAssociation.objects.filter(
+        business=business,
+        product_id__in=product_ids,
+        associated_product__status='active',
+        associated_product__current_stock__gt=0
+    ).exclude(
+        associated_product_id__in=product_ids
+    ).order_by('-lift', '-support').values(
+        'associated_product_id', 'associated_product__name', 'associated_product__sku',
+        'associated_product__selling_price', 'associated_product__current_stock',
+        'lift', 'confidence', 'support', 'product_id'
+    )
+    
+    suggestions, seen = [], set()
+    for row in rows:
+        if row['associated_product_id'] in seen:
+            continue
+        seen.add(row['associated_product_id'])
+        suggestions.append({
+            'product_id': row['associated_product_id'],
+            'name': row['associated_product__name'],
+            'sku': row['associated_product__sku'],
+            'selling_price': row['associated_product__selling_price'],
+            'current_stock': row['associated_product__current_stock'],
+            'because_of': row['product_id'],
+            'lift': row['lift'],
+            'confidence': row['confidence'],
+            'support': row['support'],
+        })
+        if len(suggestions) == limit:
+            break
+    return suggestions
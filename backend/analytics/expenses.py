@@ -0,0 +1,82 @@
+# Expense aggregates: CategoryDailyExpenses holds one row per business, category and
+# business-local day. Expense.save() and delete() hand each change to expense_changed(),
+# which applies it as a +/- delta in a single upsert, so writes stay O(1) and reads never
+# touch Expense. Bulk QuerySet updates and deletes bypass the model hooks; run
+# `manage.py rebuild_expense_totals --start ... --end ...` over the affected days after one.
+from decimal import Decimal
+from django.db import DEFAULT_DB_ALIAS, connection, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from .models import CategoryDailyExpenses
+
+def expense_key(business, created_at, category):
+    """The aggregate row an expense belongs to"""
+    return business.id, timezone.localtime(created_at, business.tzinfo).date(), category
+
+def apply_expense_deltas(deltas):
+    """Add {(business_id, date, category): (amount, count)} to the aggregate rows"""
+    rows = sorted((key, value) for key, value in deltas.items() if any(value))
+    if not rows:
+        return 0
+    table = CategoryDailyExpenses._meta.db_table
+    params = []
+    for (business_id, date, category), (amount, count) in rows:  # Key order keeps concurrent upserts from deadlocking
+        params += [business_id, date, category, amount, count, timezone.now()]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (business_id, date, category, amount, expense_count, updated_at) VALUES '
+            + ', '.join(['(%s, %s, %s, %s, %s, %s)'] * len(rows))
+            + f' ON CONFLICT (business_id, date, category) DO UPDATE SET'
+            f' amount = {table}.amount + EXCLUDED.amount,'
+            f' expense_count = {table}.expense_count + EXCLUDED.expense_count,'
+            f' updated_at = EXCLUDED.updated_at',
+            params,
+        )
+    
+    # Days whose last expense in a category went away
+    for (business_id, date, category), _ in rows:
+        CategoryDailyExpenses.objects.filter(
+            business_id=business_id, date=date, category=category, expense_count__lte=0
+        ).delete()
+    return len(rows)
+
+def expense_changed(previous, current):
+    """Move an expense's amount out of its old aggregate row and into its new one
+    
+    previous and current are Expense instances (or None for a create or delete).
+    """
+    deltas = {}
+    for expense, sign in ((previous, -1), (current, 1)):
+        if expense is None:
+            continue
+        key = expense_key(expense.business, expense.created_at, expense.category)
+        amount, count = deltas.get(key, (0, 0))
+        deltas[key] = (amount + sign * Decimal(str(expense.amount)), count + sign)
+    return apply_expense_deltas(deltas)
+
+def rebuild_expense_totals(business, start, end):
+    """Recompute aggregate rows for business-local days in [start, end] from Expense"""
+    from payments.models import Expense
+    
+    range_start, range_end = business.day_bounds(start)[0], business.day_bounds(end)[1]
+    rows = list(Expense.objects.using(DEFAULT_DB_ALIAS).filter(
+        business=business, created_at__gte=range_start, created_at__lt=range_end
+    ).annotate(day=TruncDate('created_at', tzinfo=business.tzinfo)).values('day', 'category').annotate(
+        total=Sum('amount'), count=Count('id')
+    ).order_by())
+    
+    with transaction.atomic():
+        CategoryDailyExpenses.objects.filter(business=business, date__range=[start, end]).delete()
+        CategoryDailyExpenses.objects.bulk_create([
+            CategoryDailyExpenses(business=business, date=row['day'], category=row['category'],
+                                  amount=row['total'], expense_count=row['count'])
+            for row in rows
+        ])
+    return len(rows)
+
+def expense_total(business, start, end):
+    """Expenses for business-local days in [start, end]"""
+    return CategoryDailyExpenses.objects.filter(
+        business=business, date__range=[start, end]
+    ).aggregate(total=Sum('amount'))['total'] or 0
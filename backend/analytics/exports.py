@@ -0,0 +1,123 @@
+import csv
+import json
+from itertools import islice
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from sales.models import Sale, SaleItem
+from payments.models import Payment, Expense
+from inventory.models import StockMovement
+
+# Export datasets: model, business filter, date field and exported columns
+EXPORT_DATASETS = {
+    'sales': {
+        'model': Sale,
+        'business_field': 'business',
+        'date_field': 'created_at',
+        'columns': [
+            'id', 'transaction_id', 'receipt_number', 'created_at', 'customer_name',
+            'customer_phone', 'subtotal', 'tax_amount', 'discount_amount', 'total_amount',
+            'amount_paid', 'change_given', 'refunded_amount', 'status', 'payment_status', 'cashier__email',
+            'shift_id', 'is_offline_sale', 'offline_id',
+        ],
+    },
+    'items': {
+        'model': SaleItem,
+        'business_field': 'sale__business',
+        'date_field': 'sale__created_at',
+        'columns': [
+            'id', 'sale_id', 'sale__receipt_number', 'sale__created_at', 'product_id',
+            'product_name', 'quantity', 'refunded_quantity', 'unit_price', 'total_price', 'cost_price', 'profit',
+        ],
+    },
+    'payments': {
+        'model': Payment,
+        'business_field': 'business',
+        'date_field': 'created_at',
+        'columns': [
+            'id', 'sale_id', 'sale__receipt_number', 'payment_method__name', 'amount',
+            'transaction_fee', 'net_amount', 'refunded_amount', 'provider_transaction_id', 'customer_phone',
+            'status', 'is_offline', 'created_at', 'completed_at',
+        ],
+    },
+    'expenses': {
+        'model': Expense,
+        'business_field': 'business',
+        'date_field': 'created_at',
+        'columns': [
+            'id', 'category', 'description', 'amount', 'paid_by__email',
+            'payment_method__name', 'receipt_number', 'created_at',
+        ],
+    },
+    'stock_movements': {
+        'model': StockMovement,
+        'business_field': 'product__business',
+        'date_field': 'created_at',
+        'columns': [
+            'id', 'product_id', 'product__sku', 'product__name', 'movement_type', 'quantity',
+            'previous_quantity', 'new_quantity', 'reference', 'notes', 'created_by__email',
+            'created_at',
+        ],
+    },
+}
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+class Echo:
+    """File-like object that hands each written line straight back to the caller"""
+    def write(self, value):
+        return value
+
+def export_rows(business, dataset, start_date=None, end_date=None, chunk_size=None, using=None):
+    """Yield value tuples for a dataset, streamed through a server-side cursor"""
+    spec = EXPORT_DATASETS[dataset]
+    filters = {spec['business_field']: business}
+    
+    # Date range is inclusive and measured in business-local days
+    if start_date:
+        filters[f"{spec['date_field']}__gte"] = business.day_bounds(start_date)[0]
+    if end_date:
+        filters[f"{spec['date_field']}__lt"] = business.day_bounds(end_date)[1]
+    
+    queryset = spec['model'].objects.using(using).filter(**filters).order_by('id').values_list(*spec['columns'])
+    return queryset.iterator(chunk_size=chunk_size or settings.EXPORT_CHUNK_SIZE)
+
+def _json_value(value):
+    # Datetimes as ISO 8601; Decimals and UUIDs keep their exact string form
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+def stream_export(business, dataset, export_format='csv', start_date=None, end_date=None, chunk_size=None,
+                  using=None):
+    """Yield encoded export lines, one row at a time"""
+    columns = EXPORT_DATASETS[dataset]['columns']
+    rows = export_rows(business, dataset, start_date, end_date, chunk_size, using)
+    
+    if export_format == 'csv':
+        writer = csv.writer(Echo())
+        yield writer.writerow(columns)
+        for row in rows:
+            yield writer.writerow(row)
+    else:
+        for row in rows:
+            yield json.dumps(dict(zip(columns, row)), default=_json_value) + '\n'
+
+async def astream_export(business, dataset, export_format='csv', start_date=None, end_date=None, chunk_size=None,
+                         using=None):
+    """Async form of stream_export for ASGI, yielding one chunk of lines per cursor fetch
+
+    Given a sync iterator, ASGI consumes it whole with sync_to_async(list) before sending
+    a byte. Here each chunk is pulled on the request's sync thread (thread_sensitive, so the
+    server-side cursor keeps its connection) and sent before the next one is read.
+    """
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    lines = stream_export(business, dataset, export_format, start_date, end_date, chunk_size, using)
+    next_chunk = sync_to_async(lambda: ''.join(islice(lines, chunk_size)))
+    try:
+        while chunk := await next_chunk():
+            yield chunk
+    finally:
+        await sync_to_async(lines.close)()  # Closes the cursor if the client went away
@@ -0,0 +1,95 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, transaction
+from django.db.models import Count, DecimalField, F, Max, Sum
+from django.db.models.functions import TruncDate
+from .models import CategoryDailySales, ProductDailySales
+
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+FACT_BATCH_SIZE = 2000
+
+# Measures shared by both fact tables, aggregated straight from SaleItem net of refunded
+# units. Aggregates get a prefix so they don't shadow the item fields they are computed from.
+MEASURES = ['quantity', 'revenue', 'cost', 'profit', 'transaction_count']
+
+def _measures():
+    kept = F('quantity') - F('refunded_quantity')
+    return {
+        'sum_quantity': Sum(kept),
+        'sum_revenue': Sum(F('unit_price') * kept, output_field=MONEY),
+        'sum_cost': Sum(F('cost_price') * kept, output_field=MONEY),
+        'sum_profit': Sum((F('unit_price') - F('cost_price')) * kept, output_field=MONEY),
+        'sum_transaction_count': Count('sale_id', distinct=True),
+    }
+
+def rebuild_sales_facts(business, start, end):
+    """Rebuild product-day and category-day facts for business-local days in [start, end]"""
+    from sales.models import SaleItem
+    
+    range_start, range_end = business.day_bounds(start)[0], business.day_bounds(end)[1]
+    # Source rows come from the primary even inside a replica-read request
+    items = SaleItem.objects.using(DEFAULT_DB_ALIAS).filter(
+        sale__business=business,
+        sale__created_at__gte=range_start,
+        sale__created_at__lt=range_end,
+        sale__status='completed',
+        quantity__gt=F('refunded_quantity')
+    ).annotate(day=TruncDate('sale__created_at', tzinfo=business.tzinfo))
+    
+    product_rows = items.values('day', 'product_id').annotate(
+        name=Max('product_name'),
+        category_ref=Max('product__category_id'),
+        **_measures()
+    ).order_by()
+    category_rows = items.values('day', category_ref=F('product__category_id')).annotate(
+        name=Max('product__category__name'),
+        **_measures()
+    ).order_by()
+    
+    def measures(row):
+        return {field: row[f'sum_{field}'] or 0 for field in MEASURES}
+    
+    products = [
+        ProductDailySales(
+            business=business, date=row['day'], product_id=row['product_id'],
+            product_name=row['name'] if row['product_id'] else 'Deleted products',
+            category_id=row['category_ref'], **measures(row)
+        )
+        for row in product_rows
+    ]
+    categories = [
+        CategoryDailySales(
+            business=business, date=row['day'], category_id=row['category_ref'],
+            category_name=row['name'] or 'Uncategorized', **measures(row)
+        )
+        for row in category_rows
+    ]
+    
+    try:
+        with transaction.atomic():
+            ProductDailySales.objects.filter(business=business, date__range=[start, end]).delete()
+            CategoryDailySales.objects.filter(business=business, date__range=[start, end]).delete()
+            ProductDailySales.objects.bulk_create(products, batch_size=FACT_BATCH_SIZE)
+            CategoryDailySales.objects.bulk_create(categories, batch_size=FACT_BATCH_SIZE)
+    except IntegrityError:
+        # A concurrent refresh of the same days committed first; its rows are just as fresh
+        return 0
+    return len(products)
+
+def refresh_sales_facts(business, date):
+    """Rebuild one business-local day of facts"""
+    return rebuild_sales_facts(business, date, date)
+
+def refresh_open_day(business):
+    """Refresh today's facts at most once per SALES_FACTS_REFRESH_SECONDS"""
+    today = business.local_today()
+    cache_key = f'facts:fresh:{business.id}:{today.isoformat()}'
+    if cache.add(cache_key, 1, settings.SALES_FACTS_REFRESH_SECONDS):
+        refresh_sales_facts(business, today)
+    return today
+
+def ensure_facts(business, start, end):
+    """Make sure a reporting range includes live figures for the still-open day"""
+    today = business.local_today()
+    if start <= today <= end:
+        refresh_open_day(business)
@@ -0,0 +1,75 @@
+import asyncio
+import time
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, override_settings
+from django.urls import path
+from rest_framework_simplejwt.tokens import RefreshToken
+from accounts.models import User
+from analytics.views import DashboardView
+from analytics.views_async import dashboard
+from inventory.models import Product
+from inventory.views_async import product_scan
+from notifications.views import UnreadCountView
+from notifications.views_async import unread_count
+from sales.views import TodaySalesCountView
+from sales.views_async import today_sales_count
+
+# Sync DRF views and their async counterparts side by side, mounted as this
+# module's URLconf so both run through the same ASGI handler
+urlpatterns = [
+    path('sync/dashboard/', DashboardView.as_view()),
+    path('sync/unread-count/', UnreadCountView.as_view()),
+    path('sync/today-count/', TodaySalesCountView.as_view()),
+    path('async/dashboard/', dashboard),
+    path('async/unread-count/', unread_count),
+    path('async/today-count/', today_sales_count),
+    path('async/scan/<str:code>/', product_scan),
+]
+
+class Command(BaseCommand):
+    help = 'Compare requests/second of the sync and async hot endpoints under concurrent load'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--user', required=True, help='Email of the user to authenticate as')
+        parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint')
+        parser.add_argument('--concurrency', type=int, default=20, help='Requests in flight at once')
+    
+    def handle(self, *args, **options):
+        user = User.objects.select_related('business').filter(email=options['user']).first()
+        if user is None or user.business is None:
+            raise CommandError('User not found or not assigned to a business')
+        
+        token = str(RefreshToken.for_user(user).access_token)
+        endpoints = ['dashboard/', 'unread-count/', 'today-count/']
+        product = Product.objects.filter(business=user.business).first()
+        
+        with override_settings(ROOT_URLCONF=__name__):
+            for endpoint in endpoints:
+                for mode in ('sync', 'async'):
+                    self.report(f'/{mode}/{endpoint}', token, options)
+            if product:
+                self.report(f'/async/scan/{product.barcode or product.sku}/', token, options)
+    
+    def report(self, url, token, options):
+        cache.clear()
+        elapsed, statuses = asyncio.run(self.load(url, token, options['requests'], options['concurrency']))
+        failures = sum(1 for status in statuses if status != 200)
+        self.stdout.write(
+            f'{url:<36} {len(statuses) / elapsed:8.1f} req/s'
+            + (f'  ({failures} non-200)' if failures else '')
+        )
+    
+    async def load(self, url, token, total, concurrency):
+        client = AsyncClient()
+        headers = {'Authorization': f'Bearer {token}'}
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def one():
+            async with semaphore:
+                response = await client.get(url, headers=headers)
+                return response.status_code
+        
+        started = time.perf_counter()
+        statuses = await asyncio.gather(*(one() for _ in range(total)))
+        return time.perf_counter() - started, statuses
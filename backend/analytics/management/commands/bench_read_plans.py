@@ -0,0 +1,57 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from business.models import Business
+from imanage.renderers import dumps_json
+from inventory.models import Product
+from inventory.serializers import ProductSerializer, product_read_plan
+from notifications.models import Notification
+from notifications.serializers import NotificationSerializer, notification_read_plan
+from sales.models import Sale
+from sales.serializers import SaleSerializer, sale_read_plan
+
+# Serialize one large page with the ModelSerializer and with its read plan
+class Command(BaseCommand):
+    help = 'Compare ModelSerializer and ReadPlan time for 10k-row product, sale and notification pages'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--business', type=int, required=True, help='Business ID to load rows from')
+        parser.add_argument('--rows', type=int, default=10000, help='Rows per page')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per serializer (best is reported)')
+    
+    def handle(self, *args, **options):
+        business = Business.objects.filter(pk=options['business']).first()
+        if business is None:
+            raise CommandError('Business not found')
+        rows = options['rows']
+        
+        # Serializer querysets get the prefetching a tuned view would add; plans need none
+        pages = [
+            ('products', Product.objects.filter(business=business).select_related('category'),
+             ProductSerializer, product_read_plan),
+            ('sales', Sale.objects.filter(business=business).select_related('cashier').prefetch_related(
+                'items__product'
+            ), SaleSerializer, sale_read_plan),
+            ('notifications', Notification.objects.filter(user__business=business), NotificationSerializer,
+             notification_read_plan),
+        ]
+        for name, queryset, serializer_class, plan in pages:
+            queryset = queryset.order_by('-id')[:rows]
+            slow_fetch, instances = self.best(options['repeat'], lambda: list(queryset.all()))
+            slow, slow_data = self.best(options['repeat'], lambda: serializer_class(instances, many=True).data)
+            fast_fetch, values = self.best(options['repeat'], lambda: list(plan.values(queryset.all())))
+            fast, fast_data = self.best(options['repeat'], lambda: plan.serialize(values))
+            same = dumps_json(slow_data) == dumps_json(fast_data)
+            self.stdout.write(
+                f'{name:<14} {len(fast_data):>6} rows  serialize {slow * 1000:7.1f} -> {fast * 1000:6.1f} ms '
+                f'({slow / fast:4.1f}x)  with fetch {(slow_fetch + slow) * 1000:7.1f} -> '
+                f'{(fast_fetch + fast) * 1000:6.1f} ms ({(slow_fetch + slow) / (fast_fetch + fast):4.1f}x)  '
+                f'identical={same}'
+            )
+    
+    def best(self, repeat, build):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            data = build()
+            timings.append(time.perf_counter() - started)
+        return min(timings), data
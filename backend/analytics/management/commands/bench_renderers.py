@@ -0,0 +1,54 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.text import compress_string
+from rest_framework.renderers import JSONRenderer
+from business.models import Business
+from imanage.renderers import MessagePackRenderer, ORJSONRenderer
+from inventory.models import Product
+from inventory.serializers import ProductSerializer
+from sales.models import Sale
+from sales.serializers import SaleSerializer
+
+RENDERERS = [
+    ('json (drf)', JSONRenderer()),
+    ('json (orjson)', ORJSONRenderer()),
+    ('msgpack', MessagePackRenderer()),
+]
+
+# Render the product list and sale list payloads with each wire format
+class Command(BaseCommand):
+    help = 'Compare render time and bytes on the wire (raw and gzipped) per renderer'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--business', type=int, required=True, help='Business ID to load payloads from')
+        parser.add_argument('--sales', type=int, default=2000, help='Sales in the sale list payload')
+        parser.add_argument('--repeat', type=int, default=5, help='Renders per format (best is reported)')
+    
+    def handle(self, *args, **options):
+        business = Business.objects.filter(pk=options['business']).first()
+        if business is None:
+            raise CommandError('Business not found')
+        
+        products = Product.objects.filter(business=business).select_related('category')
+        sales = Sale.objects.filter(business=business).select_related('cashier').prefetch_related(
+            'items__product'
+        ).order_by('-created_at')[:options['sales']]
+        payloads = [
+            ('products', lambda: ProductSerializer(products, many=True).data),
+            ('sales', lambda: SaleSerializer(sales, many=True).data),
+        ]
+        
+        for name, build in payloads:
+            started = time.perf_counter()
+            data = build()
+            self.stdout.write(f'{name}: {len(data)} rows, serializer {time.perf_counter() - started:.3f}s')
+            for label, renderer in RENDERERS:
+                timings = []
+                for _ in range(options['repeat']):
+                    started = time.perf_counter()
+                    body = renderer.render(data)
+                    timings.append(time.perf_counter() - started)
+                self.stdout.write(
+                    f'  {label:<14} {min(timings) * 1000:8.1f} ms  {len(body):>11,} B'
+                    f'  {len(compress_string(body)):>10,} B gzipped'
+                )
@@ -0,0 +1,44 @@
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from analytics.tasks import close_business_days, close_business_job
+from business.models import Business
+
+# Run hourly from cron: each business closes its day after its own local midnight
+class Command(BaseCommand):
+    help = 'Materialize DailySummary metrics for every business-local day that has ended'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--business', type=int, action='append', help='Only close these business IDs')
+        parser.add_argument('--date', help='Close (or re-close) a specific date, YYYY-MM-DD')
+        parser.add_argument('--workers', type=int, default=1, help='Process pool size across businesses')
+        parser.add_argument('--queue', action='store_true', help='Enqueue one job per business for run_jobs workers')
+    
+    def handle(self, *args, **options):
+        dates = None
+        if options['date']:
+            try:
+                dates = [date.fromisoformat(options['date'])]
+            except ValueError:
+                raise CommandError('--date must be YYYY-MM-DD')
+        
+        if options['queue']:
+            if dates:
+                raise CommandError('--date cannot be combined with --queue')
+            business_ids = options['business'] or Business.objects.filter(status='active').values_list('id', flat=True)
+            for business_id in business_ids:
+                close_business_job.enqueue(business_id=business_id, unique_key=f'close-business:{business_id}')
+            self.stdout.write(self.style.SUCCESS(f'Queued {len(business_ids)} business close job(s)'))
+            return
+        
+        results = close_business_days(
+            business_ids=options['business'],
+            dates=dates,
+            workers=options['workers'],
+        )
+        
+        for business_id, closed, error in results:
+            if error:
+                self.stderr.write(f'Business {business_id}: {error}')
+            elif closed:
+                self.stdout.write(f"Business {business_id}: closed {', '.join(closed)}")
+        self.stdout.write(self.style.SUCCESS(f'Processed {len(results)} business(es)'))
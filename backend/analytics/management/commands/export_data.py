@@ -0,0 +1,41 @@
+import sys
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from business.models import Business
+from analytics.exports import EXPORT_DATASETS, EXPORT_FORMATS, stream_export
+
+# Stream a dataset to a file or stdout with flat memory use
+class Command(BaseCommand):
+    help = 'Export sales, items, payments, expenses or stock movements as CSV or JSON Lines'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=list(EXPORT_DATASETS))
+        parser.add_argument('--business', type=int, required=True, help='Business ID')
+        parser.add_argument('--start-date', help='First business-local day, YYYY-MM-DD')
+        parser.add_argument('--end-date', help='Last business-local day, YYYY-MM-DD')
+        parser.add_argument('--output-format', choices=list(EXPORT_FORMATS), default='csv')
+        parser.add_argument('--output', help='File path (defaults to stdout)')
+        parser.add_argument('--chunk-size', type=int, help='Rows per server-side cursor fetch')
+    
+    def handle(self, *args, **options):
+        try:
+            business = Business.objects.get(pk=options['business'])
+        except Business.DoesNotExist:
+            raise CommandError(f"Business {options['business']} not found")
+        
+        try:
+            start_date = date.fromisoformat(options['start_date']) if options['start_date'] else None
+            end_date = date.fromisoformat(options['end_date']) if options['end_date'] else None
+        except ValueError:
+            raise CommandError('Dates must be YYYY-MM-DD')
+        
+        lines = stream_export(
+            business, options['dataset'], options['output_format'],
+            start_date, end_date, options['chunk_size']
+        )
+        
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+                output.writelines(lines)
+        else:
+            sys.stdout.writelines(lines)
@@ -0,0 +1,30 @@
+import time
+from django.core.management.base import BaseCommand
+from business.models import Business
+from analytics.basket import mine_associations
+
+# Run nightly: rebuilds "frequently bought together" suggestions for the POS
+class Command(BaseCommand):
+    help = 'Mine product associations (co-occurrence and lift) from recent sale baskets'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--business', type=int, action='append', help='Only these business IDs')
+        parser.add_argument('--days', type=int, help='Basket window in days (default BASKET_CONFIG)')
+        parser.add_argument('--top-k', type=int, help='Associations kept per product')
+        parser.add_argument('--min-support', type=int, help='Minimum baskets per pair')
+    
+    def handle(self, *args, **options):
+        businesses = Business.objects.all()
+        if options['business']:
+            businesses = businesses.filter(id__in=options['business'])
+        
+        for business in businesses:
+            started = time.perf_counter()
+            rows = mine_associations(
+                business,
+                window_days=options['days'],
+                top_k=options['top_k'],
+                min_support=options['min_support'],
+            )
+            self.stdout.write(f'Business {business.id}: {rows} associations in {time.perf_counter() - started:.2f}s')
+        self.stdout.write(self.style.SUCCESS('Product associations updated'))
@@ -0,0 +1,45 @@
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from business.models import Business
+from payments.models import Expense
+from analytics.expenses import rebuild_expense_totals
+
+# Days rebuilt per transaction, so a multi-year backfill never holds one huge batch
+WINDOW_DAYS = 31
+
+# Backfill (or repair) the category-day expense aggregates, e.g. after a bulk update
+class Command(BaseCommand):
+    help = 'Rebuild category-day expense totals from raw expenses for a date range'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--business', type=int, action='append', help='Only these business IDs')
+        parser.add_argument('--start', help='First day, YYYY-MM-DD (default: first expense)')
+        parser.add_argument('--end', help='Last day, YYYY-MM-DD (default: today)')
+    
+    def handle(self, *args, **options):
+        try:
+            start = date.fromisoformat(options['start']) if options['start'] else None
+            end = date.fromisoformat(options['end']) if options['end'] else None
+        except ValueError:
+            raise CommandError('Dates must be YYYY-MM-DD')
+        
+        businesses = Business.objects.all()
+        if options['business']:
+            businesses = businesses.filter(id__in=options['business'])
+        
+        for business in businesses:
+            first_expense = Expense.objects.filter(business=business).aggregate(first=Min('created_at'))['first']
+            if first_expense is None and start is None:
+                continue
+            day = start or first_expense.astimezone(business.tzinfo).date()
+            last_day = end or business.local_today()
+            
+            rows = 0
+            while day <= last_day:
+                window_end = min(day + timedelta(days=WINDOW_DAYS - 1), last_day)
+                rows += rebuild_expense_totals(business, day, window_end)
+                day = window_end + timedelta(days=1)
+            self.stdout.write(f'Business {business.id}: {rows} category-day rows')
+        
+        self.stdout.write(self.style.SUCCESS('Expense totals rebuilt'))
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.10 on 2026-10-19 05:50
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_initial'),
+        ('business', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AISummaryCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('fingerprint', models.CharField(max_length=64)),
+                ('metrics', models.JSONField(default=dict)),
+                ('ai_summary', models.TextField(blank=True)),
+                ('insights', models.JSONField(default=dict)),
+                ('recommendations', models.JSONField(default=list)),
+                ('hit_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('business', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='business.business')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['business', 'date', '-created_at'], name='analytics_a_busines_3c7595_idx')],
+                'unique_together': {('business', 'fingerprint')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.10 on 2026-10-19 05:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0002_ai_summary_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailysummary',
+            name='closed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.10 on 2026-10-19 06:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0003_dailysummary_closed_at'),
+        ('business', '0001_initial'),
+        ('inventory', '0003_stocktake'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryDailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('category_name', models.CharField(max_length=100)),
+                ('quantity', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0.0, max_digits=12)),
+                ('cost', models.DecimalField(decimal_places=2, default=0.0, max_digits=12)),
+                ('profit', models.DecimalField(decimal_places=2, default=0.0, max_digits=12)),
+                ('transaction_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('business', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='business.business')),
+                ('category', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='inventory.category')),
+            ],
+            options={
+                'ordering': ['-date', '-revenue'],
+                'constraints': [models.UniqueConstraint(fields=('business', 'date', 'category'), name='unique_category_daily_sales', nulls_distinct=False)],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductDailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('product_name', models.CharField(max_length=200)),
+                ('quantity', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0.0, max_digits=12)),
+                ('cost', models.DecimalField(decimal_places=2, default=0.0, max_digits=12)),
+                ('profit', models.DecimalField(decimal_places=2, default=0.0, max_digits=12)),
+                ('transaction_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('business', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='business.business')),
+                ('category', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='inventory.category')),
+                ('product', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='inventory.product')),
+            ],
+            options={
+                'ordering': ['-date', '-revenue'],
+                'constraints': [models.UniqueConstraint(fields=('business', 'date', 'product'), name='unique_product_daily_sales', nulls_distinct=False)],
+            },
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.10 on 2026-10-19 07:16
+
+import django.db.models.deletion
+from datetime import timezone as dt_timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from django.db import migrations, models
+from django.db.models.functions import TruncDate
+
+
+def backfill_expense_totals(apps, schema_editor):
+    Business = apps.get_model('business', 'Business')
+    Expense = apps.get_model('payments', 'Expense')
+    CategoryDailyExpenses = apps.get_model('analytics', 'CategoryDailyExpenses')
+    
+    # One grouped scan per timezone in use; days are business-local
+    for name in Business.objects.values_list('timezone_field', flat=True).distinct():
+        try:
+            tzinfo = ZoneInfo(name)
+        except (ZoneInfoNotFoundError, ValueError):
+            tzinfo = dt_timezone.utc
+        rows = Expense.objects.filter(business__timezone_field=name).annotate(
+            day=TruncDate('created_at', tzinfo=tzinfo)
+        ).values('business_id', 'day', 'category').annotate(
+            total=models.Sum('amount'), count=models.Count('id')
+        ).order_by()
+        CategoryDailyExpenses.objects.bulk_create([
+            CategoryDailyExpenses(business_id=row['business_id'], date=row['day'], category=row['category'],
+                                  amount=row['total'], expense_count=row['count'])
+            for row in rows
+        ], batch_size=5000)
+
+class Migration(migrations.Migration):
+    
+    dependencies = [
+        ('analytics', '0005_product_association'),
+        ('business', '0001_initial'),
+        ('payments', '0003_mobile_money_reconciliation'),
+    ]
+    
+    operations = [
+        migrations.CreateModel(
+            name='CategoryDailyExpenses',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('category', models.CharField(max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('expense_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('business', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='business.business')),
+            ],
+            options={
+                'ordering': ['-date', '-amount'],
+                'constraints': [models.UniqueConstraint(fields=('business', 'date', 'category'), name='unique_category_daily_expenses')],
+            },
+        ),
+        migrations.RunPython(backfill_expense_totals, migrations.RunPython.noop),
+    ]
@@ -27,6 +27,7 @@ class DailySummary(models.Model):
     # Processing status
     is_processed = models.BooleanField(default=False)  # AI processed this day
     processed_at = models.DateTimeField(null=True, blank=True)
+    closed_at = models.DateTimeField(null=True, blank=True)  # Metrics finalized by the end-of-day close
     
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
@@ -43,11 +44,12 @@ class DailySummary(models.Model):
         self.net_profit = self.total_sales - self.total_expenses
         super().save(*args, **kwargs)
     
-    def generate_ai_summary(self):
+    def generate_ai_summary(self, force=False):
         """Generate and save AI summary"""
         try:
             from .ai_service import ai_analyzer
-            ai_result = ai_analyzer.generate_daily_summary(self.business, self.date)
+            ai_result = ai_analyzer.generate_daily_summary(self.business, self.date, force=force)
+            self.from_cache = ai_result.get('cached', False)  # Served without calling the LLM
             self.ai_summary = ai_result['ai_summary']
             self.insights = ai_result['insights']
             self.recommendations = '\n'.join(ai_result['recommendations'])
@@ -57,4 +59,125 @@ class DailySummary(models.Model):
             return True
         except Exception as e:
             print(f"AI summary generation failed: {e}")
-            return False
\ No newline at end of file
+            return False
+
+# Content-addressed cache of generated AI summaries
+class AISummaryCache(models.Model):
+    business = models.ForeignKey('business.Business', on_delete=models.CASCADE)
+    date = models.DateField()
+    fingerprint = models.CharField(max_length=64)  # SHA-256 of the prepared metrics
+    metrics = models.JSONField(default=dict)  # Metrics the summary was generated from
+    
+    # Cached AI output
+    ai_summary = models.TextField(blank=True)
+    insights = models.JSONField(default=dict)
+    recommendations = models.JSONField(default=list)
+    
+    hit_count = models.IntegerField(default=0)  # Times served without calling the LLM
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        unique_together = ['business', 'fingerprint']
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['business', 'date', '-created_at'])]
+    
+    def __str__(self):
+        return f"AI cache {self.date} - {self.fingerprint[:12]}"
+
+# Sales fact tables: one pre-aggregated row per business-local day, refreshed
+# from SaleItem by analytics.facts so reports never scan raw items.
+# Product/category keys keep their IDs after deletion (no FK constraint).
+class ProductDailySales(models.Model):
+    business = models.ForeignKey('business.Business', on_delete=models.CASCADE)
+    date = models.DateField()
+    product = models.ForeignKey('inventory.Product', on_delete=models.DO_NOTHING, null=True,
+                                db_constraint=False, related_name='+')
+    product_name = models.CharField(max_length=200)
+    category = models.ForeignKey('inventory.Category', on_delete=models.DO_NOTHING, null=True,
+                                 db_constraint=False, related_name='+')
+    
+    # Measures
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
+    cost = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
+    profit = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
+    transaction_count = models.IntegerField(default=0)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-date', '-revenue']
+        constraints = [
+            models.UniqueConstraint(fields=['business', 'date', 'product'], nulls_distinct=False,
+                                    name='unique_product_daily_sales'),
+        ]
+    
+    def __str__(self):
+        return f"{self.product_name} {self.date}: {self.quantity}"
+
+class CategoryDailySales(models.Model):
+    business = models.ForeignKey('business.Business', on_delete=models.CASCADE)
+    date = models.DateField()
+    category = models.ForeignKey('inventory.Category', on_delete=models.DO_NOTHING, null=True,
+                                 db_constraint=False, related_name='+')
+    category_name = models.CharField(max_length=100)
+    
+    # Measures
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
+    cost = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
+    profit = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
+    transaction_count = models.IntegerField(default=0)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-date', '-revenue']
+        constraints = [
+            models.UniqueConstraint(fields=['business', 'date', 'category'], nulls_distinct=False,
+                                    name='unique_category_daily_sales'),
+        ]
+    
+    def __str__(self):
+        return f"{self.category_name} {self.date}: {self.revenue}"
+
+# Expense totals per business, category and business-local day, kept current by
+# Expense.save()/delete() through analytics.expenses so finance reports never scan Expense
+class CategoryDailyExpenses(models.Model):
+    business = models.ForeignKey('business.Business', on_delete=models.CASCADE)
+    date = models.DateField()
+    category = models.CharField(max_length=20)  # Expense.CATEGORIES key
+    
+    # Measures
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    expense_count = models.IntegerField(default=0)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-date', '-amount']
+        constraints = [
+            models.UniqueConstraint(fields=['business', 'date', 'category'], name='unique_category_daily_expenses'),
+        ]
+    
+    def __str__(self):
+        return f"{self.category} {self.date}: {self.amount}"
+
+# Top-k "frequently bought together" products for each product, rebuilt by analytics.basket
+class ProductAssociation(models.Model):
+    business = models.ForeignKey('business.Business', on_delete=models.CASCADE)
+    product = models.ForeignKey('inventory.Product', on_delete=models.CASCADE, related_name='+')
+    associated_product = models.ForeignKey('inventory.Product', on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()  # 0 = strongest association
+    
+    support = models.IntegerField()  # Baskets containing both products
+    confidence = models.FloatField()  # P(associated | product)
+    lift = models.FloatField()  # confidence / P(associated); > 1 means bought together more than by chance
+    computed_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['product', 'rank']
+        unique_together = ['product', 'rank']  # Also serves lookups by product
+    
+    def __str__(self):
+        return f"{self.product_id} -> {self.associated_product_id} (lift {self.lift:.2f})"
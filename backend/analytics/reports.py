@@ -0,0 +1,194 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from django.db.models import Count, F, Max, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+from .facts import ensure_facts
+from .models import CategoryDailyExpenses, CategoryDailySales, ProductDailySales
+
+# Metrics products can be ranked by
+RANKING_METRICS = ['revenue', 'quantity', 'profit', 'transaction_count']
+
+DEFAULT_REPORT_DAYS = 30
+
+# Buckets expense-to-sales trends can be grouped by
+TREND_PERIODS = {'day': None, 'week': TruncWeek, 'month': TruncMonth}
+
+def _sums():
+    return {
+        'quantity': Sum('quantity'),
+        'revenue': Sum('revenue'),
+        'cost': Sum('cost'),
+        'profit': Sum('profit'),
+        'transaction_count': Sum('transaction_count'),
+    }
+
+def _margin(profit, revenue):
+    if not revenue:
+        return Decimal('0.00')
+    return (Decimal(profit) * 100 / Decimal(revenue)).quantize(Decimal('0.01'))
+
+def _change(current, previous):
+    """Absolute and percentage change; percentage is None without a baseline"""
+    current, previous = current or 0, previous or 0
+    percent = None
+    if previous:
+        percent = (Decimal(current - previous) * 100 / abs(Decimal(previous))).quantize(Decimal('0.01'))
+    return {'current': current, 'previous': previous, 'change': current - previous, 'change_percent': percent}
+
+def parse_range(params, business, default_days=DEFAULT_REPORT_DAYS):
+    """Read start_date/end_date (YYYY-MM-DD, inclusive); defaults to the last N local days"""
+    end = params.get('end_date')
+    end = date.fromisoformat(end) if end else business.local_today()
+    start = params.get('start_date')
+    start = date.fromisoformat(start) if start else end - timedelta(days=default_days - 1)
+    if start > end:
+        raise ValueError('start_date must be on or before end_date')
+    return start, end
+
+def product_ranking(business, start, end, metric='revenue', bottom=False, limit=10, category_id=None):
+    """Top (or bottom) selling products over a date range, from product-day facts"""
+    ensure_facts(business, start, end)
+    facts = ProductDailySales.objects.filter(business=business, date__range=[start, end])
+    if category_id is not None:
+        facts = facts.filter(category_id=category_id)
+    
+    ordering = metric if bottom else f'-{metric}'
+    rows = facts.values('product_id').annotate(
+        product_name=Max('product_name'),
+        days_sold=Count('id'),
+        **_sums()
+    ).order_by(ordering, 'product_name')[:limit]
+    
+    return [{**row, 'margin_percent': _margin(row['profit'], row['revenue'])} for row in rows]
+
+def category_margins(business, start, end):
+    """Revenue, profit and margin per category over a date range, from category-day facts"""
+    ensure_facts(business, start, end)
+    rows = list(CategoryDailySales.objects.filter(
+        business=business, date__range=[start, end]
+    ).values('category_id').annotate(
+        category_name=Max('category_name'),
+        **_sums()
+    ).order_by('-revenue', 'category_name'))
+    
+    total_revenue = sum(row['revenue'] for row in rows)
+    for row in rows:
+        row['margin_percent'] = _margin(row['profit'], row['revenue'])
+        row['revenue_share_percent'] = _margin(row['revenue'], total_revenue)
+    return rows
+
+def period_totals(business, start, end):
+    """Quantity, revenue, cost and profit for a range (category facts are the smaller table)"""
+    totals = CategoryDailySales.objects.filter(
+        business=business, date__range=[start, end]
+    ).aggregate(
+        quantity=Sum('quantity'),
+        revenue=Sum('revenue'),
+        cost=Sum('cost'),
+        profit=Sum('profit'),
+    )
+    totals = {key: value or 0 for key, value in totals.items()}
+    totals['margin_percent'] = _margin(totals['profit'], totals['revenue'])
+    return totals
+
+def compare_periods(business, start, end, previous_start=None, previous_end=None):
+    """Compare a range against another, by default the same number of days just before it"""
+    if previous_start is None or previous_end is None:
+        length = (end - start).days + 1
+        previous_end = start - timedelta(days=1)
+        previous_start = previous_end - timedelta(days=length - 1)
+    ensure_facts(business, start, end)
+    
+    current, previous = period_totals(business, start, end), period_totals(business, previous_start, previous_end)
+    current_categories = {row['category_id']: row for row in category_margins(business, start, end)}
+    previous_categories = {
+        row['category_id']: row for row in category_margins(business, previous_start, previous_end)
+    }
+    
+    categories = []
+    for category_id in list(current_categories) + [c for c in previous_categories if c not in current_categories]:
+        now_row = current_categories.get(category_id, {})
+        then_row = previous_categories.get(category_id, {})
+        categories.append({
+            'category_id': category_id,
+            'category_name': now_row.get('category_name') or then_row.get('category_name'),
+            'revenue': _change(now_row.get('revenue'), then_row.get('revenue')),
+            'profit': _change(now_row.get('profit'), then_row.get('profit')),
+            'quantity': _change(now_row.get('quantity'), then_row.get('quantity')),
+        })
+    
+    return {
+        'period': {'start': start, 'end': end},
+        'previous_period': {'start': previous_start, 'end': previous_end},
+        'totals': {
+            key: _change(current[key], previous[key])
+            for key in ('revenue', 'profit', 'cost', 'quantity', 'margin_percent')
+        },
+        'categories': categories,
+    }
+
+def _expense_categories():
+    from payments.models import Expense
+    return dict(Expense.CATEGORIES)
+
+def burn_rate(business, start, end):
+    """Spending per day over a range, and net of gross profit, from the category-day aggregates"""
+    ensure_facts(business, start, end)
+    days = (end - start).days + 1
+    expenses = CategoryDailyExpenses.objects.filter(
+        business=business, date__range=[start, end]
+    ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
+    gross_profit = period_totals(business, start, end)['profit']
+    
+    daily = (Decimal(expenses) / days).quantize(Decimal('0.01'))
+    net_daily = (Decimal(expenses - gross_profit) / days).quantize(Decimal('0.01'))
+    return {
+        'period': {'start': start, 'end': end},
+        'days': days,
+        'total_expenses': expenses,
+        'gross_profit': gross_profit,
+        'daily_burn': daily,
+        'monthly_burn': daily * 30,
+        'net_daily_burn': net_daily,  # Negative when gross profit covers spending
+    }
+
+def expense_ratio_trend(business, start, end, period='day'):
+    """Expenses, sales revenue and expenses as a percentage of revenue per day, week or month"""
+    ensure_facts(business, start, end)
+    truncate = TREND_PERIODS[period]
+    bucket = truncate('date') if truncate else F('date')
+    
+    def by_bucket(model, measure):
+        rows = model.objects.filter(business=business, date__range=[start, end]).annotate(
+            bucket=bucket
+        ).values('bucket').annotate(total=Sum(measure)).order_by()
+        return {row['bucket']: row['total'] for row in rows}
+    
+    expenses = by_bucket(CategoryDailyExpenses, 'amount')
+    revenue = by_bucket(CategoryDailySales, 'revenue')
+    return [
+        {
+            'period_start': key,
+            'expenses': expenses.get(key, 0),
+            'revenue': revenue.get(key, 0),
+            'expense_ratio_percent': _margin(expenses.get(key, 0), revenue.get(key, 0)) if revenue.get(key) else None,
+        }
+        for key in sorted(set(expenses) | set(revenue))
+    ]
+
+def expense_category_mix(business, start, end):
+    """Spending per expense category with its share of the range's total"""
+    labels = _expense_categories()
+    rows = list(CategoryDailyExpenses.objects.filter(
+        business=business, date__range=[start, end]
+    ).values('category').annotate(
+        amount=Sum('amount'),
+        expense_count=Sum('expense_count'),
+        days=Count('id'),
+    ).order_by('-amount', 'category'))
+    
+    total = sum(row['amount'] for row in rows)
+    for row in rows:
+        row['category_display'] = labels.get(row['category'], row['category'])
+        row['share_percent'] = _margin(row['amount'], total)
+    return rows
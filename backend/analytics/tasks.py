@@ -1,10 +1,218 @@
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from django.db import connections
+from django.db.models import Count, Exists, OuterRef, Q, Sum
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from datetime import timedelta
+from jobs.queue import task
+from .expenses import expense_total
+from .facts import refresh_sales_facts
 from .models import DailySummary
 
+# How many missed days a close run will backfill per business
+MAX_CATCHUP_DAYS = 7
+
 def generate_daily_summaries():
-    """Generate AI summaries for previous day"""
-    yesterday = timezone.now().date() - timedelta(days=1)
+    """Generate AI summaries for closed days that have not been processed yet"""
+    for summary in DailySummary.objects.filter(closed_at__isnull=False, is_processed=False):
+        summary.generate_ai_summary()
+
+def compute_daily_metrics(business, date, stock=True):
+    """Compute a business-local day's metrics with set-based aggregate queries
+    
+    The stock counts are a snapshot of current stock, so they only belong on a day
+    when taken at its close; pass stock=False to leave them out.
+    """
+    from sales.models import NET_AMOUNT, Sale
+    from inventory.models import Product
+    
+    start, end = business.day_bounds(date)
+    sales = Sale.objects.filter(
+        business=business,
+        created_at__gte=start,
+        created_at__lt=end,
+        status='completed'
+    )
+    
+    # Customers whose phone number was first seen on this day
+    earlier_sale = Sale.objects.filter(
+        business=business,
+        customer_phone=OuterRef('customer_phone'),
+        created_at__lt=start
+    )
+    sale_totals = sales.aggregate(
+        total=Sum(NET_AMOUNT),
+        count=Count('id'),
+        new_customers=Count(
+            'customer_phone',
+            distinct=True,
+            filter=~Q(customer_phone='') & ~Exists(earlier_sale)
+        ),
+    )
+    
+    total_expenses = expense_total(business, date, date)
+    
+    metrics = {
+        'total_sales': sale_totals['total'] or 0,
+        'total_expenses': total_expenses,
+        'transactions_count': sale_totals['count'],
+        'new_customers': sale_totals['new_customers'],
+    }
+    if stock:
+        # Low/out-of-stock snapshot straight off the partial stock alert index
+        counts = Product.objects.filter(business=business).exclude(stock_state='ok').aggregate(
+            low=Count('id'),
+            out=Count('id', filter=Q(stock_state='out')),
+        )
+        metrics['low_stock_items'], metrics['out_of_stock_items'] = counts['low'], counts['out']
+    return metrics
+
+def materialize_daily_summary(business, date, close=False):
+    """Store a day's metrics on its DailySummary row, optionally marking the day closed"""
+    metrics = compute_daily_metrics(business, date)
+    summary, _ = DailySummary.objects.get_or_create(business=business, date=date)
+    for field, value in metrics.items():
+        setattr(summary, field, value)
+    if close:
+        refresh_sales_facts(business, date)
+        summary.closed_at = timezone.now()
+    summary.save()
+    return summary
+
+def restate_day(business, date):
+    """Rebuild a day's facts and any stored summary metrics after its sales changed (refunds)
+    
+    The day's stock snapshot is history and is left as it was.
+    """
+    refresh_sales_facts(business, date)
+    summary = DailySummary.objects.filter(business=business, date=date).first()
+    if summary:
+        for field, value in compute_daily_metrics(business, date, stock=False).items():
+            setattr(summary, field, value)
+        summary.save()
+    return summary
+
+def pending_close_dates(business, now=None):
+    """Business-local days that have ended but are not closed yet (oldest first)"""
+    local_today = timezone.localtime(now or timezone.now(), business.tzinfo).date()
+    last_day = local_today - timedelta(days=1)
+    first_day = local_today - timedelta(days=MAX_CATCHUP_DAYS)
     
-    for summary in DailySummary.objects.filter(date=yesterday, is_processed=False):
-        summary.generate_ai_summary()
\ No newline at end of file
+    closed = set(DailySummary.objects.filter(
+        business=business,
+        date__range=[first_day, last_day],
+        closed_at__isnull=False
+    ).values_list('date', flat=True))
+    
+    days = []
+    day = first_day
+    while day <= last_day:
+        if day not in closed:
+            days.append(day)
+        day += timedelta(days=1)
+    
+    # A business created mid-window has nothing to close before its first day
+    created = timezone.localtime(business.created_at, business.tzinfo).date()
+    return [d for d in days if d >= created]
+
+def close_business(business_id, dates=None, now=None):
+    """Close every pending day for one business; returns the closed dates"""
+    from business.models import Business
+    business = Business.objects.get(pk=business_id)
+    dates = dates or pending_close_dates(business, now)
+    for date in dates:
+        materialize_daily_summary(business, date, close=True)
+    return [d.isoformat() for d in dates]
+
+def _close_business_worker(args):
+    business_id, dates, now = args
+    try:
+        return business_id, close_business(business_id, dates, now), None
+    except Exception as e:
+        return business_id, [], str(e)
+    finally:
+        connections.close_all()
+
+def close_business_days(business_ids=None, dates=None, now=None, workers=1):
+    """Run the end-of-day close for all active businesses, fanning out across a process pool"""
+    from business.models import Business
+    if business_ids is None:
+        business_ids = list(Business.objects.filter(status='active').values_list('id', flat=True))
+    jobs = [(business_id, dates, now) for business_id in business_ids]
+    
+    if workers <= 1 or len(jobs) <= 1:
+        return [_close_business_worker(job) for job in jobs]
+    
+    # Forked workers must open their own database connections
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, initializer=connections.close_all) as pool:
+        return list(pool.map(_close_business_worker, jobs))
+
+def announce_summary(summary):
+    """Notify the business that a freshly generated AI summary is ready"""
+    from notifications.views import send_business_notification
+    
+    insights = summary.insights or {}
+    profitability = insights.get('profitability', 'needs_attention')
+    sales_trend = insights.get('sales_trend', 'stable')
+    
+    if profitability == 'good' and sales_trend == 'increasing':
+        title = '📈 Great Day!'
+        message = f"Your business had an excellent day on {summary.date}! Sales are up and profitable."
+    elif profitability == 'good':
+        title = '✅ Profitable Day'
+        message = f"Your business was profitable on {summary.date}. Check your AI summary for details."
+    else:
+        title = '📊 Daily Summary Ready'
+        message = f"Your AI business summary for {summary.date} is ready with insights and recommendations."
+    
+    send_business_notification(
+        business=summary.business,
+        title=title,
+        message=message,
+        notification_type='summary',
+        data={
+            'summary_id': summary.id,
+            'date': summary.date.isoformat(),
+            'profitability': profitability,
+            'sales_trend': sales_trend,
+            'net_profit': float(summary.net_profit),
+        }
+    )
+
+# Background jobs (see the jobs app); kwargs are plain IDs so they survive JSON
+
+@task(priority=5, max_attempts=3, timeout=120)
+def generate_summary_job(summary_id, force=False):
+    """Generate (or reuse) a day's AI summary and announce it; LLM failures retry with backoff"""
+    summary = DailySummary.objects.select_related('business').get(pk=summary_id)
+    if not summary.generate_ai_summary(force=force):
+        raise RuntimeError(f'AI summary generation failed for {summary.date}')
+    if not summary.from_cache:
+        announce_summary(summary)
+
+@task(timeout=900)
+def close_business_job(business_id, scheduled_for=None):
+    """End-of-day close for one business, one job per business when fanned out by the queue"""
+    close_business(business_id)
+    if settings.AI_CONFIG['enabled']:
+        # End-of-day summaries for the days just closed (and any an earlier run left behind)
+        for summary_id in DailySummary.objects.filter(
+            business_id=business_id, closed_at__isnull=False, is_processed=False
+        ).values_list('id', flat=True):
+            generate_summary_job.enqueue(summary_id=summary_id, unique_key=f'ai-summary:{summary_id}')
+
+@task(priority=10, max_attempts=1, timeout=60)
+def business_alerts_job(business_id, scheduled_for=None):
+    """Time-of-day alerts (no sales by 3 PM, peak hours) for the business-local hour of the slot"""
+    from business.models import Business
+    from .views_ai import send_periodic_business_alerts
+    now = parse_datetime(scheduled_for) if scheduled_for else None
+    send_periodic_business_alerts(Business.objects.get(pk=business_id), now=now)
+
+@task(priority=-5, timeout=1800)
+def mine_baskets_job(business_id, scheduled_for=None):
+    from business.models import Business
+    from .basket import mine_associations
+    mine_associations(Business.objects.get(pk=business_id))
@@ -1,3 +1,597 @@
-from django.test import TestCase
+import io
+import json
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from accounts.models import User
+from business.models import Business
+from jobs.models import Job
+from imanage import db_router
+from inventory.models import Category, Product
+from notifications.models import Notification
+from payments.models import Expense
+from sales.models import Sale, SaleItem
+from .ai_service import BusinessAIAnalyzer
+from .basket import load_baskets, mine_associations, suggestions_for_cart
+from .facts import rebuild_sales_facts
+from .expenses import rebuild_expense_totals
+from .models import (AISummaryCache, CategoryDailyExpenses, CategoryDailySales, DailySummary, ProductAssociation,
+                     ProductDailySales)
+from .reports import burn_rate, category_margins, compare_periods, expense_category_mix, product_ranking
+from .tasks import MAX_CATCHUP_DAYS, close_business, close_business_days, pending_close_dates
+from .views import build_dashboard
 
-# Create your tests here.
+REPLICA_ON = {**settings.REPLICA_CONFIG, 'enabled': True}
+
+# Runs with two aliases: "replica" mirrors "default" in the test database
+@override_settings(REPLICA_CONFIG=REPLICA_ON)
+class ReplicaRoutingTests(TestCase):
+    databases = {'default', 'replica'}
+    
+    def setUp(self):
+        cache.clear()
+        db_router.reset_lag_state()
+        self.business = Business.objects.create(name='Shop')
+        self.user = User.objects.create_user('owner@example.com', 'password123', first_name='O',
+                                             last_name='W', role='owner', business=self.business)
+        DailySummary.objects.create(business=self.business, date=date(2026, 1, 1))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+    
+    def tearDown(self):
+        db_router.reset_lag_state()
+    
+    def test_reads_use_replica_only_inside_block(self):
+        self.assertEqual(DailySummary.objects.all().db, 'default')
+        with db_router.reads_from_replica(self.user) as alias:
+            self.assertEqual(alias, 'replica')
+            self.assertEqual(DailySummary.objects.all().db, 'replica')
+            self.assertEqual(db_router.ReplicaRouter().db_for_write(DailySummary), 'default')
+        self.assertEqual(DailySummary.objects.all().db, 'default')
+    
+    def test_recent_writer_sticks_to_primary(self):
+        db_router.mark_write(self.user.pk)
+        self.assertEqual(db_router.read_alias(self.user), 'default')
+        self.assertEqual(db_router.read_alias(), 'replica')
+    
+    def test_lagging_or_unreachable_replica_falls_back(self):
+        for lag, expected in [(30.0, 'default'), (None, 'default'), (0.5, 'replica')]:
+            db_router.reset_lag_state()
+            with mock.patch.object(db_router, '_measure_lag', return_value=lag):
+                self.assertEqual(db_router.read_alias(), expected)
+    
+    def test_lag_is_measured_once_per_interval(self):
+        with mock.patch.object(db_router, '_measure_lag', return_value=0.0) as measure:
+            db_router.read_alias()
+            db_router.read_alias()
+        self.assertEqual(measure.call_count, 1)
+    
+    @override_settings(REPLICA_CONFIG={**REPLICA_ON, 'enabled': False})
+    def test_disabled_routing_stays_on_primary(self):
+        self.assertEqual(db_router.read_alias(), 'default')
+    
+    def test_replica_is_never_migrated(self):
+        router = db_router.ReplicaRouter()
+        self.assertFalse(router.allow_migrate('replica', 'analytics'))
+        self.assertIsNone(router.allow_migrate('default', 'analytics'))
+    
+    def test_list_endpoint_reads_replica_until_user_writes(self):
+        with CaptureQueriesContext(connections['replica']) as replica_queries:
+            response = self.client.get('/api/analytics/daily-summaries/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(any('analytics_dailysummary' in q['sql'] for q in replica_queries))
+        
+        response = self.client.post('/api/notifications/register-device/',
+                                    {'token': 'device-1', 'device_type': 'android'}, format='json')
+        self.assertLess(response.status_code, 400)
+        
+        with CaptureQueriesContext(connections['replica']) as replica_queries:
+            response = self.client.get('/api/analytics/daily-summaries/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(any('analytics_dailysummary' in q['sql'] for q in replica_queries))
+
+class ExportTests(TestCase):
+    databases = {'default', 'replica'}
+    
+    def setUp(self):
+        cache.clear()
+        db_router.reset_lag_state()
+        self.business = Business.objects.create(name='Shop')  # Africa/Nairobi, UTC+3
+        self.user = User.objects.create_user('owner@example.com', 'password123', role='owner',
+                                             business=self.business)
+        for receipt, day, hour in [('R1', date(2026, 3, 1), 1), ('R2', date(2026, 3, 2), 12), ('R3', date(2026, 3, 3), 23)]:
+            Sale.objects.create(business=self.business, receipt_number=receipt, cashier=self.user,
+                                total_amount=Decimal('12.50'),
+                                created_at=self.business.day_bounds(day)[0] + timedelta(hours=hour))
+        other = Business.objects.create(name='Other')
+        Sale.objects.create(business=other, receipt_number='X1', total_amount=Decimal('1.00'))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+    
+    def tearDown(self):
+        db_router.reset_lag_state()
+    
+    def export(self, dataset='sales', **params):
+        response = self.client.get(f'/api/analytics/export/{dataset}/', params)
+        if response.status_code != 200:
+            return response, None
+        return response, b''.join(response.streaming_content).decode()
+    
+    def test_csv_and_jsonl_output(self):
+        response, body = self.export()
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="sales_all_all.csv"')
+        lines = body.splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['id', 'transaction_id', 'receipt_number'])
+        self.assertEqual([line.split(',')[2] for line in lines[1:]], ['R1', 'R2', 'R3'])
+        
+        response, body = self.export(output='jsonl')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([(row['receipt_number'], row['total_amount']) for row in rows],
+                         [('R1', '12.50'), ('R2', '12.50'), ('R3', '12.50')])
+        self.assertEqual(rows[0]['created_at'], '2026-02-28T22:00:00+00:00')
+    
+    def test_dates_are_inclusive_business_local_days(self):
+        # R1 is on the 1st locally though the 28th in UTC; R3 is late on the 3rd locally
+        _, body = self.export(output='jsonl', start_date='2026-03-01', end_date='2026-03-02')
+        self.assertEqual([json.loads(line)['receipt_number'] for line in body.splitlines()], ['R1', 'R2'])
+        _, body = self.export(output='jsonl', start_date='2026-03-03')
+        self.assertEqual([json.loads(line)['receipt_number'] for line in body.splitlines()], ['R3'])
+    
+    def test_rejected_requests(self):
+        self.assertEqual(self.export('customers')[0].status_code, 404)
+        self.assertEqual(self.export(output='xlsx')[0].status_code, 400)
+        self.assertEqual(self.export(start_date='March')[0].status_code, 400)
+        cashier = User.objects.create_user('cashier@example.com', 'password123', role='cashier',
+                                           business=self.business)
+        self.client.force_authenticate(cashier)
+        self.assertEqual(self.export()[0].status_code, 403)
+    
+    @override_settings(REPLICA_CONFIG=REPLICA_ON)
+    def test_rows_stream_from_the_alias_pinned_by_the_request(self):
+        response = self.client.get('/api/analytics/export/sales/')
+        # The routing context has ended by now; the rows must still come from the replica
+        with CaptureQueriesContext(connections['replica']) as replica_queries:
+            b''.join(response.streaming_content)
+        self.assertTrue(any('sales_sale' in q['sql'] for q in replica_queries))
+    
+    async def test_asgi_streams_chunk_by_chunk(self):
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+        with override_settings(EXPORT_CHUNK_SIZE=2):
+            response = await AsyncClient().get('/api/analytics/export/sales/', {'output': 'jsonl'}, headers=headers)
+            self.assertTrue(response.is_async)
+            chunks = [chunk async for chunk in response.streaming_content]
+        self.assertEqual([len(chunk.splitlines()) for chunk in chunks], [2, 1])
+        self.assertEqual([json.loads(line)['receipt_number'] for line in b''.join(chunks).splitlines()],
+                         ['R1', 'R2', 'R3'])
+
+class SalesFactTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.business = Business.objects.create(name='Shop')
+        self.user = User.objects.create_user('owner@example.com', 'password123', first_name='O',
+                                             last_name='W', role='owner', business=self.business)
+        drinks = Category.objects.create(business=self.business, name='Drinks')
+        snacks = Category.objects.create(business=self.business, name='Snacks')
+        self.soda = Product.objects.create(business=self.business, category=drinks, sku='SODA', name='Soda',
+                                           cost_price=30, selling_price=50, barcode='B-SODA')
+        self.chips = Product.objects.create(business=self.business, category=snacks, sku='CHIPS', name='Chips',
+                                            cost_price=60, selling_price=100, barcode='B-CHIPS')
+        self.day1, self.day2 = date(2026, 3, 1), date(2026, 3, 2)
+        self.sell(self.day1, [(self.soda, 4), (self.chips, 1)])
+        self.sell(self.day1, [(self.soda, 2)])
+        self.sell(self.day2, [(self.chips, 3)])
+        self.sell(self.day2, [(self.soda, 10)], status='cancelled')
+    
+    def sell(self, day, lines, status='completed'):
+        noon = self.business.day_bounds(day)[0] + timedelta(hours=12)
+        sale = Sale.objects.create(business=self.business, receipt_number=f'R{Sale.objects.count()}',
+                                   status=status, cashier=self.user, created_at=noon)
+        for product, quantity in lines:
+            SaleItem.objects.create(sale=sale, product=product, product_name=product.name, quantity=quantity,
+                                    unit_price=product.selling_price, cost_price=product.cost_price)
+    
+    def test_facts_aggregate_completed_sales_per_local_day(self):
+        rebuild_sales_facts(self.business, self.day1, self.day2)
+        
+        soda = ProductDailySales.objects.get(business=self.business, date=self.day1, product=self.soda)
+        self.assertEqual((soda.quantity, soda.revenue, soda.cost, soda.profit, soda.transaction_count),
+                         (6, 300, 180, 120, 2))
+        self.assertFalse(ProductDailySales.objects.filter(date=self.day2, product=self.soda).exists())
+        self.assertEqual(CategoryDailySales.objects.filter(business=self.business).count(), 3)
+        
+        # Rebuilding is idempotent
+        rebuild_sales_facts(self.business, self.day1, self.day2)
+        self.assertEqual(ProductDailySales.objects.filter(business=self.business).count(), 3)
+    
+    def test_reports_read_only_fact_tables(self):
+        rebuild_sales_facts(self.business, self.day1, self.day2)
+        
+        with CaptureQueriesContext(connections['default']) as queries:
+            top = product_ranking(self.business, self.day1, self.day2, metric='revenue')
+            bottom = product_ranking(self.business, self.day1, self.day2, metric='revenue', bottom=True, limit=1)
+            categories = category_margins(self.business, self.day1, self.day2)
+            comparison = compare_periods(self.business, self.day2, self.day2)
+        self.assertFalse(any('sales_saleitem' in q['sql'] for q in queries))
+        
+        self.assertEqual([row['product_name'] for row in top], ['Chips', 'Soda'])
+        self.assertEqual(top[0]['revenue'], 400)
+        self.assertEqual(bottom[0]['product_name'], 'Soda')
+        self.assertEqual([(row['category_name'], row['margin_percent']) for row in categories],
+                         [('Snacks', Decimal('40.00')), ('Drinks', Decimal('40.00'))])
+        self.assertEqual(comparison['previous_period'], {'start': self.day1, 'end': self.day1})
+        self.assertEqual(comparison['totals']['revenue']['current'], 300)
+        self.assertEqual(comparison['totals']['revenue']['previous'], 400)
+        self.assertEqual(comparison['totals']['revenue']['change_percent'], Decimal('-25.00'))
+    
+    def test_report_endpoint_validates_parameters(self):
+        rebuild_sales_facts(self.business, self.day1, self.day2)
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get('/api/analytics/reports/products/', {'metric': 'colour'})
+        self.assertEqual(response.status_code, 400)
+        response = client.get('/api/analytics/reports/compare/',
+                              {'start_date': '2026-03-02', 'end_date': '2026-03-02'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['categories'][0]['category_name'], 'Snacks')
+
+@override_settings(BASKET_CONFIG={**settings.BASKET_CONFIG, 'min_support': 2})
+class BasketMiningTests(TestCase):
+    def setUp(self):
+        self.business = Business.objects.create(name='Shop')
+        self.user = User.objects.create_user('owner@example.com', 'password123', first_name='O',
+                                             last_name='W', role='owner', business=self.business)
+        self.bread, self.butter, self.milk, self.soap = (
+            Product.objects.create(business=self.business, sku=name.upper(), name=name, cost_price=10,
+                                   selling_price=15, current_stock=10, barcode=f'B-{name}')
+            for name in ('Bread', 'Butter', 'Milk', 'Soap')
+        )
+        for products, times in [((self.bread, self.butter), 3), ((self.bread, self.milk), 1),
+                                ((self.milk, self.soap), 2), ((self.soap,), 2)]:
+            for _ in range(times):
+                self.sell(products)
+        for _ in range(5):
+            self.sell((self.butter, self.soap), status='cancelled')
+    
+    def sell(self, products, status='completed'):
+        sale = Sale.objects.create(business=self.business, receipt_number=f'R{Sale.objects.count()}',
+                                   status=status, cashier=self.user)
+        for product in products:
+            SaleItem.objects.create(sale=sale, product=product, product_name=product.name, quantity=1,
+                                    unit_price=product.selling_price, cost_price=product.cost_price)
+    
+    def test_pairs_ranked_by_lift_across_chunks(self):
+        # Two baskets per chunk; the cancelled butter + soap baskets never count
+        self.assertEqual(mine_associations(self.business, chunk_sales=2), 4)
+        
+        butter = ProductAssociation.objects.get(product=self.butter, rank=0)
+        self.assertEqual(butter.associated_product_id, self.bread.id)
+        self.assertEqual((butter.support, butter.confidence, butter.lift), (3, 1.0, 2.0))
+        milk = ProductAssociation.objects.get(product=self.milk, rank=0)
+        self.assertEqual((milk.associated_product_id, milk.lift), (self.soap.id, 1.3333))
+        self.assertFalse(ProductAssociation.objects.filter(product=self.bread, associated_product=self.milk).exists())
+        
+        # Re-mining replaces rather than appends
+        mine_associations(self.business)
+        self.assertEqual(ProductAssociation.objects.filter(business=self.business).count(), 4)
+    
+    def test_baskets_load_in_bounded_chunks(self):
+        since = timezone.now() - timedelta(days=1)
+        chunks = [set(sale_ids.tolist()) for sale_ids, _ in load_baskets(self.business, since, 3)]
+        self.assertEqual([len(chunk) for chunk in chunks], [3, 3, 2])
+        completed = Sale.objects.filter(status='completed').values_list('id', flat=True)
+        self.assertEqual(set().union(*chunks), set(completed))
+    
+    def test_cart_suggestions_skip_cart_items(self):
+        mine_associations(self.business)
+        suggestions = suggestions_for_cart(self.business, [self.bread.id, self.milk.id])
+        self.assertEqual([row['product_id'] for row in suggestions], [self.butter.id, self.soap.id])
+        self.assertEqual(suggestions_for_cart(self.business, [self.bread.id, self.butter.id]), [])
+
+# The replica is a second connection, so it only sees committed data
+@override_settings(REPLICA_CONFIG=REPLICA_ON)
+class DashboardAlertTests(TransactionTestCase):
+    databases = {'default', 'replica'}
+    
+    def test_once_a_day_check_reads_the_primary(self):
+        business = Business.objects.create(name='Shop')
+        user = User.objects.create_user('owner@example.com', 'password123', role='owner', business=business)
+        for i in range(4):
+            Product.objects.create(business=business, sku=f'LOW{i}', name=f'Low {i}', cost_price=1, selling_price=2,
+                                   current_stock=1, minimum_stock=5, barcode=f'B-LOW{i}')
+        
+        db_router.reset_lag_state()
+        self.addCleanup(db_router.reset_lag_state)
+        with mock.patch.object(db_router, '_measure_lag', return_value=0.0), \
+                mock.patch('notifications.views.push_coalescer'), \
+                CaptureQueriesContext(connections['replica']) as replica_queries:
+            for _ in range(2):
+                with db_router.reads_from_replica(user):
+                    build_dashboard(business, user)
+        
+        self.assertEqual(Notification.objects.filter(user=user, notification_type='stock').count(), 1)
+        self.assertTrue(any('inventory_product' in q['sql'] for q in replica_queries))
+        self.assertFalse(any('notifications_notification' in q['sql'] for q in replica_queries))
+
+# Sub-requests run on pool threads with their own connections, so data must be committed
+class BatchRequestTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        # Pool threads close their connections after each sub-request, so none outlive the test
+        patcher = mock.patch.dict(connections.settings['default'], {'CONN_MAX_AGE': 0})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        business = Business.objects.create(name='Shop')
+        self.user = User.objects.create_user('owner@example.com', 'password123', first_name='O', last_name='W',
+                                             role='owner', business=business)
+        Product.objects.create(business=business, sku='SOAP', name='Soap', cost_price=10, selling_price=15,
+                               current_stock=3, minimum_stock=5, barcode='B-SOAP')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+    
+    def batch(self, requests):
+        return self.client.post('/api/batch/', {'requests': requests}, format='json')
+    
+    def test_sub_requests_keep_their_own_status(self):
+        # The token is checked once for the whole batch, never per sub-request
+        with mock.patch('rest_framework_simplejwt.authentication.JWTAuthentication.authenticate',
+                        side_effect=AssertionError('re-authenticated')):
+            response = self.batch([
+                {'id': 'dashboard', 'url': '/api/analytics/dashboard/'},
+                {'id': 'profile', 'url': '/api/auth/profile/'},
+                {'id': 'low', 'url': '/api/inventory/products/low-stock/?fields=sku,stock_state'},
+                {'id': 'missing', 'url': '/api/nothing-here/'},
+                {'id': 'nested', 'url': '/api/batch/'},
+            ])
+        self.assertEqual(response.status_code, 200)
+        results = {entry['id']: entry for entry in response.json()['responses']}
+        self.assertEqual(list(results), ['dashboard', 'profile', 'low', 'missing', 'nested'])
+        self.assertEqual(results['dashboard']['status'], 200)
+        self.assertEqual(results['profile']['body']['email'], 'owner@example.com')
+        self.assertEqual(results['low']['body'], [{'sku': 'SOAP', 'stock_state': 'low'}])
+        self.assertEqual(results['missing']['status'], 404)
+        self.assertEqual(results['nested']['status'], 400)
+    
+    @override_settings(BATCH_CONFIG={**settings.BATCH_CONFIG, 'max_requests': 2})
+    def test_limits_and_auth(self):
+        urls = [{'url': '/api/auth/profile/'}] * 3
+        self.assertEqual(self.batch(urls).status_code, 400)
+        self.assertEqual(self.batch([{'url': '/api/sales/sales/', 'method': 'POST'}]).status_code, 400)
+        
+        self.client.credentials()
+        self.assertEqual(self.batch(urls[:1]).status_code, 401)
+
+# close_business_days drops connections after each business, as its pool workers must
+class CloseDayTests(TransactionTestCase):
+    def setUp(self):
+        # Africa/Nairobi is UTC+3: the 10th ends locally at 21:00 UTC on the 10th
+        self.business = Business.objects.create(name='Shop',
+                                                created_at=datetime(2026, 1, 1, tzinfo=dt_timezone.utc))
+        self.midnight = datetime(2026, 3, 10, 21, 0, tzinfo=dt_timezone.utc)
+    
+    def sell(self, when, amount):
+        Sale.objects.create(business=self.business, receipt_number=f'R{Sale.objects.count()}', created_at=when,
+                            total_amount=Decimal(amount), subtotal=Decimal(amount))
+    
+    def test_local_day_closes_at_local_midnight(self):
+        self.sell(self.midnight - timedelta(minutes=30), '40.00')  # 23:30 on the 10th, local
+        self.sell(self.midnight + timedelta(minutes=30), '99.00')  # Already the 11th
+        
+        self.assertNotIn(date(2026, 3, 10), pending_close_dates(self.business, self.midnight - timedelta(seconds=1)))
+        self.assertEqual(pending_close_dates(self.business, self.midnight)[-1], date(2026, 3, 10))
+        close_business(self.business.id, now=self.midnight)
+        summary = DailySummary.objects.get(business=self.business, date=date(2026, 3, 10))
+        self.assertEqual((summary.total_sales, summary.transactions_count), (Decimal('40.00'), 1))
+        self.assertIsNotNone(summary.closed_at)
+        self.assertEqual(ProductDailySales.objects.filter(business=self.business).count(), 0)
+    
+    def test_catch_up_is_capped(self):
+        days = pending_close_dates(self.business, self.midnight)
+        self.assertEqual(len(days), MAX_CATCHUP_DAYS)
+        self.assertEqual((days[0], days[-1]), (date(2026, 3, 11) - timedelta(days=MAX_CATCHUP_DAYS), date(2026, 3, 10)))
+    
+    def test_business_created_mid_window(self):
+        created_at = datetime(2026, 3, 8, 5, 0, tzinfo=dt_timezone.utc)  # 08:00 local on the 8th
+        Business.objects.filter(pk=self.business.pk).update(created_at=created_at)
+        self.business.refresh_from_db()
+        self.assertEqual(pending_close_dates(self.business, self.midnight),
+                         [date(2026, 3, 8), date(2026, 3, 9), date(2026, 3, 10)])
+    
+    def test_rerun_closes_nothing_twice(self):
+        first = close_business_days([self.business.id], now=self.midnight)
+        self.assertEqual(len(first[0][1]), MAX_CATCHUP_DAYS)
+        closed_at = dict(DailySummary.objects.values_list('date', 'closed_at'))
+        
+        self.assertEqual(close_business_days([self.business.id], now=self.midnight), [(self.business.id, [], None)])
+        self.assertEqual(dict(DailySummary.objects.values_list('date', 'closed_at')), closed_at)
+        
+        # Only the newly ended day is closed the next night
+        result = close_business_days([self.business.id], now=self.midnight + timedelta(days=1))
+        self.assertEqual(result, [(self.business.id, ['2026-03-11'], None)])
+
+@override_settings(AI_CONFIG={**settings.AI_CONFIG, 'cache_tolerance': 0.02})
+class AISummaryCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.business = Business.objects.create(name='Shop')
+        self.day = date(2026, 3, 2)
+        self.spend('100.00')
+        self.analyzer = BusinessAIAnalyzer()
+        patcher = mock.patch('analytics.ai_service.requests.post')
+        self.post = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.post.return_value.json.return_value = {'choices': [{'message': {'content': 'A quiet day.'}}]}
+    
+    def spend(self, amount):
+        Expense.objects.create(business=self.business, category='rent', description='rent', amount=Decimal(amount),
+                               created_at=self.business.day_bounds(self.day)[0] + timedelta(hours=12))
+    
+    def summarize(self, **kwargs):
+        return self.analyzer.generate_daily_summary(self.business, self.day, **kwargs)
+    
+    def test_identical_metrics_are_served_from_the_cache(self):
+        first, second = self.summarize(), self.summarize()
+        self.assertEqual((first['cached'], second['cached']), (False, True))
+        self.assertEqual(second['ai_summary'], 'A quiet day.')
+        self.assertEqual(self.post.call_count, 1)
+        self.assertEqual(AISummaryCache.objects.get().hit_count, 1)
+    
+    def test_small_moves_reuse_the_summary_and_large_ones_do_not(self):
+        self.summarize()
+        self.spend('1.00')  # 1% more expenses
+        self.assertTrue(self.summarize()['cached'])
+        self.spend('9.00')  # 10% over the cached figure
+        self.assertFalse(self.summarize()['cached'])
+        self.assertEqual((self.post.call_count, AISummaryCache.objects.count()), (2, 2))
+    
+    def test_force_calls_the_model(self):
+        self.summarize()
+        self.assertFalse(self.summarize(force=True)['cached'])
+        self.assertEqual((self.post.call_count, AISummaryCache.objects.count()), (2, 1))
+    
+    def test_fallback_results_are_not_cached(self):
+        self.post.side_effect = ConnectionError('down')
+        self.assertTrue(self.summarize()['fallback'])
+        self.assertFalse(AISummaryCache.objects.exists())
+        
+        self.post.side_effect = None
+        self.assertFalse(self.summarize()['cached'])
+        self.assertEqual(self.post.call_count, 2)
+    
+    def test_facts_are_rebuilt_only_for_open_days(self):
+        with mock.patch('analytics.ai_service.refresh_sales_facts') as refresh:
+            self.analyzer.collect_metrics(self.business, self.day)  # Past but never closed
+            DailySummary.objects.create(business=self.business, date=self.day, total_sales=Decimal('0.00'),
+                                        total_expenses=Decimal('0.00'), closed_at=timezone.now())
+            self.analyzer.collect_metrics(self.business, self.day)
+        self.assertEqual(refresh.call_count, 1)
+        
+        with mock.patch('analytics.facts.refresh_sales_facts') as refresh:
+            for _ in range(2):  # Today is refreshed at most once per interval
+                self.analyzer.collect_metrics(self.business, self.business.local_today())
+        self.assertEqual(refresh.call_count, 1)
+
+class BackgroundSummaryTests(TestCase):
+    def test_background_generation_is_queued_once(self):
+        business = Business.objects.create(name='Shop')
+        user = User.objects.create_user('owner@example.com', 'password123', first_name='O', last_name='W',
+                                        role='owner', business=business)
+        client = APIClient()
+        client.force_authenticate(user)
+        
+        first = client.post('/api/analytics/ai/generate-summary/', {'background': True}, format='json')
+        second = client.post('/api/analytics/ai/generate-summary/', {'background': True}, format='json')
+        self.assertEqual(first.status_code, 202)
+        self.assertEqual(first.data['job_id'], second.data['job_id'])
+        job = Job.objects.get()
+        self.assertEqual((job.task, job.status), ('analytics.tasks.generate_summary_job', 'queued'))
+
+class ExpenseAggregateTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.business = Business.objects.create(name='Shop')
+        self.user = User.objects.create_user('owner@example.com', 'password123', role='owner',
+                                             business=self.business)
+        self.day1, self.day2 = date(2026, 3, 1), date(2026, 3, 2)
+    
+    def spend(self, day, category, amount, hour=12):
+        return Expense.objects.create(business=self.business, category=category, description=category,
+                                      amount=Decimal(amount), created_at=self.business.day_bounds(day)[0]
+                                      + timedelta(hours=hour))
+    
+    def totals(self):
+        return {
+            (row.date, row.category): (row.amount, row.expense_count)
+            for row in CategoryDailyExpenses.objects.filter(business=self.business)
+        }
+    
+    def test_aggregates_follow_create_update_and_delete(self):
+        rent = self.spend(self.day1, 'rent', '500.00')
+        self.spend(self.day1, 'rent', '100.00', hour=1)  # Day 1 locally, still the day before in UTC
+        power = self.spend(self.day2, 'utilities', '80.00')
+        self.assertEqual(self.totals(), {
+            (self.day1, 'rent'): (Decimal('600.00'), 2),
+            (self.day2, 'utilities'): (Decimal('80.00'), 1),
+        })
+        
+        rent.amount, rent.category = Decimal('450.00'), 'maintenance'
+        rent.save()
+        power.delete()
+        self.assertEqual(self.totals(), {
+            (self.day1, 'rent'): (Decimal('100.00'), 1),
+            (self.day1, 'maintenance'): (Decimal('450.00'), 1),
+        })
+        
+        # A rebuild from Expense agrees with the incremental rows
+        rebuild_expense_totals(self.business, self.day1, self.day2)
+        self.assertEqual(self.totals(), {
+            (self.day1, 'rent'): (Decimal('100.00'), 1),
+            (self.day1, 'maintenance'): (Decimal('450.00'), 1),
+        })
+    
+    def test_command_repairs_after_bulk_update(self):
+        self.spend(self.day1, 'rent', '500.00')
+        self.spend(self.day2, 'rent', '70.00')
+        Expense.objects.filter(business=self.business, amount=Decimal('70.00')).update(category='utilities')
+        self.assertIn((self.day2, 'rent'), self.totals())  # Bulk updates skip the model hooks
+        
+        call_command('rebuild_expense_totals', business=[self.business.id], stdout=io.StringIO())
+        self.assertEqual(self.totals(), {
+            (self.day1, 'rent'): (Decimal('500.00'), 1),
+            (self.day2, 'utilities'): (Decimal('70.00'), 1),
+        })
+    
+    def test_api_writes_keep_aggregates_current(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post('/api/payments/expenses/', {'category': 'marketing', 'description': 'Flyers',
+                                                            'amount': '40.00'}, format='json')
+        today = self.business.local_today()
+        self.assertEqual(self.totals(), {(today, 'marketing'): (Decimal('40.00'), 1)})
+        client.patch(f"/api/payments/expenses/{response.json()['id']}/", {'amount': '55.50'}, format='json')
+        self.assertEqual(self.totals(), {(today, 'marketing'): (Decimal('55.50'), 1)})
+        client.delete(f"/api/payments/expenses/{response.json()['id']}/")
+        self.assertEqual(self.totals(), {})
+    
+    def test_reports_read_only_aggregates(self):
+        self.spend(self.day1, 'rent', '300.00')
+        self.spend(self.day1, 'salaries', '100.00')
+        self.spend(self.day2, 'rent', '200.00')
+        product = Product.objects.create(business=self.business, sku='SODA', name='Soda', cost_price=30,
+                                         selling_price=50, barcode='B-SODA')
+        sale = Sale.objects.create(business=self.business, receipt_number='R1', cashier=self.user,
+                                   created_at=self.business.day_bounds(self.day1)[0] + timedelta(hours=9))
+        SaleItem.objects.create(sale=sale, product=product, product_name='Soda', quantity=20,
+                                unit_price=50, cost_price=30)
+        rebuild_sales_facts(self.business, self.day1, self.day2)
+        
+        with CaptureQueriesContext(connections['default']) as queries:
+            burn = burn_rate(self.business, self.day1, self.day2)
+            mix = expense_category_mix(self.business, self.day1, self.day2)
+        self.assertFalse(any('payments_expense' in q['sql'] or 'sales_sale' in q['sql'] for q in queries))
+        
+        self.assertEqual((burn['total_expenses'], burn['daily_burn'], burn['net_daily_burn']),
+                         (Decimal('600.00'), Decimal('300.00'), Decimal('100.00')))
+        self.assertEqual([(row['category'], row['share_percent']) for row in mix],
+                         [('rent', Decimal('83.33')), ('salaries', Decimal('16.67'))])
+        
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get('/api/analytics/reports/expenses/ratio/',
+                              {'start_date': '2026-03-01', 'end_date': '2026-03-02'})
+        self.assertEqual([(row['expense_ratio_percent'], row['expenses']) for row in response.data['trend']],
+                         [(Decimal('40.00'), Decimal('400.00')), (None, Decimal('200.00'))])
+        response = client.get('/api/analytics/reports/expenses/ratio/',
+                              {'start_date': '2026-03-01', 'end_date': '2026-03-02', 'period': 'month'})
+        self.assertEqual(response.data['trend'][0]['expense_ratio_percent'], Decimal('60.00'))
+        self.assertEqual(client.get('/api/analytics/reports/expenses/ratio/', {'period': 'year'}).status_code, 400)
@@ -1,15 +1,30 @@
 from django.urls import path
 from .views import (
     DailySummaryListView, DailySummaryDetailView,
-    DashboardView, SalesTrendView
+    SalesTrendView, ExportView
+)
+from .views_async import basket_suggestions, dashboard
+from .views_reports import (
+    CategoryMarginReportView, ExpenseBurnRateReportView, ExpenseCategoryReportView, ExpenseRatioReportView,
+    PeriodComparisonReportView, ProductRankingReportView
 )
 from .views_ai import GenerateAISummaryView, GetAISummaryView  # Add this import
 
 urlpatterns = [
     path('daily-summaries/', DailySummaryListView.as_view(), name='daily-summary-list'),
     path('daily-summaries/<int:pk>/', DailySummaryDetailView.as_view(), name='daily-summary-detail'),
-    path('dashboard/', DashboardView.as_view(), name='dashboard'),
+    path('dashboard/', dashboard, name='dashboard'),
     path('sales-trend/', SalesTrendView.as_view(), name='sales-trend'),
+    path('export/<str:dataset>/', ExportView.as_view(), name='export'),
+    path('basket-suggestions/', basket_suggestions, name='basket-suggestions'),
+    # Fact-table reports
+    path('reports/products/', ProductRankingReportView.as_view(), name='report-products'),
+    path('reports/categories/', CategoryMarginReportView.as_view(), name='report-categories'),
+    path('reports/compare/', PeriodComparisonReportView.as_view(), name='report-compare'),
+    # Expense-aggregate reports
+    path('reports/expenses/burn-rate/', ExpenseBurnRateReportView.as_view(), name='report-expense-burn-rate'),
+    path('reports/expenses/ratio/', ExpenseRatioReportView.as_view(), name='report-expense-ratio'),
+    path('reports/expenses/categories/', ExpenseCategoryReportView.as_view(), name='report-expense-categories'),
     # AI endpoints
     path('ai/generate-summary/', GenerateAISummaryView.as_view(), name='generate-ai-summary'),
     path('ai/summaries/', GetAISummaryView.as_view(), name='get-ai-summaries'),
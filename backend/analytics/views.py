@@ -1,21 +1,25 @@
 from rest_framework import generics, permissions, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from django.db import DEFAULT_DB_ALIAS
 from django.db.models import Sum, Count, Avg
 from django.utils import timezone
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from .models import DailySummary
 from .serializers import DailySummarySerializer
-from sales.models import Sale
+from sales.models import NET_AMOUNT, Sale
 from inventory.models import Product
-from payments.models import Expense
-from django.db import models
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from .expenses import expense_total
+from .exports import EXPORT_DATASETS, EXPORT_FORMATS, astream_export, stream_export
+from imanage.db_router import ReplicaReadMixin, current_read_alias
 
 # REMOVED: from notifications.models import Notification
 # REMOVED: from notifications.views import send_business_notification
 
 # Daily summary views
-class DailySummaryListView(generics.ListAPIView):
+class DailySummaryListView(ReplicaReadMixin, generics.ListAPIView):
     serializer_class = DailySummarySerializer
     permission_classes = [permissions.IsAuthenticated]
     
@@ -24,103 +28,98 @@ class DailySummaryListView(generics.ListAPIView):
             business=self.request.user.business
         ).order_by('-date')
 
-class DailySummaryDetailView(generics.RetrieveAPIView):
+class DailySummaryDetailView(ReplicaReadMixin, generics.RetrieveAPIView):
     serializer_class = DailySummarySerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
         return DailySummary.objects.filter(business=self.request.user.business)
 
-# Real-time dashboard data
-class DashboardView(APIView):
+def build_dashboard(business, user):
+    """Today's dashboard payload for a business (business-local day)"""
+    today = business.local_today()
+    start, end = business.day_bounds(today)
+    
+    # Today's sales
+    today_sales = Sale.objects.filter(
+        business=business,
+        created_at__gte=start,
+        created_at__lt=end,
+        status='completed'
+    )
+    
+    # Revenue, count and GROSS PROFIT (revenue - cost of goods sold) in one query over Sale
+    totals = today_sales.aggregate(total=Sum(NET_AMOUNT), count=Count('id'), gross_profit=Sum('gross_profit'))
+    total_revenue = totals['total'] or 0
+    transaction_count = totals['count']
+    today_gross_profit = totals['gross_profit'] or 0
+    
+    # Today's expenses, from the category-day aggregates
+    today_expenses = expense_total(business, today, today)
+    
+    # Calculate NET PROFIT (gross profit - expenses)
+    net_profit = today_gross_profit - today_expenses
+    
+    # Low stock items
+    low_stock = Product.objects.filter(business=business).exclude(stock_state='ok').count()
+    
+    # Recent transactions
+    recent_sales = Sale.objects.filter(
+        business=business
+    ).order_by('-created_at')[:10].values(
+        'id', 'receipt_number', 'total_amount', 'created_at'
+    )
+    
+    # Check if we should send low stock alert
+    if low_stock > 0 and low_stock > 3:  # Only if more than 3 items low stock
+        try:
+            # Import inside function to avoid circular import
+            from notifications.models import Notification
+            from notifications.views import send_business_notification
+            
+            # Send notification only once per day; asked of the primary, as a lagging replica
+            # would miss an alert sent moments ago
+            today_alerts = Notification.objects.using(DEFAULT_DB_ALIAS).filter(
+                user=user,
+                notification_type='stock',
+                sent_at__gte=start
+            ).exists()
+            
+            if not today_alerts:
+                send_business_notification(
+                    business=business,
+                    title='⚠️ Low Stock Alert',
+                    message=f'{low_stock} items are low in stock. Please check inventory.',
+                    notification_type='stock',
+                    data={'low_stock_count': low_stock}
+                )
+        except ImportError:
+            # If notifications app not available, skip notification
+            pass
+        except Exception as e:
+            # Log error but don't break dashboard
+            print(f"Notification error: {e}")
+    
+    return {
+        'today_sales': total_revenue,  # Total revenue
+        'today_transactions': transaction_count,
+        'avg_transaction': total_revenue / transaction_count if transaction_count > 0 else 0,
+        'today_expenses': today_expenses,
+        'today_profit': net_profit,  # Net profit after expenses
+        'today_gross_profit': today_gross_profit,  # Gross profit before expenses
+        'low_stock_items': low_stock,
+        'recent_sales': list(recent_sales),
+    }
+
+# Real-time dashboard data (sync version; the routed endpoint is views_async.dashboard)
+class DashboardView(ReplicaReadMixin, APIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def get(self, request):
-        business = request.user.business
-        today = timezone.now().date()
-        
-        # Today's sales
-        today_sales = Sale.objects.filter(
-            business=business,
-            created_at__date=today,
-            status='completed'
-        )
-        
-        # Calculate total revenue
-        total_revenue = today_sales.aggregate(total=Sum('total_amount'))['total'] or 0
-        transaction_count = today_sales.count()
-        
-        # Calculate GROSS PROFIT (revenue - cost of goods sold)
-        today_gross_profit = 0
-        for sale in today_sales:
-            for item in sale.items.all():
-                item_profit = (item.unit_price - item.cost_price) * item.quantity
-                today_gross_profit += item_profit
-        
-        # Today's expenses
-        today_expenses = Expense.objects.filter(
-            business=business,
-            created_at__date=today
-        ).aggregate(total=Sum('amount'))['total'] or 0
-        
-        # Calculate NET PROFIT (gross profit - expenses)
-        net_profit = today_gross_profit - today_expenses
-        
-        # Low stock items
-        low_stock = Product.objects.filter(
-            business=business,
-            current_stock__lte=models.F('minimum_stock')
-        ).count()
-        
-        # Recent transactions
-        recent_sales = Sale.objects.filter(
-            business=business
-        ).order_by('-created_at')[:10].values(
-            'id', 'receipt_number', 'total_amount', 'created_at'
-        )
-        
-        # Check if we should send low stock alert
-        if low_stock > 0 and low_stock > 3:  # Only if more than 3 items low stock
-            try:
-                # Import inside function to avoid circular import
-                from notifications.models import Notification
-                from notifications.views import send_business_notification
-                
-                # Send notification only once per day
-                today_alerts = Notification.objects.filter(
-                    user=request.user,
-                    notification_type='stock',
-                    sent_at__date=today
-                ).count()
-                
-                if today_alerts == 0:
-                    send_business_notification(
-                        business=business,
-                        title='⚠️ Low Stock Alert',
-                        message=f'{low_stock} items are low in stock. Please check inventory.',
-                        notification_type='stock',
-                        data={'low_stock_count': low_stock}
-                    )
-            except ImportError:
-                # If notifications app not available, skip notification
-                pass
-            except Exception as e:
-                # Log error but don't break dashboard
-                print(f"Notification error: {e}")
-        
-        return Response({
-            'today_sales': total_revenue,  # Total revenue
-            'today_transactions': transaction_count,
-            'avg_transaction': total_revenue / transaction_count if transaction_count > 0 else 0,
-            'today_expenses': today_expenses,
-            'today_profit': net_profit,  # Net profit after expenses
-            'today_gross_profit': today_gross_profit,  # Gross profit before expenses
-            'low_stock_items': low_stock,
-            'recent_sales': list(recent_sales),
-        })
+        return Response(build_dashboard(request.user.business, request.user))
 
 # Sales trend (last 7 days)
-class SalesTrendView(APIView):
+class SalesTrendView(ReplicaReadMixin, APIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def get(self, request):
@@ -134,8 +133,9 @@ class SalesTrendView(APIView):
             created_at__date__range=[start_date, end_date],
             status='completed'
         ).values('created_at__date').annotate(
-            total=Sum('total_amount'),
-            count=Count('id')
+            total=Sum(NET_AMOUNT),
+            count=Count('id'),
+            gross_profit=Sum('gross_profit')
         ).order_by('created_at__date')
         
         return Response({
@@ -143,6 +143,44 @@ class SalesTrendView(APIView):
             'daily_sales': list(daily_sales)
         })
 
+# Streaming data export for accountants (CSV or JSON Lines)
+class ExportView(ReplicaReadMixin, APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request, dataset):
+        """Stream a dataset without materializing it in memory"""
+        business = request.user.business
+        if not request.user.can_access_owner_app():
+            return Response({'error': 'Only owners and managers can export data'},
+                          status=status.HTTP_403_FORBIDDEN)
+        if dataset not in EXPORT_DATASETS:
+            return Response({'error': f'Unknown dataset. Choose from: {", ".join(EXPORT_DATASETS)}'},
+                          status=status.HTTP_404_NOT_FOUND)
+        
+        # "format" is reserved by DRF content negotiation, so use "output"
+        export_format = request.query_params.get('output', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            return Response({'error': 'output must be csv or jsonl'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            start_date = request.query_params.get('start_date')
+            end_date = request.query_params.get('end_date')
+            start_date = date.fromisoformat(start_date) if start_date else None
+            end_date = date.fromisoformat(end_date) if end_date else None
+        except ValueError:
+            return Response({'error': 'Dates must be YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Rows stream after the view returns, so pin the read alias chosen now. Under ASGI
+        # (daphne) only an async iterator is sent as it is produced.
+        stream = astream_export if isinstance(request._request, ASGIRequest) else stream_export
+        response = StreamingHttpResponse(
+            stream(business, dataset, export_format, start_date, end_date, using=current_read_alias()),
+            content_type=EXPORT_FORMATS[export_format]
+        )
+        filename = f"{dataset}_{start_date or 'all'}_{end_date or 'all'}.{export_format}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
 # Add notification helper for sales
 def send_sale_notification(sale):
     """Send notification for new sale"""
@@ -162,7 +200,7 @@ def send_sale_notification(sale):
                 'sale_id': sale.id,
                 'receipt_number': sale.receipt_number,
                 'amount': str(sale.total_amount),
-                'items_count': sale.items.count()
+                'items_count': sale.items_count
             }
         )
         
@@ -176,7 +214,7 @@ def send_sale_notification(sale):
                 'sale_id': sale.id,
                 'receipt_number': sale.receipt_number,
                 'amount': str(sale.total_amount),
-                'items_count': sale.items.count()
+                'items_count': sale.items_count
             }
         )
     except ImportError:
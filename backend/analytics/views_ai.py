@@ -6,10 +6,12 @@ from django.utils import timezone
 from datetime import date
 from .models import DailySummary
 from .ai_service import ai_analyzer
+from .tasks import announce_summary, generate_summary_job, materialize_daily_summary
+from imanage.db_router import ReplicaReadMixin
 
 # Import notification helper
 from notifications.views import send_business_notification
-from notifications.models import Notification
+from notifications.models import NotificationCounter
 
 class GenerateAISummaryView(APIView):
     permission_classes = [IsAuthenticated]
@@ -18,53 +20,49 @@ class GenerateAISummaryView(APIView):
         """Generate AI summary for today or specified date"""
         business = request.user.business
         
-        # Get date (default to today)
-        target_date = request.data.get('date', timezone.now().date())
+        # Get date (default to the business-local today)
+        target_date = request.data.get('date', business.local_today())
         if isinstance(target_date, str):
             target_date = date.fromisoformat(target_date)
         
-        # Get or create daily summary
-        summary, created = DailySummary.objects.get_or_create(
+        # Closed days are read as-is, open days get live metrics
+        summary = DailySummary.objects.filter(
             business=business,
             date=target_date,
-            defaults={
-                'total_sales': 0,
-                'total_expenses': 0,
-                'transactions_count': 0,
-            }
-        )
+            closed_at__isnull=False
+        ).first()
+        if summary is None:
+            summary = materialize_daily_summary(business, target_date)
         
-        # Generate AI summary
-        if summary.generate_ai_summary():
-            # Prepare notification message based on insights
-            insights = summary.insights or {}
-            profitability = insights.get('profitability', 'needs_attention')
-            sales_trend = insights.get('sales_trend', 'stable')
+        # Generate AI summary (force bypasses the metrics cache)
+        force = str(request.data.get('force', '')).lower() in ('1', 'true', 'yes')
+        
+        # background=true returns at once; a worker generates and announces the summary
+        if str(request.data.get('background', '')).lower() in ('1', 'true', 'yes'):
+            job = generate_summary_job.enqueue(summary_id=summary.id, force=force,
+                                               unique_key=f'ai-summary:{summary.id}')
+            return Response({
+                'success': True,
+                'message': 'AI summary queued',
+                'job_id': job.id if job else None,
+                'date': summary.date.isoformat(),
+            }, status=status.HTTP_202_ACCEPTED)
+        
+        if summary.generate_ai_summary(force=force):
+            # Cached summaries were already announced, just return them
+            if summary.from_cache:
+                return Response({
+                    'success': True,
+                    'message': 'AI summary unchanged since last generation',
+                    'summary': summary.ai_summary,
+                    'insights': summary.insights,
+                    'recommendations': summary.recommendations,
+                    'date': summary.date.isoformat(),
+                    'cached': True,
+                    'notification_sent': False,
+                })
             
-            if profitability == 'good' and sales_trend == 'increasing':
-                notification_title = '📈 Great Day!'
-                notification_message = f"Your business had an excellent day on {target_date}! Sales are up and profitable."
-            elif profitability == 'good':
-                notification_title = '✅ Profitable Day'
-                notification_message = f"Your business was profitable on {target_date}. Check your AI summary for details."
-            else:
-                notification_title = '📊 Daily Summary Ready'
-                notification_message = f"Your AI business summary for {target_date} is ready with insights and recommendations."
-            
-            # Send notification
-            send_business_notification(
-                business=business,
-                title=notification_title,
-                message=notification_message,
-                notification_type='summary',
-                data={
-                    'summary_id': summary.id,
-                    'date': target_date.isoformat(),
-                    'profitability': profitability,
-                    'sales_trend': sales_trend,
-                    'net_profit': float(summary.net_profit),
-                }
-            )
+            announce_summary(summary)
             
             return Response({
                 'success': True,
@@ -73,6 +71,7 @@ class GenerateAISummaryView(APIView):
                 'insights': summary.insights,
                 'recommendations': summary.recommendations,
                 'date': summary.date.isoformat(),
+                'cached': False,
                 'notification_sent': True,
             })
         else:
@@ -82,7 +81,7 @@ class GenerateAISummaryView(APIView):
                 'date': summary.date.isoformat(),
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-class GetAISummaryView(APIView):
+class GetAISummaryView(ReplicaReadMixin, APIView):
     permission_classes = [IsAuthenticated]
     
     def get(self, request):
@@ -91,7 +90,7 @@ class GetAISummaryView(APIView):
         
         # Get date range (default last 7 days)
         start_date = request.query_params.get('start_date')
-        end_date = request.query_params.get('end_date', timezone.now().date())
+        end_date = request.query_params.get('end_date', business.local_today())
         
         if start_date:
             summaries = DailySummary.objects.filter(
@@ -122,11 +121,8 @@ class GetAISummaryView(APIView):
                 }
             })
         
-        # Check for unread notifications
-        unread_count = Notification.objects.filter(
-            user=request.user,
-            is_read=False
-        ).count()
+        # Unread badge from the denormalized counter
+        unread_count = NotificationCounter.unread_for(request.user.id)
         
         return Response({
             'success': True,
@@ -136,32 +132,35 @@ class GetAISummaryView(APIView):
         })
 
 # Add function to send periodic business alerts
-def send_periodic_business_alerts(business):
-    """Send periodic alerts based on business performance"""
-    today = timezone.now().date()
+def send_periodic_business_alerts(business, now=None):
+    """Send periodic alerts based on business performance; hours are business-local"""
+    from sales.models import Sale
+    local_now = timezone.localtime(now or timezone.now(), business.tzinfo)
     
     # Check for zero sales day
-    today_sales = Sale.objects.filter(
-        business=business,
-        created_at__date=today,
-        status='completed'
-    ).count()
-    
-    if today_sales == 0 and timezone.now().hour >= 15:  # After 3 PM with no sales
-        send_business_notification(
+    if local_now.hour >= 15:  # After 3 PM with no sales
+        start, end = business.day_bounds(local_now.date())
+        today_sales = Sale.objects.filter(
             business=business,
-            title='⚠️ No Sales Today',
-            message="It's 3 PM and you haven't recorded any sales today. Check if everything is okay.",
-            notification_type='alert',
-            data={'alert_type': 'no_sales', 'time': timezone.now().isoformat()}
-        )
+            created_at__gte=start,
+            created_at__lt=end,
+            status='completed'
+        ).exists()
+        if not today_sales:
+            send_business_notification(
+                business=business,
+                title='⚠️ No Sales Today',
+                message=f"It's {local_now.strftime('%I:%M %p')} and you haven't recorded any sales today. Check if everything is okay.",
+                notification_type='alert',
+                data={'alert_type': 'no_sales', 'time': local_now.isoformat()}
+            )
     
     # Check for high-value sale opportunity (based on time of day)
-    if timezone.now().hour in [10, 14, 17]:  # Peak hours
+    if local_now.hour in [10, 14, 17]:  # Peak hours
         send_business_notification(
             business=business,
             title='⏰ Peak Hour Reminder',
-            message=f"It's {timezone.now().strftime('%I:%M %p')} - a peak business hour. Ensure staff are prepared!",
+            message=f"It's {local_now.strftime('%I:%M %p')} - a peak business hour. Ensure staff are prepared!",
             notification_type='alert',
-            data={'alert_type': 'peak_hour', 'hour': timezone.now().hour}
+            data={'alert_type': 'peak_hour', 'hour': local_now.hour}
         )
\ No newline at end of file
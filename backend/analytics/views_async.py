@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.core.cache import cache
+from imanage.async_api import async_api_view, json_response, run_db
+from imanage.db_router import reads_from_replica
+from .basket import suggestions_for_cart
+from .views import build_dashboard
+
+def _replica_dashboard(business, user):
+    with reads_from_replica(user):
+        return build_dashboard(business, user)
+
+# Async dashboard: cached per business, DB work off the event loop
+@async_api_view
+async def dashboard(request):
+    business = request.user.business
+    if business is None:
+        return json_response({'error': 'User not assigned to a business'}, status=400)
+    
+    cache_key = f'dashboard:{business.id}'
+    data = await cache.aget(cache_key)
+    if data is None:
+        data = await run_db(_replica_dashboard, business, request.user)
+        await cache.aset(cache_key, data, settings.HOT_CACHE_TTL['dashboard'])
+    return json_response(data)
+
+# "Frequently bought together" upsell lookup for the POS cart: ?products=1,2,3
+@async_api_view
+async def basket_suggestions(request):
+    business = request.user.business
+    if business is None:
+        return json_response({'error': 'User not assigned to a business'}, status=400)
+    try:
+        product_ids = sorted({int(p) for p in request.GET.get('products', '').split(',') if p.strip()})
+        limit = min(int(request.GET.get('limit', 5)), 20)
+    except ValueError:
+        return json_response({'error': 'products must be a comma-separated list of IDs'}, status=400)
+    if not product_ids:
+        return json_response({'suggestions': []})
+    
+    cache_key = f"basket:{business.id}:{limit}:{','.join(map(str, product_ids))}"
+    suggestions = await cache.aget(cache_key)
+    if suggestions is None:
+        suggestions = await run_db(suggestions_for_cart, business, product_ids, limit)
+        await cache.aset(cache_key, suggestions, settings.HOT_CACHE_TTL['basket'])
+    return json_response({'suggestions': suggestions})
@@ -0,0 +1,98 @@
+from datetime import date
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from imanage.db_router import ReplicaReadMixin
+from .reports import (
+    RANKING_METRICS, TREND_PERIODS, burn_rate, category_margins, compare_periods, expense_category_mix,
+    expense_ratio_trend, parse_range, product_ranking
+)
+
+# Sales reports over any date range, served from the product/category-day fact tables
+class ReportView(ReplicaReadMixin, APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request):
+        if not request.user.can_access_owner_app():
+            return Response({'error': 'Only owners and managers can view reports'},
+                          status=status.HTTP_403_FORBIDDEN)
+        try:
+            start, end = parse_range(request.query_params, request.user.business)
+            return Response(self.report(request, request.user.business, start, end))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    def report(self, request, business, start, end):
+        raise NotImplementedError
+
+class ProductRankingReportView(ReportView):
+    """Top or bottom sellers: ?metric=revenue|quantity|profit|transaction_count&order=top|bottom"""
+    
+    def report(self, request, business, start, end):
+        metric = request.query_params.get('metric', 'revenue')
+        if metric not in RANKING_METRICS:
+            raise ValueError(f'metric must be one of {", ".join(RANKING_METRICS)}')
+        order = request.query_params.get('order', 'top')
+        if order not in ('top', 'bottom'):
+            raise ValueError('order must be top or bottom')
+        limit = min(int(request.query_params.get('limit', 10)), 100)
+        category = request.query_params.get('category')
+        
+        return {
+            'period': {'start': start, 'end': end},
+            'metric': metric,
+            'order': order,
+            'products': product_ranking(
+                business, start, end, metric=metric, bottom=order == 'bottom', limit=limit,
+                category_id=int(category) if category else None
+            ),
+        }
+
+class CategoryMarginReportView(ReportView):
+    """Revenue, profit and margin by category"""
+    
+    def report(self, request, business, start, end):
+        return {
+            'period': {'start': start, 'end': end},
+            'categories': category_margins(business, start, end),
+        }
+
+class PeriodComparisonReportView(ReportView):
+    """Period-over-period comparison; previous_start/previous_end default to the preceding window"""
+    
+    def report(self, request, business, start, end):
+        previous_start = request.query_params.get('previous_start')
+        previous_end = request.query_params.get('previous_end')
+        if bool(previous_start) != bool(previous_end):
+            raise ValueError('previous_start and previous_end must be given together')
+        if previous_start:
+            previous_start, previous_end = date.fromisoformat(previous_start), date.fromisoformat(previous_end)
+        return compare_periods(business, start, end, previous_start or None, previous_end or None)
+
+class ExpenseBurnRateReportView(ReportView):
+    """Average spending per day and per 30 days, gross and net of gross profit"""
+    
+    def report(self, request, business, start, end):
+        return burn_rate(business, start, end)
+
+class ExpenseRatioReportView(ReportView):
+    """Expense-to-sales ratio over time: ?period=day|week|month"""
+    
+    def report(self, request, business, start, end):
+        period = request.query_params.get('period', 'day')
+        if period not in TREND_PERIODS:
+            raise ValueError(f'period must be one of {", ".join(TREND_PERIODS)}')
+        return {
+            'period': {'start': start, 'end': end},
+            'group_by': period,
+            'trend': expense_ratio_trend(business, start, end, period=period),
+        }
+
+class ExpenseCategoryReportView(ReportView):
+    """Spending and share of total by expense category"""
+    
+    def report(self, request, business, start, end):
+        return {
+            'period': {'start': start, 'end': end},
+            'categories': expense_category_mix(business, start, end),
+        }
@@ -1,3 +1,5 @@
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 from django.db import models
 from django.utils import timezone
 
@@ -43,4 +45,25 @@ class Business(models.Model):
     # Property to check if business is active
     @property
     def is_active(self):
-        return self.status == 'active'
\ No newline at end of file
+        return self.status == 'active'
+    
+    # Business-local timezone (falls back to UTC for unknown zone names)
+    @property
+    def tzinfo(self):
+        try:
+            return ZoneInfo(self.timezone_field)
+        except (ZoneInfoNotFoundError, ValueError):
+            return dt_timezone.utc
+    
+    # Current time in the business timezone
+    def local_now(self):
+        return timezone.localtime(timezone.now(), self.tzinfo)
+    
+    # Current calendar date in the business timezone
+    def local_today(self):
+        return self.local_now().date()
+    
+    # Aware [start, end) datetimes covering a business-local day
+    def day_bounds(self, date):
+        start = datetime.combine(date, time.min, tzinfo=self.tzinfo)
+        return start, start + timedelta(days=1)
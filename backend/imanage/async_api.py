@@ -0,0 +1,63 @@
+# Helpers for async-native hot endpoints served by daphne. DRF views are sync,
+# so under ASGI each request hops onto one thread per worker; these views run
+# their ORM work on the shared thread pool instead.
+from functools import partial, wraps
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.http import HttpResponse
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from .renderers import dumps_json
+
+_jwt = JWTAuthentication()
+
+def _in_request_scope(func, *args, **kwargs):
+    # Pool threads never see request_started/finished, so apply CONN_MAX_AGE here
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+async def run_db(func, *args, **kwargs):
+    """Run a block of ORM work off the event loop without serializing on one thread"""
+    return await sync_to_async(_in_request_scope, thread_sensitive=False)(func, *args, **kwargs)
+
+def json_response(data, status=200):
+    """JSON response encoded the same way as DRF's renderer"""
+    return HttpResponse(dumps_json(data), status=status, content_type='application/json')
+
+def _load_user(user_id):
+    from accounts.models import User
+    return User.objects.select_related('business').filter(pk=user_id, is_active=True).first()
+
+async def authenticate(request):
+    """Resolve the bearer-token user (with business loaded), or None"""
+    header = _jwt.get_header(request)
+    raw_token = _jwt.get_raw_token(header) if header else None
+    if raw_token is None:
+        return None
+    validated = _jwt.get_validated_token(raw_token)  # Signature/expiry check, no DB
+    return await run_db(_load_user, validated.get('user_id'))
+
+def async_api_view(view=None, *, methods=('GET', 'HEAD')):
+    """Authenticate an async view like IsAuthenticated + JWTAuthentication would"""
+    if view is None:
+        return partial(async_api_view, methods=methods)
+    
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in methods:
+            return json_response({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+        # Batch sub-requests arrive with the batch's user already resolved
+        user = getattr(request, '_force_auth_user', None)
+        if user is None:
+            try:
+                user = await authenticate(request)
+            except (InvalidToken, AuthenticationFailed) as e:
+                return json_response({'detail': str(e.detail) if hasattr(e, 'detail') else str(e)}, status=401)
+        if user is None:
+            return json_response({'detail': 'Authentication credentials were not provided.'}, status=401)
+        request.user = user
+        return await view(request, *args, **kwargs)
+    return wrapper
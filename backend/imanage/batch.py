@@ -0,0 +1,98 @@
+# Batched reads for app startup: POST /api/batch/ with
+#   {"requests": [{"id": "dashboard", "url": "/api/analytics/dashboard/"}, ...]}
+# runs every GET sub-request in one round trip. The token is checked and the user and
+# business loaded once; sub-requests skip middleware and authentication, run
+# concurrently, and each keeps its own status and body.
+import asyncio
+import json
+from urllib.parse import urlsplit
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse, QueryDict
+from django.urls import Resolver404, resolve, reverse
+from django.views.decorators.csrf import csrf_exempt
+from .async_api import async_api_view, json_response, run_db
+from .renderers import dumps_json
+
+class SubRequest(HttpRequest):
+    """A GET request for one batch entry, sharing the batch request's user and headers"""
+    
+    def __init__(self, parent, path, query):
+        super().__init__()
+        self.method = 'GET'
+        self.path = self.path_info = path
+        self.META = {key: value for key, value in parent.META.items() if key not in ('CONTENT_LENGTH', 'CONTENT_TYPE')}
+        self.META.update({'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query,
+                          'HTTP_ACCEPT': 'application/json'})
+        self.GET = QueryDict(query)
+        self.user = self._force_auth_user = parent.user  # DRF uses it instead of re-authenticating
+        self._scheme = parent.scheme
+    
+    def _get_scheme(self):
+        return self._scheme
+
+def _error(status, message):
+    return json_response({'error': message}, status=status)
+
+def _call_sync(view, request, args, kwargs):
+    response = view(request, *args, **kwargs)
+    if hasattr(response, 'render'):
+        response.render()
+    return response
+
+async def _dispatch(request, url, semaphore):
+    """Run one sub-request, always returning a response (errors included)"""
+    parts = urlsplit(url)
+    if parts.scheme or parts.netloc or not parts.path.startswith('/api/') or parts.path == reverse('batch'):
+        return _error(400, 'Only relative /api/ URLs can be batched')
+    try:
+        match = resolve(parts.path)
+    except Resolver404:
+        return json_response({'detail': 'Not found.'}, status=404)
+    
+    sub_request = SubRequest(request, parts.path, parts.query)
+    async with semaphore:
+        try:
+            if iscoroutinefunction(match.func):
+                response = await match.func(sub_request, *match.args, **match.kwargs)
+            else:
+                response = await run_db(_call_sync, match.func, sub_request, match.args, match.kwargs)
+        except Exception as e:
+            print(f"Batch sub-request {parts.path} failed: {e}")
+            return _error(500, 'Internal server error')
+    if response.streaming:
+        response.close()
+        return _error(400, 'Streaming responses cannot be batched')
+    return response
+
+def _entry(entry_id, response):
+    # JSON bodies are spliced in as-is rather than decoded and encoded again
+    head = dumps_json({'id': entry_id, 'status': response.status_code})[:-1]
+    if not response.content:
+        body = b'null'
+    elif response.get('Content-Type', '').startswith('application/json'):
+        body = response.content
+    else:
+        body = dumps_json(response.content.decode(response.charset or 'utf-8', 'replace'))
+    return head + b',"body":' + body + b'}'
+
+# One round trip for several reads
+@csrf_exempt
+@async_api_view(methods=('POST',))
+async def batch(request):
+    config = settings.BATCH_CONFIG
+    try:
+        entries = json.loads(request.body)['requests']
+    except (ValueError, KeyError, TypeError):
+        return _error(400, 'Body must be {"requests": [{"id": ..., "url": ...}, ...]}')
+    if not isinstance(entries, list) or not all(isinstance(e, dict) and isinstance(e.get('url'), str) for e in entries):
+        return _error(400, 'Each request needs a "url"')
+    if len(entries) > config['max_requests']:
+        return _error(400, f"At most {config['max_requests']} requests per batch")
+    if any(str(e.get('method', 'GET')).upper() != 'GET' for e in entries):
+        return _error(400, 'Only GET requests can be batched')
+    
+    semaphore = asyncio.Semaphore(config['max_concurrency'])
+    responses = await asyncio.gather(*(_dispatch(request, e['url'], semaphore) for e in entries))
+    body = b','.join(_entry(e.get('id', i), response) for i, (e, response) in enumerate(zip(entries, responses)))
+    return HttpResponse(b'{"responses":[' + body + b']}', content_type='application/json')
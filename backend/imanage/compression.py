@@ -0,0 +1,10 @@
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+
+# GZip only bodies worth it: a 150-byte count costs more CPU to compress than it saves,
+# while catalog and sales lists shrink 5-10x. Streaming exports are always compressed.
+class LargeResponseGZipMiddleware(GZipMiddleware):
+    def process_response(self, request, response):
+        if not response.streaming and len(response.content) < settings.COMPRESS_MIN_BYTES:
+            return response
+        return super().process_response(request, response)
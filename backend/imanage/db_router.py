@@ -0,0 +1,177 @@
+# Read-replica routing. Reads go to the replica only inside reads_from_replica()
+# (or a ReplicaReadMixin view); everything else, and every write, uses default.
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections
+from rest_framework.permissions import SAFE_METHODS
+
+PRIMARY_ALIAS = 'default'
+
+# Alias chosen for reads in the current request/task; None means "let Django decide"
+_read_alias = ContextVar('read_alias', default=None)
+
+_lag_lock = threading.Lock()
+_lag_state = {'checked_at': 0.0, 'lag': None}
+
+# Seconds the replica is behind; 0 when fully replayed or when it is a primary
+LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+def _config():
+    return settings.REPLICA_CONFIG
+
+def replica_alias():
+    """The replica alias when routing is enabled and configured, else None"""
+    config = _config()
+    alias = config['alias']
+    if not config['enabled'] or alias not in settings.DATABASES:
+        return None
+    return alias
+
+def _sticky_key(user_id):
+    return f'db:sticky:{user_id}'
+
+def mark_write(user_id):
+    """Pin a user's reads to the primary for the stickiness window"""
+    cache.set(_sticky_key(user_id), 1, _config()['sticky_seconds'])
+
+async def amark_write(user_id):
+    await cache.aset(_sticky_key(user_id), 1, _config()['sticky_seconds'])
+
+def is_sticky(user_id):
+    return cache.get(_sticky_key(user_id)) is not None
+
+def _measure_lag(alias):
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        return 0.0
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(LAG_SQL)
+            return float(cursor.fetchone()[0])
+    except DatabaseError:
+        return None  # Unreachable counts as unusable
+
+def replica_lag(alias):
+    """Replica lag in seconds (None if unreachable), re-measured at most every lag_check_interval"""
+    now = time.monotonic()
+    with _lag_lock:
+        if now - _lag_state['checked_at'] < _config()['lag_check_interval']:
+            return _lag_state['lag']
+        # Claim the check so concurrent requests reuse the previous value meanwhile
+        _lag_state['checked_at'] = now
+    lag = _measure_lag(alias)
+    with _lag_lock:
+        _lag_state['lag'] = lag
+    return lag
+
+def reset_lag_state():
+    with _lag_lock:
+        _lag_state.update(checked_at=0.0, lag=None)
+
+def read_alias(user=None):
+    """Alias a read-only request should use: replica unless sticky, lagging or down"""
+    alias = replica_alias()
+    if alias is None:
+        return PRIMARY_ALIAS
+    if user is not None and user.is_authenticated and is_sticky(user.pk):
+        return PRIMARY_ALIAS
+    lag = replica_lag(alias)
+    if lag is None or lag > _config()['max_lag_seconds']:
+        return PRIMARY_ALIAS
+    return alias
+
+@contextmanager
+def reads_from_replica(user=None):
+    """Route ORM reads in this block to the replica when it is safe to"""
+    alias = read_alias(user)
+    token = _read_alias.set(alias)
+    try:
+        yield alias
+    finally:
+        _read_alias.reset(token)
+
+def current_read_alias():
+    """Alias reads resolve to right now; pin lazily-evaluated querysets with .using()"""
+    return _read_alias.get() or PRIMARY_ALIAS
+
+class ReplicaRouter:
+    """Sends reads to the alias chosen by reads_from_replica(); writes always to default"""
+    
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+    
+    def db_for_write(self, model, **hints):
+        return PRIMARY_ALIAS
+    
+    def allow_relation(self, obj1, obj2, **hints):
+        # Same data on both sides, so objects may be related across the two
+        aliases = {PRIMARY_ALIAS, _config()['alias']}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+    
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica receives schema changes through replication
+        if db == _config()['alias']:
+            return False
+        return None
+
+class ReplicaReadMixin:
+    """DRF view mixin: safe-method requests read from the replica after authentication"""
+    
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS:
+            self._replica_token = _read_alias.set(read_alias(request.user))
+    
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_replica_token', None)
+        if token is not None:
+            _read_alias.reset(token)
+            self._replica_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
+
+class ReplicaStickinessMiddleware:
+    """After a successful write by a user, keep their reads on the primary for a while"""
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+    
+    def _wrote(self, request, response):
+        user = getattr(request, 'user', None)
+        return (
+            request.method not in SAFE_METHODS
+            and response.status_code < 400
+            and user is not None
+            and user.is_authenticated
+        )
+    
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        response = self.get_response(request)
+        if self._wrote(request, response):
+            mark_write(request.user.pk)
+        return response
+    
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if self._wrote(request, response):
+            await amark_write(request.user.pk)
+        return response
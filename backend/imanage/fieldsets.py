@@ -0,0 +1,176 @@
+# Sparse fieldsets for GET endpoints. ?fields=id,name,selling_price keeps only those
+# fields and ?include=payments adds embedded relations a serializer leaves out by
+# default (its Meta.include_fields). Pruned fields cost nothing: read plans drop their
+# columns, joins and child queries, and serializer views only join what is still read and
+# only select the columns it comes from (all of them when a field reads a model method).
+from functools import lru_cache
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import permissions, serializers
+
+def _names(value):
+    return [name for name in (part.strip() for part in value.split(',')) if name]
+
+class SparseFieldsMixin:
+    """ModelSerializer that takes fields=[...]; Meta.include_fields are only there when asked for"""
+    
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is None:
+            fields = [name for name in self.Meta.fields if name not in self.include_fields()]
+        for name in set(self.fields) - set(fields):
+            self.fields.pop(name)
+    
+    @classmethod
+    def include_fields(cls):
+        return getattr(cls.Meta, 'include_fields', ())
+    
+    @classmethod
+    def select_fields(cls, fields=None, include=None):
+        """Field names for a ?fields= / ?include= pair in declared order, None for the default set"""
+        if fields is None and not include:
+            return None
+        optional = set(cls.include_fields())
+        default = [name for name in cls.Meta.fields if name not in optional]
+        errors = {}
+        unknown = [name for name in fields or () if name not in default]
+        if unknown:
+            errors['fields'] = [f"Unknown field '{name}'" for name in unknown]
+        unknown = [name for name in include or () if name not in optional]
+        if unknown:
+            errors['include'] = [f"Unknown include '{name}'" for name in unknown]
+        if errors:
+            raise serializers.ValidationError(errors)
+        
+        wanted = set(default if fields is None else fields) | set(include or ())
+        return tuple(name for name in cls.Meta.fields if name in wanted)
+
+def _joined_path(model, path):
+    """The leading part of a dotted source that walks to-one relations"""
+    joined = []
+    for part in path:
+        try:
+            relation = model._meta.get_field(part)
+        except FieldDoesNotExist:
+            break
+        if not (relation.many_to_one or relation.one_to_one):
+            break
+        joined.append(part)
+        model = relation.related_model
+    return joined
+
+def related_lookups(serializer):
+    """(select_related, prefetch_related) lookups for the relations the serializer's fields read"""
+    model = serializer.Meta.model
+    select, prefetch = [], []
+    for field in serializer.fields.values():
+        if field.write_only or field.source == '*':
+            continue
+        if isinstance(field, serializers.ListSerializer):
+            child_select, child_prefetch = related_lookups(field.child)
+            prefetch.append(field.source)
+            prefetch.extend(f'{field.source}__{lookup}' for lookup in child_select + child_prefetch)
+            continue
+        
+        path = field.source.split('.')
+        joined = _joined_path(model, path)
+        if isinstance(field, serializers.BaseSerializer) and joined == path:
+            # Embedded to-one serializer: join it and whatever it reads in turn
+            child_select, child_prefetch = related_lookups(field)
+            select.append(field.source)
+            select.extend(f'{field.source}__{lookup}' for lookup in child_select)
+            prefetch.extend(f'{field.source}__{lookup}' for lookup in child_prefetch)
+            continue
+        if joined == path:
+            joined = joined[:-1]  # A bare foreign key only needs its own column
+        if joined:
+            select.append('__'.join(joined))
+    return list(dict.fromkeys(select)), list(dict.fromkeys(prefetch))
+
+def _column(model, name):
+    """The model field a source part reads, following get_FOO_display to FOO; None for anything else"""
+    if name.startswith('get_') and name.endswith('_display'):
+        name = name[len('get_'):-len('_display')]
+    try:
+        return model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+
+def related_columns(serializer):
+    """only() lookups for the columns the serializer's fields read, None when a field may read any"""
+    model = serializer.Meta.model
+    columns, whole = [model._meta.pk.name], set()
+    for field in serializer.fields.values():
+        if field.write_only or isinstance(field, serializers.ListSerializer):
+            continue  # Child rows are prefetched by the primary key
+        if field.source == '*':
+            return None
+        
+        path = field.source.split('.')
+        joined = _joined_path(model, path)
+        columns += ['__'.join(joined[:depth]) for depth in range(1, len(joined) + 1)]  # Each join's key
+        if isinstance(field, serializers.BaseSerializer) and joined == path:
+            child = related_columns(field)
+            if child is not None:
+                columns += [f'{field.source.replace(".", "__")}__{column}' for column in child]
+            continue
+        if joined == path:
+            continue  # A bare foreign key
+        
+        related = model
+        for part in joined:
+            related = related._meta.get_field(part).related_model
+        column = _column(related, path[len(joined)])
+        if column is not None and column.concrete:
+            columns.append('__'.join(joined + [column.name]))
+        elif joined:
+            whole.add('__'.join(joined))  # A method on a joined row may read any of its columns
+        else:
+            return None  # A property or method on the model itself
+    return [
+        column for column in dict.fromkeys(columns)
+        if not any(column.startswith(f'{prefix}__') for prefix in whole)
+    ]
+
+@lru_cache(maxsize=256)
+def _lookups_for(serializer_class, fields):
+    serializer = serializer_class(fields=fields)
+    select, prefetch = related_lookups(serializer)
+    return select, prefetch, related_columns(serializer) if fields is not None else None
+
+class SparseFieldsViewMixin:
+    """?fields= / ?include= on GET; list views with a read plan serialize the pruned plan"""
+    
+    def requested_fields(self):
+        if self.request.method not in permissions.SAFE_METHODS:
+            return None
+        if not hasattr(self, '_requested_fields'):
+            params = self.request.query_params
+            fields, include = params.get('fields'), params.get('include')
+            self._requested_fields = self.get_serializer_class().select_fields(
+                _names(fields) if fields else None,
+                _names(include) if include else None
+            )
+        return self._requested_fields
+    
+    def get_serializer(self, *args, **kwargs):
+        fields = self.requested_fields()
+        if fields is not None:
+            kwargs.setdefault('fields', fields)
+        return super().get_serializer(*args, **kwargs)
+    
+    def get_read_plan(self):
+        return super().get_read_plan().only(self.requested_fields())
+    
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        serializer_class = self.get_serializer_class()
+        if not issubclass(serializer_class, SparseFieldsMixin):
+            return queryset
+        select, prefetch, columns = _lookups_for(serializer_class, self.requested_fields())
+        if columns:
+            queryset = queryset.only(*columns)
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset
@@ -0,0 +1,248 @@
+# Fast read path for large list endpoints. A ReadPlan is compiled once from an existing
+# ModelSerializer: every field becomes a .values() column plus a plain converter, and the
+# whole row becomes one generated function returning a dict literal. A page is one query
+# per nesting level, with no model instances and no per-field DRF calls. Output (keys,
+# order, formatting) is the serializer's, which the contract tests check.
+import decimal
+from datetime import timedelta, timezone as dt_timezone
+from django.utils import timezone
+from django.utils.encoding import force_str, is_protected_type
+from rest_framework import serializers
+from rest_framework.fields import ISO_8601
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+ZERO = timedelta(0)
+DECIMAL_MEMO_SIZE = 10000
+DATE_MEMO_SIZE = 1000
+SUBSET_CACHE_SIZE = 128
+
+# Returned by a computed field to leave its key out, as DRF does for a null relation
+SKIP = object()
+
+# Field types whose to_representation() returns column values unchanged
+PASSTHROUGH_FIELDS = (
+    serializers.CharField, serializers.IntegerField, serializers.BooleanField, serializers.ChoiceField,
+    serializers.ReadOnlyField, serializers.PrimaryKeyRelatedField,
+)
+
+def _decimal_converter(field):
+    coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    if field.decimal_places is None or not coerce_to_string or field.localize or field.normalize_output:
+        return field.to_representation
+    exponent = decimal.Decimal('.1') ** field.decimal_places
+    context = decimal.getcontext().copy()
+    if field.max_digits is not None:
+        context.prec = field.max_digits
+    rounding = field.rounding
+    formatted = {}  # Prices repeat across rows: memoize, bounded (Postgres has no -0)
+    
+    def convert(value):
+        try:
+            return formatted[value]
+        except KeyError:
+            if len(formatted) >= DECIMAL_MEMO_SIZE:
+                formatted.clear()
+            result = formatted[value] = format(value.quantize(exponent, rounding=rounding, context=context), 'f')
+            return result
+    return convert
+
+def _datetime_converter():
+    """DateTimeField's ISO 8601 output; UTC values are formatted directly, as isoformat()
+    spends most of its time on the offset that becomes "Z" anyway"""
+    dates = {}  # A page's rows fall on a handful of days: memoize, bounded
+    
+    def convert(value, tz):
+        if tz is not None:
+            value = value.astimezone(tz)
+        elif value.tzinfo is dt_timezone.utc:
+            day = value.date()
+            try:
+                prefix = dates[day]
+            except KeyError:
+                if len(dates) >= DATE_MEMO_SIZE:
+                    dates.clear()
+                prefix = dates[day] = day.isoformat() + 'T'
+            if value.microsecond:
+                return f'{prefix}{value.hour:02d}:{value.minute:02d}:{value.second:02d}.{value.microsecond:06d}Z'
+            return f'{prefix}{value.hour:02d}:{value.minute:02d}:{value.second:02d}Z'
+        value = value.isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    return convert
+
+def _model_field_converter(value):
+    # e.g. GeneratedField: protected types as-is, anything else through value_to_string()'s str()
+    return value if is_protected_type(value) else str(value)
+
+def _field_step(field):
+    """(kind, converter) equivalent to field.to_representation for non-null column values"""
+    if isinstance(field, serializers.DecimalField):
+        return 'convert', _decimal_converter(field)
+    if isinstance(field, serializers.DateTimeField):
+        iso = getattr(field, 'format', api_settings.DATETIME_FORMAT).lower() == ISO_8601
+        if iso and not hasattr(field, 'timezone'):
+            return 'datetime', _datetime_converter()
+        return 'convert', field.to_representation
+    if isinstance(field, serializers.JSONField):
+        return ('convert', field.to_representation) if field.binary else ('copy', None)
+    if isinstance(field, PASSTHROUGH_FIELDS):
+        return 'copy', None
+    if isinstance(field, serializers.ModelField):
+        return 'convert', _model_field_converter
+    return 'convert', field.to_representation
+
+class ReadPlan:
+    """Serialize .values() rows exactly like `serializer_class(many=True)` would"""
+    
+    def __init__(self, serializer_class, computed=None, nested=None, fields=None):
+        # computed: {field name: (columns, function(row))} for sources values() can't read,
+        # such as model methods; a function may return SKIP to leave the key out.
+        # fields: a sparse fieldset, passed on to a SparseFieldsMixin serializer
+        self.serializer_class = serializer_class
+        self.computed = computed or {}
+        self.nested = nested or {}
+        self.fields = fields
+        self._compiled = None
+        self._subsets = {}
+    
+    def only(self, fields):
+        """The plan for a sparse fieldset (None is this plan), compiled once per distinct set"""
+        if fields is None:
+            return self
+        fields = tuple(fields)
+        plan = self._subsets.get(fields)
+        if plan is None:
+            if len(self._subsets) >= SUBSET_CACHE_SIZE:
+                self._subsets.clear()
+            plan = self._subsets[fields] = ReadPlan(self.serializer_class, self.computed, self.nested, fields)
+        return plan
+    
+    def compile(self):
+        """(row builder, values() columns, nested plans), built on first use"""
+        if self._compiled is None:
+            self._compiled = self._compile()
+        return self._compiled
+    
+    def _compile(self):
+        model = self.serializer_class.Meta.model
+        namespace = {'SKIP': SKIP}
+        entries, skippable, columns, nested = [], [], [], []
+        
+        serializer = self.serializer_class() if self.fields is None else self.serializer_class(fields=self.fields)
+        for i, (name, field) in enumerate(serializer.fields.items()):
+            function = f'f{i}'
+            if name in self.computed:
+                needed, namespace[function] = self.computed[name]
+                columns.extend(needed)
+                expression = f'{function}(row)'
+                skippable.append(name)
+            elif isinstance(field, serializers.ListSerializer):
+                # Reverse foreign key (e.g. sale.items): one query for a whole page of parents
+                relation = model._meta.get_field(field.source).field.attname
+                nested.append((name, self.nested.get(name) or ReadPlan(type(field.child)), relation))
+                columns.append('id')
+                expression = f"children[{name!r}].get(row['id'], [])"
+            elif isinstance(field, serializers.BaseSerializer):
+                # Embedded to-one relation: its columns ride on the parent row's join
+                child_build, child_columns, child_nested = ReadPlan(type(field)).compile()
+                if child_nested:
+                    raise ValueError(f'{name}: embedded serializers cannot nest lists')
+                namespace[function] = child_build
+                prefix = field.source.replace('.', '__') + '__'
+                columns.extend(prefix + column for column in ['id', *child_columns])
+                child_row = ', '.join(f'{column!r}: row[{prefix + column!r}]' for column in child_columns)
+                expression = f'(None if row[{prefix + "id"!r}] is None else {function}({{{child_row}}}, tz, None))'
+            else:
+                path = field.source.split('.')
+                if path[-1].startswith('get_') and path[-1].endswith('_display'):
+                    # get_FOO_display: look the label up in the model field's choices
+                    choice_field = path[-1][len('get_'):-len('_display')]
+                    namespace[function] = {
+                        key: force_str(label, strings_only=True)
+                        for key, label in model._meta.get_field(choice_field).flatchoices
+                    }
+                    column = '__'.join(path[:-1] + [choice_field])
+                    expression = f'{function}.get(row[{column!r}], row[{column!r}])'
+                else:
+                    column = '__'.join(path)
+                    kind, namespace[function] = _field_step(field)
+                    value = f'row[{column!r}]'
+                    if kind == 'copy':
+                        converted = 'v'
+                    elif kind == 'datetime':
+                        converted = f'{function}(v, tz)'
+                    else:
+                        converted = f'{function}(v)'
+                    # A dotted source through a null relation drops the key, like DRF's SkipField
+                    if len(path) > 1:
+                        skippable.append(name)
+                        expression = f'(SKIP if (v := {value}) is None else {converted})'
+                    elif kind == 'copy':
+                        expression = value
+                    else:
+                        expression = f'(None if (v := {value}) is None else {converted})'
+                columns.append(column)
+            entries.append(f'        {name!r}: {expression},')
+        
+        source = '\n'.join([
+            'def build(row, tz, children):',
+            '    item = {',
+            *entries,
+            '    }',
+            *(f'    if item[{name!r}] is SKIP:\n        del item[{name!r}]' for name in skippable),
+            '    return item',
+        ])
+        exec(compile(source, f'<read plan for {self.serializer_class.__name__}>', 'exec'), namespace)
+        return namespace['build'], list(dict.fromkeys(columns)), nested
+    
+    def values(self, queryset, extra=()):
+        """The queryset reduced to the plan's columns (paginate this, then call serialize)"""
+        return queryset.prefetch_related(None).values(*dict.fromkeys([*self.compile()[1], *extra]))
+    
+    def serialize(self, rows):
+        """Build output dicts from rows of self.values(...)"""
+        build, _, nested = self.compile()
+        rows = list(rows)
+        children = {
+            name: child.grouped_by(relation, [row['id'] for row in rows])
+            for name, child, relation in nested
+        }
+        tz = timezone.get_current_timezone()
+        if tz.utcoffset(None) == ZERO:
+            tz = None  # Rows already come back in UTC
+        return [build(row, tz, children) for row in rows]
+    
+    def grouped_by(self, relation, parent_ids):
+        """Serialized rows for the given parents, as {parent id: [item, ...]}"""
+        if not parent_ids:
+            return {}
+        model = self.serializer_class.Meta.model
+        rows = list(model.objects.filter(**{f'{relation}__in': parent_ids}).values(
+            *self.compile()[1], relation
+        ))
+        grouped = {}
+        for row, item in zip(rows, self.serialize(rows)):
+            grouped.setdefault(row[relation], []).append(item)
+        return grouped
+
+class ReadPlanListMixin:
+    """GET lists go through `read_plan`; writes and detail views keep the serializer"""
+    read_plan = None
+    
+    def get_read_plan(self):
+        return self.read_plan
+    
+    def list(self, request, *args, **kwargs):
+        read_plan = self.get_read_plan()
+        # Cursor pagination reads its ordering columns from the rows, even when a sparse
+        # fieldset leaves them out of the output
+        ordering = getattr(self.paginator, 'ordering', None) or ()
+        if isinstance(ordering, str):
+            ordering = [ordering]
+        queryset = read_plan.values(
+            self.filter_queryset(self.get_queryset()), [field.lstrip('-') for field in ordering]
+        )
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(read_plan.serialize(page))
+        return Response(read_plan.serialize(queryset))
@@ -0,0 +1,70 @@
+# Faster wire formats for DRF. Payloads stay identical to the stock renderers: any type
+# orjson/msgpack can't encode natively (Decimal, datetime, lazy strings, querysets) goes
+# through DRF's own JSONEncoder.default, so clients see the same values either way.
+import msgpack
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+# Optional orjson support; without it JSON falls back to DRF's stdlib renderer
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_encoder = JSONEncoder()
+
+def _default(obj):
+    return _encoder.default(obj)
+
+if orjson is not None:
+    # Datetimes pass through to DRF's formatting (trimmed microseconds, "Z" for UTC)
+    ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+def dumps_json(data, indent=False):
+    """Encode like DRF's JSONRenderer, with orjson when it is installed"""
+    if orjson is None:
+        return JSONRenderer().render(data, renderer_context={'indent': 2 if indent else None})
+    options = ORJSON_OPTIONS | orjson.OPT_INDENT_2 if indent else ORJSON_OPTIONS
+    return orjson.dumps(data, default=_default, option=options)
+
+# application/json via orjson
+class ORJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        return dumps_json(data, indent=bool(indent))
+
+# application/msgpack for tills that send Accept: application/msgpack
+class MessagePackRenderer(BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+    
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=_default)
+
+class ORJSONParser(JSONParser):
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
+
+class MessagePackParser(BaseParser):
+    media_type = 'application/msgpack'
+    
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read())
+        except ValueError as exc:
+            raise ParseError(f'MessagePack parse error - {exc}')
@@ -57,15 +57,18 @@ INSTALLED_APPS = [
     'payments',
     'analytics',
     'notifications',
+    'jobs',
 ]
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'imanage.compression.LargeResponseGZipMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'imanage.db_router.ReplicaStickinessMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -99,9 +102,31 @@ DATABASES = {
         'PASSWORD': os.getenv('DB_PASSWORD', 'imanage_password'),
         'HOST': os.getenv('DB_HOST', 'localhost'),
         'PORT': os.getenv('DB_PORT', '5432'),
+        # Reuse connections per thread (incl. the async endpoints' pool threads)
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Read replica for analytics and list endpoints (a second connection to the
+# primary unless DB_REPLICA_HOST is set; tests mirror it onto default)
+DATABASES['replica'] = {
+    **DATABASES['default'],
+    'HOST': os.getenv('DB_REPLICA_HOST', DATABASES['default']['HOST']),
+    'PORT': os.getenv('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+    'TEST': {'MIRROR': 'default'},
+}
+
+DATABASE_ROUTERS = ['imanage.db_router.ReplicaRouter']
+
+REPLICA_CONFIG = {
+    'enabled': bool(os.getenv('DB_REPLICA_HOST')),
+    'alias': 'replica',
+    'sticky_seconds': 10,  # Read-your-writes window after a user's write
+    'max_lag_seconds': 5,  # Fall back to primary beyond this
+    'lag_check_interval': 5,
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -139,8 +164,29 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    # JSON stays the default; tills can ask for MessagePack with Accept: application/msgpack
+    'DEFAULT_RENDERER_CLASSES': (
+        'imanage.renderers.ORJSONRenderer',
+        'imanage.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'imanage.renderers.ORJSONParser',
+        'imanage.renderers.MessagePackParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
 }
 
+# POST /api/batch/ limits: sub-requests per batch, and how many run at once
+BATCH_CONFIG = {
+    'max_requests': 10,
+    'max_concurrency': 4,
+}
+
+# Responses smaller than this are sent uncompressed
+COMPRESS_MIN_BYTES = 1024
+
 # JWT settings
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(hours=12),
@@ -163,21 +209,142 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Cache (Redis in Docker); the async hot endpoints use its async API
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+# Seconds the async hot endpoints cache their payloads
+HOT_CACHE_TTL = {
+    'dashboard': 10,
+    'scan': 30,
+    'basket': 60,
+}
+
 # AI Configuration
 AI_CONFIG = {
     'enabled': bool(GROK_API_KEY),
     'provider': 'grok',
     'max_tokens': 500,
     'temperature': 0.7,
+    # Reuse a cached summary while money metrics move less than this fraction
+    'cache_tolerance': float(os.getenv('AI_CACHE_TOLERANCE', '0.02')),
+}
+
+# Push delivery: events of coalesced types are buffered per business for
+# coalesce_window seconds and only the latest is sent; multicast chunks go out
+# on up to max_parallel threads
+PUSH_CONFIG = {
+    'coalesce_window': float(os.getenv('PUSH_COALESCE_WINDOW', '2.0')),
+    'coalesce_types': ['sale', 'stock'],
+    'max_parallel': int(os.getenv('PUSH_MAX_PARALLEL', '4')),
+}
+
+# Notification retention (days) per type; sale notifications are folded into
+# daily digests once they are older than NOTIFICATION_COMPACT_AFTER_DAYS
+NOTIFICATION_RETENTION_DAYS = {
+    'sale': 30,
+    'stock': 30,
+    'alert': 30,
+    'system': 30,
+    'summary': 90,
+    'digest': 180,
+}
+NOTIFICATION_COMPACT_AFTER_DAYS = int(os.getenv('NOTIFICATION_COMPACT_AFTER_DAYS', '7'))
+NOTIFICATION_PRUNE_BATCH_SIZE = 5000
+
+# Nightly demand forecast and reorder points (inventory.forecasting)
+FORECAST_CONFIG = {
+    'history_days': 56,  # Eight weeks of daily sales per SKU
+    'season_length': 7,  # Day-of-week seasonality
+    'alpha': 0.3,  # Exponential smoothing factor
+    'service_level_z': 1.65,  # ~95% chance of not stocking out during the lead time
+    'lead_time_days': 3,
+    'review_days': 7,  # Days an order should cover beyond the lead time
+    'apply_to_minimum_stock': False,  # Opt in to moving thresholds nobody has set by hand
+}
+
+# Nightly market-basket mining (analytics.basket)
+BASKET_CONFIG = {
+    'window_days': 90,
+    'top_k': 5,  # Associations kept per product
+    'min_support': 3,  # Baskets a pair must appear in
+    'chunk_sales': 20000,  # Sales per incidence-matrix chunk
 }
 
+# Background job queue (jobs app); workers run with manage.py run_jobs
+JOB_QUEUE_CONFIG = {
+    'poll_interval': 5,  # Seconds an idle worker waits without a NOTIFY
+    'visibility_timeout': 300,  # Seconds a claim lasts before the job is handed out again
+    'max_attempts': 5,
+    'backoff_base': 10,  # Seconds before the first retry, doubling per attempt
+    'backoff_max': 3600,
+    'maintenance_interval': 30,  # Seconds between expired-claim and pruning sweeps
+    'keep_done_days': 7,
+    'keep_failed_days': 30,
+    'scheduler_lock_id': 4_607_310_046,  # pg advisory lock key held by the leading scheduler
+    'max_catchup_minutes': 24 * 60,  # Missed minutes a new leader evaluates after downtime
+}
+
+# Cron-like schedule driven by run_scheduler: 'cron' is "minute hour day month weekday"
+# (weekday 0 = Sunday). per_business entries match in each business's own timezone and
+# enqueue one job per active business (kwargs business_id); others match in UTC. Tasks
+# get the slot as scheduled_for. Missed slots run once on catch-up unless older than
+# 'expires' minutes.
+JOB_SCHEDULE = {
+    'business-alerts': {
+        'task': 'analytics.tasks.business_alerts_job',
+        'cron': '0 10,14,15,17 * * *',
+        'per_business': True,
+        'expires': 30,
+    },
+    'close-business-day': {
+        'task': 'analytics.tasks.close_business_job',
+        'cron': '15 0 * * *',
+        'per_business': True,
+    },
+    'forecast-reorder-points': {
+        'task': 'inventory.tasks.forecast_reorder_points_job',
+        'cron': '30 1 * * *',
+        'per_business': True,
+    },
+    'mine-baskets': {
+        'task': 'analytics.tasks.mine_baskets_job',
+        'cron': '0 2 * * 0',
+        'per_business': True,
+    },
+    'prune-notifications': {
+        'task': 'notifications.tasks.prune_notifications_job',
+        'cron': '0 1 * * *',
+    },
+}
+
+# Mobile-money callbacks and statement reconciliation (payments.mobile_money / reconciliation)
+MOBILE_MONEY_CONFIG = {
+    'match_window_minutes': 15,  # How far apart a payment and its provider record may be timed
+    'enable_fake_provider': DEBUG,  # Accept the local 'fake' provider used by tests and development
+}
+
+# Seconds between refreshes of the open day's sales facts when reports are read
+SALES_FACTS_REFRESH_SECONDS = 60
+
+# Rows fetched per round trip when streaming exports through server-side cursors
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', '2000'))
+
 # Docker/Production settings
 if os.getenv('DOCKER_ENV') == 'true':
     ALLOWED_HOSTS = ['*']  
     DATABASES['default']['HOST'] = 'postgres'
+    DATABASES['replica']['HOST'] = os.getenv('DB_REPLICA_HOST', 'postgres')
     CHANNEL_LAYERS['default'] = {
         'BACKEND': 'channels_redis.core.RedisChannelLayer',
         'CONFIG': {
             'hosts': [('redis', 6379)],
         },
+    }
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://redis:6379/1',
     }
\ No newline at end of file
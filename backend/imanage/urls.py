@@ -1,13 +1,14 @@
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
-from . import views
+from . import batch, views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('api/', views.api_root, name='api-root'),  
+    path('api/batch/', batch.batch, name='batch'),
     path('api/auth/', include('accounts.urls')),
     path('api/business/', include('business.urls')),
     path('api/inventory/', include('inventory.urls')),
@@ -15,4 +16,5 @@ urlpatterns = [
     path('api/payments/', include('payments.urls')),
     path('api/analytics/', include('analytics.urls')),
     path('api/notifications/', include('notifications.urls')),  
+    path('api/jobs/', include('jobs.urls')),
 ]
\ No newline at end of file
@@ -15,6 +15,7 @@ def api_root(request, format=None):
             'logout': reverse('logout', request=request, format=format),
         },
         'business': reverse('business-list', request=request, format=format),
+        'batch': reverse('batch', request=request),
         'inventory': {
             'products': reverse('product-list', request=request, format=format),
             'categories': reverse('category-list', request=request, format=format),
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Category, Product, StockMovement
+from .models import Category, Product, StockMovement, Stocktake
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -15,4 +15,9 @@ class ProductAdmin(admin.ModelAdmin):
 @admin.register(StockMovement)
 class StockMovementAdmin(admin.ModelAdmin):
     list_display = ('product', 'movement_type', 'quantity', 'created_by', 'created_at')
-    list_filter = ('movement_type', 'created_at')
\ No newline at end of file
+    list_filter = ('movement_type', 'created_at')
+
+@admin.register(Stocktake)
+class StocktakeAdmin(admin.ModelAdmin):
+    list_display = ('name', 'business', 'status', 'created_by', 'created_at', 'committed_at')
+    list_filter = ('status',)
@@ -0,0 +1,216 @@
+import io
+import math
+from datetime import timedelta
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, OuterRef, Q, Subquery
+from django.utils import timezone
+from .models import Product, ReorderSuggestion
+
+# Every step below works on whole (products x days) arrays: there is no per-product
+# Python loop, so a 50k-SKU catalog costs a handful of matrix operations.
+
+def load_history(business, end, days):
+    """Product arrays plus a (products x days) matrix of units sold per local day up to `end`"""
+    from analytics.models import ProductDailySales
+    
+    start = end - timedelta(days=days - 1)
+    rows = list(Product.objects.filter(business=business).order_by('id').values_list(
+        'id', 'current_stock', 'maximum_stock'
+    ))
+    if not rows:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty, np.zeros((0, days)), start
+    ids, stock, maximum = (np.array(column, dtype=np.int64) for column in zip(*rows))
+    
+    # Fact rows as (product, day offset, qty) triples for the window
+    facts = ProductDailySales.objects.filter(
+        business=business, date__range=[start, end], product_id__isnull=False
+    ).order_by()
+    if connection.vendor == 'postgresql':
+        triples = _copy_triples(facts, start)
+    else:
+        triples = np.array([
+            (product_id, (day - start).days, quantity)
+            for product_id, day, quantity in facts.values_list('product_id', 'date', 'quantity')
+        ], dtype=np.int64).reshape(-1, 3)
+    
+    history = np.zeros((len(ids), days))
+    product_ids, columns, quantities = triples.T
+    positions = np.searchsorted(ids, product_ids)
+    known = (positions < len(ids)) & (ids[np.minimum(positions, len(ids) - 1)] == product_ids)
+    history[positions[known], columns[known]] = quantities[known]
+    return ids, stock, maximum, history, start
+
+def _copy_triples(facts, start):
+    """Stream fact triples with COPY and parse them in one numpy call (no per-row Python objects)"""
+    sql, params = facts.values_list('product_id', 'date', 'quantity').query.sql_with_params()
+    buffer = io.StringIO()
+    with connection.cursor() as cursor:
+        # Only the column list is rewritten; the filtered query stays the ORM's
+        select = cursor.cursor.mogrify(sql, params).decode()
+        cursor.cursor.copy_expert(
+            f"COPY (SELECT product_id, date - DATE '{start.isoformat()}', quantity "
+            f"FROM ({select}) AS facts) TO STDOUT",
+            buffer
+        )
+    return np.array(buffer.getvalue().split(), dtype=np.int64).reshape(-1, 3)
+
+def smoothing_weights(days, alpha):
+    """(days x days) matrix W so that (series @ W)[:, t] is the exponentially smoothed level at day t"""
+    i = np.arange(days)[:, None]
+    t = np.arange(days)[None, :]
+    weights = np.where(i <= t, alpha * (1 - alpha) ** np.clip(t - i, 0, None), 0.0)
+    weights[0, :] = (1 - alpha) ** np.arange(days)  # First observation seeds the level
+    return weights
+
+def seasonal_indices(history, start, season_length):
+    """Per-product day-of-week multipliers (mean 1), 1 everywhere for products with no sales"""
+    days = history.shape[1]
+    phase = (start.weekday() + np.arange(days)) % season_length
+    onehot = np.eye(season_length)[phase]  # (days x season)
+    by_phase = (history @ onehot) / onehot.sum(axis=0)
+    mean = by_phase.mean(axis=1, keepdims=True)
+    indices = np.divide(by_phase, mean, out=np.ones_like(by_phase), where=mean > 0)
+    # Sparse sellers get zero-heavy phases; keep a floor so deseasonalizing stays finite
+    return np.maximum(indices, 0.1)
+
+def fit_forecast(history, start, alpha, season_length):
+    """Seasonal exponential smoothing for every product at once: (level, seasonal, sigma)"""
+    days = history.shape[1]
+    seasonal = seasonal_indices(history, start, season_length)
+    phase = (start.weekday() + np.arange(days)) % season_length
+    adjusted = history / seasonal[:, phase]
+    
+    levels = adjusted @ smoothing_weights(days, alpha)  # Level after each day
+    errors = adjusted[:, 1:] - levels[:, :-1]  # One-step-ahead forecast errors
+    sigma = np.sqrt((errors ** 2).mean(axis=1)) if days > 1 else np.zeros(len(history))
+    return levels[:, -1], seasonal, sigma
+
+def forecast_demand(level, seasonal, first_day, horizon, season_length):
+    """Units expected over the next `horizon` days starting at first_day"""
+    if horizon <= 0:
+        return np.zeros(len(level))
+    phase = (first_day.weekday() + np.arange(horizon)) % season_length
+    return level * seasonal[:, phase].sum(axis=1)
+
+def _ceil(values):
+    # Round off float noise first so exactly 15.0 units doesn't become 16
+    return np.ceil(np.round(values, 6))
+
+def compute_reorder_points(business, end=None, config=None):
+    """Forecast demand for a business's whole catalog and derive reorder advice arrays"""
+    config = config or settings.FORECAST_CONFIG
+    end = end or business.local_today() - timedelta(days=1)  # Last closed day
+    lead_time, review = config['lead_time_days'], config['review_days']
+    season_length = config['season_length']
+    
+    ids, stock, maximum, history, start = load_history(business, end, config['history_days'])
+    level, seasonal, sigma = fit_forecast(history, start, config['alpha'], season_length)
+    
+    first_day = end + timedelta(days=1)
+    lead_time_demand = forecast_demand(level, seasonal, first_day, lead_time, season_length)
+    cover_demand = forecast_demand(level, seasonal, first_day, lead_time + review, season_length)
+    
+    safety_stock = _ceil(config['service_level_z'] * sigma * math.sqrt(lead_time))
+    reorder_point = _ceil(lead_time_demand + safety_stock)
+    target = _ceil(cover_demand + safety_stock)
+    target = np.where(maximum > 0, np.minimum(target, maximum), target)
+    reorder_quantity = np.where(stock <= reorder_point, np.maximum(target - stock, 0), 0)
+    days_of_cover = np.divide(stock, level, out=np.full(len(ids), np.nan), where=level > 0)
+    
+    return {
+        'product_id': ids,
+        'daily_demand': level,
+        'demand_std': sigma,
+        'lead_time_demand': lead_time_demand,
+        'safety_stock': safety_stock,
+        'reorder_point': reorder_point,
+        'reorder_quantity': reorder_quantity,
+        'days_of_cover': np.clip(days_of_cover, None, 99999),
+        'history_days': (history > 0).sum(axis=1),
+    }
+
+# Columns written to ReorderSuggestion, with their SQL array types
+SUGGESTION_COLUMNS = [
+    ('product_id', 'bigint'), ('daily_demand', 'numeric'), ('demand_std', 'numeric'),
+    ('lead_time_demand', 'numeric'), ('safety_stock', 'integer'), ('reorder_point', 'integer'),
+    ('reorder_quantity', 'integer'), ('days_of_cover', 'numeric'), ('history_days', 'integer'),
+]
+
+def _column_values(result, column):
+    values = result[column]
+    if column == 'days_of_cover':
+        return [None if math.isnan(v) else round(v, 1) for v in values.tolist()]
+    if column in ('daily_demand', 'demand_std', 'lead_time_demand'):
+        return np.round(values, 2).tolist()
+    return values.astype(np.int64).tolist()
+
+def _array_literal(values):
+    # Postgres array text is far cheaper to send than per-element parameter adaptation
+    return '{' + ','.join('NULL' if value is None else str(value) for value in values) + '}'
+
+def _unnest_upsert(business, result, computed_at):
+    """One INSERT ... SELECT FROM unnest(arrays) ON CONFLICT for the whole catalog"""
+    table = ReorderSuggestion._meta.db_table
+    names = [name for name, _ in SUGGESTION_COLUMNS]
+    arrays = ', '.join(f'%s::{sql_type}[]' for _, sql_type in SUGGESTION_COLUMNS)
+    updates = ', '.join(f'{name} = EXCLUDED.{name}' for name in names[1:])
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            INSERT INTO {table} ({', '.join(names)}, business_id, computed_at)
+            SELECT *, %s, %s FROM unnest({arrays})
+            ON CONFLICT (product_id) DO UPDATE SET {updates}, computed_at = EXCLUDED.computed_at
+        """, [business.id, computed_at, *(_array_literal(_column_values(result, name)) for name in names)])
+
+def _bulk_upsert(business, result, computed_at):
+    """Portable fallback for the unnest upsert"""
+    names = [name for name, _ in SUGGESTION_COLUMNS]
+    columns = {name: _column_values(result, name) for name in names}
+    ReorderSuggestion.objects.bulk_create(
+        [
+            ReorderSuggestion(business=business, computed_at=computed_at,
+                              **{name: columns[name][i] for name in names})
+            for i in range(len(columns['product_id']))
+        ],
+        batch_size=2000,
+        update_conflicts=True,
+        unique_fields=['product'],
+        update_fields=names[1:] + ['computed_at'],
+    )
+
+def update_reorder_suggestions(business, end=None, apply=None):
+    """Nightly job body: refresh every product's suggestion, optionally moving minimum_stock"""
+    config = settings.FORECAST_CONFIG
+    result = compute_reorder_points(business, end, config)
+    if not len(result['product_id']):
+        return 0
+    
+    computed_at = timezone.now()
+    apply = config['apply_to_minimum_stock'] if apply is None else apply
+    with transaction.atomic():
+        # Only thresholds nobody has set by hand move: still the model default, or the
+        # reorder point the last run wrote. Read before the upsert replaces those points.
+        if apply:
+            untouched = list(Product.objects.filter(business=business).filter(
+                Q(minimum_stock=Product._meta.get_field('minimum_stock').default)
+                | Q(minimum_stock=F('reorder_suggestion__reorder_point'))
+            ).values_list('id', flat=True))
+        
+        if connection.vendor == 'postgresql':
+            _unnest_upsert(business, result, computed_at)
+        else:
+            _bulk_upsert(business, result, computed_at)
+        
+        # Low-stock alerts key off minimum_stock; move it to the forecast reorder point
+        # for products that actually sell, leaving the static default on the rest
+        if apply:
+            Product.objects.filter(
+                id__in=untouched, reorder_suggestion__daily_demand__gt=0
+            ).exclude(minimum_stock=F('reorder_suggestion__reorder_point')).update(
+                minimum_stock=Subquery(
+                    ReorderSuggestion.objects.filter(product=OuterRef('pk')).values('reorder_point')[:1]
+                )
+            )
+    return len(result['product_id'])
@@ -0,0 +1,288 @@
+import csv
+import io
+import uuid
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+from django.db import connection, models, transaction
+from django.db.models import Case, DecimalField, F, Value, When
+from django.utils import timezone
+from .models import Category, Product, sync_stock_status
+
+# Optional XLSX support
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+# Columns accepted in an import file; sku, name and both prices are required
+IMPORT_COLUMNS = [
+    'sku', 'name', 'description', 'category', 'cost_price', 'selling_price',
+    'current_stock', 'minimum_stock', 'maximum_stock', 'barcode', 'status',
+]
+REQUIRED_COLUMNS = ['sku', 'name', 'cost_price', 'selling_price']
+
+# Fields overwritten when an existing SKU is re-imported (stock is left to stocktakes)
+UPDATE_FIELDS = [
+    'name', 'description', 'category', 'cost_price', 'selling_price',
+    'minimum_stock', 'maximum_stock', 'barcode', 'status', 'updated_at',
+]
+
+IMPORT_BATCH_SIZE = 2000
+
+def read_rows(upload):
+    """Read an uploaded CSV or XLSX file into a list of dicts"""
+    name = getattr(upload, 'name', '') or ''
+    if name.lower().endswith('.xlsx'):
+        if openpyxl is None:
+            raise ValueError('XLSX import requires openpyxl; upload a CSV instead')
+        sheet = openpyxl.load_workbook(upload, read_only=True, data_only=True).active
+        values = sheet.iter_rows(values_only=True)
+        header = [str(h or '').strip().lower() for h in next(values, [])]
+        return [dict(zip(header, row)) for row in values]
+    
+    content = upload.read() if hasattr(upload, 'read') else upload
+    if isinstance(content, bytes):
+        content = content.decode('utf-8-sig')
+    reader = csv.DictReader(io.StringIO(content))
+    reader.fieldnames = [(h or '').strip().lower() for h in reader.fieldnames or []]
+    return list(reader)
+
+def _clean(value):
+    return '' if value is None else str(value).strip()
+
+def _decimal(value):
+    try:
+        value = Decimal(_clean(value))
+        return value.quantize(Decimal('0.01')) if value.is_finite() else None
+    except (InvalidOperation, ValueError):
+        return None
+
+def _integer(value, default):
+    value = _clean(value)
+    if value == '':
+        return default
+    try:
+        return int(Decimal(value))
+    except (InvalidOperation, ValueError, OverflowError):  # NaN and Infinity parse but are not whole numbers
+        return None
+
+def _out_of_range(column, value):
+    """Whether the Product column cannot store value (it would fail the whole upsert)"""
+    field = Product._meta.get_field(column)
+    if isinstance(field, models.DecimalField):
+        return abs(value) >= Decimal(10) ** (field.max_digits - field.decimal_places)
+    low, high = connection.ops.integer_field_range(field.get_internal_type())
+    return (low is not None and value < low) or (high is not None and value > high)
+
+def validate_rows(business, rows):
+    """Validate all rows in one pass; returns (valid rows, per-row error report)"""
+    skus = [_clean(row.get('sku')) if isinstance(row, dict) else '' for row in rows]
+    barcodes = [_clean(row.get('barcode')) if isinstance(row, dict) else '' for row in rows]
+    sku_counts = Counter(s for s in skus if s)
+    barcode_counts = Counter(b for b in barcodes if b)
+    
+    # One query each for SKUs and barcodes that already exist anywhere
+    existing = {
+        p['sku']: p for p in Product.objects.filter(sku__in=list(sku_counts)).values('sku', 'business_id', 'barcode')
+    }
+    barcode_owners = dict(
+        Product.objects.filter(barcode__in=list(barcode_counts)).values_list('barcode', 'sku')
+    )
+    status_choices = {choice for choice, _ in Product.STATUS_CHOICES}
+    
+    valid, report = [], []
+    for index, row in enumerate(rows, start=2):  # Row 1 is the header
+        sku, barcode = skus[index - 2], barcodes[index - 2]
+        if not isinstance(row, dict):
+            report.append({'row': index, 'sku': '', 'errors': ['row must be an object of column values']})
+            continue
+        errors = []
+        
+        for column in REQUIRED_COLUMNS:
+            if not _clean(row.get(column)):
+                errors.append(f'{column} is required')
+        for column, max_length in (('sku', 50), ('name', 200), ('barcode', 100), ('category', 100)):
+            if len(_clean(row.get(column))) > max_length:
+                errors.append(f'{column} is longer than {max_length} characters')
+        if sku and sku_counts[sku] > 1:
+            errors.append('duplicate sku in file')
+        if sku in existing and existing[sku]['business_id'] != business.id:
+            errors.append('sku belongs to another business')
+        if barcode and barcode_counts[barcode] > 1:
+            errors.append('duplicate barcode in file')
+        if barcode and barcode_owners.get(barcode, sku) != sku:
+            errors.append('barcode already used by another product')
+        
+        cost_price, selling_price = _decimal(row.get('cost_price')), _decimal(row.get('selling_price'))
+        if _clean(row.get('cost_price')) and (cost_price is None or cost_price < 0):
+            errors.append('cost_price must be a non-negative number')
+        if _clean(row.get('selling_price')) and (selling_price is None or selling_price <= 0):
+            errors.append('selling_price must be a positive number')
+        for column, value in (('cost_price', cost_price), ('selling_price', selling_price)):
+            if value is not None and _out_of_range(column, value):
+                errors.append(f'{column} is out of range')
+        
+        stock = {
+            'current_stock': _integer(row.get('current_stock'), 0),
+            'minimum_stock': _integer(row.get('minimum_stock'), 10),
+            'maximum_stock': _integer(row.get('maximum_stock'), 1000),
+        }
+        for field, value in stock.items():
+            if value is None:
+                errors.append(f'{field} must be a whole number')
+            elif _out_of_range(field, value):
+                errors.append(f'{field} is out of range')
+        
+        status = _clean(row.get('status')) or 'active'
+        if status not in status_choices:
+            errors.append(f'status must be one of {", ".join(sorted(status_choices))}')
+        
+        if errors:
+            report.append({'row': index, 'sku': sku, 'errors': errors})
+            continue
+        
+        # Keep the stored barcode when the file leaves it blank, else generate one
+        if not barcode:
+            barcode = existing[sku]['barcode'] if sku in existing else uuid.uuid4().hex[:12].upper()
+        
+        valid.append({
+            'sku': sku,
+            'name': _clean(row.get('name')),
+            'description': _clean(row.get('description')),
+            'category': _clean(row.get('category')),
+            'cost_price': cost_price,
+            'selling_price': selling_price,
+            'barcode': barcode,
+            'status': status,
+            'is_new': sku not in existing,
+            **stock,
+        })
+    
+    return valid, report
+
+def import_products(business, rows, dry_run=False):
+    """Validate and upsert catalog rows in bulk; returns a summary with per-row errors"""
+    valid, report = validate_rows(business, rows)
+    result = {
+        'total_rows': len(rows),
+        'created': sum(1 for row in valid if row['is_new']),
+        'updated': sum(1 for row in valid if not row['is_new']),
+        'failed': len(report),
+        'errors': report,
+        'dry_run': dry_run,
+    }
+    if dry_run or not valid:
+        return result
+    
+    with transaction.atomic():
+        # Auto-create missing categories in one insert
+        names = {row['category'] for row in valid if row['category']}
+        categories = dict(Category.objects.filter(business=business, name__in=names).values_list('name', 'id'))
+        Category.objects.bulk_create([
+            Category(business=business, name=name) for name in names if name not in categories
+        ])
+        categories = dict(Category.objects.filter(business=business, name__in=names).values_list('name', 'id'))
+        for row in valid:
+            row['category_id'] = categories.get(row['category'])
+        
+        if connection.vendor == 'postgresql':
+            _copy_upsert(business, valid)
+        else:
+            _bulk_upsert(business, valid)
+        # A file may mark an empty product active; stock decides, as in Product.save()
+        sync_stock_status(Product.objects.filter(business=business))
+    
+    return result
+
+# Columns written to the staging table, in COPY order
+STAGE_COLUMNS = [
+    'sku', 'name', 'description', 'category_id', 'cost_price', 'selling_price',
+    'current_stock', 'minimum_stock', 'maximum_stock', 'barcode', 'status',
+]
+
+def _copy_upsert(business, rows):
+    """COPY rows into a temp staging table, then upsert them with one INSERT ... ON CONFLICT"""
+    table = Product._meta.db_table
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([row[column] for column in STAGE_COLUMNS])
+    buffer.seek(0)
+    
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            CREATE TEMP TABLE product_import_stage (
+                sku varchar(50), name varchar(200), description text, category_id bigint,
+                cost_price numeric(10, 2), selling_price numeric(10, 2), current_stock integer,
+                minimum_stock integer, maximum_stock integer, barcode varchar(100), status varchar(20)
+            ) ON COMMIT DROP
+        """)
+        # Empty unquoted CSV fields are NULL unless forced; text columns must stay ''
+        cursor.cursor.copy_expert(
+            f"COPY product_import_stage ({', '.join(STAGE_COLUMNS)}) FROM STDIN "
+            "WITH (FORMAT csv, FORCE_NOT_NULL (sku, name, description, barcode, status))",
+            buffer
+        )
+        # profit_margin follows the same rule as Product.save(), computed in SQL
+        cursor.execute(f"""
+            INSERT INTO {table} (
+                business_id, sku, name, description, category_id, cost_price, selling_price,
+                profit_margin, current_stock, minimum_stock, maximum_stock, barcode, status,
+                created_at, updated_at
+            )
+            SELECT %s, sku, name, description, category_id, cost_price, selling_price,
+                   CASE WHEN cost_price > 0 THEN selling_price - cost_price ELSE 0 END,
+                   current_stock, minimum_stock, maximum_stock, barcode, status, now(), now()
+            FROM product_import_stage
+            ON CONFLICT (sku) DO UPDATE SET
+                name = EXCLUDED.name,
+                description = EXCLUDED.description,
+                category_id = EXCLUDED.category_id,
+                cost_price = EXCLUDED.cost_price,
+                selling_price = EXCLUDED.selling_price,
+                profit_margin = EXCLUDED.profit_margin,
+                minimum_stock = EXCLUDED.minimum_stock,
+                maximum_stock = EXCLUDED.maximum_stock,
+                barcode = EXCLUDED.barcode,
+                status = EXCLUDED.status,
+                updated_at = EXCLUDED.updated_at
+            WHERE {table}.business_id = EXCLUDED.business_id
+        """, [business.id])
+
+def _bulk_upsert(business, rows):
+    """Portable fallback: bulk_create with update_conflicts, then fix margins in SQL"""
+    started_at = timezone.now()
+    products = [
+        Product(
+            business=business,
+            sku=row['sku'],
+            name=row['name'],
+            description=row['description'],
+            category_id=row['category_id'],
+            cost_price=row['cost_price'],
+            selling_price=row['selling_price'],
+            profit_margin=0,  # Filled in by the set-based update below
+            current_stock=row['current_stock'],
+            minimum_stock=row['minimum_stock'],
+            maximum_stock=row['maximum_stock'],
+            barcode=row['barcode'],
+            status=row['status'],
+        )
+        for row in rows
+    ]
+    Product.objects.bulk_create(
+        products,
+        batch_size=IMPORT_BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=['sku'],
+        update_fields=UPDATE_FIELDS,
+    )
+    
+    # Same rule as Product.save(), applied to every imported row in SQL
+    Product.objects.filter(business=business, updated_at__gte=started_at).update(
+        profit_margin=Case(
+            When(cost_price__gt=0, then=F('selling_price') - F('cost_price')),
+            default=Value(Decimal('0.00')),
+            output_field=DecimalField(max_digits=10, decimal_places=2),
+        )
+    )
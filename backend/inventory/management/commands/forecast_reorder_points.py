@@ -0,0 +1,26 @@
+import time
+from django.core.management.base import BaseCommand
+from business.models import Business
+from inventory.forecasting import update_reorder_suggestions
+
+# Run nightly after close_business_day so yesterday's sales facts are final
+class Command(BaseCommand):
+    help = 'Forecast per-SKU demand and refresh reorder points and quantities'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--business', type=int, action='append', help='Only these business IDs')
+        parser.add_argument('--apply', action='store_true',
+                            help='Also move Product.minimum_stock where it has not been set by hand')
+        parser.add_argument('--no-apply', action='store_true',
+                            help='Write suggestions without updating Product.minimum_stock')
+    
+    def handle(self, *args, **options):
+        businesses = Business.objects.all()
+        if options['business']:
+            businesses = businesses.filter(id__in=options['business'])
+        
+        for business in businesses:
+            started = time.perf_counter()
+            count = update_reorder_suggestions(business, apply=False if options['no_apply'] else options['apply'] or None)
+            self.stdout.write(f'Business {business.id}: {count} products in {time.perf_counter() - started:.2f}s')
+        self.stdout.write(self.style.SUCCESS('Reorder suggestions updated'))
@@ -0,0 +1,33 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from business.models import Business
+from inventory.importer import import_products, read_rows
+
+# Load a wholesaler catalog file straight into the product table
+class Command(BaseCommand):
+    help = 'Bulk import products from a CSV or XLSX file'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or XLSX file')
+        parser.add_argument('--business', type=int, required=True, help='Business ID')
+        parser.add_argument('--dry-run', action='store_true', help='Validate only, write nothing')
+    
+    def handle(self, *args, **options):
+        try:
+            business = Business.objects.get(pk=options['business'])
+        except Business.DoesNotExist:
+            raise CommandError(f"Business {options['business']} not found")
+        
+        try:
+            with open(options['path'], 'rb') as upload:
+                rows = read_rows(upload)
+        except (OSError, ValueError, UnicodeDecodeError) as e:
+            raise CommandError(str(e))
+        
+        result = import_products(business, rows, dry_run=options['dry_run'])
+        for error in result['errors']:
+            self.stderr.write(json.dumps(error))
+        self.stdout.write(self.style.SUCCESS(
+            f"{result['created']} created, {result['updated']} updated, {result['failed']} failed"
+            + (' (dry run)' if result['dry_run'] else '')
+        ))
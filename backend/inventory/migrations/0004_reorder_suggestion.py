@@ -0,0 +1,37 @@
+# Generated by Django 5.2.10 on 2026-10-19 06:11
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('business', '0001_initial'),
+        ('inventory', '0003_stocktake'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReorderSuggestion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('daily_demand', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('demand_std', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('lead_time_demand', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('safety_stock', models.IntegerField(default=0)),
+                ('reorder_point', models.IntegerField(default=0)),
+                ('reorder_quantity', models.IntegerField(default=0)),
+                ('days_of_cover', models.DecimalField(blank=True, decimal_places=1, max_digits=10, null=True)),
+                ('history_days', models.IntegerField(default=0)),
+                ('computed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('business', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='business.business')),
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='reorder_suggestion', to='inventory.product')),
+            ],
+            options={
+                'ordering': ['days_of_cover'],
+                'indexes': [models.Index(fields=['business', 'days_of_cover'], name='inventory_r_busines_84e640_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.10 on 2026-10-19 06:26
+
+from django.db import migrations, models
+
+
+def sync_out_of_stock_status(apps, schema_editor):
+    Product = apps.get_model('inventory', 'Product')
+    Product.objects.filter(status='active', stock_state='out').update(status='out_of_stock')
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('business', '0001_initial'),
+        ('inventory', '0004_reorder_suggestion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='stock_state',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(current_stock__lte=0, then=models.Value('out')), models.When(current_stock__lte=models.F('minimum_stock'), then=models.Value('low')), default=models.Value('ok')), output_field=models.CharField(choices=[('ok', 'OK'), ('low', 'Low Stock'), ('out', 'Out of Stock')], max_length=3)),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('stock_state', 'ok'), _negated=True), fields=['business', 'stock_state'], name='product_stock_alert_idx'),
+        ),
+        migrations.RunPython(sync_out_of_stock_status, migrations.RunPython.noop),
+    ]
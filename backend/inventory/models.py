@@ -1,4 +1,8 @@
-from django.db import models
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.signals import post_save
+from django.dispatch import receiver
 from django.utils import timezone
 import uuid  # For unique barcodes
 
@@ -25,6 +29,13 @@ class Product(models.Model):
         ('out_of_stock', 'Out of Stock'),
     )
     
+    # Stock level states; anything but 'ok' shows up in low stock alerts
+    STOCK_STATE_CHOICES = (
+        ('ok', 'OK'),
+        ('low', 'Low Stock'),
+        ('out', 'Out of Stock'),
+    )
+    
     # Basic product info
     business = models.ForeignKey('business.Business', on_delete=models.CASCADE)
     sku = models.CharField(max_length=50, unique=True)  # Stock Keeping Unit
@@ -42,6 +53,17 @@ class Product(models.Model):
     minimum_stock = models.IntegerField(default=10)  # Low stock threshold
     maximum_stock = models.IntegerField(default=1000)  # Max capacity
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
+    # Computed by the database on every write (saves, bulk updates, COPY imports),
+    # so it can never drift from the stock columns
+    stock_state = models.GeneratedField(
+        expression=Case(
+            When(current_stock__lte=0, then=Value('out')),
+            When(current_stock__lte=F('minimum_stock'), then=Value('low')),
+            default=Value('ok'),
+        ),
+        output_field=models.CharField(max_length=3, choices=STOCK_STATE_CHOICES),
+        db_persist=True,
+    )
     
     # Barcode/QR code
     barcode = models.CharField(max_length=100, unique=True, blank=True)
@@ -52,16 +74,26 @@ class Product(models.Model):
     
     class Meta:
         ordering = ['name']
+        indexes = [
+            # Only the few low/out rows are indexed: alert lists and counts never touch healthy stock
+            models.Index(fields=['business', 'stock_state'], condition=~Q(stock_state='ok'),
+                         name='product_stock_alert_idx'),
+        ]
     
     def __str__(self):
         return f"{self.name} ({self.sku})"
     
-    # Auto-calculate profit margin before saving
+    # Auto-calculate profit margin and stock status before saving
     def save(self, *args, **kwargs):
         if self.cost_price and self.selling_price and self.cost_price > 0:
             self.profit_margin = self.selling_price - self.cost_price
         else:
             self.profit_margin = 0
+        # Sellable products go out of stock at zero and come back when restocked
+        if self.status == 'active' and self.current_stock <= 0:
+            self.status = 'out_of_stock'
+        elif self.status == 'out_of_stock' and self.current_stock > 0:
+            self.status = 'active'
         super().save(*args, **kwargs)
     
     # Check if stock is low
@@ -74,6 +106,34 @@ class Product(models.Model):
     def is_out_of_stock(self):
         return self.current_stock <= 0
 
+def sync_stock_status(products):
+    """Set-based version of the status flip in Product.save(), for stock written in bulk"""
+    flipped = products.filter(status='active', stock_state='out').update(status='out_of_stock')
+    flipped += products.filter(status='out_of_stock').exclude(stock_state='out').update(status='active')
+    return flipped
+
+def scan_cache_key(business_id, code):
+    return f'scan:{business_id}:{code}'
+
+# Drop cached scan lookups when a product is edited (bulk imports rely on the TTL)
+@receiver(post_save, sender=Product)
+def invalidate_scan_cache(sender, instance, **kwargs):
+    cache.delete_many([
+        scan_cache_key(instance.business_id, code) for code in (instance.barcode, instance.sku) if code
+    ])
+
+def invalidate_scan_caches(products):
+    """invalidate_scan_cache for stock written with a QuerySet update, which sends no post_save
+    
+    Keys are dropped once the transaction commits, so a scan in between cannot re-cache the old stock.
+    """
+    keys = [
+        scan_cache_key(business_id, code)
+        for business_id, barcode, sku in products.values_list('business_id', 'barcode', 'sku')
+        for code in (barcode, sku) if code
+    ]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
 # Stock movement tracking
 class StockMovement(models.Model):
     MOVEMENT_TYPES = (
@@ -98,4 +158,77 @@ class StockMovement(models.Model):
         ordering = ['-created_at']
     
     def __str__(self):
-        return f"{self.product.name} - {self.movement_type} ({self.quantity})"
\ No newline at end of file
+        return f"{self.product.name} - {self.movement_type} ({self.quantity})"
+# Physical stock count session
+class Stocktake(models.Model):
+    STATUS_CHOICES = (
+        ('open', 'Open'),
+        ('committed', 'Committed'),
+        ('cancelled', 'Cancelled'),
+    )
+    
+    business = models.ForeignKey('business.Business', on_delete=models.CASCADE)
+    name = models.CharField(max_length=100)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='open')
+    notes = models.TextField(blank=True)
+    
+    created_by = models.ForeignKey('accounts.User', on_delete=models.SET_NULL, null=True, related_name='stocktakes')
+    committed_by = models.ForeignKey('accounts.User', on_delete=models.SET_NULL, null=True, blank=True, related_name='committed_stocktakes')
+    created_at = models.DateTimeField(default=timezone.now)
+    committed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"Stocktake {self.name} ({self.status})"
+    
+    # Reference written on the StockMovement rows of this count
+    @property
+    def reference(self):
+        return f"STOCKTAKE-{self.id}"
+
+# Counted quantity for one product within a stocktake
+class StocktakeCount(models.Model):
+    stocktake = models.ForeignKey(Stocktake, on_delete=models.CASCADE, related_name='counts')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    counted_quantity = models.IntegerField()
+    counted_by = models.ForeignKey('accounts.User', on_delete=models.SET_NULL, null=True)
+    counted_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        unique_together = ['stocktake', 'product']  # Re-counting a product replaces the earlier count
+        ordering = ['id']
+    
+    def __str__(self):
+        return f"{self.product.name}: {self.counted_quantity}"
+
+# Forecast-driven reorder advice for one product, rewritten by the nightly forecast job
+class ReorderSuggestion(models.Model):
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name='reorder_suggestion')
+    business = models.ForeignKey('business.Business', on_delete=models.CASCADE)
+    
+    # Forecast
+    daily_demand = models.DecimalField(max_digits=10, decimal_places=2, default=0)  # Mean forecast units/day
+    demand_std = models.DecimalField(max_digits=10, decimal_places=2, default=0)  # Daily demand variability
+    lead_time_demand = models.DecimalField(max_digits=12, decimal_places=2, default=0)  # Forecast over lead time
+    
+    # Advice
+    safety_stock = models.IntegerField(default=0)
+    reorder_point = models.IntegerField(default=0)  # Reorder when stock falls to this level
+    reorder_quantity = models.IntegerField(default=0)  # Units to order now to reach the target level
+    days_of_cover = models.DecimalField(max_digits=10, decimal_places=1, null=True, blank=True)  # None without demand
+    
+    history_days = models.IntegerField(default=0)  # Days of sales history the forecast used
+    computed_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['days_of_cover']
+        indexes = [models.Index(fields=['business', 'days_of_cover'])]
+    
+    def __str__(self):
+        return f"{self.product.name}: reorder at {self.reorder_point}"
+    
+    @property
+    def needs_reorder(self):
+        return self.reorder_quantity > 0
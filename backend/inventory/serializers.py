@@ -1,5 +1,7 @@
 from rest_framework import serializers
-from .models import Category, Product, StockMovement
+from imanage.fieldsets import SparseFieldsMixin
+from imanage.read_serializers import ReadPlan
+from .models import Category, Product, ReorderSuggestion, StockMovement, Stocktake
 
 # Category serializer
 class CategorySerializer(serializers.ModelSerializer):
@@ -7,22 +9,36 @@ class CategorySerializer(serializers.ModelSerializer):
         model = Category
         fields = ['id', 'name', 'description', 'created_at']
 
+# Forecast advice embedded in a product with ?include=reorder_suggestion
+class ProductReorderSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ReorderSuggestion
+        fields = ['daily_demand', 'reorder_point', 'reorder_quantity', 'days_of_cover', 'computed_at']
+
 # Product serializer with computed fields
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     is_low_stock = serializers.BooleanField(read_only=True)
     is_out_of_stock = serializers.BooleanField(read_only=True)
     category_name = serializers.CharField(source='category.name', read_only=True)
+    reorder_suggestion = ProductReorderSerializer(read_only=True)
     
     class Meta:
         model = Product
         fields = ['id', 'sku', 'name', 'description', 'category', 'category_name',
                   'cost_price', 'selling_price', 'profit_margin', 'current_stock',
-                  'minimum_stock', 'maximum_stock', 'status', 'barcode',
-                  'is_low_stock', 'is_out_of_stock', 'created_at', 'updated_at']
-        read_only_fields = ['profit_margin', 'created_at', 'updated_at']
+                  'minimum_stock', 'maximum_stock', 'status', 'stock_state', 'barcode',
+                  'is_low_stock', 'is_out_of_stock', 'created_at', 'updated_at', 'reorder_suggestion']
+        read_only_fields = ['profit_margin', 'stock_state', 'created_at', 'updated_at']
+        include_fields = ['reorder_suggestion']
+
+# Precompiled read path for product lists, same output as ProductSerializer
+product_read_plan = ReadPlan(ProductSerializer, computed={
+    'is_low_stock': (['current_stock', 'minimum_stock'], lambda row: row['current_stock'] <= row['minimum_stock']),
+    'is_out_of_stock': (['current_stock'], lambda row: row['current_stock'] <= 0),
+})
 
 # Stock movement serializer
-class StockMovementSerializer(serializers.ModelSerializer):
+class StockMovementSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     product_name = serializers.CharField(source='product.name', read_only=True)
     created_by_name = serializers.CharField(source='created_by.get_full_name', read_only=True)
     
@@ -31,4 +47,32 @@ class StockMovementSerializer(serializers.ModelSerializer):
         fields = ['id', 'product', 'product_name', 'movement_type', 'quantity',
                   'previous_quantity', 'new_quantity', 'reference', 'notes',
                   'created_by', 'created_by_name', 'created_at']
-        read_only_fields = ['previous_quantity', 'new_quantity', 'created_at']
\ No newline at end of file
+        read_only_fields = ['previous_quantity', 'new_quantity', 'created_at']
+
+# Stocktake session serializer
+class StocktakeSerializer(serializers.ModelSerializer):
+    created_by_name = serializers.CharField(source='created_by.get_full_name', read_only=True)
+    committed_by_name = serializers.CharField(source='committed_by.get_full_name', read_only=True)
+    counts_recorded = serializers.IntegerField(read_only=True)
+    
+    class Meta:
+        model = Stocktake
+        fields = ['id', 'name', 'status', 'notes', 'created_by', 'created_by_name',
+                  'committed_by', 'committed_by_name', 'counts_recorded',
+                  'created_at', 'committed_at']
+        read_only_fields = ['status', 'created_by', 'committed_by', 'created_at', 'committed_at']
+
+# Forecast-driven reorder advice with the product's current stock position
+class ReorderSuggestionSerializer(serializers.ModelSerializer):
+    sku = serializers.CharField(source='product.sku', read_only=True)
+    product_name = serializers.CharField(source='product.name', read_only=True)
+    current_stock = serializers.IntegerField(source='product.current_stock', read_only=True)
+    minimum_stock = serializers.IntegerField(source='product.minimum_stock', read_only=True)
+    needs_reorder = serializers.BooleanField(read_only=True)
+    
+    class Meta:
+        model = ReorderSuggestion
+        fields = ['id', 'product', 'sku', 'product_name', 'current_stock', 'minimum_stock',
+                  'daily_demand', 'demand_std', 'lead_time_demand', 'safety_stock',
+                  'reorder_point', 'reorder_quantity', 'days_of_cover', 'needs_reorder',
+                  'history_days', 'computed_at']
@@ -0,0 +1,9 @@
+from jobs.queue import task
+
+# Background jobs (see the jobs app); kwargs are plain IDs so they survive JSON
+
+@task(priority=-5, timeout=1800)
+def forecast_reorder_points_job(business_id, scheduled_for=None):
+    from business.models import Business
+    from .forecasting import update_reorder_suggestions
+    update_reorder_suggestions(Business.objects.get(pk=business_id))
@@ -1,3 +1,481 @@
-from django.test import TestCase
+import gzip
+import json
+from unittest import mock
+from datetime import date, timedelta
+from decimal import Decimal
+import msgpack
+import numpy as np
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from accounts.models import User
+from django.conf import settings
+from analytics.models import ProductDailySales
+from business.models import Business
+from sales.models import Sale, SaleItem
+from sales.refunds import refund_sale
+from .forecasting import fit_forecast, update_reorder_suggestions
+from .models import Category, Product, ReorderSuggestion, StockMovement, Stocktake, StocktakeCount, sync_stock_status
+from .serializers import ProductSerializer
 
-# Create your tests here.
+FORECAST = {**settings.FORECAST_CONFIG, 'history_days': 28, 'lead_time_days': 3, 'review_days': 7,
+            'apply_to_minimum_stock': True}
+
+@override_settings(FORECAST_CONFIG=FORECAST)
+class ReorderForecastTests(TestCase):
+    def setUp(self):
+        self.business = Business.objects.create(name='Shop')
+        self.end = date(2026, 3, 29)  # A Sunday
+        self.steady = self.product('STEADY', stock=12)
+        self.weekend = self.product('WEEKEND', stock=500)
+        self.idle = self.product('IDLE', stock=3)
+        
+        facts = []
+        for offset in range(28):
+            day = self.end - timedelta(days=offset)
+            facts.append(self.fact(self.steady, day, 5))
+            facts.append(self.fact(self.weekend, day, 20 if day.weekday() >= 5 else 2))
+        ProductDailySales.objects.bulk_create(facts)
+    
+    def product(self, sku, stock):
+        return Product.objects.create(business=self.business, sku=sku, name=sku, cost_price=10,
+                                      selling_price=15, current_stock=stock, barcode=f'B-{sku}')
+    
+    def fact(self, product, day, quantity):
+        return ProductDailySales(business=self.business, date=day, product=product, product_name=product.name,
+                                 quantity=quantity, revenue=quantity * 15, cost=quantity * 10,
+                                 profit=quantity * 5, transaction_count=quantity)
+    
+    def test_weekday_seasonality_is_captured(self):
+        start = self.end - timedelta(days=27)
+        history = np.array([[20 if (start + timedelta(days=d)).weekday() >= 5 else 2 for d in range(28)]], float)
+        level, seasonal, sigma = fit_forecast(history, start, alpha=0.3, season_length=7)
+        
+        saturday = (5 - start.weekday()) % 7
+        monday = (0 - start.weekday()) % 7
+        self.assertAlmostEqual(level[0] * seasonal[0, saturday], 20, places=6)
+        self.assertAlmostEqual(level[0] * seasonal[0, monday], 2, places=6)
+        self.assertAlmostEqual(sigma[0], 0, places=6)
+    
+    def test_suggestions_written_for_whole_catalog(self):
+        self.assertEqual(update_reorder_suggestions(self.business, end=self.end), 3)
+        
+        steady = ReorderSuggestion.objects.get(product=self.steady)
+        self.assertEqual(float(steady.daily_demand), 5.0)
+        self.assertEqual(steady.safety_stock, 0)
+        self.assertEqual(steady.reorder_point, 15)  # 3 days of lead time at 5/day
+        self.assertEqual(steady.reorder_quantity, 50 - 12)  # Up to 10 days of cover
+        self.assertTrue(steady.needs_reorder)
+        
+        # Mon-Wed lead time for a weekend seller needs far less than its weekly average
+        weekend = ReorderSuggestion.objects.get(product=self.weekend)
+        self.assertEqual(weekend.reorder_point, 6)
+        self.assertEqual(weekend.reorder_quantity, 0)
+        
+        # Minimum stock follows the forecast only for products that sell
+        self.steady.refresh_from_db()
+        self.idle.refresh_from_db()
+        self.assertEqual(self.steady.minimum_stock, 15)
+        self.assertEqual(self.idle.minimum_stock, 10)
+        self.assertEqual(ReorderSuggestion.objects.get(product=self.idle).reorder_point, 0)
+        
+        # Re-running updates in place
+        update_reorder_suggestions(self.business, end=self.end)
+        self.assertEqual(ReorderSuggestion.objects.filter(business=self.business).count(), 3)
+    
+    def test_minimum_stock_set_by_hand_is_kept(self):
+        Product.objects.filter(pk=self.weekend.pk).update(minimum_stock=40)
+        update_reorder_suggestions(self.business, end=self.end)
+        self.assertEqual(Product.objects.get(pk=self.weekend.pk).minimum_stock, 40)
+        
+        # A threshold the forecast set keeps following it; one edited since then does not
+        Product.objects.filter(pk=self.steady.pk).update(minimum_stock=30)
+        update_reorder_suggestions(self.business, end=self.end - timedelta(days=1))
+        self.assertEqual(Product.objects.get(pk=self.steady.pk).minimum_stock, 30)
+    
+    @override_settings(FORECAST_CONFIG=settings.FORECAST_CONFIG)
+    def test_minimum_stock_is_left_alone_by_default(self):
+        update_reorder_suggestions(self.business, end=self.end)
+        self.assertEqual(Product.objects.get(pk=self.steady.pk).minimum_stock, 10)
+        self.assertTrue(ReorderSuggestion.objects.get(product=self.steady).needs_reorder)
+
+class StockStateTests(TestCase):
+    def setUp(self):
+        self.business = Business.objects.create(name='Shop')
+        self.product = Product.objects.create(business=self.business, sku='SOAP', name='Soap', cost_price=10,
+                                              selling_price=15, current_stock=50, minimum_stock=10, barcode='B-SOAP')
+    
+    def state(self):
+        self.product.refresh_from_db()
+        return self.product.stock_state, self.product.status
+    
+    def test_state_and_status_follow_saves(self):
+        self.assertEqual(self.state(), ('ok', 'active'))
+        for stock, expected in [(10, ('low', 'active')), (0, ('out', 'out_of_stock')), (5, ('low', 'active'))]:
+            self.product.current_stock = stock
+            self.product.save()
+            self.assertEqual(self.state(), expected)
+        
+        # Discontinued products keep their status whatever the stock
+        self.product.status, self.product.current_stock = 'discontinued', 0
+        self.product.save()
+        self.assertEqual(self.state(), ('out', 'discontinued'))
+    
+    def test_bulk_stock_writes(self):
+        # Queryset updates bypass save(): the state is computed by the database, status is synced
+        products = Product.objects.filter(business=self.business)
+        products.update(current_stock=0)
+        self.assertEqual(sync_stock_status(products), 1)
+        self.assertEqual(self.state(), ('out', 'out_of_stock'))
+        products.update(current_stock=100, minimum_stock=200)
+        sync_stock_status(products)
+        self.assertEqual(self.state(), ('low', 'active'))
+    
+    def test_low_stock_list(self):
+        Product.objects.create(business=self.business, sku='SALT', name='Salt', cost_price=1, selling_price=2,
+                               current_stock=3, minimum_stock=5, barcode='B-SALT')
+        user = User.objects.create_user('owner@example.com', 'password123', first_name='O', last_name='W',
+                                        role='owner', business=self.business)
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.get('/api/inventory/products/low-stock/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(row['sku'], row['stock_state']) for row in response.data], [('SALT', 'low')])
+
+class WireFormatTests(TestCase):
+    def setUp(self):
+        self.business = Business.objects.create(name='Shop')
+        for i in range(30):
+            Product.objects.create(business=self.business, sku=f'SKU{i}', name=f'Product {i}', cost_price=Decimal('10.25'),
+                                   selling_price=Decimal('15.50'), current_stock=i, barcode=f'B-{i}')
+        user = User.objects.create_user('owner@example.com', 'password123', first_name='O', last_name='W',
+                                        role='owner', business=self.business)
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+    
+    def test_json_matches_stock_renderer(self):
+        response = self.client.get('/api/inventory/products/')
+        self.assertEqual(response['Content-Type'], 'application/json')
+        products = Product.objects.filter(business=self.business)
+        self.assertEqual(response.content, JSONRenderer().render(ProductSerializer(products, many=True).data))
+        self.assertEqual(json.loads(response.content)[0]['selling_price'], '15.50')  # Decimals stay strings
+    
+    def test_msgpack_negotiated_and_parsed(self):
+        as_json = self.client.get('/api/inventory/products/').json()
+        response = self.client.get('/api/inventory/products/', HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(response.content), as_json)
+        
+        response = self.client.post('/api/inventory/categories/', msgpack.packb({'name': 'Drinks'}),
+                                    content_type='application/msgpack')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Category.objects.filter(business=self.business, name='Drinks').exists())
+        
+        response = self.client.post('/api/inventory/categories/', b'\xc1', content_type='application/msgpack')
+        self.assertEqual(response.status_code, 400)
+    
+    def test_large_responses_gzipped(self):
+        response = self.client.get('/api/inventory/products/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(len(json.loads(gzip.decompress(response.content))), 30)
+        
+        response = self.client.get('/api/inventory/categories/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+class ProductFieldsetTests(TestCase):
+    def setUp(self):
+        business = Business.objects.create(name='Shop')
+        drinks = Category.objects.create(business=business, name='Drinks')
+        soda = Product.objects.create(business=business, sku='SODA', name='Soda', category=drinks, cost_price=1,
+                                      selling_price=2, current_stock=40, barcode='B-SODA')
+        Product.objects.create(business=business, sku='SALT', name='Salt', cost_price=1, selling_price=2,
+                               current_stock=3, barcode='B-SALT')
+        ReorderSuggestion.objects.create(business=business, product=soda, daily_demand=Decimal('4.25'),
+                                         reorder_point=13, reorder_quantity=20)
+        user = User.objects.create_user('owner@example.com', 'password123', first_name='O', last_name='W',
+                                        role='owner', business=business)
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+        self.products = Product.objects.filter(business=business)
+    
+    def test_fields_and_include_match_serializer(self):
+        cases = [
+            (['sku', 'category_name', 'selling_price'], None),
+            (None, ['reorder_suggestion']),
+            (['name'], ['reorder_suggestion']),
+        ]
+        for fields, include in cases:
+            params = {'fields': ','.join(fields or []), 'include': ','.join(include or [])}
+            expected = ProductSerializer(self.products, many=True,
+                                         fields=ProductSerializer.select_fields(fields, include)).data
+            with self.assertNumQueries(1):
+                response = self.client.get('/api/inventory/products/', params)
+            self.assertEqual(response.content, JSONRenderer().render(expected), params)
+        
+        response = self.client.get('/api/inventory/products/', {'fields': 'sku', 'include': 'reorder_suggestion'})
+        by_sku = {row['sku']: row for row in response.json()}
+        self.assertEqual(by_sku['SODA']['reorder_suggestion']['daily_demand'], '4.25')
+        self.assertIsNone(by_sku['SALT']['reorder_suggestion'])
+    
+    def test_detail_joins_only_what_it_reads(self):
+        product = self.products.get(sku='SODA')
+        with self.assertNumQueries(1):  # Category joined in
+            response = self.client.get(f'/api/inventory/products/{product.id}/', {'fields': 'name,category_name'})
+        self.assertEqual(response.json(), {'name': 'Soda', 'category_name': 'Drinks'})
+    
+    def test_detail_selects_only_what_it_reads(self):
+        product = self.products.get(sku='SODA')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/inventory/products/{product.id}/',
+                                       {'fields': 'sku,category_name', 'include': 'reorder_suggestion'})
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(response.json()['reorder_suggestion']['reorder_point'], 13)
+        sql = queries[0]['sql']
+        self.assertIn('"inventory_category"."name"', sql)
+        self.assertNotIn('"inventory_product"."description"', sql)
+        self.assertNotIn('"inventory_category"."business_id"', sql)
+        
+        # A field backed by a model property needs the whole row
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/inventory/products/{product.id}/', {'fields': 'name,is_low_stock'})
+        self.assertEqual((len(queries), response.json()), (1, {'name': 'Soda', 'is_low_stock': False}))
+        self.assertIn('"inventory_product"."description"', queries[0]['sql'])
+
+class ProductImportTests(TestCase):
+    def setUp(self):
+        self.business = Business.objects.create(name='Shop')
+        self.other = Business.objects.create(name='Other')
+        self.soap = Product.objects.create(business=self.business, sku='SOAP', name='Soap', cost_price=10,
+                                           selling_price=15, current_stock=7, barcode='B-SOAP')
+        self.theirs = Product.objects.create(business=self.other, sku='THEIRS', name='Theirs', cost_price=1,
+                                             selling_price=2, current_stock=1, barcode='B-THEIRS')
+        owner = User.objects.create_user('owner@example.com', 'password123', first_name='O', last_name='W',
+                                         role='owner', business=self.business)
+        self.client = APIClient()
+        self.client.force_authenticate(owner)
+    
+    def upload(self, text, **data):
+        upload = SimpleUploadedFile('products.csv', text.encode(), content_type='text/csv')
+        return self.client.post('/api/inventory/products/import/', {'file': upload, **data}, format='multipart')
+    
+    def test_csv_is_upserted(self):
+        response = self.upload(
+            'SKU,Name,Category,Cost_Price,Selling_Price,Current_Stock,Barcode\n'
+            'SOAP,Soap Bar,Bath,12,18,99,\n'
+            'TEA,Tea,Drinks,4,6,0,B-TEA\n'
+            'MILK,Milk,Drinks,0,3,5,\n'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['created'], response.data['updated'], response.data['failed']), (2, 1, 0))
+        
+        products = {p.sku: p for p in Product.objects.filter(business=self.business).select_related('category')}
+        soap, tea, milk = products['SOAP'], products['TEA'], products['MILK']
+        # Re-imports update the catalog but leave stock and the stored barcode alone
+        self.assertEqual((soap.name, soap.selling_price, soap.profit_margin),
+                         ('Soap Bar', Decimal('18.00'), Decimal('6.00')))
+        self.assertEqual((soap.current_stock, soap.barcode, soap.category.name), (7, 'B-SOAP', 'Bath'))
+        self.assertEqual((tea.barcode, tea.status, tea.stock_state), ('B-TEA', 'out_of_stock', 'out'))
+        self.assertEqual((milk.profit_margin, milk.current_stock), (Decimal('0.00'), 5))
+        self.assertEqual(Category.objects.filter(business=self.business).count(), 2)
+    
+    def test_dry_run_reports_without_writing(self):
+        response = self.upload('sku,name,cost_price,selling_price\nTEA,Tea,4,6\nSOAP,Soap,1,2\n', dry_run='true')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created'], response.data['updated'], response.data['dry_run']), (1, 1, True))
+        self.assertFalse(Product.objects.filter(sku='TEA').exists())
+        self.assertEqual(Product.objects.get(sku='SOAP').name, 'Soap')
+    
+    def test_error_report_lists_each_bad_row(self):
+        response = self.client.post('/api/inventory/products/import/', {'rows': [
+            {'sku': 'TEA', 'name': 'Tea', 'cost_price': '4', 'selling_price': '6'},
+            {'sku': 'BAD', 'name': '', 'cost_price': '-1', 'selling_price': 'x', 'minimum_stock': 'lots'},
+            'SOAP,Soap,1,2',
+            ['SOAP', 'Soap'],
+            None,
+            {'sku': 'DUP', 'name': 'A', 'cost_price': '1', 'selling_price': '2', 'barcode': 'B-SOAP'},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['created'], response.data['failed']), (1, 5))
+        errors = {row['row']: row['errors'] for row in response.data['errors']}
+        self.assertEqual(errors[3], ['name is required', 'cost_price must be a non-negative number',
+                                     'selling_price must be a positive number', 'minimum_stock must be a whole number'])
+        self.assertEqual([errors[row] for row in (4, 5, 6)], [['row must be an object of column values']] * 3)
+        self.assertEqual(errors[7], ['barcode already used by another product'])
+        self.assertTrue(Product.objects.filter(business=self.business, sku='TEA').exists())
+    
+    def test_values_the_columns_cannot_hold_are_row_errors(self):
+        base = {'sku': 'X', 'name': 'X', 'cost_price': '1', 'selling_price': '2'}
+        response = self.client.post('/api/inventory/products/import/', {'rows': [
+            {**base, 'sku': 'NAN', 'current_stock': 'NaN', 'cost_price': 'NaN'},
+            {**base, 'sku': 'INF', 'minimum_stock': 'Infinity', 'selling_price': '-Infinity'},
+            {**base, 'sku': 'BIG', 'maximum_stock': '2147483648', 'selling_price': '100000000'},
+            {**base, 'sku': 'OK', 'current_stock': '2147483647', 'selling_price': '99999999.99'},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 201)
+        errors = {row['sku']: row['errors'] for row in response.data['errors']}
+        self.assertEqual(errors, {
+            'NAN': ['cost_price must be a non-negative number', 'current_stock must be a whole number'],
+            'INF': ['selling_price must be a positive number', 'minimum_stock must be a whole number'],
+            'BIG': ['selling_price is out of range', 'maximum_stock is out of range'],
+        })
+        self.assertEqual(Product.objects.get(sku='OK').current_stock, 2147483647)
+    
+    def test_body_must_be_an_object(self):
+        response = self.client.post('/api/inventory/products/import/', [{'sku': 'TEA'}], format='json')
+        self.assertEqual(response.status_code, 400)
+    
+    def test_other_businesses_skus_are_untouched(self):
+        response = self.upload('sku,name,cost_price,selling_price\nTHEIRS,Mine now,1,50\n')
+        self.assertEqual(response.data['errors'],
+                         [{'row': 2, 'sku': 'THEIRS', 'errors': ['sku belongs to another business']}])
+        self.theirs.refresh_from_db()
+        self.assertEqual((self.theirs.business, self.theirs.name, self.theirs.selling_price),
+                         (self.other, 'Theirs', Decimal('2.00')))
+
+class StocktakeTests(TestCase):
+    def setUp(self):
+        self.business = Business.objects.create(name='Shop')
+        self.soap = Product.objects.create(business=self.business, sku='SOAP', name='Soap', cost_price=10,
+                                           selling_price=15, current_stock=20, minimum_stock=5, barcode='B-SOAP')
+        self.salt = Product.objects.create(business=self.business, sku='SALT', name='Salt', cost_price=2,
+                                           selling_price=3, current_stock=8, minimum_stock=5, barcode='B-SALT')
+        self.milk = Product.objects.create(business=self.business, sku='MILK', name='Milk', cost_price=4,
+                                           selling_price=6, current_stock=5, minimum_stock=2, barcode='B-MILK')
+        self.owner = User.objects.create_user('owner@example.com', 'password123', first_name='O', last_name='W',
+                                              role='owner', business=self.business)
+        self.cashier = User.objects.create_user('cashier@example.com', 'password123', first_name='C', last_name='S',
+                                                role='cashier', business=self.business)
+        self.stocktake = Stocktake.objects.create(business=self.business, name='March', created_by=self.owner)
+        self.url = f'/api/inventory/stocktakes/{self.stocktake.id}'
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+    
+    def count(self, *entries):
+        return self.client.post(f'{self.url}/counts/', {'counts': list(entries)}, format='json')
+    
+    def test_counts_are_upserted(self):
+        response = self.count({'sku': 'SOAP', 'counted_quantity': 18}, {'barcode': 'B-SALT', 'counted_quantity': 9},
+                              {'sku': 'NOPE', 'counted_quantity': 1}, {'product': self.milk.id, 'counted_quantity': -1},
+                              'junk')
+        self.assertEqual((response.data['recorded'], response.data['failed']), (2, 3))
+        self.assertEqual([error['index'] for error in response.data['errors']], [2, 3, 4])
+        
+        # A recount replaces the earlier figure
+        self.count({'sku': 'SOAP', 'counted_quantity': 17})
+        self.assertEqual(dict(StocktakeCount.objects.values_list('product__sku', 'counted_quantity')),
+                         {'SOAP': 17, 'SALT': 9})
+    
+    def test_product_ids_are_coerced(self):
+        response = self.count({'product': str(self.milk.id), 'counted_quantity': 4}, {'product': 'abc'},
+                              {'product': [self.milk.id]}, {'product': {'id': 1}})
+        self.assertEqual((response.status_code, response.data['recorded']), (200, 1))
+        self.assertEqual([error['error'] for error in response.data['errors']], ['product must be a product id'] * 3)
+        self.assertEqual(StocktakeCount.objects.get().product, self.milk)
+        
+        response = self.client.post(f'{self.url}/counts/', [{'sku': 'SOAP', 'counted_quantity': 1}], format='json')
+        self.assertEqual(response.status_code, 400)
+    
+    def test_variance_is_computed_in_sql(self):
+        self.count({'sku': 'SOAP', 'counted_quantity': 17}, {'sku': 'SALT', 'counted_quantity': 9},
+                   {'sku': 'MILK', 'counted_quantity': 5})
+        with self.assertNumQueries(5):  # Stocktake, summary, header and its creator, items: none per product
+            response = self.client.get(f'{self.url}/variance/')
+        self.assertEqual(response.data['summary'], {
+            'products_counted': 3, 'products_with_variance': 2, 'total_variance': -2,
+            'total_variance_value': Decimal('-28.00'),
+        })
+        self.assertEqual([(row['sku'], row['variance']) for row in response.data['items']],
+                         [('SOAP', -3), ('MILK', 0), ('SALT', 1)])
+        
+        response = self.client.get(f'{self.url}/variance/', {'only_variances': 'true'})
+        self.assertEqual([row['sku'] for row in response.data['items']], ['SOAP', 'SALT'])
+    
+    def test_commit_writes_movements_and_stock_once(self):
+        self.count({'sku': 'SOAP', 'counted_quantity': 0}, {'sku': 'SALT', 'counted_quantity': 9},
+                   {'sku': 'MILK', 'counted_quantity': 5})
+        self.assertEqual(self.client.post(f'{self.url}/commit/').status_code, 200)
+        
+        movements = StockMovement.objects.filter(reference=self.stocktake.reference)
+        self.assertEqual(
+            sorted(movements.values_list('product__sku', 'quantity', 'previous_quantity', 'new_quantity')),
+            [('SALT', 1, 8, 9), ('SOAP', -20, 20, 0)],
+        )
+        stock = {p.sku: (p.current_stock, p.status) for p in Product.objects.filter(business=self.business)}
+        self.assertEqual(stock, {'SOAP': (0, 'out_of_stock'), 'SALT': (9, 'active'), 'MILK': (5, 'active')})
+        self.stocktake.refresh_from_db()
+        self.assertEqual((self.stocktake.status, self.stocktake.committed_by), ('committed', self.owner))
+        
+        # A second commit, or further counts, are refused and change nothing
+        self.assertEqual(self.client.post(f'{self.url}/commit/').status_code, 400)
+        self.assertEqual(self.count({'sku': 'SALT', 'counted_quantity': 1}).status_code, 400)
+        self.assertEqual(movements.count(), 2)
+    
+    def test_only_owners_and_managers_commit_or_cancel(self):
+        self.client.force_authenticate(self.cashier)
+        self.assertEqual(self.client.post(f'{self.url}/commit/').status_code, 403)
+        self.assertEqual(self.client.post(f'{self.url}/cancel/').status_code, 403)
+        self.stocktake.refresh_from_db()
+        self.assertEqual(self.stocktake.status, 'open')
+        
+        self.client.force_authenticate(self.owner)
+        self.assertEqual(self.client.post(f'{self.url}/cancel/').status_code, 200)
+        self.assertEqual(self.client.post(f'{self.url}/cancel/').status_code, 404)
+        self.assertEqual(Product.objects.get(pk=self.soap.pk).current_stock, 20)
+
+# The scan endpoint is async and reads on pool threads with their own connections, so data must be committed
+class ScanCacheTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.dict(connections.settings['default'], {'CONN_MAX_AGE': 0})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.business = Business.objects.create(name='Shop')
+        self.owner = User.objects.create_user('owner@example.com', 'password123', first_name='O', last_name='W',
+                                              role='owner', business=self.business)
+        self.soap = Product.objects.create(business=self.business, sku='SOAP', name='Soap', cost_price=10,
+                                           selling_price=15, current_stock=10, barcode='B-SOAP')
+        other = Business.objects.create(name='Other')
+        Product.objects.create(business=other, sku='THEIRS', name='Theirs', cost_price=1, selling_price=2,
+                               barcode='B-THEIRS')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.owner)}')
+    
+    def scan(self, code='B-SOAP'):
+        response = self.client.get(f'/api/inventory/products/scan/{code}/')
+        return response.status_code, response.json().get('current_stock')
+    
+    def test_scan_finds_codes_in_the_business_only(self):
+        self.assertEqual(self.scan(), (200, 10))
+        self.assertEqual(self.scan('SOAP'), (200, 10))
+        self.assertEqual(self.scan('B-THEIRS'), (404, None))
+        self.assertEqual(self.client.post('/api/inventory/products/scan/SOAP/').status_code, 405)
+        self.client.credentials()
+        self.assertEqual(self.client.get('/api/inventory/products/scan/SOAP/').status_code, 401)
+    
+    def test_cached_until_the_product_is_saved(self):
+        self.assertEqual(self.scan(), (200, 10))
+        Product.objects.filter(pk=self.soap.pk).update(current_stock=9)  # No signal: the cached copy stands
+        self.assertEqual(self.scan(), (200, 10))
+        self.soap.refresh_from_db()
+        self.soap.save()
+        self.assertEqual(self.scan(), (200, 9))
+    
+    def test_bulk_stock_writes_drop_cached_scans(self):
+        self.assertEqual(self.scan(), (200, 10))
+        stocktake = Stocktake.objects.create(business=self.business, name='March', created_by=self.owner)
+        StocktakeCount.objects.create(stocktake=stocktake, product=self.soap, counted_quantity=4)
+        self.client.post(f'/api/inventory/stocktakes/{stocktake.id}/commit/')
+        self.assertEqual(self.scan(), (200, 4))
+        
+        sale = Sale.objects.create(business=self.business, receipt_number='R1', cashier=self.owner,
+                                   total_amount=Decimal('30.00'), subtotal=Decimal('30.00'))
+        SaleItem.objects.create(sale=sale, product=self.soap, product_name='Soap', quantity=2,
+                                unit_price=Decimal('15.00'), cost_price=Decimal('10.00'))
+        self.assertEqual(self.scan('SOAP'), (200, 4))
+        refund_sale(sale.id, self.business, self.owner, void=True)
+        self.assertEqual((self.scan(), self.scan('SOAP')), ((200, 6), (200, 6)))
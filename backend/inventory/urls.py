@@ -2,8 +2,13 @@ from django.urls import path
 from .views import (
     CategoryListCreateView, CategoryDetailView,
     ProductListCreateView, ProductDetailView, ProductDeleteView,
-    LowStockProductsView, StockMovementListView
+    LowStockProductsView, StockMovementListView, ProductImportView, ReorderSuggestionListView
 )
+from .views_stocktake import (
+    StocktakeListCreateView, StocktakeDetailView, StocktakeCountsView,
+    StocktakeVarianceView, StocktakeCommitView, StocktakeCancelView
+)
+from .views_async import product_scan
 
 urlpatterns = [
     # Category endpoints
@@ -15,7 +20,20 @@ urlpatterns = [
     path('products/<int:pk>/', ProductDetailView.as_view(), name='product-detail'),
     path('products/<int:pk>/delete/', ProductDeleteView.as_view(), name='product-delete'),
     path('products/low-stock/', LowStockProductsView.as_view(), name='product-low-stock'),
+    path('products/scan/<str:code>/', product_scan, name='product-scan'),
+    path('products/import/', ProductImportView.as_view(), name='product-import'),
+    
+    # Forecast reorder advice
+    path('reorder-suggestions/', ReorderSuggestionListView.as_view(), name='reorder-suggestion-list'),
     
     # Stock movement
     path('stock-movements/', StockMovementListView.as_view(), name='stock-movement-list'),
+    
+    # Stocktake sessions
+    path('stocktakes/', StocktakeListCreateView.as_view(), name='stocktake-list'),
+    path('stocktakes/<int:pk>/', StocktakeDetailView.as_view(), name='stocktake-detail'),
+    path('stocktakes/<int:pk>/counts/', StocktakeCountsView.as_view(), name='stocktake-counts'),
+    path('stocktakes/<int:pk>/variance/', StocktakeVarianceView.as_view(), name='stocktake-variance'),
+    path('stocktakes/<int:pk>/commit/', StocktakeCommitView.as_view(), name='stocktake-commit'),
+    path('stocktakes/<int:pk>/cancel/', StocktakeCancelView.as_view(), name='stocktake-cancel'),
 ]
\ No newline at end of file
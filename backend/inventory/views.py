@@ -1,7 +1,19 @@
-from rest_framework import generics, permissions, filters
+from rest_framework import generics, permissions, filters, status
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.parsers import JSONParser, MultiPartParser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from django.db import models
 from django_filters.rest_framework import DjangoFilterBackend
-from .models import Category, Product, StockMovement
-from .serializers import CategorySerializer, ProductSerializer, StockMovementSerializer
+from .models import Category, Product, ReorderSuggestion, StockMovement
+from .serializers import (
+    CategorySerializer, ProductSerializer, ReorderSuggestionSerializer, StockMovementSerializer,
+    product_read_plan
+)
+from .importer import import_products, read_rows
+from imanage.db_router import ReplicaReadMixin
+from imanage.fieldsets import SparseFieldsViewMixin
+from imanage.read_serializers import ReadPlanListMixin
 
 # Category views
 class CategoryListCreateView(generics.ListCreateAPIView):
@@ -24,9 +36,10 @@ class CategoryDetailView(generics.RetrieveUpdateDestroyAPIView):
         return Category.objects.filter(business=self.request.user.business)
 
 # Product views
-class ProductListCreateView(generics.ListCreateAPIView):
+class ProductListCreateView(ReplicaReadMixin, SparseFieldsViewMixin, ReadPlanListMixin, generics.ListCreateAPIView):
     serializer_class = ProductSerializer
     permission_classes = [permissions.IsAuthenticated]
+    read_plan = product_read_plan
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     filterset_fields = ['category', 'status']
     search_fields = ['name', 'sku', 'barcode']
@@ -37,14 +50,14 @@ class ProductListCreateView(generics.ListCreateAPIView):
     def perform_create(self, serializer):
         serializer.save(business=self.request.user.business)
 
-class ProductDetailView(generics.RetrieveUpdateDestroyAPIView):
+class ProductDetailView(SparseFieldsViewMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = ProductSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
         return Product.objects.filter(business=self.request.user.business)
-    
-    
+
+
 # Add this after ProductDetailView
 class ProductDeleteView(generics.DestroyAPIView):
     serializer_class = ProductSerializer
@@ -61,22 +74,69 @@ class ProductDeleteView(generics.DestroyAPIView):
 
 
 # Low stock alert endpoint
-class LowStockProductsView(generics.ListAPIView):
+class LowStockProductsView(ReplicaReadMixin, SparseFieldsViewMixin, ReadPlanListMixin, generics.ListAPIView):
     serializer_class = ProductSerializer
     permission_classes = [permissions.IsAuthenticated]
+    read_plan = product_read_plan
     
     def get_queryset(self):
         return Product.objects.filter(
-            business=self.request.user.business,
-            current_stock__lte=models.F('minimum_stock')
-        ).order_by('current_stock')
+            business=self.request.user.business
+        ).exclude(stock_state='ok').order_by('current_stock')
 
 # Stock movement history
-class StockMovementListView(generics.ListAPIView):
+class StockMovementListView(ReplicaReadMixin, SparseFieldsViewMixin, generics.ListAPIView):
     serializer_class = StockMovementSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
         return StockMovement.objects.filter(
             product__business=self.request.user.business
-        ).order_by('-created_at')
\ No newline at end of file
+        ).order_by('-created_at')
+
+class ReorderSuggestionPagination(PageNumberPagination):
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+# Forecast reorder points/quantities from the nightly job; ?all=true includes products that need nothing
+class ReorderSuggestionListView(ReplicaReadMixin, generics.ListAPIView):
+    serializer_class = ReorderSuggestionSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ReorderSuggestionPagination
+    
+    def get_queryset(self):
+        queryset = ReorderSuggestion.objects.filter(
+            business=self.request.user.business
+        ).select_related('product')
+        if self.request.query_params.get('all') != 'true':
+            queryset = queryset.filter(reorder_quantity__gt=0)
+        # Least cover first; products without demand sort last
+        return queryset.order_by(models.F('days_of_cover').asc(nulls_last=True), 'product__name')
+
+# Bulk catalog import (CSV/XLSX upload or JSON rows)
+class ProductImportView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    parser_classes = [MultiPartParser, JSONParser]
+    
+    def post(self, request):
+        """Validate and upsert products in bulk, returning a per-row error report"""
+        if request.user.role not in ['owner', 'manager']:
+            return Response({'error': 'Only owners and managers can import products'},
+                          status=status.HTTP_403_FORBIDDEN)
+        
+        if not isinstance(request.data, dict):
+            return Response({'error': 'Send a JSON object with a "rows" list'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        upload = request.FILES.get('file')
+        try:
+            rows = read_rows(upload) if upload else request.data.get('rows')
+        except (ValueError, UnicodeDecodeError) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if not isinstance(rows, list) or not rows:
+            return Response({'error': 'Upload a file or send a non-empty "rows" list'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true', 'yes')
+        result = import_products(request.user.business, rows, dry_run=dry_run)
+        return Response(result, status=status.HTTP_200_OK if dry_run else status.HTTP_201_CREATED)
@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from imanage.async_api import async_api_view, json_response, run_db
+from .models import Product, scan_cache_key
+from .serializers import ProductSerializer
+
+def lookup_product(business, code):
+    """Serialized product matching a barcode or SKU in this business, or None"""
+    product = Product.objects.select_related('category').filter(
+        Q(barcode=code) | Q(sku=code), business=business
+    ).first()
+    return ProductSerializer(product).data if product else None
+
+# Barcode/SKU scan lookup for the POS
+@async_api_view
+async def product_scan(request, code):
+    business = request.user.business
+    if business is None:
+        return json_response({'error': 'User not assigned to a business'}, status=400)
+    
+    cache_key = scan_cache_key(business.id, code)
+    data = await cache.aget(cache_key)
+    if data is None:
+        data = await run_db(lookup_product, business, code)
+        if data is None:
+            return json_response({'error': 'Product not found'}, status=404)
+        await cache.aset(cache_key, data, settings.HOT_CACHE_TTL['scan'])
+    return json_response(data)
@@ -0,0 +1,242 @@
+from rest_framework import generics, permissions, status
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery, Sum
+from django.utils import timezone
+from .models import Product, StockMovement, Stocktake, StocktakeCount, invalidate_scan_caches, sync_stock_status
+from .serializers import StocktakeSerializer
+
+# Largest chunk of counts accepted per request
+MAX_COUNTS_PER_REQUEST = 5000
+
+def variance_queryset(stocktake):
+    """Counts annotated with expected stock and variance, all computed in SQL"""
+    return StocktakeCount.objects.filter(stocktake=stocktake).annotate(
+        sku=F('product__sku'),
+        product_name=F('product__name'),
+        expected_quantity=F('product__current_stock'),
+        variance=F('counted_quantity') - F('product__current_stock'),
+        variance_value=(F('counted_quantity') - F('product__current_stock')) * F('product__cost_price'),
+    )
+
+# Stocktake sessions
+class StocktakeListCreateView(generics.ListCreateAPIView):
+    serializer_class = StocktakeSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get_queryset(self):
+        return Stocktake.objects.filter(
+            business=self.request.user.business
+        ).annotate(counts_recorded=Count('counts'))
+    
+    def perform_create(self, serializer):
+        serializer.save(business=self.request.user.business, created_by=self.request.user)
+
+class StocktakeDetailView(generics.RetrieveAPIView):
+    serializer_class = StocktakeSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get_queryset(self):
+        return Stocktake.objects.filter(
+            business=self.request.user.business
+        ).annotate(counts_recorded=Count('counts'))
+
+def _product_id(entry):
+    """The entry's product id as an int, None when it is not one"""
+    try:
+        return int(entry.get('product'))
+    except (TypeError, ValueError):
+        return None
+
+# Submit a chunk of counted quantities
+class StocktakeCountsView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def post(self, request, pk):
+        """Record counts as [{"sku" or "barcode" or "product": ..., "counted_quantity": n}]"""
+        try:
+            stocktake = Stocktake.objects.get(pk=pk, business=request.user.business)
+        except Stocktake.DoesNotExist:
+            return Response({'error': 'Stocktake not found'}, status=status.HTTP_404_NOT_FOUND)
+        if stocktake.status != 'open':
+            return Response({'error': f'Stocktake is {stocktake.status}'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        entries = request.data.get('counts') if isinstance(request.data, dict) else None
+        if not isinstance(entries, list) or not entries:
+            return Response({'error': 'counts must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(entries) > MAX_COUNTS_PER_REQUEST:
+            return Response({'error': f'Send at most {MAX_COUNTS_PER_REQUEST} counts per request'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        
+        # Resolve every identifier with one query
+        products = Product.objects.filter(business=request.user.business)
+        skus = {str(e.get('sku')) for e in entries if isinstance(e, dict) and e.get('sku')}
+        barcodes = {str(e.get('barcode')) for e in entries if isinstance(e, dict) and e.get('barcode')}
+        ids = {_product_id(e) for e in entries if isinstance(e, dict) and e.get('product')} - {None}
+        by_sku, by_barcode, known_ids = {}, {}, set()
+        for product_id, sku, barcode in (
+            products.filter(sku__in=skus) | products.filter(barcode__in=barcodes) | products.filter(id__in=ids)
+        ).values_list('id', 'sku', 'barcode'):
+            by_sku[sku] = product_id
+            by_barcode[barcode] = product_id
+            known_ids.add(product_id)
+        
+        counts, errors = {}, []
+        for index, entry in enumerate(entries):
+            entry = entry if isinstance(entry, dict) else {}
+            if entry.get('sku'):
+                product_id = by_sku.get(str(entry['sku']))
+            elif entry.get('barcode'):
+                product_id = by_barcode.get(str(entry['barcode']))
+            elif entry.get('product'):
+                product_id = _product_id(entry)
+                if product_id is None:
+                    errors.append({'index': index, 'error': 'product must be a product id'})
+                    continue
+                product_id = product_id if product_id in known_ids else None
+            else:
+                product_id = None
+            try:
+                quantity = int(entry.get('counted_quantity'))
+            except (TypeError, ValueError):
+                quantity = None
+            
+            if product_id is None:
+                errors.append({'index': index, 'error': 'Unknown product'})
+            elif quantity is None or quantity < 0:
+                errors.append({'index': index, 'error': 'counted_quantity must be a non-negative integer'})
+            else:
+                counts[product_id] = quantity  # Last count in the chunk wins
+        
+        now = timezone.now()
+        StocktakeCount.objects.bulk_create(
+            [
+                StocktakeCount(stocktake=stocktake, product_id=product_id, counted_quantity=quantity,
+                               counted_by=request.user, counted_at=now)
+                for product_id, quantity in counts.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['stocktake', 'product'],
+            update_fields=['counted_quantity', 'counted_by', 'counted_at'],
+        )
+        
+        return Response({
+            'recorded': len(counts),
+            'failed': len(errors),
+            'errors': errors,
+        })
+
+# Variance report, computed entirely in the database
+class StocktakeVarianceView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request, pk):
+        """Counted vs expected stock for each product in the session"""
+        try:
+            stocktake = Stocktake.objects.get(pk=pk, business=request.user.business)
+        except Stocktake.DoesNotExist:
+            return Response({'error': 'Stocktake not found'}, status=status.HTTP_404_NOT_FOUND)
+        
+        variances = variance_queryset(stocktake)
+        summary = variances.aggregate(
+            products_counted=Count('id'),
+            products_with_variance=Count('id', filter=~Q(variance=0)),
+            total_variance=Sum('variance'),
+            total_variance_value=Sum('variance_value'),
+        )
+        
+        if request.query_params.get('only_variances', '').lower() in ('1', 'true', 'yes'):
+            variances = variances.exclude(variance=0)
+        
+        return Response({
+            'stocktake': StocktakeSerializer(
+                Stocktake.objects.annotate(counts_recorded=Count('counts')).get(pk=stocktake.pk)
+            ).data,
+            'summary': summary,
+            'items': list(variances.order_by('variance').values(
+                'product_id', 'sku', 'product_name', 'expected_quantity',
+                'counted_quantity', 'variance', 'variance_value'
+            )),
+        })
+
+# Apply every adjustment in one transaction
+class StocktakeCommitView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def post(self, request, pk):
+        """Set stock to the counted quantities and write the StockMovement trail"""
+        if request.user.role not in ['owner', 'manager']:
+            return Response({'error': 'Only owners and managers can commit a stocktake'},
+                          status=status.HTTP_403_FORBIDDEN)
+        
+        with transaction.atomic():
+            try:
+                stocktake = Stocktake.objects.select_for_update().get(pk=pk, business=request.user.business)
+            except Stocktake.DoesNotExist:
+                return Response({'error': 'Stocktake not found'}, status=status.HTTP_404_NOT_FOUND)
+            if stocktake.status != 'open':
+                return Response({'error': f'Stocktake is {stocktake.status}'}, status=status.HTTP_400_BAD_REQUEST)
+            
+            # Lock counted products in id order, as refunds do, so concurrent writers queue rather than deadlock
+            counted_products = Product.objects.filter(stocktakecount__stocktake=stocktake)
+            list(counted_products.select_for_update().order_by('id').values_list('id', flat=True))
+            
+            now = timezone.now()
+            adjustments = variance_queryset(stocktake).exclude(variance=0).values_list(
+                'product_id', 'expected_quantity', 'counted_quantity', 'variance'
+            )
+            movements = StockMovement.objects.bulk_create([
+                StockMovement(
+                    product_id=product_id,
+                    movement_type='adjustment',
+                    quantity=variance,
+                    previous_quantity=expected,
+                    new_quantity=counted,
+                    reference=stocktake.reference,
+                    notes=f'Stocktake: {stocktake.name}',
+                    created_by=request.user,
+                    created_at=now,
+                )
+                for product_id, expected, counted, variance in adjustments
+            ], batch_size=2000)
+            
+            # One UPDATE sets every counted product to its counted quantity
+            counted_quantity = StocktakeCount.objects.filter(
+                stocktake=stocktake, product=OuterRef('pk')
+            ).values('counted_quantity')[:1]
+            counted_products.exclude(
+                current_stock=Subquery(counted_quantity, output_field=IntegerField())
+            ).update(
+                current_stock=Subquery(counted_quantity, output_field=IntegerField()),
+                updated_at=now,
+            )
+            sync_stock_status(counted_products)
+            invalidate_scan_caches(counted_products)
+            
+            stocktake.status = 'committed'
+            stocktake.committed_by = request.user
+            stocktake.committed_at = now
+            stocktake.save()
+        
+        return Response({
+            'success': True,
+            'adjusted_products': len(movements),
+            'reference': stocktake.reference,
+        })
+
+# Abandon an open stocktake without touching stock
+class StocktakeCancelView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def post(self, request, pk):
+        if request.user.role not in ['owner', 'manager']:
+            return Response({'error': 'Only owners and managers can cancel a stocktake'},
+                          status=status.HTTP_403_FORBIDDEN)
+        
+        updated = Stocktake.objects.filter(
+            pk=pk, business=request.user.business, status='open'
+        ).update(status='cancelled')
+        if not updated:
+            return Response({'error': 'Open stocktake not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'success': True})
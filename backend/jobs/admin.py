@@ -0,0 +1,14 @@
+from django.contrib import admin
+from .models import Job, ScheduleState
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('task', 'status', 'priority', 'attempts', 'run_at', 'created_at', 'finished_at')
+    list_filter = ('status', 'task')
+    search_fields = ('unique_key',)
+
+@admin.register(ScheduleState)
+class ScheduleStateAdmin(admin.ModelAdmin):
+    list_display = ('name', 'last_tick', 'last_run_at', 'last_duration_ms', 'leader', 'ticks', 'jobs_enqueued',
+                    'caught_up_minutes', 'expired_slots')
+    readonly_fields = list_display
@@ -0,0 +1,75 @@
+import multiprocessing
+import signal
+from django.core.management.base import BaseCommand
+from django.db import connections
+from jobs.scheduler import Scheduler
+from jobs.worker import Worker
+
+def _work(batch_size, poll_interval, burst):
+    # Forked workers must open their own database connections
+    connections.close_all()
+    worker = Worker(batch_size=batch_size, poll_interval=poll_interval)
+    worker.install_signal_handlers()
+    worker.run(burst=burst)
+
+def _schedule():
+    connections.close_all()
+    scheduler = Scheduler()
+    scheduler.install_signal_handlers()
+    scheduler.run()
+
+# Long-running: start under a process supervisor (systemd, Docker) next to daphne
+class Command(BaseCommand):
+    help = 'Run background job workers on the Postgres queue'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1, help='Worker processes to run')
+        parser.add_argument('--batch-size', type=int, default=1, help='Jobs claimed per round trip')
+        parser.add_argument('--poll-interval', type=float, help='Seconds between polls without a NOTIFY')
+        parser.add_argument('--burst', action='store_true', help='Exit once no job is runnable')
+        parser.add_argument('--scheduler', action='store_true', help='Also run a scheduler process (see run_scheduler)')
+    
+    def handle(self, *args, **options):
+        args = (options['batch_size'], options['poll_interval'], options['burst'])
+        if options['processes'] <= 1 and not options['scheduler']:
+            worker = Worker(batch_size=options['batch_size'], poll_interval=options['poll_interval'])
+            worker.install_signal_handlers()
+            worker.run(burst=options['burst'])
+            self.stdout.write(self.style.SUCCESS(f'Ran {worker.processed} job(s), {worker.failed} failed'))
+            return
+        
+        connections.close_all()
+        stopping = False
+        
+        def stop(*_):
+            nonlocal stopping
+            stopping = True
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()  # SIGTERM: finish the current job, then exit
+        
+        processes = [multiprocessing.Process(target=_work, args=args) for _ in range(max(options['processes'], 1))]
+        if options['scheduler'] and not options['burst']:
+            processes.append(multiprocessing.Process(target=_schedule, name='scheduler'))
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        for process in processes:
+            process.start()
+        
+        # Replace workers that die unexpectedly until told to stop
+        while processes:
+            for process in list(processes):
+                process.join(timeout=1)
+                if process.is_alive():
+                    continue
+                if stopping or options['burst'] or process.exitcode == 0:
+                    processes.remove(process)
+                else:
+                    self.stderr.write(f'Worker {process.pid} exited with {process.exitcode}, restarting')
+                    if process.name == 'scheduler':
+                        replacement = multiprocessing.Process(target=_schedule, name='scheduler')
+                    else:
+                        replacement = multiprocessing.Process(target=_work, args=args)
+                    processes[processes.index(process)] = replacement
+                    replacement.start()
+        self.stdout.write(self.style.SUCCESS('Workers stopped'))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from jobs.scheduler import Scheduler
+
+# Long-running: start one per replica; replicas elect a single leader between them
+class Command(BaseCommand):
+    help = 'Enqueue JOB_SCHEDULE jobs each minute while holding the scheduler lock'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Evaluate one tick now, if leading, and exit')
+    
+    def handle(self, *args, **options):
+        scheduler = Scheduler()
+        if options['once']:
+            enqueued = scheduler.step()
+            if enqueued is None:
+                self.stdout.write('Another scheduler holds the lock; nothing done')
+            else:
+                self.stdout.write(self.style.SUCCESS(f'Enqueued {sum(enqueued.values())} job(s)'))
+            return
+        scheduler.install_signal_handlers()
+        scheduler.run()
+        self.stdout.write(self.style.SUCCESS('Scheduler stopped'))
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.10 on 2026-10-19 07:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduleState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('last_tick', models.DateTimeField()),
+                ('last_run_at', models.DateTimeField(blank=True, null=True)),
+                ('last_duration_ms', models.IntegerField(default=0)),
+                ('leader', models.CharField(blank=True, max_length=100)),
+                ('ticks', models.IntegerField(default=0)),
+                ('jobs_enqueued', models.IntegerField(default=0)),
+                ('caught_up_minutes', models.IntegerField(default=0)),
+                ('expired_slots', models.IntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+    ]
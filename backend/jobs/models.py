@@ -0,0 +1,63 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.utils import timezone
+
+class Job(models.Model):
+    """A unit of background work, claimed by workers with FOR UPDATE SKIP LOCKED"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    task = models.CharField(max_length=100)  # Registered task name
+    kwargs = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    priority = models.SmallIntegerField(default=0)  # Higher runs first
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    unique_key = models.CharField(max_length=200, null=True, blank=True)  # At most one queued job per key
+    
+    run_at = models.DateTimeField(default=timezone.now)  # Not claimed before this (retry backoff)
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=5)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)  # Visibility timeout of the current claim
+    last_error = models.TextField(blank=True)
+    
+    created_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # Claim order over the queued rows only
+            models.Index(fields=['-priority', 'run_at', 'id'], name='job_claim_idx', condition=models.Q(status='queued')),
+            # Expired claims to hand back out
+            models.Index(fields=['locked_until'], name='job_lease_idx', condition=models.Q(status='running')),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['unique_key'], condition=models.Q(status='queued'), name='job_unique_queued_key'),
+        ]
+    
+    def __str__(self):
+        return f"{self.task} #{self.id} ({self.status})"
+
+class ScheduleState(models.Model):
+    """Last evaluated minute and run metrics for one JOB_SCHEDULE entry"""
+    name = models.CharField(max_length=100, unique=True)
+    last_tick = models.DateTimeField()  # UTC minute evaluated last; later ticks resume after it
+    last_run_at = models.DateTimeField(null=True, blank=True)
+    last_duration_ms = models.IntegerField(default=0)
+    leader = models.CharField(max_length=100, blank=True)  # Scheduler that ran the last tick
+    
+    # Counters since the entry was first seen
+    ticks = models.IntegerField(default=0)
+    jobs_enqueued = models.IntegerField(default=0)
+    caught_up_minutes = models.IntegerField(default=0)  # Minutes evaluated late, after missed ticks
+    expired_slots = models.IntegerField(default=0)  # Due slots dropped as older than the entry's expiry
+    
+    class Meta:
+        ordering = ['name']
+    
+    def __str__(self):
+        return f"{self.name} @ {self.last_tick:%Y-%m-%d %H:%M}"
@@ -0,0 +1,207 @@
+# Durable background jobs in the project database. enqueue() inserts a row and NOTIFYs
+# idle workers; workers claim rows with SELECT ... FOR UPDATE SKIP LOCKED, so any number
+# of them share the queue without blocking on or double-claiming a job. A claim is a
+# lease: if a worker dies mid-job its locked_until passes and the job is handed out again.
+import random
+import traceback
+from datetime import timedelta
+from functools import update_wrapper
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import Job
+
+NOTIFY_CHANNEL = 'job_queue'
+
+# Registered tasks by name, filled in by @task as each app's tasks.py is imported
+TASKS = {}
+
+def _config():
+    return settings.JOB_QUEUE_CONFIG
+
+class Task:
+    """A function that can run inline as before, or later on a worker via .enqueue(**kwargs)"""
+    
+    def __init__(self, func, name, priority, max_attempts, timeout):
+        update_wrapper(self, func)
+        self.func = func
+        self.name = name
+        self.priority = priority
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+    
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+    
+    def enqueue(self, unique_key=None, priority=None, run_at=None, **kwargs):
+        return enqueue(self.name, kwargs, unique_key=unique_key, priority=priority, run_at=run_at)
+
+def task(func=None, *, name=None, priority=0, max_attempts=None, timeout=None):
+    """Register a function as a background task; its kwargs must be JSON-serializable"""
+    def register(func):
+        registered = Task(
+            func,
+            name or f'{func.__module__}.{func.__name__}',
+            priority,
+            max_attempts or _config()['max_attempts'],
+            timeout or _config()['visibility_timeout'],
+        )
+        TASKS[registered.name] = registered
+        return registered
+    return register(func) if func else register
+
+def enqueue(name, kwargs=None, unique_key=None, priority=None, run_at=None):
+    """Queue a job; with a unique_key an already-queued job for the key is returned instead"""
+    if name not in TASKS:
+        raise ValueError(f'Unknown task: {name}')
+    registered = TASKS[name]
+    job = Job(
+        task=name,
+        kwargs=kwargs or {},
+        unique_key=unique_key,
+        priority=registered.priority if priority is None else priority,
+        max_attempts=registered.max_attempts,
+        run_at=run_at or timezone.now(),
+    )
+    with transaction.atomic():
+        if unique_key is None:
+            job.save()
+        else:
+            Job.objects.bulk_create([job], ignore_conflicts=True)
+            job = Job.objects.filter(unique_key=unique_key, status='queued').first()
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f'NOTIFY {NOTIFY_CHANNEL}')  # Delivered on commit
+    return job
+
+def enqueue_many(name, entries, priority=None):
+    """Queue one job per (kwargs, unique_key) pair in bulk; keys already queued are skipped
+    
+    Returns the number of jobs actually queued.
+    """
+    if name not in TASKS:
+        raise ValueError(f'Unknown task: {name}')
+    registered = TASKS[name]
+    now = timezone.now()
+    jobs = [
+        Job(task=name, kwargs=kwargs, unique_key=unique_key, run_at=now, created_at=now,
+            max_attempts=registered.max_attempts, priority=registered.priority if priority is None else priority)
+        for kwargs, unique_key in entries
+    ]
+    if not jobs:
+        return 0
+    keys = [job.unique_key for job in jobs if job.unique_key is not None]
+    with transaction.atomic():
+        Job.objects.bulk_create(jobs, batch_size=1000, ignore_conflicts=True)
+        # Skipped conflicts leave no trace, so count this batch's keyed rows by their shared created_at
+        queued = len(jobs) - len(keys)
+        if keys:
+            queued += Job.objects.filter(unique_key__in=keys, status='queued', created_at=now).count()
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f'NOTIFY {NOTIFY_CHANNEL}')
+    return queued
+
+def claim(worker, limit=1):
+    """Lease up to `limit` runnable jobs to a worker, highest priority first"""
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status='queued', run_at__lte=now)
+            .order_by('-priority', 'run_at', 'id')[:limit]
+        )
+        by_timeout = {}
+        for job in jobs:
+            registered = TASKS.get(job.task)
+            timeout = registered.timeout if registered else _config()['visibility_timeout']
+            by_timeout.setdefault(timeout, []).append(job)
+        for timeout, leased in by_timeout.items():
+            locked_until = now + timedelta(seconds=timeout)
+            Job.objects.filter(id__in=[job.id for job in leased]).update(
+                status='running', attempts=F('attempts') + 1, locked_by=worker, locked_until=locked_until
+            )
+            for job in leased:
+                job.status, job.locked_by, job.locked_until = 'running', worker, locked_until
+                job.attempts += 1
+    return jobs
+
+def _lease(job):
+    # Updates only apply while this worker still holds the claim
+    return Job.objects.filter(pk=job.pk, status='running', locked_by=job.locked_by, attempts=job.attempts)
+
+def backoff(attempts):
+    """Seconds before retry number `attempts`: exponential, capped, with jitter"""
+    config = _config()
+    delay = min(config['backoff_base'] * 2 ** (attempts - 1), config['backoff_max'])
+    return delay * random.uniform(0.5, 1.0)
+
+def complete(job):
+    return _lease(job).update(status='done', finished_at=timezone.now(), locked_until=None)
+
+def fail(job, error):
+    """Schedule a retry with backoff, or mark the job failed once its attempts are used up"""
+    now = timezone.now()
+    if job.attempts >= job.max_attempts:
+        return _lease(job).update(status='failed', finished_at=now, locked_until=None, last_error=error)
+    try:
+        with transaction.atomic():
+            return _lease(job).update(
+                status='queued', run_at=now + timedelta(seconds=backoff(job.attempts)),
+                locked_until=None, last_error=error
+            )
+    except IntegrityError:
+        # A newer job with the same unique key is already queued and will do the work
+        return _lease(job).update(status='failed', finished_at=now, locked_until=None,
+                                  last_error=f'{error}\nRetry superseded by a queued job')
+
+def run_job(job):
+    """Run one claimed job; returns True when it succeeded"""
+    registered = TASKS.get(job.task)
+    if registered is None:
+        job.max_attempts = job.attempts  # Retrying cannot help
+        fail(job, f'Unknown task: {job.task}')
+        return False
+    try:
+        registered.func(**job.kwargs)
+    except Exception:
+        fail(job, traceback.format_exc()[-4000:])
+        return False
+    complete(job)
+    return True
+
+def requeue_expired():
+    """Hand out jobs whose worker let the visibility timeout pass; returns (requeued, failed)"""
+    now = timezone.now()
+    expired = Job.objects.filter(status='running', locked_until__lt=now)
+    failed = expired.filter(attempts__gte=F('max_attempts')).update(
+        status='failed', finished_at=now, locked_until=None, last_error='Visibility timeout expired'
+    )
+    requeue = {'status': 'queued', 'run_at': now, 'locked_by': '', 'locked_until': None,
+               'last_error': 'Visibility timeout expired'}
+    requeued = expired.filter(unique_key__isnull=True).update(**requeue)
+    
+    # Keyed jobs one at a time: a queued job with the same key already covers the retry
+    for job_id in expired.values_list('id', flat=True):
+        try:
+            with transaction.atomic():
+                requeued += expired.filter(pk=job_id).update(**requeue)
+        except IntegrityError:
+            failed += expired.filter(pk=job_id).update(
+                status='failed', finished_at=now, locked_until=None,
+                last_error='Visibility timeout expired; retry superseded by a queued job'
+            )
+    return requeued, failed
+
+def prune_finished():
+    """Delete old done and failed jobs; returns rows deleted"""
+    config = _config()
+    now = timezone.now()
+    done, _ = Job.objects.filter(
+        status='done', finished_at__lt=now - timedelta(days=config['keep_done_days'])
+    ).delete()
+    failed, _ = Job.objects.filter(
+        status='failed', finished_at__lt=now - timedelta(days=config['keep_failed_days'])
+    ).delete()
+    return done + failed
@@ -0,0 +1,192 @@
+# Cron-like schedule for JOB_SCHEDULE. Every replica may run a scheduler; only the one
+# holding a Postgres session advisory lock evaluates ticks, and the others take over
+# when its connection goes away. A tick never runs the work itself: it enqueues jobs
+# (one per business for per_business entries) that the job workers share out. Each
+# entry's last evaluated minute is kept in ScheduleState, so a new leader catches up
+# on the minutes missed while nobody led.
+import os
+import signal
+import socket
+import time
+from datetime import timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+from .models import ScheduleState
+from .queue import enqueue_many
+
+MINUTE = timedelta(minutes=1)
+
+# (low, high) for minute, hour, day of month, month, weekday
+CRON_RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+def _parse_field(text, low, high):
+    values = set()
+    for part in text.split(','):
+        step = 1
+        if '/' in part:
+            part, step = part.split('/', 1)
+            step = int(step)
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start, end = (int(value) for value in part.split('-', 1))
+        else:
+            start = int(part)
+            end = high if step > 1 else start
+        if not low <= start <= end <= high or step < 1:
+            raise ValueError(f'Cron field {text!r} is outside {low}-{high}')
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+class CronSpec:
+    """A five-field cron expression matched against local wall-clock minutes"""
+    
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f'Cron expression needs 5 fields: {expression!r}')
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            _parse_field(field, *bounds) for field, bounds in zip(fields, CRON_RANGES)
+        )
+        self.weekdays = frozenset(day % 7 for day in weekdays)  # 7 is Sunday too
+        # As in cron, a restricted day of month and weekday match when either does
+        self.any_day = fields[2] == '*' or fields[4] == '*'
+    
+    def matches(self, local):
+        if local.minute not in self.minutes or local.hour not in self.hours or local.month not in self.months:
+            return False
+        in_days = local.day in self.days
+        in_weekdays = (local.weekday() + 1) % 7 in self.weekdays
+        return in_days and in_weekdays if self.any_day else in_days or in_weekdays
+
+def schedule():
+    """JOB_SCHEDULE entries by name, with parsed cron specs"""
+    return {
+        name: {**entry, 'spec': CronSpec(entry['cron'])}
+        for name, entry in getattr(settings, 'JOB_SCHEDULE', {}).items()
+    }
+
+def business_timezones():
+    """Active business IDs grouped by tzinfo, so each timezone is matched once per slot"""
+    from business.models import Business
+    groups = {}
+    for business_id, timezone_field in Business.objects.filter(status='active').values_list('id', 'timezone_field'):
+        groups.setdefault(timezone_field, []).append(business_id)
+    timezones = {}
+    for name, ids in groups.items():
+        timezones.setdefault(Business(timezone_field=name).tzinfo, []).extend(ids)  # Unknown names share UTC
+    return timezones
+
+def _due_slot(spec, slots, tzinfo, expires_before):
+    """The latest slot the spec matches in tzinfo, and how many matches were dropped as expired"""
+    due = [slot for slot in slots if spec.matches(slot.astimezone(tzinfo))]
+    live = [slot for slot in due if expires_before is None or slot >= expires_before]
+    return (live[-1] if live else None), len(due) - len(live)
+
+def fire(name, entry, now, timezones, leader=''):
+    """Evaluate one entry for every minute since its last tick up to now; returns jobs enqueued"""
+    started = time.monotonic()
+    max_catchup = timedelta(minutes=settings.JOB_QUEUE_CONFIG['max_catchup_minutes'])
+    with transaction.atomic():
+        # The row lock and last_tick check keep a minute from firing twice, whoever leads
+        state, _ = ScheduleState.objects.select_for_update().get_or_create(
+            name=name, defaults={'last_tick': now - MINUTE}
+        )
+        if state.last_tick >= now:
+            return 0
+        first = max(state.last_tick + MINUTE, now - max_catchup)
+        slots = [first + MINUTE * i for i in range((now - first) // MINUTE + 1)]
+        expires_before = now - timedelta(minutes=entry['expires']) if entry.get('expires') is not None else None
+        
+        # Missed matches collapse into one run, at the latest slot
+        entries, expired = [], 0
+        kwargs = entry.get('kwargs', {})
+        groups = timezones.items() if entry.get('per_business') else [(dt_timezone.utc, [None])]
+        for tzinfo, business_ids in groups:
+            slot, dropped = _due_slot(entry['spec'], slots, tzinfo, expires_before)
+            expired += dropped * len(business_ids)
+            if slot is None:
+                continue
+            for business_id in business_ids:
+                job_kwargs = {**kwargs, 'scheduled_for': slot.isoformat()}
+                key = f'schedule:{name}:{slot:%Y%m%dT%H%M}'
+                if business_id is not None:
+                    job_kwargs['business_id'] = business_id
+                    key = f'schedule:{name}:{business_id}:{slot:%Y%m%dT%H%M}'
+                entries.append((job_kwargs, key))
+        
+        enqueued = enqueue_many(entry['task'], entries)
+        state.last_tick = now
+        state.last_run_at = timezone.now()
+        state.last_duration_ms = int((time.monotonic() - started) * 1000)
+        state.leader = leader
+        state.ticks += 1
+        state.jobs_enqueued += enqueued
+        state.caught_up_minutes += len(slots) - 1
+        state.expired_slots += expired
+        state.save()
+    return enqueued
+
+def tick(now=None, leader=''):
+    """Evaluate every schedule entry up to the current minute; returns jobs enqueued by entry"""
+    now = (now or timezone.now()).replace(second=0, microsecond=0)
+    timezones = business_timezones()
+    return {name: fire(name, entry, now, timezones, leader) for name, entry in schedule().items()}
+
+class Scheduler:
+    """Leader-elected tick loop; run one per replica next to the job workers"""
+    
+    def __init__(self, name=None):
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}'
+        self.lock_id = settings.JOB_QUEUE_CONFIG['scheduler_lock_id']
+        self.leader = False
+        self.stopping = False
+    
+    def stop(self, *args):
+        self.stopping = True
+    
+    def install_signal_handlers(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+    
+    def _query(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [self.lock_id])
+            return cursor.fetchone()[0]
+    
+    def elect(self):
+        """Take or confirm leadership; the session lock lasts as long as this connection"""
+        if connection.vendor != 'postgresql':
+            self.leader = True  # Nothing to coordinate with
+        elif not self.leader:
+            self.leader = self._query('SELECT pg_try_advisory_lock(%s)')
+        else:
+            # After a reconnect the lock is gone and another replica may hold it
+            self.leader = self._query(
+                "SELECT EXISTS (SELECT 1 FROM pg_locks WHERE locktype = 'advisory' AND granted"
+                " AND pid = pg_backend_pid() AND ((classid::bigint << 32) | objid::bigint) = %s)"
+            )
+        return self.leader
+    
+    def step(self, now=None):
+        """One loop iteration: elect, then tick if leading; returns jobs enqueued or None"""
+        try:
+            if self.elect():
+                return tick(now, leader=self.name)
+        except DatabaseError as e:
+            print(f"Scheduler {self.name} lost its database connection: {e}")
+            connection.close()  # Releases the lock, if still held, for a standby to take
+            self.leader = False
+        return None
+    
+    def run(self):
+        while not self.stopping:
+            self.step()
+            # Wake on the next minute boundary, in short slices so a stop is noticed
+            deadline = time.time() // 60 * 60 + 60
+            while not self.stopping and time.time() < deadline:
+                time.sleep(min(1.0, deadline - time.time()))
+        if self.leader and connection.vendor == 'postgresql':
+            connection.close()  # Hand over to a standby straight away
@@ -0,0 +1,202 @@
+import threading
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import skipUnless
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from accounts.models import User
+from business.models import Business
+from notifications.models import Notification
+from .models import Job, ScheduleState
+from .queue import claim, enqueue, enqueue_many, requeue_expired, run_job, task
+from .scheduler import CronSpec, Scheduler, tick
+from .worker import Worker
+
+calls = []
+
+@task(name='tests.record', priority=0)
+def record(value):
+    calls.append(value)
+
+@task(name='tests.flaky', max_attempts=2)
+def flaky():
+    raise ValueError('provider down')
+
+@task(name='tests.scheduled')
+def scheduled(business_id=None, scheduled_for=None):
+    calls.append((business_id, scheduled_for))
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+    
+    def test_priority_order_and_unique_keys(self):
+        enqueue('tests.record', {'value': 'low'}, priority=-1)
+        first = record.enqueue(value='a', unique_key='refresh:1')
+        duplicate = record.enqueue(value='b', unique_key='refresh:1')
+        self.assertEqual(first.id, duplicate.id)
+        record.enqueue(value='urgent', priority=10)
+        
+        self.assertEqual(Worker(name='w1', batch_size=2).run(burst=True), 3)
+        self.assertEqual(calls, ['urgent', 'a', 'low'])
+        self.assertEqual(set(Job.objects.values_list('status', flat=True)), {'done'})
+        
+        # Once the keyed job has run, the key is free again
+        self.assertNotEqual(record.enqueue(value='c', unique_key='refresh:1').id, first.id)
+    
+    def test_bulk_enqueue_counts_only_new_jobs(self):
+        record.enqueue(value='a', unique_key='k1')
+        entries = [({'value': 'a'}, 'k1'), ({'value': 'b'}, 'k2'), ({'value': 'b'}, 'k2'), ({'value': 'c'}, None)]
+        self.assertEqual(enqueue_many('tests.record', entries), 2)
+        self.assertEqual(Job.objects.count(), 3)
+    
+    def test_retry_with_backoff_then_fail(self):
+        job = flaky.enqueue()
+        self.assertFalse(run_job(claim('w1')[0]))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('queued', 1))
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn('provider down', job.last_error)
+        self.assertEqual(claim('w1'), [])  # Backing off
+        
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        run_job(claim('w1')[0])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+    
+    def test_expired_claims_are_handed_out_again(self):
+        job = record.enqueue(value='x')
+        claimed = claim('dead-worker')[0]
+        Job.objects.filter(pk=job.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(requeue_expired(), (1, 0))
+        
+        # The dead worker's late result is ignored; the new claim completes the job
+        reclaimed = claim('w2')[0]
+        self.assertTrue(run_job(claimed) is True and run_job(reclaimed))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by, job.attempts), ('done', 'w2', 2))
+
+# Two connections are needed to see SKIP LOCKED, so rows must be committed
+class SkipLockedTests(TransactionTestCase):
+    @skipUnless(connection.vendor == 'postgresql', 'SKIP LOCKED row locks need Postgres')
+    def test_concurrent_claims_never_share_a_job(self):
+        for value in range(2):
+            record.enqueue(value=value)
+        holding, release = threading.Event(), threading.Event()
+        
+        def hold_first():
+            try:
+                with transaction.atomic():
+                    Job.objects.select_for_update().filter(id=Job.objects.order_by('id')[0].id).get()
+                    holding.set()
+                    release.wait(5)
+            finally:
+                connection.close()
+        
+        other = threading.Thread(target=hold_first)
+        other.start()
+        holding.wait(5)
+        try:
+            claimed = claim('w1', limit=2)
+        finally:
+            release.set()
+            other.join()
+        self.assertEqual([job.kwargs['value'] for job in claimed], [1])
+
+def utc(*args):
+    return datetime(*args, tzinfo=dt_timezone.utc)
+
+@override_settings(JOB_SCHEDULE={
+    'opening': {'task': 'tests.scheduled', 'cron': '0 10 * * *', 'per_business': True, 'expires': 30},
+    'nightly': {'task': 'tests.scheduled', 'cron': '0 1 * * *'},
+})
+class SchedulerTests(TestCase):
+    def setUp(self):
+        calls.clear()
+        self.nairobi = Business.objects.create(name='Nairobi', timezone_field='Africa/Nairobi')
+        self.lagos = Business.objects.create(name='Lagos', timezone_field='Africa/Lagos')
+        Business.objects.create(name='Closed', timezone_field='Africa/Nairobi', status='inactive')
+        self.owner = User.objects.create_user('owner@example.com', 'password123', first_name='O', last_name='W',
+                                              role='owner', business=self.nairobi)
+        User.objects.create_user('lagos@example.com', 'password123', first_name='L', last_name='W',
+                                 role='owner', business=self.lagos)
+    
+    def test_cron_fields(self):
+        spec = CronSpec('*/15 9-17 * * 1-5')
+        self.assertTrue(spec.matches(datetime(2026, 3, 2, 9, 45)))  # Monday
+        self.assertFalse(spec.matches(datetime(2026, 3, 2, 9, 50)))
+        self.assertFalse(spec.matches(datetime(2026, 3, 1, 9, 45)))  # Sunday
+        self.assertTrue(CronSpec('0 0 1 * 0').matches(datetime(2026, 3, 8)))  # Either day field
+        with self.assertRaises(ValueError):
+            CronSpec('61 * * * *')
+    
+    def test_per_business_entries_match_local_time_once(self):
+        # 07:00 UTC is 10:00 in Nairobi and 08:00 in Lagos
+        self.assertEqual(tick(utc(2026, 3, 2, 7, 0, 20)), {'opening': 1, 'nightly': 0})
+        self.assertEqual(tick(utc(2026, 3, 2, 7, 0, 50)), {'opening': 0, 'nightly': 0})
+        self.assertEqual(tick(utc(2026, 3, 2, 9, 0)), {'opening': 1, 'nightly': 0})
+        
+        Worker(name='w1').run(burst=True)
+        self.assertEqual(calls, [
+            (self.nairobi.id, '2026-03-02T07:00:00+00:00'),
+            (self.lagos.id, '2026-03-02T09:00:00+00:00'),
+        ])
+    
+    def test_missed_minutes_are_caught_up_once(self):
+        tick(utc(2026, 3, 1, 23, 0))
+        
+        # Down from 23:01 until 09:10: nightly (01:00 UTC) runs late; Nairobi's
+        # opening expired 30 minutes after 07:00, Lagos's at 09:00 is still due
+        self.assertEqual(tick(utc(2026, 3, 2, 9, 10)), {'opening': 1, 'nightly': 1})
+        nightly = ScheduleState.objects.get(name='nightly')
+        self.assertEqual((nightly.ticks, nightly.jobs_enqueued, nightly.caught_up_minutes), (2, 1, 609))
+        opening = ScheduleState.objects.get(name='opening')
+        self.assertEqual((opening.jobs_enqueued, opening.expired_slots), (1, 1))
+        self.assertEqual(Job.objects.get(kwargs__business_id=self.lagos.id).unique_key,
+                         f'schedule:opening:{self.lagos.id}:20260302T0900')
+    
+    def test_business_alerts_use_local_hour(self):
+        from analytics.tasks import business_alerts_job
+        # 12:00 UTC is 3 PM in Nairobi, with nothing sold today
+        business_alerts_job(self.nairobi.id, scheduled_for='2026-03-02T12:00:00+00:00')
+        business_alerts_job(self.lagos.id, scheduled_for='2026-03-02T12:00:00+00:00')
+        alerts = Notification.objects.filter(notification_type='alert')
+        self.assertEqual([(n.user_id, n.data['alert_type']) for n in alerts], [(self.owner.id, 'no_sales')])
+    
+    def test_status_is_staff_only(self):
+        tick(utc(2026, 3, 2, 7, 0))
+        user = self.owner
+        client = APIClient()
+        client.force_authenticate(user)
+        self.assertEqual(client.get('/api/jobs/status/').status_code, 403)
+        
+        user.is_staff = True
+        user.save()
+        response = client.get('/api/jobs/status/')
+        self.assertEqual(response.data['queue']['queued'], 1)
+        opening = next(s for s in response.data['schedules'] if s['name'] == 'opening')
+        self.assertEqual((opening['ticks'], opening['jobs_enqueued']), (1, 1))
+
+# Advisory locks belong to a database session, so each scheduler needs its own connection
+@override_settings(JOB_SCHEDULE={})
+class SchedulerLeaderTests(TransactionTestCase):
+    @skipUnless(connection.vendor == 'postgresql', 'Leader election uses Postgres advisory locks')
+    def test_one_leader_until_its_connection_goes(self):
+        first, second = Scheduler(name='a'), Scheduler(name='b')
+        self.assertTrue(first.elect())
+        
+        def elect(results):
+            try:
+                results.append(second.elect())
+            finally:
+                connection.close()
+        
+        results = []
+        for _ in range(2):
+            other = threading.Thread(target=elect, args=(results,))
+            other.start()
+            other.join()
+            connection.close()  # The leader dies after the first attempt
+        self.assertEqual(results, [False, True])
+        self.assertFalse(first.elect())  # Reconnected without the lock
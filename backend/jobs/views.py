@@ -0,0 +1,42 @@
+from django.db.models import Count, Min
+from django.utils import timezone
+from rest_framework import permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from .models import Job, ScheduleState
+from .scheduler import schedule
+
+# Queue depth and scheduler run metrics for operators (staff accounts only)
+class JobStatusView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+    
+    def get(self, request):
+        now = timezone.now()
+        counts = dict(Job.objects.values_list('status').annotate(count=Count('id')).order_by())
+        oldest = Job.objects.filter(status='queued', run_at__lte=now).aggregate(oldest=Min('run_at'))['oldest']
+        states = {state.name: state for state in ScheduleState.objects.all()}
+        
+        schedules = []
+        for name, entry in schedule().items():
+            state = states.get(name)
+            schedules.append({
+                'name': name,
+                'task': entry['task'],
+                'cron': entry['cron'],
+                'per_business': bool(entry.get('per_business')),
+                'last_tick': state.last_tick if state else None,
+                'lag_seconds': int((now - state.last_tick).total_seconds()) if state else None,
+                'last_run_at': state.last_run_at if state else None,
+                'last_duration_ms': state.last_duration_ms if state else None,
+                'leader': state.leader if state else '',
+                'ticks': state.ticks if state else 0,
+                'jobs_enqueued': state.jobs_enqueued if state else 0,
+                'caught_up_minutes': state.caught_up_minutes if state else 0,
+                'expired_slots': state.expired_slots if state else 0,
+            })
+        
+        return Response({
+            'queue': {status: counts.get(status, 0) for status, _ in Job.STATUS_CHOICES},
+            'oldest_runnable_seconds': int((now - oldest).total_seconds()) if oldest else 0,
+            'schedules': schedules,
+        })
@@ -0,0 +1,73 @@
+import os
+import select
+import signal
+import socket
+import time
+from django.conf import settings
+from django.db import close_old_connections, connection
+from .queue import NOTIFY_CHANNEL, claim, prune_finished, requeue_expired, run_job
+
+class Worker:
+    """Claims and runs jobs in a loop; one per process"""
+    
+    def __init__(self, name=None, batch_size=1, poll_interval=None):
+        config = settings.JOB_QUEUE_CONFIG
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}'
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval or config['poll_interval']
+        self.maintenance_interval = config['maintenance_interval']
+        self.stopping = False
+        self.processed = self.failed = 0
+    
+    def stop(self, *args):
+        # The job in hand is finished first; claimed jobs are never abandoned mid-run
+        self.stopping = True
+    
+    def install_signal_handlers(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+    
+    def refresh_connection(self):
+        # Same CONN_MAX_AGE handling as a request; never inside a caller's transaction
+        if not connection.in_atomic_block:
+            close_old_connections()
+    
+    def maintain(self):
+        requeue_expired()
+        prune_finished()
+    
+    def run(self, burst=False):
+        """Process jobs until stopped, or in burst mode until nothing is runnable; returns jobs run"""
+        last_maintenance = None
+        while not self.stopping:
+            self.refresh_connection()
+            if last_maintenance is None or time.monotonic() - last_maintenance >= self.maintenance_interval:
+                self.maintain()
+                last_maintenance = time.monotonic()
+            
+            jobs = claim(self.name, self.batch_size)
+            for job in jobs:
+                if not run_job(job):
+                    self.failed += 1
+                self.processed += 1
+            if not jobs:
+                if burst:
+                    break
+                self.wait()
+        self.refresh_connection()
+        return self.processed
+    
+    def wait(self):
+        """Sleep until a job is enqueued (LISTEN/NOTIFY) or the poll interval passes"""
+        if connection.vendor != 'postgresql':
+            time.sleep(self.poll_interval)
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(f'LISTEN {NOTIFY_CHANNEL}')
+        raw = connection.connection
+        deadline = time.monotonic() + self.poll_interval
+        # Short slices so a stop signal is noticed within a second
+        while not raw.notifies and not self.stopping and time.monotonic() < deadline:
+            select.select([raw], [], [], min(1.0, deadline - time.monotonic()))
+            raw.poll()
+        raw.notifies.clear()
@@ -0,0 +1,22 @@
+import json
+from django.core.management.base import BaseCommand
+from notifications.retention import run_retention
+
+# Run nightly: folds old sale notifications into digests and drops expired rows
+class Command(BaseCommand):
+    help = 'Compact sale notifications into daily digests and purge notifications past their TTL'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be removed')
+        parser.add_argument('--archive', action='store_true', help='Copy expired rows to the compressed archive first')
+        parser.add_argument('--batch-size', type=int, help='Rows deleted per transaction')
+        parser.add_argument('--pause', type=float, default=0, help='Seconds to sleep between delete batches')
+    
+    def handle(self, *args, **options):
+        report = run_retention(
+            dry_run=options['dry_run'],
+            archive=options['archive'],
+            batch_size=options['batch_size'],
+            pause=options['pause'],
+        )
+        self.stdout.write(json.dumps(report, indent=2))
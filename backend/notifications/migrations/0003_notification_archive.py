@@ -0,0 +1,36 @@
+# Generated by Django 5.2.10 on 2026-10-19 05:57
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0002_notification_counter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('notification_type', models.CharField(max_length=20)),
+                ('first_id', models.BigIntegerField()),
+                ('last_id', models.BigIntegerField()),
+                ('row_count', models.IntegerField()),
+                ('oldest_sent_at', models.DateTimeField()),
+                ('newest_sent_at', models.DateTimeField()),
+                ('payload', models.BinaryField()),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['-archived_at'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='notification_type',
+            field=models.CharField(choices=[('sale', 'New Sale'), ('stock', 'Low Stock Alert'), ('alert', 'Business Alert'), ('summary', 'Daily Summary'), ('system', 'System Update'), ('digest', 'Sales Digest')], max_length=20),
+        ),
+    ]
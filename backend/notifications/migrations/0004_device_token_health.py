@@ -0,0 +1,48 @@
+# Generated by Django 5.2.10 on 2026-10-19 05:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0003_notification_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='devicetoken',
+            name='backoff_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='devicetoken',
+            name='consecutive_failures',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='devicetoken',
+            name='failure_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='devicetoken',
+            name='last_error',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='devicetoken',
+            name='last_failure_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='devicetoken',
+            name='last_success_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='devicetoken',
+            name='success_count',
+            field=models.IntegerField(default=0),
+        ),
+    ]
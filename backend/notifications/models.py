@@ -1,9 +1,19 @@
+import json
+import zlib
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.db.models.functions import Greatest
 from django.utils import timezone
 
 User = get_user_model()
 
+class DeviceTokenQuerySet(models.QuerySet):
+    def deliverable(self):
+        """Active tokens that are not backing off after transient failures"""
+        return self.filter(is_active=True).filter(
+            models.Q(backoff_until__isnull=True) | models.Q(backoff_until__lte=timezone.now())
+        )
+
 class DeviceToken(models.Model):
     """Store FCM device tokens for push notifications"""
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='device_tokens')
@@ -14,15 +24,36 @@ class DeviceToken(models.Model):
         ('web', 'Web'),
     ], default='android')
     is_active = models.BooleanField(default=True)
+    
+    # Delivery health, maintained by the push sender
+    success_count = models.IntegerField(default=0)
+    failure_count = models.IntegerField(default=0)
+    consecutive_failures = models.IntegerField(default=0)
+    last_success_at = models.DateTimeField(null=True, blank=True)
+    last_failure_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.CharField(max_length=100, blank=True)
+    backoff_until = models.DateTimeField(null=True, blank=True)  # Skipped by fan-out until then
+    
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = DeviceTokenQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-created_at']
     
     def __str__(self):
         return f"{self.user.email} - {self.device_type}"
 
+class NotificationManager(models.Manager):
+    def create_for_users(self, user_ids, **fields):
+        """Insert one notification per user and bump their unread counters"""
+        user_ids = list(user_ids)
+        notifications = self.bulk_create([self.model(user_id=user_id, **fields) for user_id in user_ids])
+        if not fields.get('is_read'):
+            NotificationCounter.adjust(user_ids, 1)
+        return notifications
+
 class Notification(models.Model):
     """Store notifications sent to users"""
     NOTIFICATION_TYPES = [
@@ -31,6 +62,7 @@ class Notification(models.Model):
         ('alert', 'Business Alert'),
         ('summary', 'Daily Summary'),
         ('system', 'System Update'),
+        ('digest', 'Sales Digest'),  # Old sale notifications folded per day
     ]
     
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
@@ -42,13 +74,74 @@ class Notification(models.Model):
     sent_at = models.DateTimeField(default=timezone.now)
     read_at = models.DateTimeField(null=True, blank=True)
     
+    objects = NotificationManager()
+    
     class Meta:
         ordering = ['-sent_at']
+        indexes = [models.Index(fields=['user', '-sent_at', '-id'])]  # Inbox pages
     
     def __str__(self):
         return f"{self.title} - {self.user.email}"
     
     def mark_as_read(self):
+        now = timezone.now()
+        # Conditional update so a double tap only decrements the counter once
+        if Notification.objects.filter(pk=self.pk, is_read=False).update(is_read=True, read_at=now):
+            NotificationCounter.adjust([self.user_id], -1)
         self.is_read = True
-        self.read_at = timezone.now()
-        self.save()
\ No newline at end of file
+        self.read_at = now
+
+class NotificationArchive(models.Model):
+    """Compressed cold storage for a batch of expired notifications"""
+    notification_type = models.CharField(max_length=20)
+    first_id = models.BigIntegerField()
+    last_id = models.BigIntegerField()
+    row_count = models.IntegerField()
+    oldest_sent_at = models.DateTimeField()
+    newest_sent_at = models.DateTimeField()
+    payload = models.BinaryField()  # zlib-compressed JSON list of the archived rows
+    archived_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['-archived_at']
+    
+    def __str__(self):
+        return f"{self.notification_type} archive {self.first_id}-{self.last_id} ({self.row_count})"
+    
+    def rows(self):
+        """Decompress the archived notification rows"""
+        return json.loads(zlib.decompress(bytes(self.payload)))
+
+class NotificationCounter(models.Model):
+    """Denormalized unread notification count per user (badge reads one row)"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='notification_counter')
+    unread_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.user_id}: {self.unread_count} unread"
+    
+    @classmethod
+    def adjust(cls, user_ids, delta):
+        """Add delta to each user's counter, creating missing rows first"""
+        user_ids = list(user_ids)
+        if not user_ids:
+            return
+        cls.objects.bulk_create([cls(user_id=user_id) for user_id in user_ids], ignore_conflicts=True)
+        cls.objects.filter(user_id__in=user_ids).update(
+            unread_count=Greatest(models.F('unread_count') + delta, 0),
+            updated_at=timezone.now()
+        )
+    
+    @classmethod
+    def recount(cls, user_id):
+        """Rebuild a counter from the notification table"""
+        unread = Notification.objects.filter(user_id=user_id, is_read=False).count()
+        cls.objects.update_or_create(user_id=user_id, defaults={'unread_count': unread})
+        return unread
+    
+    @classmethod
+    def unread_for(cls, user_id):
+        """Single-row read of a user's unread count"""
+        counter = cls.objects.filter(user_id=user_id).values_list('unread_count', flat=True).first()
+        return counter if counter is not None else cls.recount(user_id)
\ No newline at end of file
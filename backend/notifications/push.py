@@ -0,0 +1,284 @@
+import atexit
+import os
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.db import connections
+from django.db.models import F
+from django.utils import timezone
+from .models import DeviceToken
+
+# Firebase Admin SDK
+try:
+    import firebase_admin
+    from firebase_admin import credentials, messaging
+    from firebase_admin.exceptions import FirebaseError
+    
+    # Initialize Firebase Admin SDK
+    if not firebase_admin._apps:
+        cred_path = getattr(settings, 'FIREBASE_CREDENTIALS_PATH', None)
+        if cred_path and os.path.exists(cred_path):
+            cred = credentials.Certificate(cred_path)
+            firebase_admin.initialize_app(cred)
+            print("Firebase Admin SDK initialized successfully")
+        else:
+            print(f"Firebase credentials not found at: {cred_path}")
+except ImportError:
+    print("Firebase Admin SDK not installed")
+    firebase_admin = None
+    messaging = None
+    FirebaseError = Exception
+
+# FCM accepts at most this many tokens per multicast
+MULTICAST_LIMIT = 500
+
+# FCM error codes grouped by what they say about the token
+DEAD_TOKEN_CODES = {'NOT_FOUND', 'UNREGISTERED', 'SENDER_ID_MISMATCH'}
+RETRYABLE_CODES = {'RESOURCE_EXHAUSTED', 'QUOTA_EXCEEDED', 'UNAVAILABLE', 'INTERNAL', 'DEADLINE_EXCEEDED'}
+# Credential, project or payload problems on our side: logged and retried, never a reason to drop a token
+CONFIG_ERROR_CODES = {'PERMISSION_DENIED', 'INVALID_ARGUMENT'}
+
+# Exponential backoff for tokens hitting transient errors
+BACKOFF_BASE = timedelta(minutes=1)
+BACKOFF_MAX = timedelta(hours=6)
+
+def classify_error(exception):
+    """Return 'dead', 'retry' or 'unknown' for a per-token send failure"""
+    if messaging is not None:
+        if isinstance(exception, (messaging.UnregisteredError, messaging.SenderIdMismatchError)):
+            return 'dead'
+        if isinstance(exception, messaging.QuotaExceededError):
+            return 'retry'
+    code = str(getattr(exception, 'code', '') or '').upper()
+    if code in DEAD_TOKEN_CODES:
+        return 'dead'
+    if code in RETRYABLE_CODES or code in CONFIG_ERROR_CODES:
+        return 'retry'
+    return 'unknown'
+
+def backoff_for(consecutive_failures):
+    """Delay before retrying a token that has failed this many times in a row"""
+    return min(BACKOFF_BASE * (2 ** min(consecutive_failures, 16)), BACKOFF_MAX)
+
+def build_message(tokens, title, message, data=None, notification_type='system', collapse_key=None):
+    """Build the multicast message sent to a chunk of tokens"""
+    # Devices keep only the newest undelivered message per collapse key
+    apns_headers = {'apns-collapse-id': collapse_key[:64]} if collapse_key else None
+    return messaging.MulticastMessage(
+        notification=messaging.Notification(
+            title=title,
+            body=message,
+        ),
+        # FCM data payloads only carry strings
+        data={key: str(value) for key, value in (data or {}).items() if value is not None},
+        android=messaging.AndroidConfig(
+            priority='high',
+            collapse_key=collapse_key,
+            notification=messaging.AndroidNotification(
+                sound='default',
+                channel_id='imanage_alerts',
+                icon='imanageai_icon',
+                color='#1976d2',
+                tag=notification_type,  # Group notifications by type
+            ),
+        ),
+        apns=messaging.APNSConfig(
+            headers=apns_headers,
+            payload=messaging.APNSPayload(
+                aps=messaging.Aps(
+                    sound='default',
+                    badge=1,
+                    category=notification_type,
+                    thread_id=notification_type,
+                ),
+            ),
+        ),
+        tokens=list(tokens),
+    )
+
+def record_delivery(tokens, responses):
+    """Update per-token health from a batch response with a handful of bulk UPDATEs"""
+    now = timezone.now()
+    delivered, dead, retry, unknown = [], [], [], []
+    errors = {}
+    for token, resp in zip(tokens, responses):
+        if resp.success:
+            delivered.append(token)
+            continue
+        kind = classify_error(resp.exception)
+        errors[token] = str(getattr(resp.exception, 'code', '') or type(resp.exception).__name__)[:100]
+        {'dead': dead, 'retry': retry, 'unknown': unknown}[kind].append(token)
+    
+    config_errors = sorted({errors[t] for t in retry if errors[t] in CONFIG_ERROR_CODES})
+    if config_errors:
+        print(f"Push: FCM reported {', '.join(config_errors)}; check the Firebase credentials and message")
+    
+    # A config error for every token means the message or project is bad, not the tokens
+    if retry and len(retry) == len(tokens) and all(errors[t] in CONFIG_ERROR_CODES for t in retry):
+        unknown, retry = unknown + retry, []
+    
+    if delivered:
+        DeviceToken.objects.filter(token__in=delivered).update(
+            success_count=F('success_count') + 1,
+            consecutive_failures=0,
+            last_success_at=now,
+            backoff_until=None,
+        )
+    
+    # Deactivate dead tokens, grouped by error so last_error stays accurate
+    dead_by_error = defaultdict(list)
+    for token in dead:
+        dead_by_error[errors[token]].append(token)
+    for error, group in dead_by_error.items():
+        DeviceToken.objects.filter(token__in=group).update(
+            is_active=False,
+            failure_count=F('failure_count') + 1,
+            consecutive_failures=F('consecutive_failures') + 1,
+            last_failure_at=now,
+            last_error=error,
+        )
+    
+    # Back off transient failures; one UPDATE per distinct failure streak and error
+    streaks = defaultdict(list)
+    for token, failures in DeviceToken.objects.filter(token__in=retry).values_list('token', 'consecutive_failures'):
+        streaks[failures, errors[token]].append(token)
+    for (failures, error), group in streaks.items():
+        DeviceToken.objects.filter(token__in=group).update(
+            failure_count=F('failure_count') + 1,
+            consecutive_failures=failures + 1,
+            last_failure_at=now,
+            last_error=error,
+            backoff_until=now + backoff_for(failures),
+        )
+    
+    if unknown:
+        DeviceToken.objects.filter(token__in=unknown).update(
+            failure_count=F('failure_count') + 1,
+            last_failure_at=now,
+        )
+    
+    return {'delivered': len(delivered), 'deactivated': len(dead), 'backed_off': len(retry), 'errors': errors}
+
+def send_push_notification(device_tokens, title, message, data=None, notification_type='system',
+                           client=None, collapse_key=None):
+    """Send push notification using Firebase Admin SDK, tracking per-device health"""
+    client = client or messaging
+    device_tokens = list(dict.fromkeys(device_tokens or []))
+    if not device_tokens or client is None or (client is messaging and not firebase_admin._apps):
+        print("Cannot send notification: Firebase not initialized or no tokens")
+        return None
+    
+    chunks = [device_tokens[i:i + MULTICAST_LIMIT] for i in range(0, len(device_tokens), MULTICAST_LIMIT)]
+    
+    def send_chunk(chunk):
+        return client.send_each_for_multicast(
+            build_message(chunk, title, message, data, notification_type, collapse_key)
+        )
+    
+    result = {'success_count': 0, 'failure_count': 0, 'deactivated': 0, 'backed_off': 0, 'responses': []}
+    try:
+        # Chunks go out concurrently; health is recorded on this thread afterwards
+        if len(chunks) == 1:
+            responses = [send_chunk(chunks[0])]
+        else:
+            workers = min(settings.PUSH_CONFIG['max_parallel'], len(chunks))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                responses = list(pool.map(send_chunk, chunks))
+        
+        for chunk, response in zip(chunks, responses):
+            health = record_delivery(chunk, response.responses)
+            result['success_count'] += response.success_count
+            result['failure_count'] += response.failure_count
+            result['deactivated'] += health['deactivated']
+            result['backed_off'] += health['backed_off']
+            result['responses'].extend(
+                {
+                    'success': resp.success,
+                    'message_id': resp.message_id if resp.success else None,
+                    'error': str(resp.exception) if not resp.success else None
+                }
+                for resp in response.responses
+            )
+    except FirebaseError as e:
+        print(f"Firebase error sending notification: {e}")
+        return None
+    except Exception as e:
+        print(f"Unexpected error sending notification: {e}")
+        return None
+    
+    if result['failure_count']:
+        print(f"Push: {result['success_count']} sent, {result['failure_count']} failed, "
+              f"{result['deactivated']} tokens deactivated, {result['backed_off']} backing off")
+    return result
+
+def send_business_push(business_id, title, message, data=None, notification_type='system',
+                       client=None, collapse_key=None):
+    """Push to every deliverable device of a business"""
+    tokens = DeviceToken.objects.deliverable().filter(
+        user__business_id=business_id
+    ).values_list('token', flat=True)
+    return send_push_notification(list(tokens), title, message, data, notification_type,
+                                  client=client, collapse_key=collapse_key)
+
+class PushCoalescer:
+    """Buffers bursts of business pushes and sends only the latest per business and type"""
+    
+    def __init__(self, client=None):
+        self.client = client
+        self.lock = threading.Lock()
+        self.pending = {}  # (business_id, notification_type) -> latest event
+        self.timer = None
+    
+    def submit(self, business_id, title, message, data=None, notification_type='system'):
+        """Queue a push; non-coalesced types (or a zero window) are sent immediately"""
+        window = settings.PUSH_CONFIG['coalesce_window']
+        if window <= 0 or notification_type not in settings.PUSH_CONFIG['coalesce_types']:
+            return send_business_push(business_id, title, message, data, notification_type, client=self.client)
+        
+        with self.lock:
+            key = (business_id, notification_type)
+            previous = self.pending.get(key)
+            self.pending[key] = {
+                'business_id': business_id,
+                'title': title,
+                'message': message,
+                'data': data or {},
+                'notification_type': notification_type,
+                'count': previous['count'] + 1 if previous else 1,
+            }
+            if self.timer is None:
+                self.timer = threading.Timer(window, self._flush_from_timer)
+                self.timer.daemon = True
+                self.timer.start()
+        return None
+    
+    def flush(self):
+        """Send everything buffered so far"""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+        
+        for event in pending.values():
+            message, data = event['message'], dict(event['data'])
+            if event['count'] > 1:
+                message = f"{message}\n+{event['count'] - 1} more since the last alert"
+                data['coalesced'] = event['count']
+            send_business_push(
+                event['business_id'], event['title'], message, data, event['notification_type'],
+                client=self.client, collapse_key=event['notification_type']
+            )
+        return len(pending)
+    
+    def _flush_from_timer(self):
+        try:
+            self.flush()
+        finally:
+            connections.close_all()  # Timer threads own their DB connections
+
+# Process-wide coalescer used by send_business_notification
+push_coalescer = PushCoalescer()
+atexit.register(push_coalescer.flush)
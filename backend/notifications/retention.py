@@ -0,0 +1,155 @@
+import json
+import time
+import zlib
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, DecimalField, Max, Q, Sum
+from django.db.models.fields.json import KT
+from django.db.models.functions import Cast, TruncDate
+from django.utils import timezone
+from .models import Notification, NotificationArchive, NotificationCounter
+
+# Columns copied into the archive payload
+ARCHIVE_FIELDS = ['id', 'user_id', 'title', 'message', 'notification_type', 'data', 'is_read', 'sent_at', 'read_at']
+
+def _release_unread(queryset):
+    """Decrement counters for the unread rows in queryset (call before deleting them)"""
+    by_delta = defaultdict(list)
+    for row in queryset.filter(is_read=False).values('user_id').annotate(unread=Count('id')):
+        by_delta[row['unread']].append(row['user_id'])
+    for unread, user_ids in by_delta.items():
+        NotificationCounter.adjust(user_ids, -unread)
+
+def _sale_groups(business, cutoff, max_id):
+    """Per user/local-day aggregates of sale notifications eligible for compaction"""
+    return (
+        Notification.objects.filter(
+            user__business=business,
+            notification_type='sale',
+            sent_at__lt=cutoff,
+            id__lte=max_id,
+        )
+        .annotate(day=TruncDate('sent_at', tzinfo=business.tzinfo))
+        .values('user_id', 'day')
+        .annotate(
+            sales_count=Count('id'),
+            unread=Count('id', filter=Q(is_read=False)),
+            total_amount=Sum(Cast(KT('data__total_amount'), DecimalField(max_digits=12, decimal_places=2))),
+            last_sent=Max('sent_at'),
+        )
+        .order_by('day', 'user_id')
+    )
+
+def compact_sale_notifications(now=None, dry_run=False):
+    """Fold old per-sale notifications into one digest per user per business-local day"""
+    from business.models import Business
+    now = now or timezone.now()
+    cutoff = now - timedelta(days=settings.NOTIFICATION_COMPACT_AFTER_DAYS)
+    # Rows inserted while the job runs are left for the next run
+    max_id = Notification.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+    report = {'notifications': 0, 'digests': 0}
+    
+    for business in Business.objects.all():
+        # Only whole local days are folded: the day the cutoff falls in waits for the next run
+        day_cutoff = business.day_bounds(timezone.localtime(cutoff, business.tzinfo).date())[0]
+        groups_by_day = defaultdict(list)
+        for group in _sale_groups(business, day_cutoff, max_id):
+            groups_by_day[group['day']].append(group)
+        
+        for day, groups in groups_by_day.items():
+            report['notifications'] += sum(g['sales_count'] for g in groups)
+            report['digests'] += len(groups)
+            if dry_run:
+                continue
+            
+            # One short transaction per business day keeps locks brief
+            start, end = business.day_bounds(day)
+            with transaction.atomic():
+                folded = Notification.objects.filter(
+                    user_id__in=[g['user_id'] for g in groups],
+                    notification_type='sale',
+                    sent_at__gte=start,
+                    sent_at__lt=min(end, day_cutoff),
+                    id__lte=max_id,
+                )
+                _release_unread(folded)
+                folded.delete()
+                
+                Notification.objects.bulk_create([
+                    Notification(
+                        user_id=g['user_id'],
+                        title=f"🧾 Sales digest {day.isoformat()}",
+                        message=f"{g['sales_count']} sales totalling {business.currency} {g['total_amount'] or 0:.2f}",
+                        notification_type='digest',
+                        data={
+                            'date': day.isoformat(),
+                            'sales_count': g['sales_count'],
+                            'total_amount': str(g['total_amount'] or 0),
+                        },
+                        is_read=g['unread'] == 0,
+                        sent_at=g['last_sent'],
+                        read_at=now if g['unread'] == 0 else None,
+                    )
+                    for g in groups
+                ])
+                unread_user_ids = [g['user_id'] for g in groups if g['unread']]
+                NotificationCounter.adjust(unread_user_ids, 1)
+    
+    return report
+
+def _archive_batch(notification_type, rows):
+    """Store a batch of rows as one compressed archive record"""
+    payload = json.dumps(rows, default=str, separators=(',', ':')).encode('utf-8')
+    NotificationArchive.objects.create(
+        notification_type=notification_type,
+        first_id=rows[0]['id'],
+        last_id=rows[-1]['id'],
+        row_count=len(rows),
+        oldest_sent_at=min(row['sent_at'] for row in rows),
+        newest_sent_at=max(row['sent_at'] for row in rows),
+        payload=zlib.compress(payload, 9),
+    )
+
+def purge_expired_notifications(now=None, dry_run=False, archive=False, batch_size=None, pause=0):
+    """Delete (optionally archiving first) notifications older than their type's TTL, in small batches"""
+    now = now or timezone.now()
+    batch_size = batch_size or settings.NOTIFICATION_PRUNE_BATCH_SIZE
+    report = {}
+    
+    for notification_type, days in settings.NOTIFICATION_RETENTION_DAYS.items():
+        expired = Notification.objects.filter(
+            notification_type=notification_type,
+            sent_at__lt=now - timedelta(days=days)
+        )
+        if dry_run:
+            report[notification_type] = expired.count()
+            continue
+        
+        removed = 0
+        while True:
+            with transaction.atomic():
+                ids = list(expired.order_by('id').values_list('id', flat=True)[:batch_size])
+                if not ids:
+                    break
+                batch = Notification.objects.filter(id__in=ids)
+                if archive:
+                    _archive_batch(notification_type, list(batch.order_by('id').values(*ARCHIVE_FIELDS)))
+                _release_unread(batch)
+                removed += batch.delete()[0]
+            if pause:
+                time.sleep(pause)  # Let foreground writes through between batches
+        report[notification_type] = removed
+    
+    return report
+
+def run_retention(dry_run=False, archive=False, batch_size=None, pause=0, now=None):
+    """Compact then purge; returns a report of what was (or would be) removed"""
+    return {
+        'dry_run': dry_run,
+        'compacted': compact_sale_notifications(now=now, dry_run=dry_run),
+        'expired': purge_expired_notifications(
+            now=now, dry_run=dry_run, archive=archive, batch_size=batch_size, pause=pause
+        ),
+    }
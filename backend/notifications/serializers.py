@@ -1,15 +1,22 @@
 from rest_framework import serializers
+from imanage.fieldsets import SparseFieldsMixin
+from imanage.read_serializers import ReadPlan
 from .models import DeviceToken, Notification
 
 class DeviceTokenSerializer(serializers.ModelSerializer):
     class Meta:
         model = DeviceToken
-        fields = ['id', 'token', 'device_type', 'is_active', 'created_at']
-        read_only_fields = ['id', 'created_at']
+        fields = ['id', 'token', 'device_type', 'is_active', 'success_count', 'failure_count',
+                  'last_success_at', 'last_failure_at', 'last_error', 'backoff_until', 'created_at']
+        read_only_fields = ['id', 'success_count', 'failure_count', 'last_success_at',
+                            'last_failure_at', 'last_error', 'backoff_until', 'created_at']
 
-class NotificationSerializer(serializers.ModelSerializer):
+class NotificationSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Notification
         fields = ['id', 'title', 'message', 'notification_type', 'data', 
                  'is_read', 'sent_at', 'read_at']
-        read_only_fields = ['id', 'sent_at', 'read_at']
\ No newline at end of file
+        read_only_fields = ['id', 'sent_at', 'read_at']
+
+# Precompiled read path for the inbox, same output as NotificationSerializer
+notification_read_plan = ReadPlan(NotificationSerializer)
@@ -0,0 +1,9 @@
+from jobs.queue import task
+from .retention import run_retention
+
+# Background jobs (see the jobs app)
+
+@task(priority=-5, max_attempts=3, timeout=3600)
+def prune_notifications_job(scheduled_for=None):
+    """Nightly compaction and TTL purge, archiving expired rows; pauses let live writes through"""
+    run_retention(archive=True, pause=0.05)
@@ -1,3 +1,306 @@
-from django.test import TestCase
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
+from django.db import connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from accounts.models import User
+from business.models import Business
+from imanage.renderers import dumps_json
+from .models import DeviceToken, Notification, NotificationArchive, NotificationCounter
+from .push import PushCoalescer, send_push_notification
+from .retention import compact_sale_notifications, purge_expired_notifications
+from .serializers import NotificationSerializer, notification_read_plan
 
-# Create your tests here.
+# Stand-in for firebase_admin.messaging that fails chosen tokens with chosen codes
+class FakeMessaging:
+    def __init__(self, failures=None):
+        self.failures = failures or {}
+        self.sent = []
+    
+    def send_each_for_multicast(self, message):
+        self.sent.append(message)
+        responses = []
+        for token in message.tokens:
+            code = self.failures.get(token)
+            if code:
+                error = Exception(code)
+                error.code = code
+                responses.append(SimpleNamespace(success=False, message_id=None, exception=error))
+            else:
+                responses.append(SimpleNamespace(success=True, message_id=f'msg-{token}', exception=None))
+        return SimpleNamespace(
+            responses=responses,
+            success_count=sum(1 for r in responses if r.success),
+            failure_count=sum(1 for r in responses if not r.success),
+        )
+
+class PushDeliveryHealthTests(TestCase):
+    def setUp(self):
+        business = Business.objects.create(name='Shop')
+        self.user = User.objects.create_user('owner@example.com', 'password123', first_name='O',
+                                             last_name='W', role='owner', business=business)
+        for token in ['good', 'gone', 'busy', 'odd']:
+            DeviceToken.objects.create(user=self.user, token=token)
+    
+    def send(self, client):
+        tokens = list(DeviceToken.objects.deliverable().values_list('token', flat=True))
+        return send_push_notification(tokens, 'Title', 'Body', {'sale_id': 1}, 'sale', client=client)
+    
+    def test_dead_tokens_are_deactivated_and_transient_ones_back_off(self):
+        client = FakeMessaging({'gone': 'NOT_FOUND', 'busy': 'RESOURCE_EXHAUSTED', 'odd': 'SOMETHING'})
+        result = self.send(client)
+        
+        self.assertEqual(result['success_count'], 1)
+        self.assertEqual(result['deactivated'], 1)
+        self.assertEqual(result['backed_off'], 1)
+        self.assertEqual(client.sent[0].data, {'sale_id': '1'})
+        
+        good, gone, busy, odd = (DeviceToken.objects.get(token=t) for t in ['good', 'gone', 'busy', 'odd'])
+        self.assertEqual((good.success_count, good.consecutive_failures), (1, 0))
+        self.assertFalse(gone.is_active)
+        self.assertEqual(gone.last_error, 'NOT_FOUND')
+        self.assertTrue(busy.is_active)
+        self.assertEqual(busy.consecutive_failures, 1)
+        self.assertGreater(busy.backoff_until, timezone.now())
+        self.assertTrue(odd.is_active)
+        self.assertIsNone(odd.backoff_until)
+        
+        # The next fan-out skips both the dead and the backing-off token
+        self.assertEqual(
+            sorted(DeviceToken.objects.deliverable().values_list('token', flat=True)),
+            ['good', 'odd']
+        )
+    
+    def test_backoff_grows_with_consecutive_failures(self):
+        DeviceToken.objects.filter(token='busy').update(consecutive_failures=3)
+        self.send(FakeMessaging({'busy': 'UNAVAILABLE'}))
+        busy = DeviceToken.objects.get(token='busy')
+        self.assertEqual(busy.consecutive_failures, 4)
+        self.assertGreater(busy.backoff_until - timezone.now(), timezone.timedelta(minutes=7))
+    
+    def test_success_clears_failure_streak(self):
+        DeviceToken.objects.filter(token='busy').update(consecutive_failures=2)
+        self.send(FakeMessaging())
+        self.assertEqual(DeviceToken.objects.get(token='busy').consecutive_failures, 0)
+    
+    def test_invalid_argument_for_every_token_blames_the_message(self):
+        client = FakeMessaging({t: 'INVALID_ARGUMENT' for t in ['good', 'gone', 'busy', 'odd']})
+        self.send(client)
+        self.assertEqual(DeviceToken.objects.deliverable().count(), 4)
+    
+    def test_config_errors_back_off_instead_of_deactivating(self):
+        result = self.send(FakeMessaging({'gone': 'PERMISSION_DENIED', 'odd': 'INVALID_ARGUMENT'}))
+        self.assertEqual((result['deactivated'], result['backed_off']), (0, 2))
+        gone = DeviceToken.objects.get(token='gone')
+        self.assertTrue(gone.is_active)
+        self.assertEqual((gone.last_error, gone.consecutive_failures), ('PERMISSION_DENIED', 1))
+        self.assertEqual(sorted(DeviceToken.objects.deliverable().values_list('token', flat=True)), ['busy', 'good'])
+
+@override_settings(PUSH_CONFIG={'coalesce_window': 60, 'coalesce_types': ['sale', 'stock'], 'max_parallel': 4})
+class PushCoalescingTests(TestCase):
+    def setUp(self):
+        self.business = Business.objects.create(name='Shop')
+        user = User.objects.create_user('owner@example.com', 'password123', first_name='O',
+                                        last_name='W', role='owner', business=self.business)
+        DeviceToken.objects.create(user=user, token='phone')
+        self.client_fake = FakeMessaging()
+        self.coalescer = PushCoalescer(client=self.client_fake)
+    
+    def tearDown(self):
+        self.coalescer.flush()
+    
+    def test_burst_of_sales_sends_only_the_latest(self):
+        for receipt in ['R1', 'R2', 'R3']:
+            self.coalescer.submit(self.business.id, 'New Sale', f'Receipt {receipt}', {'receipt': receipt}, 'sale')
+        self.coalescer.submit(self.business.id, 'Low Stock', 'Milk', {}, 'stock')
+        self.assertEqual(self.client_fake.sent, [])
+        
+        self.assertEqual(self.coalescer.flush(), 2)
+        sale = next(m for m in self.client_fake.sent if m.data.get('receipt'))
+        self.assertEqual(sale.data['receipt'], 'R3')
+        self.assertEqual(sale.data['coalesced'], '3')
+        self.assertEqual(sale.android.collapse_key, 'sale')
+        self.assertEqual(sale.apns.headers, {'apns-collapse-id': 'sale'})
+    
+    def test_other_types_are_sent_immediately(self):
+        self.coalescer.submit(self.business.id, 'Shift', 'Opened', {}, 'system')
+        self.assertEqual(len(self.client_fake.sent), 1)
+    
+    def test_large_fan_out_is_chunked(self):
+        tokens = [f'token-{i}' for i in range(1200)]
+        result = send_push_notification(tokens, 'Title', 'Body', client=self.client_fake)
+        self.assertEqual(len(self.client_fake.sent), 3)
+        self.assertEqual(result['success_count'], 1200)
+
+class NotificationReadPlanTests(TestCase):
+    def setUp(self):
+        business = Business.objects.create(name='Shop')
+        self.user = User.objects.create_user('owner@example.com', 'password123', first_name='O',
+                                             last_name='W', role='owner', business=business)
+        for i in range(5):
+            Notification.objects.create(user=self.user, title=f'Sale {i}', message='KES 100', notification_type='sale',
+                                        data={'sale_id': i, 'items': [1, 2]}, is_read=i % 2 == 0,
+                                        read_at=timezone.now() if i % 2 == 0 else None)
+    
+    def test_plan_matches_serializer(self):
+        notifications = Notification.objects.filter(user=self.user)
+        expected = NotificationSerializer(notifications, many=True).data
+        rows = notification_read_plan.serialize(notification_read_plan.values(notifications))
+        self.assertEqual(dumps_json(rows), dumps_json(expected))
+    
+    def test_timestamps_match_serializer(self):
+        whole_second = datetime(2026, 3, 1, 9, 5, 7, tzinfo=dt_timezone.utc)
+        Notification.objects.filter(title='Sale 0').update(sent_at=whole_second, read_at=whole_second)
+        Notification.objects.filter(title='Sale 1').update(sent_at=whole_second.replace(microsecond=40))
+        notifications = Notification.objects.filter(user=self.user)
+        for zone in ['UTC', 'Africa/Nairobi']:
+            with timezone.override(zone):
+                rows = notification_read_plan.serialize(notification_read_plan.values(notifications))
+                self.assertEqual(dumps_json(rows), dumps_json(NotificationSerializer(notifications, many=True).data))
+        by_title = {row['title']: row for row in rows}
+        self.assertEqual(by_title['Sale 1']['sent_at'], '2026-03-01T12:05:07.000040+03:00')
+    
+    def test_cursor_pages(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        first = client.get('/api/notifications/', {'page_size': 3}).json()
+        second = client.get(first['next']).json()
+        titles = [row['title'] for row in first['results'] + second['results']]
+        self.assertEqual(titles, [f'Sale {i}' for i in range(4, -1, -1)])
+        self.assertIsNone(second['next'])
+        
+        # A sparse page still paginates on the columns it leaves out
+        first = client.get('/api/notifications/', {'page_size': 3, 'fields': 'title'}).json()
+        self.assertEqual(first['results'][0], {'title': 'Sale 4'})
+        self.assertEqual(len(client.get(first['next']).json()['results']), 2)
+    
+    def test_since_returns_only_newer(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        latest = Notification.objects.get(title='Sale 2').id
+        rows = client.get('/api/notifications/', {'since': latest}).json()['results']
+        self.assertEqual([row['title'] for row in rows], ['Sale 4', 'Sale 3'])
+        self.assertEqual(len(client.get('/api/notifications/', {'since': 'x'}).json()['results']), 5)
+
+class UnreadCounterTests(TestCase):
+    def setUp(self):
+        business = Business.objects.create(name='Shop')
+        self.user = User.objects.create_user('owner@example.com', 'password123', role='owner', business=business)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.notifications = [
+            Notification.objects.create_for_users([self.user.id], title=f'Sale {i}', message='')[0] for i in range(3)
+        ]
+    
+    def unread(self):
+        return NotificationCounter.unread_for(self.user.id)
+    
+    def test_reads_decrement_once(self):
+        self.assertEqual(self.unread(), 3)
+        url = f'/api/notifications/{self.notifications[0].id}/mark-read/'
+        self.client.patch(url)
+        self.client.patch(url)
+        self.assertEqual(self.unread(), 2)
+        
+        response = self.client.post('/api/notifications/mark-all-read/')
+        self.assertEqual(response.json()['message'], '2 notifications marked as read')
+        self.assertEqual(self.unread(), 0)
+    
+    def test_mark_all_read_keeps_counts_it_did_not_clear(self):
+        # A notification counted but not yet visible to the UPDATE, as when it commits mid-request
+        NotificationCounter.adjust([self.user.id], 1)
+        self.client.post('/api/notifications/mark-all-read/')
+        self.assertEqual(self.unread(), 1)
+        self.assertEqual(NotificationCounter.recount(self.user.id), 0)
+
+# The badge endpoint is async and reads on pool threads with their own connections, so data must be committed
+class UnreadCountEndpointTests(TransactionTestCase):
+    def test_badge_reads_the_counter(self):
+        patcher = mock.patch.dict(connections.settings['default'], {'CONN_MAX_AGE': 0})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        business = Business.objects.create(name='Shop')
+        user = User.objects.create_user('owner@example.com', 'password123', role='owner', business=business)
+        client = APIClient()
+        self.assertEqual(client.get('/api/notifications/unread-count/').status_code, 401)
+        
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+        Notification.objects.create(user=user, title='Uncounted', message='')
+        self.assertEqual(client.get('/api/notifications/unread-count/').json(), {'unread_count': 1})  # Recounted
+        Notification.objects.create_for_users([user.id], title='Sale', message='')
+        self.assertEqual(client.get('/api/notifications/unread-count/').json(), {'unread_count': 2})
+
+@override_settings(NOTIFICATION_COMPACT_AFTER_DAYS=7)
+class RetentionTests(TestCase):
+    def setUp(self):
+        self.business = Business.objects.create(name='Shop')  # Africa/Nairobi, UTC+3
+        self.user = User.objects.create_user('owner@example.com', 'password123', role='owner',
+                                             business=self.business)
+        # Cutoff is 2026-03-13 12:00 UTC, 15:00 local; the 13th is the boundary day
+        self.now = datetime(2026, 3, 20, 12, 0, tzinfo=dt_timezone.utc)
+    
+    def notify(self, day, hour, notification_type='sale', is_read=False, amount='10.00'):
+        sent_at = self.business.day_bounds(day)[0] + timedelta(hours=hour)
+        return Notification.objects.create(user=self.user, title='Sale', message='', notification_type=notification_type,
+                                           data={'total_amount': amount}, is_read=is_read, sent_at=sent_at)
+    
+    def sale_history(self):
+        self.notify(datetime(2026, 3, 10).date(), 10, amount='100.00')
+        self.notify(datetime(2026, 3, 10).date(), 23, amount='50.00')  # Still the 10th locally
+        self.notify(datetime(2026, 3, 10).date(), 11, is_read=True, amount='25.00')
+        self.notify(datetime(2026, 3, 11).date(), 9, is_read=True)
+        self.boundary = [self.notify(datetime(2026, 3, 13).date(), 9), self.notify(datetime(2026, 3, 13).date(), 16)]
+        self.notify(datetime(2026, 3, 10).date(), 9, notification_type='stock')
+        NotificationCounter.recount(self.user.id)
+    
+    def test_old_sales_fold_into_daily_digests(self):
+        self.sale_history()
+        self.assertEqual(NotificationCounter.unread_for(self.user.id), 5)
+        
+        report = compact_sale_notifications(now=self.now)
+        self.assertEqual(report, {'notifications': 4, 'digests': 2})
+        digests = {n.data['date']: n for n in Notification.objects.filter(notification_type='digest')}
+        self.assertEqual(set(digests), {'2026-03-10', '2026-03-11'})
+        self.assertEqual((digests['2026-03-10'].data['sales_count'], Decimal(digests['2026-03-10'].data['total_amount'])),
+                         (3, Decimal('175.00')))
+        self.assertFalse(digests['2026-03-10'].is_read)
+        self.assertTrue(digests['2026-03-11'].is_read)
+        
+        # The whole boundary day waits, even the part before the cutoff
+        self.assertEqual(set(Notification.objects.filter(notification_type='sale').values_list('id', flat=True)),
+                         {n.id for n in self.boundary})
+        self.assertEqual(Notification.objects.filter(notification_type='stock').count(), 1)
+        
+        # Two unread sales became one unread digest
+        self.assertEqual(NotificationCounter.unread_for(self.user.id), 4)
+        self.assertEqual(NotificationCounter.recount(self.user.id), 4)
+        
+        # A second run has nothing left to fold
+        self.assertEqual(compact_sale_notifications(now=self.now), {'notifications': 0, 'digests': 0})
+    
+    def test_dry_run_changes_nothing(self):
+        self.sale_history()
+        before = Notification.objects.count()
+        self.assertEqual(compact_sale_notifications(now=self.now, dry_run=True), {'notifications': 4, 'digests': 2})
+        self.assertEqual(Notification.objects.count(), before)
+        self.assertEqual(NotificationCounter.unread_for(self.user.id), 5)
+    
+    def test_expired_rows_are_archived_then_purged(self):
+        old = [self.notify(datetime(2026, 2, 1).date(), hour, notification_type='stock') for hour in (9, 10, 11)]
+        kept = self.notify(datetime(2026, 3, 1).date(), 9, notification_type='stock')
+        NotificationCounter.recount(self.user.id)
+        
+        self.assertEqual(purge_expired_notifications(now=self.now, dry_run=True)['stock'], 3)
+        self.assertFalse(NotificationArchive.objects.exists())
+        
+        report = purge_expired_notifications(now=self.now, archive=True, batch_size=2)
+        self.assertEqual(report['stock'], 3)
+        self.assertEqual(list(Notification.objects.values_list('id', flat=True)), [kept.id])
+        archives = NotificationArchive.objects.order_by('first_id')
+        self.assertEqual([a.row_count for a in archives], [2, 1])
+        self.assertEqual([row['id'] for a in archives for row in a.rows()], [n.id for n in old])
+        self.assertEqual(NotificationCounter.unread_for(self.user.id), 1)
@@ -5,14 +5,16 @@ from .views import (
     NotificationListView,
     MarkNotificationReadView,
     MarkAllNotificationsReadView,
-    TestNotificationView  # ADD THIS IMPORT
+    TestNotificationView,  # ADD THIS IMPORT
 )
+from .views_async import unread_count
 
 urlpatterns = [
     path('register-device/', RegisterDeviceView.as_view(), name='register-device'),
     path('send/', SendNotificationView.as_view(), name='send-notification'),
     path('', NotificationListView.as_view(), name='notification-list'),
     path('<int:pk>/mark-read/', MarkNotificationReadView.as_view(), name='mark-notification-read'),
+    path('unread-count/', unread_count, name='notification-unread-count'),
     path('mark-all-read/', MarkAllNotificationsReadView.as_view(), name='mark-all-notifications-read'),
     path('test/', TestNotificationView.as_view(), name='test-notification'), 
 ]
\ No newline at end of file
@@ -1,97 +1,14 @@
 from rest_framework import generics, permissions, status
+from rest_framework.pagination import CursorPagination
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from django.db import transaction
 from django.utils import timezone
-from .models import DeviceToken, Notification
-from .serializers import DeviceTokenSerializer, NotificationSerializer
-import os
-from django.conf import settings
-
-# Firebase Admin SDK
-try:
-    import firebase_admin
-    from firebase_admin import credentials, messaging
-    from firebase_admin.exceptions import FirebaseError
-    
-    # Initialize Firebase Admin SDK
-    if not firebase_admin._apps:
-        cred_path = getattr(settings, 'FIREBASE_CREDENTIALS_PATH', None)
-        if cred_path and os.path.exists(cred_path):
-            cred = credentials.Certificate(cred_path)
-            firebase_admin.initialize_app(cred)
-            print("Firebase Admin SDK initialized successfully")
-        else:
-            print(f"Firebase credentials not found at: {cred_path}")
-except ImportError:
-    print("Firebase Admin SDK not installed")
-    firebase_admin = None
-    messaging = None
-
-def send_push_notification(device_tokens, title, message, data=None, notification_type='system'):
-    """Send push notification using Firebase Admin SDK"""
-    if not device_tokens or not firebase_admin or not messaging:
-        print("Cannot send notification: Firebase not initialized or no tokens")
-        return None
-    
-    try:
-        # Prepare message for multiple devices
-        message = messaging.MulticastMessage(
-            notification=messaging.Notification(
-                title=title,
-                body=message,
-            ),
-            data=data or {},
-            android=messaging.AndroidConfig(
-                priority='high',
-                notification=messaging.AndroidNotification(
-                    sound='default',
-                    channel_id='imanage_alerts',
-                    icon='imanageai_icon',
-                    color='#1976d2',
-                    tag=notification_type,  # Group notifications by type
-                ),
-            ),
-            apns=messaging.APNSConfig(
-                payload=messaging.APNSPayload(
-                    aps=messaging.Aps(
-                        sound='default',
-                        badge=1,
-                        category=notification_type,
-                        thread_id=notification_type,
-                    ),
-                ),
-            ),
-            tokens=list(device_tokens),
-        )
-        
-        # Send the message
-        response = messaging.send_multicast(message)
-        
-        print(f"Successfully sent {response.success_count} notifications")
-        if response.failure_count > 0:
-            for idx, resp in enumerate(response.responses):
-                if not resp.success:
-                    print(f"Failed to send to token {device_tokens[idx]}: {resp.exception}")
-        
-        return {
-            'success_count': response.success_count,
-            'failure_count': response.failure_count,
-            'responses': [
-                {
-                    'success': resp.success,
-                    'message_id': resp.message_id if resp.success else None,
-                    'error': str(resp.exception) if not resp.success else None
-                }
-                for resp in response.responses
-            ]
-        }
-        
-    except FirebaseError as e:
-        print(f"Firebase error sending notification: {e}")
-        return None
-    except Exception as e:
-        print(f"Unexpected error sending notification: {e}")
-        return None
+from .models import DeviceToken, Notification, NotificationCounter
+from .serializers import DeviceTokenSerializer, NotificationSerializer, notification_read_plan
+from .push import push_coalescer, send_push_notification
+from imanage.fieldsets import SparseFieldsViewMixin
+from imanage.read_serializers import ReadPlanListMixin
 
 class RegisterDeviceView(APIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -113,7 +30,10 @@ class RegisterDeviceView(APIView):
             defaults={
                 'user': request.user,
                 'device_type': device_type,
-                'is_active': True
+                'is_active': True,
+                # A re-registered token starts with a clean delivery record
+                'consecutive_failures': 0,
+                'backoff_until': None,
             }
         )
         
@@ -154,9 +74,8 @@ class SendNotificationView(APIView):
             )
         
         # Get user's active device tokens
-        device_tokens = DeviceToken.objects.filter(
-            user=user,
-            is_active=True
+        device_tokens = DeviceToken.objects.deliverable().filter(
+            user=user
         ).values_list('token', flat=True)
         
         if not device_tokens:
@@ -175,13 +94,13 @@ class SendNotificationView(APIView):
         )
         
         # Store notification in database
-        notification = Notification.objects.create(
-            user=user,
+        notification = Notification.objects.create_for_users(
+            [user.id],
             title=title,
             message=message,
             notification_type=notification_type,
             data=data
-        )
+        )[0]
         
         return Response({
             'success': True,
@@ -190,14 +109,34 @@ class SendNotificationView(APIView):
             'fcm_response': fcm_response
         })
 
-class NotificationListView(generics.ListAPIView):
+# Keyset pagination over (sent_at, id) so deep pages cost the same as the first
+class NotificationCursorPagination(CursorPagination):
+    ordering = ('-sent_at', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+class NotificationListView(SparseFieldsViewMixin, ReadPlanListMixin, generics.ListAPIView):
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = NotificationCursorPagination
+    read_plan = notification_read_plan
     
     def get_queryset(self):
-        return Notification.objects.filter(
-            user=self.request.user
-        ).order_by('-sent_at')
+        queryset = Notification.objects.filter(user=self.request.user)
+        
+        # ?since=<notification id> returns only items newer than the client's latest
+        since = self.request.query_params.get('since')
+        if since and since.isdigit():
+            queryset = queryset.filter(id__gt=int(since))
+        return queryset
+
+# Badge count: one primary-key row read
+class UnreadCountView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request):
+        return Response({'unread_count': NotificationCounter.unread_for(request.user.id)})
 
 class MarkNotificationReadView(APIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -225,13 +164,16 @@ class MarkAllNotificationsReadView(APIView):
     
     def post(self, request):
         """Mark all notifications as read"""
-        updated = Notification.objects.filter(
-            user=request.user,
-            is_read=False
-        ).update(
-            is_read=True,
-            read_at=timezone.now()
-        )
+        # Take off only what was marked, so notifications arriving meanwhile keep their count
+        with transaction.atomic():
+            updated = Notification.objects.filter(
+                user=request.user,
+                is_read=False
+            ).update(
+                is_read=True,
+                read_at=timezone.now()
+            )
+            NotificationCounter.adjust([request.user.id], -updated)
         
         return Response({
             'success': True,
@@ -245,43 +187,27 @@ def send_business_notification(business, title, message, notification_type='syst
     User = get_user_model()
     
     # Get all users associated with this business
-    users = User.objects.filter(business=business)
+    user_ids = list(User.objects.filter(business=business).values_list('id', flat=True))
     
-    all_tokens = []
-    notifications_created = 0
+    # Store one notification per user in a single insert
+    notifications_created = len(Notification.objects.create_for_users(
+        user_ids,
+        title=title,
+        message=message,
+        notification_type=notification_type,
+        data=data or {}
+    ))
     
-    for user in users:
-        # Get user's active device tokens
-        device_tokens = DeviceToken.objects.filter(
-            user=user,
-            is_active=True
-        ).values_list('token', flat=True)
-        
-        if device_tokens:
-            all_tokens.extend(device_tokens)
-        
-        # Store notification in database
-        Notification.objects.create(
-            user=user,
-            title=title,
-            message=message,
-            notification_type=notification_type,
-            data=data or {}
-        )
-        notifications_created += 1
-    
-    # Send push notification to all tokens at once (more efficient)
-    if all_tokens:
-        send_push_notification(
-            all_tokens,
-            title,
-            message,
-            {**(data or {}), 'type': notification_type},
-            notification_type
-        )
+    # Push goes through the coalescer so bursts collapse into one alert per type
+    push_coalescer.submit(
+        business.id,
+        title,
+        message,
+        {**(data or {}), 'type': notification_type},
+        notification_type
+    )
     
     return {
-        'tokens_sent': len(all_tokens),
         'notifications_created': notifications_created
     }
 
@@ -294,9 +220,8 @@ class TestNotificationView(APIView):
         user = request.user
         
         # Get user's active device tokens
-        device_tokens = DeviceToken.objects.filter(
-            user=user,
-            is_active=True
+        device_tokens = DeviceToken.objects.deliverable().filter(
+            user=user
         ).values_list('token', flat=True)
         
         if not device_tokens:
@@ -315,8 +240,8 @@ class TestNotificationView(APIView):
         )
         
         # Store test notification
-        Notification.objects.create(
-            user=user,
+        Notification.objects.create_for_users(
+            [user.id],
             title='Test Notification',
             message='This is a test notification from Imanage AI.',
             notification_type='system',
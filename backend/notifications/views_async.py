@@ -0,0 +1,8 @@
+from imanage.async_api import async_api_view, json_response, run_db
+from .models import NotificationCounter
+
+# Unread badge count, polled by the apps
+@async_api_view
+async def unread_count(request):
+    count = await run_db(NotificationCounter.unread_for, request.user.id)
+    return json_response({'unread_count': count})
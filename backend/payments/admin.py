@@ -1,3 +1,18 @@
 from django.contrib import admin
+from .models import ProviderCallback, ReconciliationException, StatementImport
 
-# Register your models here.
+@admin.register(ProviderCallback)
+class ProviderCallbackAdmin(admin.ModelAdmin):
+    list_display = ('transaction_id', 'payment_method', 'status', 'payment', 'received_at', 'processed_at')
+    list_filter = ('status',)
+    search_fields = ('transaction_id',)
+
+@admin.register(StatementImport)
+class StatementImportAdmin(admin.ModelAdmin):
+    list_display = ('filename', 'business', 'payment_method', 'lines_count', 'matched_count', 'exceptions_count',
+                    'duration_ms', 'created_at')
+
+@admin.register(ReconciliationException)
+class ReconciliationExceptionAdmin(admin.ModelAdmin):
+    list_display = ('statement', 'kind', 'payment', 'sale', 'amount', 'detail')
+    list_filter = ('kind',)
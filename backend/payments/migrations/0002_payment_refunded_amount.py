@@ -0,0 +1,18 @@
+# Generated by Django 5.2.10 on 2026-10-19 07:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='refunded_amount',
+            field=models.DecimalField(decimal_places=2, default=0.0, max_digits=12),
+        ),
+    ]
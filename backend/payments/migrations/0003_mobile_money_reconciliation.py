@@ -0,0 +1,149 @@
+# Generated by Django 5.2.10 on 2026-10-19 07:13
+
+import django.db.models.deletion
+import django.utils.timezone
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('business', '0001_initial'),
+        ('payments', '0002_payment_refunded_amount'),
+        ('sales', '0003_refunds'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProviderCallback',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('transaction_id', models.CharField(blank=True, max_length=100)),
+                ('payload', models.JSONField()),
+                ('status', models.CharField(choices=[('received', 'Received'), ('processed', 'Processed'), ('unmatched', 'Unmatched'), ('invalid', 'Invalid')], default='received', max_length=20)),
+                ('error', models.TextField(blank=True)),
+                ('received_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-received_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ReconciliationException',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('unmatched_line', 'Money received with no payment recorded'), ('amount_mismatch', 'Statement and payment amounts differ'), ('duplicate_line', 'Transaction listed more than once'), ('unreadable_line', 'Statement line could not be read'), ('missing_from_statement', 'Completed payment not on the statement'), ('sale_short', 'Sale paid less than its total')], max_length=30)),
+                ('amount', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('detail', models.CharField(blank=True, max_length=255)),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='StatementImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('filename', models.CharField(blank=True, max_length=255)),
+                ('period_start', models.DateTimeField(blank=True, null=True)),
+                ('period_end', models.DateTimeField(blank=True, null=True)),
+                ('lines_count', models.IntegerField(default=0)),
+                ('matched_count', models.IntegerField(default=0)),
+                ('exceptions_count', models.IntegerField(default=0)),
+                ('statement_total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('matched_total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('summary', models.JSONField(default=dict)),
+                ('duration_ms', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='StatementLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('row_number', models.IntegerField()),
+                ('transaction_id', models.CharField(blank=True, max_length=100)),
+                ('occurred_at', models.DateTimeField(blank=True, null=True)),
+                ('amount', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('phone', models.CharField(blank=True, max_length=20)),
+                ('match_status', models.CharField(choices=[('matched', 'Matched by transaction ID'), ('matched_fuzzy', 'Matched by phone, amount and time'), ('amount_mismatch', 'Amount differs from the payment'), ('duplicate', 'Duplicate line'), ('unmatched', 'No payment found'), ('unreadable', 'Could not be read')], max_length=20)),
+            ],
+            options={
+                'ordering': ['row_number'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['payment_method', 'created_at'], name='payment_method_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(condition=models.Q(('provider_transaction_id', ''), _negated=True), fields=['business', 'provider_transaction_id'], name='payment_provider_txn_idx'),
+        ),
+        migrations.AddField(
+            model_name='providercallback',
+            name='payment',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='payments.payment'),
+        ),
+        migrations.AddField(
+            model_name='providercallback',
+            name='payment_method',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='callbacks', to='payments.paymentmethod'),
+        ),
+        migrations.AddField(
+            model_name='reconciliationexception',
+            name='payment',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='payments.payment'),
+        ),
+        migrations.AddField(
+            model_name='reconciliationexception',
+            name='sale',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='sales.sale'),
+        ),
+        migrations.AddField(
+            model_name='statementimport',
+            name='business',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='business.business'),
+        ),
+        migrations.AddField(
+            model_name='statementimport',
+            name='payment_method',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='statements', to='payments.paymentmethod'),
+        ),
+        migrations.AddField(
+            model_name='statementimport',
+            name='uploaded_by',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='reconciliationexception',
+            name='statement',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exceptions', to='payments.statementimport'),
+        ),
+        migrations.AddField(
+            model_name='statementline',
+            name='payment',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='payments.payment'),
+        ),
+        migrations.AddField(
+            model_name='statementline',
+            name='statement',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='payments.statementimport'),
+        ),
+        migrations.AddField(
+            model_name='reconciliationexception',
+            name='line',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='payments.statementline'),
+        ),
+        migrations.AddConstraint(
+            model_name='providercallback',
+            constraint=models.UniqueConstraint(condition=models.Q(('transaction_id', ''), _negated=True), fields=('payment_method', 'transaction_id'), name='callback_unique_txn'),
+        ),
+    ]
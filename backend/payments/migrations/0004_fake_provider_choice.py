@@ -0,0 +1,18 @@
+# Generated by Django 5.2.10 on 2026-10-19 08:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0003_mobile_money_reconciliation'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='paymentmethod',
+            name='provider',
+            field=models.CharField(blank=True, choices=[('mpesa', 'M-Pesa'), ('airtel_money', 'Airtel Money'), ('mtn_momo', 'MTN MoMo'), ('orange_money', 'Orange Money'), ('fake', 'Fake (development)')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,97 @@
+# Provider callbacks: receive_callback() stores the raw payload and queues a job in one
+# short transaction, so the provider gets its acknowledgement at once. The job parses
+# the payload and settles the matching payment.
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import DecimalField, OuterRef, Subquery, Sum
+from django.utils import timezone
+from .models import Payment, ProviderCallback
+from .providers import get_provider, phone_key
+
+def match_window():
+    return timedelta(minutes=settings.MOBILE_MONEY_CONFIG['match_window_minutes'])
+
+def receive_callback(method, provider, payload):
+    """Store and queue a callback; returns None for a retry of one already received"""
+    from .tasks import process_callback_job
+    try:
+        with transaction.atomic():
+            callback = ProviderCallback.objects.create(
+                payment_method=method,
+                transaction_id=provider.transaction_id(payload)[:100],
+                payload=payload,
+            )
+            process_callback_job.enqueue(callback_id=callback.id)
+    except IntegrityError:
+        return None
+    return callback
+
+def find_payment(method, txn):
+    """The payment a callback is about: its provider ID, else the closest pending payment
+    from the same phone for the same amount within the match window"""
+    payments = Payment.objects.select_for_update().filter(business_id=method.business_id)
+    if txn['transaction_id']:
+        payment = payments.filter(provider_transaction_id=txn['transaction_id']).first()
+        if payment:
+            return payment
+    if txn['amount'] is None or txn['occurred_at'] is None:
+        return None
+    
+    window = match_window()
+    candidates = payments.filter(
+        payment_method=method,
+        status='pending',
+        provider_transaction_id='',
+        amount=txn['amount'],
+        created_at__range=(txn['occurred_at'] - window, txn['occurred_at'] + window),
+    )
+    key = phone_key(txn['phone'])
+    candidates = [payment for payment in candidates if phone_key(payment.customer_phone) == key]
+    return min(candidates, key=lambda payment: abs(payment.created_at - txn['occurred_at']), default=None)
+
+def settle_sales(sale_ids):
+    """Mark sales paid once their completed payments cover what they still owe"""
+    from sales.models import NET_AMOUNT, Sale
+    paid = Payment.objects.filter(sale=OuterRef('pk'), status='completed').order_by().values('sale').annotate(
+        total=Sum('amount')
+    ).values('total')
+    return Sale.objects.filter(id__in=list(sale_ids)).exclude(payment_status='paid').annotate(
+        paid=Subquery(paid, output_field=DecimalField())
+    ).filter(paid__gte=NET_AMOUNT).update(payment_status='paid')
+
+def process_callback(callback_id):
+    """Parse one stored callback and apply it to its payment"""
+    callback = ProviderCallback.objects.select_related('payment_method__business').get(pk=callback_id)
+    if callback.status != 'received':
+        return callback.status  # Already handled by an earlier attempt
+    method = callback.payment_method
+    now = timezone.now()
+    try:
+        txn = get_provider(method.provider).parse_callback(callback.payload, method.business.tzinfo)
+    except (KeyError, TypeError, ValueError, AttributeError) as e:
+        callback.status, callback.error, callback.processed_at = 'invalid', repr(e)[:1000], now
+        callback.save(update_fields=['status', 'error', 'processed_at'])
+        return callback.status
+    
+    with transaction.atomic():
+        payment = find_payment(method, txn)
+        if payment is None:
+            callback.status = 'unmatched'  # Left for statement reconciliation to explain
+        else:
+            if txn['succeeded'] and payment.status in ('pending', 'failed'):
+                payment.status = 'completed'
+                payment.completed_at = txn['occurred_at'] or now
+            elif not txn['succeeded'] and payment.status == 'pending':
+                payment.status = 'failed'
+            if txn['succeeded'] and txn['transaction_id']:
+                payment.provider_transaction_id = txn['transaction_id']
+            if not payment.customer_phone:
+                payment.customer_phone = txn['phone'][:20]
+            payment.save(update_fields=['status', 'completed_at', 'provider_transaction_id', 'customer_phone'])
+            if payment.status == 'completed':
+                settle_sales([payment.sale_id])
+            callback.payment, callback.status = payment, 'processed'
+        callback.processed_at = now
+        callback.save(update_fields=['status', 'payment', 'processed_at'])
+    return callback.status
@@ -1,5 +1,7 @@
 
-from django.db import models
+from decimal import Decimal
+from django.db import models, transaction
+from django.db.models import Q
 from django.utils import timezone
 
 # Payment methods supported
@@ -16,6 +18,7 @@ class PaymentMethod(models.Model):
         ('airtel_money', 'Airtel Money'),
         ('mtn_momo', 'MTN MoMo'),
         ('orange_money', 'Orange Money'),
+        ('fake', 'Fake (development)'),  # Only usable with MOBILE_MONEY_CONFIG['enable_fake_provider']
     )
     
     business = models.ForeignKey('business.Business', on_delete=models.CASCADE)
@@ -50,8 +53,9 @@ class Payment(models.Model):
     
     # Payment details
     amount = models.DecimalField(max_digits=12, decimal_places=2)
-    transaction_fee = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+    transaction_fee = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))  # Decimal: save() subtracts it
     net_amount = models.DecimalField(max_digits=12, decimal_places=2)  # amount - fee
+    refunded_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)  # Status 'refunded' once all of it
     
     # Mobile money transaction IDs
     provider_transaction_id = models.CharField(max_length=100, blank=True)  # From M-Pesa etc.
@@ -67,6 +71,12 @@ class Payment(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Reconciliation loads a method's payments by time, and callbacks look up provider IDs
+            models.Index(fields=['payment_method', 'created_at'], name='payment_method_time_idx'),
+            models.Index(fields=['business', 'provider_transaction_id'], name='payment_provider_txn_idx',
+                         condition=~Q(provider_transaction_id='')),
+        ]
     
     def __str__(self):
         return f"Payment {self.id} - {self.amount}"
@@ -107,4 +117,120 @@ class Expense(models.Model):
         ordering = ['-created_at']
     
     def __str__(self):
-        return f"{self.get_category_display()} - {self.amount}"
\ No newline at end of file
+        return f"{self.get_category_display()} - {self.amount}"
+    
+    # Keep the category-day expense aggregates in step with every save and delete
+    def save(self, *args, **kwargs):
+        from analytics.expenses import expense_changed
+        with transaction.atomic():
+            previous = None
+            if self.pk:
+                previous = Expense.objects.select_for_update(of=('self',)).select_related('business').filter(pk=self.pk).first()
+            super().save(*args, **kwargs)
+            expense_changed(previous, self)
+    
+    def delete(self, *args, **kwargs):
+        from analytics.expenses import expense_changed
+        with transaction.atomic():
+            previous = Expense.objects.select_for_update(of=('self',)).select_related('business').filter(pk=self.pk).first()
+            result = super().delete(*args, **kwargs)
+            expense_changed(previous, None)
+        return result
+
+# Raw provider callback, stored before it is processed so an acknowledged callback is never lost
+class ProviderCallback(models.Model):
+    STATUS_CHOICES = (
+        ('received', 'Received'),
+        ('processed', 'Processed'),
+        ('unmatched', 'Unmatched'),
+        ('invalid', 'Invalid'),
+    )
+    
+    payment_method = models.ForeignKey(PaymentMethod, on_delete=models.CASCADE, related_name='callbacks')
+    transaction_id = models.CharField(max_length=100, blank=True)  # Provider retries share it
+    payload = models.JSONField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='received')
+    payment = models.ForeignKey(Payment, on_delete=models.SET_NULL, null=True, blank=True)
+    error = models.TextField(blank=True)
+    received_at = models.DateTimeField(default=timezone.now)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-received_at']
+        constraints = [
+            models.UniqueConstraint(fields=['payment_method', 'transaction_id'], condition=~Q(transaction_id=''),
+                                    name='callback_unique_txn'),
+        ]
+    
+    def __str__(self):
+        return f"{self.payment_method.provider} callback {self.transaction_id or self.id} ({self.status})"
+
+# One provider statement file matched against recorded payments
+class StatementImport(models.Model):
+    business = models.ForeignKey('business.Business', on_delete=models.CASCADE)
+    payment_method = models.ForeignKey(PaymentMethod, on_delete=models.CASCADE, related_name='statements')
+    filename = models.CharField(max_length=255, blank=True)
+    uploaded_by = models.ForeignKey('accounts.User', on_delete=models.SET_NULL, null=True)
+    
+    # Results
+    period_start = models.DateTimeField(null=True, blank=True)  # First and last statement line
+    period_end = models.DateTimeField(null=True, blank=True)
+    lines_count = models.IntegerField(default=0)
+    matched_count = models.IntegerField(default=0)
+    exceptions_count = models.IntegerField(default=0)
+    statement_total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    matched_total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    summary = models.JSONField(default=dict)  # Counts by match status and exception kind
+    duration_ms = models.IntegerField(default=0)
+    
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"Statement {self.filename or self.id} - {self.lines_count} lines"
+
+class StatementLine(models.Model):
+    MATCH_STATUS = (
+        ('matched', 'Matched by transaction ID'),
+        ('matched_fuzzy', 'Matched by phone, amount and time'),
+        ('amount_mismatch', 'Amount differs from the payment'),
+        ('duplicate', 'Duplicate line'),
+        ('unmatched', 'No payment found'),
+        ('unreadable', 'Could not be read'),
+    )
+    
+    statement = models.ForeignKey(StatementImport, on_delete=models.CASCADE, related_name='lines')
+    row_number = models.IntegerField()
+    transaction_id = models.CharField(max_length=100, blank=True)
+    occurred_at = models.DateTimeField(null=True, blank=True)
+    amount = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    phone = models.CharField(max_length=20, blank=True)
+    match_status = models.CharField(max_length=20, choices=MATCH_STATUS)
+    payment = models.ForeignKey(Payment, on_delete=models.SET_NULL, null=True, blank=True)
+    
+    class Meta:
+        ordering = ['row_number']
+
+# Anything a reconciliation could not square, from either side
+class ReconciliationException(models.Model):
+    KINDS = (
+        ('unmatched_line', 'Money received with no payment recorded'),
+        ('amount_mismatch', 'Statement and payment amounts differ'),
+        ('duplicate_line', 'Transaction listed more than once'),
+        ('unreadable_line', 'Statement line could not be read'),
+        ('missing_from_statement', 'Completed payment not on the statement'),
+        ('sale_short', 'Sale paid less than its total'),
+    )
+    
+    statement = models.ForeignKey(StatementImport, on_delete=models.CASCADE, related_name='exceptions')
+    kind = models.CharField(max_length=30, choices=KINDS)
+    line = models.ForeignKey(StatementLine, on_delete=models.CASCADE, null=True, blank=True)
+    payment = models.ForeignKey(Payment, on_delete=models.SET_NULL, null=True, blank=True)
+    sale = models.ForeignKey('sales.Sale', on_delete=models.SET_NULL, null=True, blank=True)
+    amount = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    detail = models.CharField(max_length=255, blank=True)
+    
+    class Meta:
+        ordering = ['id']
@@ -0,0 +1,169 @@
+# Mobile-money provider adapters. Each one turns its provider's callback payloads and
+# statement exports into the same transaction dicts:
+#   {'transaction_id', 'amount', 'phone', 'occurred_at', 'succeeded', 'reference'}
+# so ingestion and reconciliation never deal with provider formats. FakeProvider is a
+# local stand-in used by the tests and in development.
+import csv
+import io
+import re
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from django.conf import settings
+from django.core import signing
+from django.utils import timezone
+
+# Signs payment method IDs into callback URLs; providers cannot send our auth headers
+CALLBACK_SIGNER = signing.Signer(salt='payments.mobile-money-callback')
+
+def callback_token(method):
+    return CALLBACK_SIGNER.sign(str(method.id))
+
+def phone_key(phone):
+    """Last 9 digits, so 0712..., 254712... and +254 712... compare equal"""
+    return re.sub(r'\D', '', str(phone or ''))[-9:]
+
+def parse_amount(value):
+    try:
+        return Decimal(str(value).replace(',', '').strip()).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        return None
+
+def parse_time(value, tzinfo, formats):
+    """Provider times are business-local wall clock"""
+    value = str(value).strip()
+    for fmt in formats:
+        try:
+            return timezone.make_aware(datetime.strptime(value, fmt), tzinfo)
+        except ValueError:
+            continue
+    raise ValueError(f'Unrecognised time {value!r}')
+
+def _transaction(transaction_id, amount, phone, occurred_at, succeeded=True, reference=''):
+    return {
+        'transaction_id': str(transaction_id or '').strip(),
+        'amount': amount,
+        'phone': str(phone or '').strip(),
+        'occurred_at': occurred_at,
+        'succeeded': succeeded,
+        'reference': str(reference or '').strip(),
+    }
+
+def _read_table(text, first_column):
+    """CSV rows as dicts from the header row starting with first_column (exports put a preamble first)"""
+    lines = text.splitlines()
+    for start, line in enumerate(lines):
+        if line.lstrip('\ufeff"').lower().startswith(first_column.lower()):
+            break
+    else:
+        raise ValueError(f'No "{first_column}" header row found')
+    reader = csv.DictReader(io.StringIO('\n'.join(lines[start:])))
+    reader.fieldnames = [(name or '').strip().lower() for name in reader.fieldnames]
+    for row_number, row in enumerate(reader, start=start + 2):
+        yield row_number, row
+
+class MpesaProvider:
+    """Safaricom M-Pesa: STK push and C2B callbacks, org portal statement CSV"""
+    name = 'mpesa'
+    ack = {'ResultCode': 0, 'ResultDesc': 'Accepted'}
+    TIME_FORMATS = ['%Y%m%d%H%M%S', '%Y-%m-%d %H:%M:%S', '%d-%m-%Y %H:%M:%S', '%d/%m/%Y %H:%M:%S']
+    
+    def transaction_id(self, payload):
+        """Just the ID, read without validating the rest, for deduplicating retries on receipt"""
+        try:
+            if 'TransID' in payload:
+                return str(payload['TransID'])
+            callback = payload['Body']['stkCallback']
+            items = {item.get('Name'): item.get('Value') for item in callback.get('CallbackMetadata', {}).get('Item', [])}
+            return str(items.get('MpesaReceiptNumber') or callback.get('CheckoutRequestID') or '')
+        except (KeyError, TypeError, AttributeError):
+            return ''
+    
+    def parse_callback(self, payload, tzinfo):
+        if 'TransID' in payload:  # C2B confirmation
+            return _transaction(
+                payload['TransID'], parse_amount(payload['TransAmount']), payload.get('MSISDN'),
+                parse_time(payload['TransTime'], tzinfo, self.TIME_FORMATS), reference=payload.get('BillRefNumber')
+            )
+        callback = payload['Body']['stkCallback']
+        items = {item.get('Name'): item.get('Value') for item in callback.get('CallbackMetadata', {}).get('Item', [])}
+        succeeded = int(callback['ResultCode']) == 0
+        return _transaction(
+            items.get('MpesaReceiptNumber') or callback.get('CheckoutRequestID'),
+            parse_amount(items['Amount']) if 'Amount' in items else None,
+            items.get('PhoneNumber'),
+            parse_time(items['TransactionDate'], tzinfo, self.TIME_FORMATS) if 'TransactionDate' in items else None,
+            succeeded=succeeded,
+        )
+    
+    def parse_statement(self, text, tzinfo):
+        """Yields (row number, transaction or None, error) for every money-in line"""
+        for row_number, row in _read_table(text, 'Receipt No'):
+            status = (row.get('transaction status') or 'completed').strip().lower()
+            paid_in = (row.get('paid in') or '').strip()
+            if status != 'completed' or not paid_in:
+                continue  # Withdrawals, charges and failed attempts are not customer payments
+            try:
+                amount = parse_amount(paid_in)
+                if amount is None:
+                    raise ValueError(f'Bad amount {paid_in!r}')
+                other_party = (row.get('other party info') or '').split(' - ')[0]
+                yield row_number, _transaction(
+                    row.get('receipt no.') or row.get('receipt no'), amount, other_party,
+                    parse_time(row.get('completion time', ''), tzinfo, self.TIME_FORMATS),
+                    reference=row.get('a/c no.'),
+                ), None
+            except ValueError as e:
+                yield row_number, None, str(e)
+
+class FakeProvider:
+    """Local provider with flat JSON callbacks and a plain CSV statement"""
+    name = 'fake'
+    ack = {'status': 'accepted'}
+    STATEMENT_COLUMNS = ['transaction_id', 'time', 'amount', 'phone', 'reference']
+    TIME_FORMATS = ['%Y-%m-%d %H:%M:%S']
+    
+    def transaction_id(self, payload):
+        return str(payload.get('transaction_id', '')) if isinstance(payload, dict) else ''
+    
+    def parse_callback(self, payload, tzinfo):
+        return _transaction(
+            payload['transaction_id'], parse_amount(payload['amount']), payload.get('phone'),
+            parse_time(payload['time'], tzinfo, self.TIME_FORMATS),
+            succeeded=payload.get('status', 'success') == 'success', reference=payload.get('reference'),
+        )
+    
+    def parse_statement(self, text, tzinfo):
+        for row_number, row in _read_table(text, 'transaction_id'):
+            try:
+                amount = parse_amount(row.get('amount', ''))
+                if amount is None:
+                    raise ValueError(f"Bad amount {row.get('amount')!r}")
+                yield row_number, _transaction(
+                    row.get('transaction_id'), amount, row.get('phone'),
+                    parse_time(row.get('time', ''), tzinfo, self.TIME_FORMATS), reference=row.get('reference'),
+                ), None
+            except ValueError as e:
+                yield row_number, None, str(e)
+    
+    # Builders for tests and local development
+    
+    def callback(self, transaction_id, amount, phone, time, status='success', reference=''):
+        return {'transaction_id': transaction_id, 'amount': str(amount), 'phone': phone,
+                'time': time.strftime(self.TIME_FORMATS[0]), 'status': status, 'reference': reference}
+    
+    def statement(self, rows):
+        """CSV text for (transaction_id, local time, amount, phone) rows"""
+        out = io.StringIO()
+        writer = csv.writer(out)
+        writer.writerow(self.STATEMENT_COLUMNS)
+        for transaction_id, time, amount, phone in rows:
+            writer.writerow([transaction_id, time.strftime(self.TIME_FORMATS[0]), amount, phone, ''])
+        return out.getvalue()
+
+PROVIDERS = {provider.name: provider for provider in (MpesaProvider(), FakeProvider())}
+
+def get_provider(name):
+    """Adapter for a PaymentMethod.provider; raises KeyError for providers without one"""
+    if name == 'fake' and not settings.MOBILE_MONEY_CONFIG['enable_fake_provider']:
+        raise KeyError(name)
+    return PROVIDERS[name]
@@ -0,0 +1,192 @@
+# Statement reconciliation: a provider statement file is matched against the payment
+# method's recorded payments in two hash-join passes held in memory, first on provider
+# transaction ID, then on (phone, amount) with the nearest payment inside the match
+# window. Payments come in with one indexed range scan (payment_method, created_at) plus
+# chunked lookups on the provider ID index, and results go out with bulk writes, so a
+# statement costs a handful of queries however many lines it has.
+import time
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from sales.models import NET_AMOUNT, Sale
+from .mobile_money import match_window, settle_sales
+from .models import Payment, ReconciliationException, StatementImport, StatementLine
+from .providers import get_provider, phone_key
+
+BATCH_SIZE = 1000
+PAYMENT_FIELDS = ['id', 'sale_id', 'amount', 'status', 'provider_transaction_id', 'customer_phone', 'created_at',
+                  'completed_at']
+
+def _chunks(values, size=BATCH_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+def _load_payments(business, method, start, end, transaction_ids):
+    """The method's payments around the statement period, plus any others the statement's IDs name"""
+    window = match_window()
+    payments = {
+        payment['id']: payment
+        for payment in Payment.objects.filter(
+            payment_method=method, created_at__range=(start - window, end + window)
+        ).order_by().values(*PAYMENT_FIELDS)
+    }
+    known = {payment['provider_transaction_id'] for payment in payments.values()}
+    for chunk in _chunks(sorted(transaction_ids - known)):
+        named = Payment.objects.filter(business=business, provider_transaction_id__in=chunk)
+        for payment in named.order_by().values(*PAYMENT_FIELDS):
+            payments[payment['id']] = payment
+    return payments
+
+def _nearest(bucket, occurred_at, window):
+    """Pop the payment in bucket closest in time to occurred_at, if one is inside the window"""
+    best = min(range(len(bucket)), key=lambda i: abs(bucket[i]['created_at'] - occurred_at), default=None)
+    if best is None or abs(bucket[best]['created_at'] - occurred_at) > window:
+        return None
+    return bucket.pop(best)
+
+def _short_sales(sale_ids):
+    """Completed sales among sale_ids whose completed payments fall short of what they owe"""
+    paid = Payment.objects.filter(sale=OuterRef('pk'), status='completed').order_by().values('sale').annotate(
+        total=Sum('amount')
+    ).values('total')
+    short = []
+    for chunk in _chunks(sorted(sale_ids)):
+        short += Sale.objects.filter(id__in=chunk, status='completed').annotate(
+            due=NET_AMOUNT,
+            paid=Coalesce(Subquery(paid), Value(Decimal('0.00')), output_field=DecimalField()),
+        ).filter(paid__lt=NET_AMOUNT).order_by().values('id', 'due', 'paid')
+    return short
+
+def reconcile_statement(business, method, text, filename='', user=None):
+    """Import a statement for a mobile-money payment method and match it; returns the StatementImport
+    
+    Raises ValueError for a file the method's provider cannot read.
+    """
+    started = time.monotonic()
+    try:
+        provider = get_provider(method.provider)
+    except KeyError:
+        raise ValueError(f'No statement format for provider {method.provider!r}')
+    rows = list(provider.parse_statement(text, business.tzinfo))
+    times = [txn['occurred_at'] for _, txn, _ in rows if txn]
+    if not times:
+        raise ValueError('Statement has no readable payment lines')
+    window = match_window()
+    start, end = min(times), max(times)
+    
+    with transaction.atomic():
+        statement = StatementImport.objects.create(
+            business=business, payment_method=method, filename=filename[:255], uploaded_by=user,
+            period_start=start, period_end=end,
+        )
+        transaction_ids = {txn['transaction_id'] for _, txn, _ in rows if txn and txn['transaction_id']}
+        payments = _load_payments(business, method, start, end, transaction_ids)
+        by_transaction_id = {
+            payment['provider_transaction_id']: payment
+            for payment in payments.values() if payment['provider_transaction_id']
+        }
+        
+        # Pass 1: join on transaction ID
+        lines, problems, claimed, seen, fuzzy = [], [], {}, set(), []
+        for row_number, txn, error in rows:
+            line = StatementLine(statement=statement, row_number=row_number)
+            lines.append(line)
+            if txn is None:
+                line.match_status = 'unreadable'
+                problems.append((line, 'unreadable_line', None, error))
+                continue
+            line.transaction_id = txn['transaction_id'][:100]
+            line.occurred_at, line.amount, line.phone = txn['occurred_at'], txn['amount'], txn['phone'][:20]
+            if line.transaction_id and line.transaction_id in seen:
+                line.match_status = 'duplicate'
+                problems.append((line, 'duplicate_line', None, f'{line.transaction_id} already listed'))
+                continue
+            seen.add(line.transaction_id)
+            payment = by_transaction_id.get(line.transaction_id) if line.transaction_id else None
+            if payment is None:
+                fuzzy.append((line, txn))
+            elif payment['amount'] != txn['amount']:
+                line.match_status, line.payment_id = 'amount_mismatch', payment['id']
+                problems.append((line, 'amount_mismatch', payment, f"Payment recorded {payment['amount']}"))
+                claimed[payment['id']] = None
+            else:
+                line.match_status, line.payment_id = 'matched', payment['id']
+                claimed[payment['id']] = txn
+        
+        # Pass 2: join the rest on (phone, amount), nearest payment in time without a provider ID
+        buckets = {}
+        for payment in payments.values():
+            if payment['id'] in claimed or payment['provider_transaction_id']:
+                continue
+            if payment['status'] in ('pending', 'completed'):
+                buckets.setdefault((phone_key(payment['customer_phone']), payment['amount']), []).append(payment)
+        for line, txn in fuzzy:
+            bucket = buckets.get((phone_key(txn['phone']), txn['amount'])) if phone_key(txn['phone']) else None
+            payment = _nearest(bucket, txn['occurred_at'], window) if bucket else None
+            if payment is None:
+                line.match_status = 'unmatched'
+                problems.append((line, 'unmatched_line', None, ''))
+            else:
+                line.match_status, line.payment_id = 'matched_fuzzy', payment['id']
+                claimed[payment['id']] = txn
+        
+        # The statement is the provider's word: matched payments take its ID and are completed
+        updates = []
+        for payment_id, txn in claimed.items():
+            payment = payments[payment_id]
+            if txn is None or (payment['status'] == 'completed' and payment['provider_transaction_id']):
+                continue
+            updates.append(Payment(
+                id=payment_id,
+                provider_transaction_id=payment['provider_transaction_id'] or txn['transaction_id'][:100],
+                status='completed' if payment['status'] == 'pending' else payment['status'],
+                completed_at=payment['completed_at'] or txn['occurred_at'],
+            ))
+            payment['status'] = updates[-1].status
+        Payment.objects.bulk_update(updates, ['provider_transaction_id', 'status', 'completed_at'], batch_size=BATCH_SIZE)
+        settle_sales({payments[payment.id]['sale_id'] for payment in updates})
+        
+        # Payment side: completed in the period but not on the statement, and sales left short
+        in_period = [payment for payment in payments.values() if start <= payment['created_at'] <= end]
+        for payment in in_period:
+            if payment['status'] == 'completed' and payment['id'] not in claimed:
+                problems.append((None, 'missing_from_statement', payment, ''))
+        sale_problems = [
+            ReconciliationException(
+                statement=statement, kind='sale_short', sale_id=sale['id'], amount=sale['due'] - sale['paid'],
+                detail=f"Paid {sale['paid']} of {sale['due']}",
+            )
+            for sale in _short_sales({payment['sale_id'] for payment in in_period})
+        ]
+        
+        StatementLine.objects.bulk_create(lines, batch_size=BATCH_SIZE)
+        exceptions = [
+            ReconciliationException(
+                statement=statement, kind=kind, line=line, payment_id=payment['id'] if payment else None,
+                sale_id=payment['sale_id'] if payment else None,
+                amount=line.amount if line is not None else payment['amount'], detail=(detail or '')[:255],
+            )
+            for line, kind, payment, detail in problems
+        ] + sale_problems
+        ReconciliationException.objects.bulk_create(exceptions, batch_size=BATCH_SIZE)
+        
+        summary = {'lines': {}, 'exceptions': {}}
+        for line in lines:
+            summary['lines'][line.match_status] = summary['lines'].get(line.match_status, 0) + 1
+        for exception in exceptions:
+            summary['exceptions'][exception.kind] = summary['exceptions'].get(exception.kind, 0) + 1
+        matched = [line for line in lines if line.match_status in ('matched', 'matched_fuzzy')]
+        statement.lines_count = len(lines)
+        statement.matched_count = len(matched)
+        statement.exceptions_count = len(exceptions)
+        statement.statement_total = sum(
+            (line.amount for line in lines if line.amount is not None and line.match_status != 'duplicate'),
+            Decimal('0.00'),
+        )
+        statement.matched_total = sum((line.amount for line in matched), Decimal('0.00'))
+        statement.summary = summary
+        statement.duration_ms = int((time.monotonic() - started) * 1000)
+        statement.save()
+    return statement
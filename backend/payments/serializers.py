@@ -1,8 +1,11 @@
+from django.conf import settings
 from rest_framework import serializers
-from .models import PaymentMethod, Payment, Expense
+from imanage.fieldsets import SparseFieldsMixin
+from imanage.read_serializers import ReadPlan
+from .models import PaymentMethod, Payment, Expense, StatementImport, ReconciliationException
 
 # Payment method serializer
-class PaymentMethodSerializer(serializers.ModelSerializer):
+class PaymentMethodSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     method_type_display = serializers.CharField(source='get_method_type_display', read_only=True)
     provider_display = serializers.CharField(source='get_provider_display', read_only=True)
     
@@ -15,9 +18,14 @@ class PaymentMethodSerializer(serializers.ModelSerializer):
             'api_key': {'write_only': True},
             'api_secret': {'write_only': True}
         }
+    
+    def validate_provider(self, value):
+        if value == 'fake' and not settings.MOBILE_MONEY_CONFIG['enable_fake_provider']:
+            raise serializers.ValidationError('The fake provider is only available in development')
+        return value
 
 # Payment serializer
-class PaymentSerializer(serializers.ModelSerializer):
+class PaymentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     sale_receipt = serializers.CharField(source='sale.receipt_number', read_only=True)
     method_name = serializers.CharField(source='payment_method.name', read_only=True)
     status_display = serializers.CharField(source='get_status_display', read_only=True)
@@ -29,8 +37,11 @@ class PaymentSerializer(serializers.ModelSerializer):
                   'status', 'status_display', 'is_offline', 'created_at', 'completed_at']
         read_only_fields = ['net_amount', 'created_at', 'completed_at']
 
+# Precompiled read path for payment lists, same output as PaymentSerializer
+payment_read_plan = ReadPlan(PaymentSerializer)
+
 # Expense serializer
-class ExpenseSerializer(serializers.ModelSerializer):
+class ExpenseSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     category_display = serializers.CharField(source='get_category_display', read_only=True)
     paid_by_name = serializers.CharField(source='paid_by.get_full_name', read_only=True)
     
@@ -38,4 +49,28 @@ class ExpenseSerializer(serializers.ModelSerializer):
         model = Expense
         fields = ['id', 'category', 'category_display', 'description', 'amount', 'paid_by',
                   'paid_by_name', 'payment_method', 'receipt_number', 'receipt_image', 'created_at']
-        read_only_fields = ['created_at']
\ No newline at end of file
+        read_only_fields = ['created_at']
+# Statement import serializer (results only; files come in through the view)
+class StatementImportSerializer(serializers.ModelSerializer):
+    method_name = serializers.CharField(source='payment_method.name', read_only=True)
+    
+    class Meta:
+        model = StatementImport
+        fields = ['id', 'payment_method', 'method_name', 'filename', 'uploaded_by', 'period_start', 'period_end',
+                  'lines_count', 'matched_count', 'exceptions_count', 'statement_total', 'matched_total',
+                  'summary', 'duration_ms', 'created_at']
+        read_only_fields = fields
+
+# Reconciliation exception serializer
+class ReconciliationExceptionSerializer(serializers.ModelSerializer):
+    kind_display = serializers.CharField(source='get_kind_display', read_only=True)
+    row_number = serializers.IntegerField(source='line.row_number', read_only=True, default=None)
+    transaction_id = serializers.CharField(source='line.transaction_id', read_only=True, default='')
+    occurred_at = serializers.DateTimeField(source='line.occurred_at', read_only=True, default=None)
+    phone = serializers.CharField(source='line.phone', read_only=True, default='')
+    
+    class Meta:
+        model = ReconciliationException
+        fields = ['id', 'statement', 'kind', 'kind_display', 'row_number', 'transaction_id', 'occurred_at',
+                  'phone', 'payment', 'sale', 'amount', 'detail']
+        read_only_fields = fields
@@ -0,0 +1,9 @@
+from jobs.queue import task
+from .mobile_money import process_callback
+
+# Background jobs (see the jobs app)
+
+@task(priority=10, max_attempts=8)
+def process_callback_job(callback_id):
+    """Apply a stored provider callback; queued by the callback endpoint"""
+    process_callback(callback_id)
@@ -1,3 +1,193 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from accounts.models import User
+from business.models import Business
+from jobs.models import Job
+from jobs.queue import claim, run_job
+from sales.models import Sale
+from .models import Payment, PaymentMethod, ProviderCallback, ReconciliationException, StatementLine
+from .providers import PROVIDERS, callback_token
 
-# Create your tests here.
+FAKE = PROVIDERS['fake']
+
+@override_settings(MOBILE_MONEY_CONFIG={'match_window_minutes': 15, 'enable_fake_provider': True})
+class MobileMoneyTestCase(TestCase):
+    def setUp(self):
+        self.business = Business.objects.create(name='Shop')
+        self.tz = self.business.tzinfo
+        self.owner = User.objects.create_user('owner@example.com', 'password123', role='owner', business=self.business)
+        self.method = PaymentMethod.objects.create(business=self.business, name='Till', method_type='mobile_money',
+                                                   provider='fake')
+        self.now = timezone.now().replace(microsecond=0) - timedelta(hours=1)
+        self.client = APIClient()
+    
+    def local(self, when):
+        return timezone.localtime(when, self.tz)
+    
+    def payment(self, amount, phone='0712345678', minutes=0, status='pending', txn='', sale_total=None):
+        """A sale paid by one mobile-money payment created `minutes` after self.now"""
+        sale = Sale.objects.create(business=self.business, receipt_number=f'R{Sale.objects.count() + 1}',
+                                   total_amount=Decimal(sale_total or amount), payment_status='pending')
+        return Payment.objects.create(business=self.business, sale=sale, payment_method=self.method,
+                                      amount=Decimal(amount), customer_phone=phone, status=status,
+                                      provider_transaction_id=txn, created_at=self.now + timedelta(minutes=minutes))
+
+class CallbackTests(MobileMoneyTestCase):
+    def post(self, payload, token=None):
+        return self.client.post(f'/api/payments/mobile-money/callback/{token or callback_token(self.method)}/',
+                                payload, format='json')
+    
+    def run_jobs(self):
+        while True:
+            jobs = claim('w1', limit=10)
+            if not jobs:
+                return
+            for job in jobs:
+                run_job(job)
+    
+    def test_callback_is_acknowledged_then_settles_the_payment(self):
+        payment = self.payment('150.00')
+        response = self.post(FAKE.callback('QX1', '150.00', '254712345678', self.local(self.now + timedelta(minutes=1))))
+        self.assertEqual((response.status_code, response.json()), (200, FAKE.ack))
+        
+        # Nothing is matched until the queued job runs
+        self.assertEqual(Payment.objects.get(pk=payment.pk).status, 'pending')
+        self.assertEqual(Job.objects.get().task, 'payments.tasks.process_callback_job')
+        self.run_jobs()
+        
+        payment.refresh_from_db()
+        self.assertEqual((payment.status, payment.provider_transaction_id), ('completed', 'QX1'))
+        self.assertEqual(payment.completed_at, self.now + timedelta(minutes=1))
+        self.assertEqual(Sale.objects.get(pk=payment.sale_id).payment_status, 'paid')
+        self.assertEqual(ProviderCallback.objects.get().status, 'processed')
+    
+    def test_retried_callback_is_stored_once(self):
+        payload = FAKE.callback('QX1', '150.00', '0712345678', self.local(self.now))
+        self.assertEqual(self.post(payload).status_code, 200)
+        self.assertEqual(self.post(payload).status_code, 200)
+        self.assertEqual((ProviderCallback.objects.count(), Job.objects.count()), (1, 1))
+    
+    def test_nearest_pending_payment_wins_and_failures_fail(self):
+        far = self.payment('80.00', minutes=-10)
+        near = self.payment('80.00', minutes=2)
+        other_phone = self.payment('80.00', phone='0700000000', minutes=1)
+        self.post(FAKE.callback('QX2', '80.00', '+254 712 345 678', self.local(self.now + timedelta(minutes=1))))
+        self.post(FAKE.callback('QX3', '80.00', '0712345678', self.local(self.now - timedelta(minutes=9)),
+                                status='failed'))
+        self.run_jobs()
+        statuses = dict(Payment.objects.values_list('id', 'status'))
+        self.assertEqual((statuses[near.id], statuses[far.id], statuses[other_phone.id]),
+                         ('completed', 'failed', 'pending'))
+    
+    def test_unmatched_and_invalid_callbacks_are_kept(self):
+        self.post(FAKE.callback('QX4', '99.00', '0712345678', self.local(self.now)))
+        self.post({'transaction_id': 'QX5', 'amount': '10.00'})  # No time
+        self.run_jobs()
+        self.assertEqual(dict(ProviderCallback.objects.values_list('transaction_id', 'status')),
+                         {'QX4': 'unmatched', 'QX5': 'invalid'})
+    
+    def test_bad_tokens_are_rejected(self):
+        self.assertEqual(self.post({}, token='1:forged').status_code, 403)
+        with override_settings(MOBILE_MONEY_CONFIG={'match_window_minutes': 15, 'enable_fake_provider': False}):
+            self.assertEqual(self.post(FAKE.callback('QX6', '1.00', '', self.local(self.now))).status_code, 404)
+        self.assertFalse(ProviderCallback.objects.exists())
+    
+    def test_callback_url_is_owner_only(self):
+        cashier = User.objects.create_user('cashier@example.com', 'password123', role='cashier',
+                                           business=self.business)
+        self.client.force_authenticate(cashier)
+        self.assertEqual(self.client.get(f'/api/payments/methods/{self.method.id}/callback-url/').status_code, 403)
+        self.client.force_authenticate(self.owner)
+        url = self.client.get(f'/api/payments/methods/{self.method.id}/callback-url/').json()['callback_url']
+        self.assertTrue(url.endswith(f'/api/payments/mobile-money/callback/{callback_token(self.method)}/'))
+    
+    def test_fake_provider_is_a_labelled_choice_only_in_development(self):
+        self.method.full_clean()
+        self.assertEqual(self.method.get_provider_display(), 'Fake (development)')
+        self.client.force_authenticate(self.owner)
+        payload = {'name': 'Test till', 'method_type': 'mobile_money', 'provider': 'fake'}
+        self.assertEqual(self.client.post('/api/payments/methods/', payload, format='json').status_code, 201)
+        with override_settings(MOBILE_MONEY_CONFIG={'match_window_minutes': 15, 'enable_fake_provider': False}):
+            response = self.client.post('/api/payments/methods/', payload, format='json')
+        self.assertEqual((response.status_code, list(response.json())), (400, ['provider']))
+
+class ReconciliationTests(MobileMoneyTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.owner)
+    
+    def upload(self, rows):
+        return self.client.post('/api/payments/statements/', {
+            'payment_method': self.method.id, 'text': FAKE.statement(rows)
+        }, format='json')
+    
+    def test_statement_is_matched_and_exceptions_reported(self):
+        by_id = self.payment('100.00', txn='T1', status='completed')
+        by_phone = self.payment('50.00', phone='254711111111', minutes=20)
+        mismatch = self.payment('70.00', txn='T3', status='completed', minutes=30)
+        missing = self.payment('25.00', txn='T9', status='completed', minutes=40)
+        short = self.payment('30.00', phone='0722222222', minutes=50, sale_total='60.00')
+        at = lambda minutes: self.local(self.now + timedelta(minutes=minutes))
+        
+        with self.assertNumQueries(12):
+            response = self.upload([
+                ('T1', at(1), '100.00', '0712345678'),
+                ('T2', at(24), '50.00', '0711111111'),
+                ('T3', at(30), '75.00', '0712345678'),
+                ('T1', at(1), '100.00', '0712345678'),
+                ('T4', at(45), '12.00', '0733333333'),
+                ('T5', at(52), '30.00', '0722222222'),
+            ])
+        self.assertEqual(response.status_code, 201)
+        result = response.json()
+        self.assertEqual((result['lines_count'], result['matched_count'], result['statement_total']),
+                         (6, 3, '267.00'))
+        self.assertEqual(result['summary']['lines'],
+                         {'matched': 1, 'matched_fuzzy': 2, 'amount_mismatch': 1, 'duplicate': 1, 'unmatched': 1})
+        
+        exceptions = set(ReconciliationException.objects.values_list('kind', 'payment', 'sale'))
+        self.assertEqual(exceptions, {
+            ('duplicate_line', None, None),
+            ('amount_mismatch', mismatch.id, mismatch.sale_id),
+            ('unmatched_line', None, None),
+            ('missing_from_statement', missing.id, missing.sale_id),
+            ('sale_short', None, short.sale_id),
+        })
+        
+        # Fuzzy matches take the statement's transaction and settle their sale when it is covered
+        by_phone.refresh_from_db()
+        self.assertEqual((by_phone.status, by_phone.provider_transaction_id), ('completed', 'T2'))
+        self.assertEqual(Sale.objects.get(pk=by_phone.sale_id).payment_status, 'paid')
+        self.assertEqual(Sale.objects.get(pk=short.sale_id).payment_status, 'pending')
+        self.assertEqual(StatementLine.objects.get(transaction_id='T2', match_status='matched_fuzzy').payment_id,
+                         by_phone.id)
+        self.assertEqual(Payment.objects.get(pk=by_id.pk).provider_transaction_id, 'T1')
+        
+        report = self.client.get(f"/api/payments/statements/{result['id']}/exceptions/", {'kind': 'sale_short'})
+        self.assertEqual([row['sale'] for row in report.json()['results']], [short.sale_id])
+    
+    def test_transaction_ids_outside_the_period_still_match(self):
+        old = self.payment('40.00', txn='OLD', status='completed', minutes=-3000)
+        response = self.upload([('OLD', self.local(self.now), '40.00', '0712345678')])
+        self.assertEqual(response.json()['summary']['lines'], {'matched': 1})
+        self.assertEqual(StatementLine.objects.get().payment_id, old.id)
+    
+    def test_unreadable_statements_and_rows(self):
+        self.assertEqual(self.client.post('/api/payments/statements/', {
+            'payment_method': self.method.id, 'text': 'nothing,here\n1,2'
+        }, format='json').status_code, 400)
+        
+        text = FAKE.statement([('T1', self.local(self.now), '10.00', '0712345678')]) + 'T2,yesterday,5.00,0712,\n'
+        response = self.client.post('/api/payments/statements/', {'payment_method': self.method.id, 'text': text},
+                                    format='json')
+        self.assertEqual(response.json()['summary']['exceptions'], {'unmatched_line': 1, 'unreadable_line': 1})
+        self.assertEqual(ReconciliationException.objects.get(kind='unreadable_line').line.row_number, 3)
+    
+    def test_only_owners_and_managers_reconcile(self):
+        cashier = User.objects.create_user('cashier@example.com', 'password123', role='cashier',
+                                           business=self.business)
+        self.client.force_authenticate(cashier)
+        self.assertEqual(self.upload([('T1', self.local(self.now), '1.00', '0712345678')]).status_code, 403)
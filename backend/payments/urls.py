@@ -2,13 +2,15 @@ from django.urls import path
 from .views import (
     PaymentMethodListView, PaymentMethodDetailView,
     PaymentListView, ExpenseListView, ExpenseDetailView,
-    MobileMoneyPaymentView
+    MobileMoneyPaymentView, MobileMoneyCallbackView, MobileMoneyCallbackUrlView,
+    StatementImportListView, StatementImportDetailView, ReconciliationExceptionListView
 )
 
 urlpatterns = [
     # Payment methods
     path('methods/', PaymentMethodListView.as_view(), name='payment-method-list'),
     path('methods/<int:pk>/', PaymentMethodDetailView.as_view(), name='payment-method-detail'),
+    path('methods/<int:pk>/callback-url/', MobileMoneyCallbackUrlView.as_view(), name='payment-method-callback-url'),
     
     # Payments
     path('transactions/', PaymentListView.as_view(), name='payment-list'),
@@ -19,4 +21,10 @@ urlpatterns = [
     
     # Mobile money
     path('mobile-money/pay/', MobileMoneyPaymentView.as_view(), name='mobile-money-pay'),
+    path('mobile-money/callback/<str:token>/', MobileMoneyCallbackView.as_view(), name='mobile-money-callback'),
+    
+    # Statement reconciliation
+    path('statements/', StatementImportListView.as_view(), name='statement-list'),
+    path('statements/<int:pk>/', StatementImportDetailView.as_view(), name='statement-detail'),
+    path('statements/<int:pk>/exceptions/', ReconciliationExceptionListView.as_view(), name='statement-exceptions'),
 ]
\ No newline at end of file
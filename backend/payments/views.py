@@ -1,12 +1,26 @@
+from django.core import signing
+from django.urls import reverse
+from django.utils import timezone
 from rest_framework import generics, permissions
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.parsers import JSONParser, MultiPartParser
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from .models import PaymentMethod, Payment, Expense
-from .serializers import PaymentMethodSerializer, PaymentSerializer, ExpenseSerializer
+from .mobile_money import receive_callback
+from .models import PaymentMethod, Payment, Expense, ReconciliationException, StatementImport
+from .providers import CALLBACK_SIGNER, callback_token, get_provider
+from .reconciliation import reconcile_statement
+from .serializers import (
+    PaymentMethodSerializer, PaymentSerializer, ExpenseSerializer, payment_read_plan,
+    ReconciliationExceptionSerializer, StatementImportSerializer
+)
+from imanage.db_router import ReplicaReadMixin
+from imanage.fieldsets import SparseFieldsViewMixin
+from imanage.read_serializers import ReadPlanListMixin
 
 # Payment method views
-class PaymentMethodListView(generics.ListCreateAPIView):
+class PaymentMethodListView(SparseFieldsViewMixin, generics.ListCreateAPIView):
     serializer_class = PaymentMethodSerializer
     permission_classes = [permissions.IsAuthenticated]
     
@@ -16,7 +30,7 @@ class PaymentMethodListView(generics.ListCreateAPIView):
     def perform_create(self, serializer):
         serializer.save(business=self.request.user.business)
 
-class PaymentMethodDetailView(generics.RetrieveUpdateDestroyAPIView):
+class PaymentMethodDetailView(SparseFieldsViewMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = PaymentMethodSerializer
     permission_classes = [permissions.IsAuthenticated]
     
@@ -24,9 +38,10 @@ class PaymentMethodDetailView(generics.RetrieveUpdateDestroyAPIView):
         return PaymentMethod.objects.filter(business=self.request.user.business)
 
 # Payment views
-class PaymentListView(generics.ListCreateAPIView):
+class PaymentListView(ReplicaReadMixin, SparseFieldsViewMixin, ReadPlanListMixin, generics.ListCreateAPIView):
     serializer_class = PaymentSerializer
     permission_classes = [permissions.IsAuthenticated]
+    read_plan = payment_read_plan
     
     def get_queryset(self):
         return Payment.objects.filter(business=self.request.user.business)
@@ -35,7 +50,7 @@ class PaymentListView(generics.ListCreateAPIView):
         serializer.save(business=self.request.user.business)
 
 # Expense views
-class ExpenseListView(generics.ListCreateAPIView):
+class ExpenseListView(ReplicaReadMixin, SparseFieldsViewMixin, generics.ListCreateAPIView):
     serializer_class = ExpenseSerializer
     permission_classes = [permissions.IsAuthenticated]
     
@@ -45,7 +60,7 @@ class ExpenseListView(generics.ListCreateAPIView):
     def perform_create(self, serializer):
         serializer.save(business=self.request.user.business, paid_by=self.request.user)
 
-class ExpenseDetailView(generics.RetrieveUpdateDestroyAPIView):
+class ExpenseDetailView(SparseFieldsViewMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = ExpenseSerializer
     permission_classes = [permissions.IsAuthenticated]
     
@@ -80,4 +95,104 @@ class MobileMoneyPaymentView(APIView):
             'success': True,
             'message': 'Payment simulated successfully',
             'data': payment_data
-        })
\ No newline at end of file
+        })
+
+# Provider callbacks (M-Pesa etc.); the signed token in the URL identifies the payment method
+class MobileMoneyCallbackView(APIView):
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+    parser_classes = [JSONParser]
+    
+    def post(self, request, token):
+        """Store and queue the callback, then acknowledge at once; a job does the matching"""
+        try:
+            method_id = int(CALLBACK_SIGNER.unsign(token))
+        except (signing.BadSignature, ValueError):
+            return Response({'error': 'Invalid callback URL'}, status=status.HTTP_403_FORBIDDEN)
+        method = PaymentMethod.objects.filter(pk=method_id, method_type='mobile_money', is_active=True).first()
+        try:
+            provider = get_provider(method.provider) if method else None
+        except KeyError:
+            provider = None
+        if provider is None:
+            return Response({'error': 'Unknown payment method'}, status=status.HTTP_404_NOT_FOUND)
+        if not isinstance(request.data, dict):
+            return Response({'error': 'Expected a JSON object'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        receive_callback(method, provider, request.data)  # Retries of a stored callback are acknowledged too
+        return Response(provider.ack)
+
+# Callback URL to register with the provider (owner only: it authorizes callbacks for the method)
+class MobileMoneyCallbackUrlView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request, pk):
+        if request.user.role != 'owner':
+            return Response({'error': 'Only owners can view callback URLs'}, status=status.HTTP_403_FORBIDDEN)
+        method = PaymentMethod.objects.filter(pk=pk, business=request.user.business, method_type='mobile_money').first()
+        if method is None:
+            return Response({'error': 'Mobile money method not found'}, status=status.HTTP_404_NOT_FOUND)
+        path = reverse('mobile-money-callback', kwargs={'token': callback_token(method)})
+        return Response({'callback_url': request.build_absolute_uri(path)})
+
+class StatementPagination(PageNumberPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+# Provider statement imports: upload a statement file to reconcile it against payments
+class StatementImportListView(generics.ListCreateAPIView):
+    serializer_class = StatementImportSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    parser_classes = [MultiPartParser, JSONParser]
+    pagination_class = StatementPagination
+    
+    def get_queryset(self):
+        return StatementImport.objects.filter(business=self.request.user.business).select_related('payment_method')
+    
+    def create(self, request, *args, **kwargs):
+        """Reconcile an uploaded statement ('file', or 'text' in JSON) for 'payment_method'"""
+        if request.user.role not in ['owner', 'manager']:
+            return Response({'error': 'Only owners and managers can reconcile statements'},
+                          status=status.HTTP_403_FORBIDDEN)
+        
+        method = PaymentMethod.objects.filter(
+            pk=request.data.get('payment_method'), business=request.user.business, method_type='mobile_money'
+        ).first() if str(request.data.get('payment_method', '')).isdigit() else None
+        if method is None:
+            return Response({'error': 'payment_method must be one of your mobile money methods'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        
+        upload = request.FILES.get('file')
+        try:
+            text = upload.read().decode('utf-8-sig') if upload else request.data.get('text')
+            if not isinstance(text, str) or not text.strip():
+                raise ValueError('Upload a statement file or send its "text"')
+            statement = reconcile_statement(
+                request.user.business, method, text, filename=upload.name if upload else '', user=request.user
+            )
+        except (ValueError, UnicodeDecodeError) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(self.get_serializer(statement).data, status=status.HTTP_201_CREATED)
+
+class StatementImportDetailView(generics.RetrieveAPIView):
+    serializer_class = StatementImportSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get_queryset(self):
+        return StatementImport.objects.filter(business=self.request.user.business).select_related('payment_method')
+
+# Exceptions report for one statement; ?kind= narrows it to one kind
+class ReconciliationExceptionListView(generics.ListAPIView):
+    serializer_class = ReconciliationExceptionSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = StatementPagination
+    
+    def get_queryset(self):
+        exceptions = ReconciliationException.objects.filter(
+            statement_id=self.kwargs['pk'], statement__business=self.request.user.business
+        ).select_related('line')
+        kind = self.request.query_params.get('kind')
+        if kind:
+            exceptions = exceptions.filter(kind=kind)
+        return exceptions
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.10 on 2026-10-19 07:05
+
+from decimal import Decimal
+from django.db import migrations, models, transaction
+from django.db.models.functions import Coalesce
+
+BATCH_SIZE = 5000
+
+
+def backfill_aggregates(apps, schema_editor):
+    Sale = apps.get_model('sales', 'Sale')
+    SaleItem = apps.get_model('sales', 'SaleItem')
+    items = SaleItem.objects.filter(sale=models.OuterRef('pk')).order_by().values('sale')
+    zero = models.Value(Decimal('0.00'))
+    aggregates = {
+        'items_count': Coalesce(models.Subquery(items.annotate(n=models.Count('id')).values('n')), 0),
+        'total_cost': Coalesce(models.Subquery(
+            items.annotate(cost=models.Sum(models.F('cost_price') * models.F('quantity'))).values('cost')
+        ), zero),
+        'gross_profit': Coalesce(models.Subquery(items.annotate(profit=models.Sum('profit')).values('profit')), zero),
+    }
+    
+    # One committed UPDATE per id range, so row locks stay short on a live table
+    last_id = Sale.objects.aggregate(last=models.Max('id'))['last'] or 0
+    for start in range(0, last_id, BATCH_SIZE):
+        with transaction.atomic(using=schema_editor.connection.alias):
+            Sale.objects.filter(id__gt=start, id__lte=start + BATCH_SIZE).update(**aggregates)
+
+class Migration(migrations.Migration):
+    atomic = False
+    
+    dependencies = [
+        ('sales', '0001_initial'),
+    ]
+    
+    operations = [
+        migrations.AddField(
+            model_name='sale',
+            name='gross_profit',
+            field=models.DecimalField(decimal_places=2, default=0.0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='sale',
+            name='items_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='sale',
+            name='total_cost',
+            field=models.DecimalField(decimal_places=2, default=0.0, max_digits=12),
+        ),
+        migrations.RunPython(backfill_aggregates, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,28 @@
+from decimal import Decimal
 from django.db import models
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 import uuid  # For unique transaction IDs
-from django.db.models.signals import post_save
-from django.dispatch import receiver
+
+# Revenue a completed sale still holds after partial refunds (refunded and voided sales are not 'completed')
+NET_AMOUNT = F('total_amount') - F('refunded_amount')
+
+class SaleQuerySet(models.QuerySet):
+    def refresh_aggregates(self):
+        """Recompute items_count, total_cost and gross_profit from the unrefunded items in one UPDATE"""
+        items = SaleItem.objects.filter(sale=OuterRef('pk')).order_by().values('sale')
+        kept = F('quantity') - F('refunded_quantity')
+        zero = Value(Decimal('0.00'))
+        return self.update(
+            items_count=Coalesce(Subquery(
+                items.annotate(n=Count('id', filter=Q(quantity__gt=F('refunded_quantity')))).values('n')
+            ), 0),
+            total_cost=Coalesce(Subquery(items.annotate(cost=Sum(F('cost_price') * kept)).values('cost')), zero),
+            gross_profit=Coalesce(Subquery(
+                items.annotate(profit=Sum((F('unit_price') - F('cost_price')) * kept)).values('profit')
+            ), zero),
+        )
 
 # Sale transaction model
 class Sale(models.Model):
@@ -39,6 +59,12 @@ class Sale(models.Model):
     amount_paid = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)  # Cash received
     change_given = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)  # Change to customer
     
+    # Item aggregates, set at checkout and on refunds so reports need not join SaleItem
+    items_count = models.IntegerField(default=0)  # Line items
+    total_cost = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)  # Cost of goods sold
+    gross_profit = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)  # Sum of item profits
+    refunded_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)  # Handed back so far
+    
     # Status tracking
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='completed')
     payment_status = models.CharField(max_length=20, choices=PAYMENT_STATUS_CHOICES, default='paid')
@@ -57,6 +83,8 @@ class Sale(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     synced_at = models.DateTimeField(null=True, blank=True)  # When synced to cloud
     
+    objects = SaleQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-created_at']
     
@@ -83,6 +111,7 @@ class SaleItem(models.Model):
     total_price = models.DecimalField(max_digits=10, decimal_places=2)  # quantity * unit_price
     cost_price = models.DecimalField(max_digits=10, decimal_places=2)  # For profit calculation
     profit = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)  # Actual profit
+    refunded_quantity = models.IntegerField(default=0)  # Units returned by refunds
     
     class Meta:
         ordering = ['id']
@@ -126,13 +155,18 @@ class Shift(models.Model):
     def __str__(self):
         return f"Shift {self.shift_number} - {self.cashier.email}"
     
-    # Calculate expected cash (starting + cash sales)
+    # Calculate expected cash (starting + cash taken - cash refunded from this drawer)
     def calculate_expected_cash(self):
-        cash_sales_total = Sale.objects.filter(
-            shift=self,
-            payment_method='cash'  # Will add payment_method field
-        ).aggregate(total=models.Sum('amount_paid'))['total'] or 0
-        self.expected_cash = self.starting_cash + cash_sales_total
+        from payments.models import Payment
+        cash_sales_total = Payment.objects.filter(
+            sale__shift=self,
+            payment_method__method_type='cash',
+            status__in=['completed', 'refunded']  # Refunds are counted where the cash left
+        ).aggregate(total=models.Sum('amount'))['total'] or 0
+        cash_refunds_total = Refund.objects.filter(shift=self).aggregate(
+            total=models.Sum('cash_amount')
+        )['total'] or 0
+        self.expected_cash = self.starting_cash + cash_sales_total - cash_refunds_total
         return self.expected_cash
     
     # Calculate difference
@@ -140,10 +174,42 @@ class Shift(models.Model):
         self.difference = self.actual_cash - self.expected_cash
         return self.difference
 
-# Signal to send notification when sale is created
-@receiver(post_save, sender=Sale)
-def send_sale_notification(sender, instance, created, **kwargs):
-    if created and instance.status == 'completed':
+# Money (and stock) handed back on a sale; a void reverses the whole sale on its own day
+class Refund(models.Model):
+    KIND_CHOICES = (
+        ('refund', 'Refund'),
+        ('void', 'Void'),
+    )
+    
+    business = models.ForeignKey('business.Business', on_delete=models.CASCADE)
+    sale = models.ForeignKey(Sale, on_delete=models.CASCADE, related_name='refunds')
+    reference = models.CharField(max_length=100, unique=True, default=uuid.uuid4)  # On the stock movements
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default='refund')
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    cash_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)  # Paid out of the drawer
+    reason = models.TextField(blank=True)
+    shift = models.ForeignKey(Shift, on_delete=models.SET_NULL, null=True, blank=True)  # Drawer the cash came from
+    created_by = models.ForeignKey('accounts.User', on_delete=models.SET_NULL, null=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.amount} on {self.sale.receipt_number}"
+
+class RefundItem(models.Model):
+    refund = models.ForeignKey(Refund, on_delete=models.CASCADE, related_name='items')
+    sale_item = models.ForeignKey(SaleItem, on_delete=models.CASCADE, related_name='refund_items')
+    quantity = models.IntegerField()
+    amount = models.DecimalField(max_digits=12, decimal_places=2)  # Share of the refund for these units
+    
+    class Meta:
+        ordering = ['id']
+
+# Notify the business of a new sale; checkout calls it once the sale and its items are committed
+def send_sale_notification(instance):
+    if instance.status == 'completed':
         try:
             # Import here to avoid circular import
             from notifications.views import send_business_notification
@@ -169,7 +235,7 @@ def send_sale_notification(sender, instance, created, **kwargs):
                     'sale_id': instance.id,
                     'receipt_number': instance.receipt_number,
                     'total_amount': str(instance.total_amount),
-                    'items_count': instance.items.count(),
+                    'items_count': instance.items_count,
                     'cashier': instance.cashier.email if instance.cashier else None,
                     'timestamp': instance.created_at.isoformat(),
                 }
@@ -0,0 +1,167 @@
+# Refunds and voids. Everything a sale fed is corrected inside the refund's transaction:
+# stock (one UPDATE plus 'return' StockMovement rows), the items' refunded units and the
+# sale's aggregates, its payments, and the day's sales facts and stored summary. Checkout
+# does no extra work for any of this.
+from decimal import ROUND_HALF_UP, Decimal
+from django.db import transaction
+from django.db.models import F, IntegerField, OuterRef, Subquery, Sum
+from django.utils import timezone
+from analytics.models import DailySummary
+from analytics.tasks import restate_day
+from inventory.models import Product, StockMovement, invalidate_scan_caches, sync_stock_status
+from payments.models import Payment
+from .models import Refund, RefundItem, Sale, SaleItem, Shift
+
+CENT = Decimal('0.01')
+
+def _quantities(items, requested):
+    """{item id: units} to refund: everything left when requested is None, else the validated request"""
+    remaining = {item.id: item.quantity - item.refunded_quantity for item in items}
+    if requested is None:
+        return {item_id: left for item_id, left in remaining.items() if left > 0}
+    if not isinstance(requested, list):
+        raise ValueError('items must be a list of {"item": id, "quantity": n}')
+    
+    quantities = {}
+    for entry in requested:
+        try:
+            item_id, quantity = int(entry['item']), int(entry['quantity'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('Each item needs an "item" id and a whole "quantity"')
+        if item_id not in remaining:
+            raise ValueError(f'Item {item_id} is not on this sale')
+        if quantity <= 0:
+            raise ValueError('Quantities must be positive')
+        quantities[item_id] = quantities.get(item_id, 0) + quantity
+        if quantities[item_id] > remaining[item_id]:
+            raise ValueError(f'Only {remaining[item_id]} of item {item_id} can still be refunded')
+    return quantities
+
+def _amounts(sale, items, quantities, closes_sale):
+    """Money per refunded item and in total; sale-level tax and discount are shared by item value"""
+    item_total = sum((item.total_price for item in items), Decimal('0.00'))
+    ratio = sale.total_amount / item_total if item_total else Decimal('0')
+    by_item = {
+        item.id: (item.unit_price * quantities[item.id] * ratio).quantize(CENT, ROUND_HALF_UP)
+        for item in items if item.id in quantities
+    }
+    total = sum(by_item.values(), Decimal('0.00'))
+    left = sale.total_amount - sale.refunded_amount
+    if closes_sale or total > left:
+        # The last refund hands back exactly what is left, absorbing rounding
+        by_item[max(by_item)] += left - total
+        total = left
+    return by_item, total
+
+def _allocate(sale, amount):
+    """Take the refund off the sale's payments, newest first; returns the part paid out in cash"""
+    payments = list(
+        Payment.objects.select_for_update(of=('self',)).select_related('payment_method')
+        .filter(sale=sale, status='completed').order_by('-created_at', '-id')
+    )
+    left, cash = amount, Decimal('0.00')
+    for payment in payments:
+        share = min(left, payment.amount - payment.refunded_amount)
+        if share <= 0:
+            continue
+        payment.refunded_amount += share
+        if payment.refunded_amount >= payment.amount:
+            payment.status = 'refunded'
+        if payment.payment_method and payment.payment_method.method_type == 'cash':
+            cash += share
+        left -= share
+    Payment.objects.bulk_update(payments, ['refunded_amount', 'status'])
+    
+    # Whatever no payment record covers was settled in cash at the till
+    return cash + left
+
+def _return_stock(refund, user, now):
+    """Put refunded units back on the shelf with one UPDATE and a 'return' movement per product"""
+    returned = RefundItem.objects.filter(refund=refund, sale_item__product__isnull=False)
+    by_product = dict(returned.values_list('sale_item__product').annotate(total=Sum('quantity')).order_by())
+    if not by_product:
+        return 0
+    
+    # Lock in id order, as stocktake commits do, so concurrent writers queue rather than deadlock
+    products = Product.objects.filter(id__in=by_product)
+    stock = dict(products.select_for_update().order_by('id').values_list('id', 'current_stock'))
+    StockMovement.objects.bulk_create([
+        StockMovement(
+            product_id=product_id,
+            movement_type='return',
+            quantity=quantity,
+            previous_quantity=stock[product_id],
+            new_quantity=stock[product_id] + quantity,
+            reference=refund.reference,
+            notes=f'{refund.get_kind_display()} of sale {refund.sale.receipt_number}',
+            created_by=user,
+            created_at=now,
+        )
+        for product_id, quantity in by_product.items()
+    ])
+    
+    units = returned.filter(sale_item__product=OuterRef('pk')).values('sale_item__product').annotate(
+        total=Sum('quantity')
+    ).values('total')
+    products.update(current_stock=F('current_stock') + Subquery(units, output_field=IntegerField()), updated_at=now)
+    sync_stock_status(products)
+    invalidate_scan_caches(products)
+    return len(by_product)
+
+def refund_sale(sale_id, business, user, items=None, reason='', void=False):
+    """Refund units of a completed sale (all that is left when items is None) or void all of it
+    
+    Raises Sale.DoesNotExist for an unknown sale and ValueError for a refund that cannot be made.
+    """
+    with transaction.atomic():
+        sale = Sale.objects.select_for_update().get(pk=sale_id, business=business)
+        if sale.status != 'completed':
+            raise ValueError(f'Sale is {sale.status}')
+        day = timezone.localtime(sale.created_at, business.tzinfo).date()
+        if void:
+            if sale.refunded_amount:
+                raise ValueError('Sale already has refunds; refund the rest instead')
+            if DailySummary.objects.filter(business=business, date=day, closed_at__isnull=False).exists():
+                raise ValueError('Sales on a closed day can only be refunded')
+        
+        sale_items = list(sale.items.all())
+        quantities = _quantities(sale_items, None if void else items)
+        if not quantities:
+            raise ValueError('Nothing left to refund')
+        closes_sale = all(item.quantity - item.refunded_quantity == quantities.get(item.id, 0) for item in sale_items)
+        by_item, amount = _amounts(sale, sale_items, quantities, closes_sale)
+        
+        now = timezone.now()
+        refund = Refund.objects.create(
+            business=business,
+            sale=sale,
+            kind='void' if void else 'refund',
+            amount=amount,
+            cash_amount=_allocate(sale, amount),
+            reason=reason,
+            shift=Shift.objects.filter(cashier=user, is_active=True).first(),  # The drawer paying out
+            created_by=user,
+            created_at=now,
+        )
+        RefundItem.objects.bulk_create([
+            RefundItem(refund=refund, sale_item_id=item_id, quantity=quantity, amount=by_item[item_id])
+            for item_id, quantity in quantities.items()
+        ])
+        
+        refunded = RefundItem.objects.filter(refund=refund, sale_item=OuterRef('pk')).values('quantity')[:1]
+        SaleItem.objects.filter(refund_items__refund=refund).update(
+            refunded_quantity=F('refunded_quantity') + Subquery(refunded, output_field=IntegerField())
+        )
+        _return_stock(refund, user, now)
+        
+        sale.refunded_amount += amount
+        if void:
+            sale.status = 'cancelled'
+        elif closes_sale:
+            sale.status = 'refunded'
+        sale.save(update_fields=['refunded_amount', 'status', 'updated_at'])
+        Sale.objects.filter(pk=sale.pk).refresh_aggregates()
+        
+        # Restate the day the sale was made on, closed or not, so reports never drift
+        restate_day(business, day)
+    return refund
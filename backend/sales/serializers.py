@@ -1,5 +1,9 @@
+from decimal import Decimal
 from rest_framework import serializers
-from .models import Sale, SaleItem, Shift
+from imanage.fieldsets import SparseFieldsMixin
+from imanage.read_serializers import SKIP, ReadPlan
+from payments.serializers import PaymentSerializer
+from .models import Refund, RefundItem, Sale, SaleItem, Shift
 
 # Sale item serializer
 class SaleItemSerializer(serializers.ModelSerializer):
@@ -8,12 +12,13 @@ class SaleItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = SaleItem
         fields = ['id', 'product', 'product_name', 'quantity', 'unit_price', 
-                  'total_price', 'cost_price', 'profit']
-        read_only_fields = ['product_name', 'total_price', 'profit']
+                  'total_price', 'cost_price', 'profit', 'refunded_quantity']
+        read_only_fields = ['product_name', 'total_price', 'profit', 'refunded_quantity']
 
-# Sale serializer with nested items
-class SaleSerializer(serializers.ModelSerializer):
+# Sale serializer with nested items (payments with ?include=payments)
+class SaleSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     items = SaleItemSerializer(many=True, read_only=True)
+    payments = PaymentSerializer(many=True, read_only=True)
     cashier_name = serializers.CharField(source='cashier.get_full_name', read_only=True)
     payment_status_display = serializers.CharField(source='get_payment_status_display', read_only=True)
     status_display = serializers.CharField(source='get_status_display', read_only=True)
@@ -22,10 +27,24 @@ class SaleSerializer(serializers.ModelSerializer):
         model = Sale
         fields = ['id', 'transaction_id', 'receipt_number', 'customer_name', 'customer_phone',
                   'subtotal', 'tax_amount', 'discount_amount', 'total_amount', 'amount_paid',
-                  'change_given', 'status', 'status_display', 'payment_status', 'payment_status_display',
+                  'change_given', 'items_count', 'total_cost', 'gross_profit', 'refunded_amount',
+                  'status', 'status_display', 'payment_status', 'payment_status_display',
                   'cashier', 'cashier_name', 'shift', 'is_offline_sale', 'sync_status',
-                  'offline_id', 'items', 'created_at', 'updated_at', 'synced_at']
-        read_only_fields = ['transaction_id', 'created_at', 'updated_at', 'synced_at']
+                  'offline_id', 'items', 'created_at', 'updated_at', 'synced_at', 'payments']
+        read_only_fields = ['transaction_id', 'items_count', 'total_cost', 'gross_profit', 'refunded_amount',
+                            'created_at', 'updated_at', 'synced_at']
+        include_fields = ['payments']
+
+def _cashier_name(row):
+    # Same as User.get_full_name(); no key at all when the cashier is gone
+    if row['cashier'] is None:
+        return SKIP
+    return f"{row['cashier__first_name']} {row['cashier__last_name']}"
+
+# Precompiled read path for sale lists (items included), same output as SaleSerializer
+sale_read_plan = ReadPlan(SaleSerializer, computed={
+    'cashier_name': (['cashier', 'cashier__first_name', 'cashier__last_name'], _cashier_name),
+})
 
 # Create sale with items
 class CreateSaleSerializer(serializers.ModelSerializer):
@@ -39,7 +58,16 @@ class CreateSaleSerializer(serializers.ModelSerializer):
     
     def create(self, validated_data):
         items_data = validated_data.pop('items')
-        sale = Sale.objects.create(**validated_data)
+        
+        # Item aggregates go in with the sale row (same arithmetic as SaleItem.save)
+        sale = Sale.objects.create(
+            **validated_data,
+            items_count=len(items_data),
+            total_cost=sum((item['cost_price'] * item['quantity'] for item in items_data), Decimal('0.00')),
+            gross_profit=sum(
+                ((item['unit_price'] - item['cost_price']) * item['quantity'] for item in items_data), Decimal('0.00')
+            ),
+        )
         
         # Create sale items
         for item_data in items_data:
@@ -47,6 +75,23 @@ class CreateSaleSerializer(serializers.ModelSerializer):
         
         return sale
 
+# Refund with the units it covered
+class RefundItemSerializer(serializers.ModelSerializer):
+    product_name = serializers.CharField(source='sale_item.product_name', read_only=True)
+    
+    class Meta:
+        model = RefundItem
+        fields = ['id', 'sale_item', 'product_name', 'quantity', 'amount']
+
+class RefundSerializer(serializers.ModelSerializer):
+    items = RefundItemSerializer(many=True, read_only=True)
+    created_by_name = serializers.CharField(source='created_by.get_full_name', read_only=True)
+    
+    class Meta:
+        model = Refund
+        fields = ['id', 'reference', 'sale', 'kind', 'amount', 'cash_amount', 'reason', 'shift',
+                  'created_by', 'created_by_name', 'created_at', 'items']
+
 # Shift serializer
 class ShiftSerializer(serializers.ModelSerializer):
     cashier_name = serializers.CharField(source='cashier.get_full_name', read_only=True)
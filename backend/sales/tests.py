@@ -1,3 +1,252 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from django.db import connections
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from accounts.models import User
+from analytics.views import build_dashboard
+from business.models import Business
+from imanage.renderers import dumps_json
+from inventory.models import Product
+from notifications.models import Notification
+from analytics.models import DailySummary, ProductDailySales
+from inventory.models import StockMovement
+from payments.models import Payment, PaymentMethod
+from .models import Refund, Sale, SaleItem, Shift
+from .serializers import SaleSerializer, sale_read_plan
 
-# Create your tests here.
+class SaleReadPlanTests(TestCase):
+    def setUp(self):
+        self.business = Business.objects.create(name='Shop')
+        self.user = User.objects.create_user('owner@example.com', 'password123', first_name='Ada',
+                                             last_name='Obi', role='owner', business=self.business)
+        soap = Product.objects.create(business=self.business, sku='SOAP', name='Soap', cost_price=Decimal('10.00'),
+                                      selling_price=Decimal('15.50'), current_stock=50, barcode='B-SOAP')
+        gone = Product.objects.create(business=self.business, sku='GONE', name='Gone', cost_price=Decimal('1.00'),
+                                      selling_price=Decimal('2.00'), current_stock=5, barcode='B-GONE')
+        
+        first = Sale.objects.create(business=self.business, receipt_number='R1', cashier=self.user,
+                                    total_amount=Decimal('33.00'), status='refunded', payment_status='partial')
+        SaleItem.objects.create(sale=first, product=soap, product_name='Soap', quantity=2,
+                                unit_price=Decimal('15.50'), cost_price=Decimal('10.00'))
+        SaleItem.objects.create(sale=first, product=gone, product_name='Gone', quantity=1,
+                                unit_price=Decimal('2.00'), cost_price=Decimal('1.00'))
+        Sale.objects.create(business=self.business, receipt_number='R2', cashier=None)  # No items, no cashier
+        gone.delete()  # Item keeps its row with product NULL
+    
+    def test_plan_matches_serializer(self):
+        sales = Sale.objects.filter(business=self.business)
+        expected = SaleSerializer(sales, many=True).data
+        self.assertEqual(dumps_json(sale_read_plan.serialize(sale_read_plan.values(sales))), dumps_json(expected))
+        
+        # The edge cases the plan has to mirror really are in the data
+        by_receipt = {sale['receipt_number']: sale for sale in expected}
+        self.assertNotIn('cashier_name', by_receipt['R2'])
+        self.assertEqual(by_receipt['R1']['cashier_name'], 'Ada Obi')
+        self.assertEqual(by_receipt['R1']['status_display'], 'Refunded')
+        self.assertNotIn('product_name', by_receipt['R1']['items'][1])
+        self.assertEqual(by_receipt['R2']['items'], [])
+    
+    def test_list_endpoint_uses_two_queries(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with self.assertNumQueries(2):  # Sales, then all their items
+            response = client.get('/api/sales/sales/')
+        sales = Sale.objects.filter(business=self.business)
+        self.assertEqual(response.content, JSONRenderer().render(SaleSerializer(sales, many=True).data))
+
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        self.business = Business.objects.create(name='Shop')
+        self.user = User.objects.create_user('owner@example.com', 'password123', first_name='Ada',
+                                             last_name='Obi', role='owner', business=self.business)
+        product = Product.objects.create(business=self.business, sku='SOAP', name='Soap', cost_price=Decimal('10.00'),
+                                         selling_price=Decimal('15.50'), current_stock=50, barcode='B-SOAP')
+        self.sale = Sale.objects.create(business=self.business, receipt_number='R1', cashier=self.user,
+                                        total_amount=Decimal('31.00'))
+        SaleItem.objects.create(sale=self.sale, product=product, product_name='Soap', quantity=2,
+                                unit_price=Decimal('15.50'), cost_price=Decimal('10.00'))
+        Payment.objects.create(business=self.business, sale=self.sale, amount=Decimal('31.00'),
+                               transaction_fee=Decimal('0.00'), status='completed')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+    
+    def test_fields_prune_output_and_queries(self):
+        with self.assertNumQueries(1):  # No items query
+            response = self.client.get('/api/sales/sales/', {'fields': 'receipt_number,total_amount'})
+        self.assertEqual(response.json(), [{'receipt_number': 'R1', 'total_amount': '31.00'}])
+        
+        response = self.client.get(f'/api/sales/sales/{self.sale.id}/', {'fields': 'id,cashier_name'})
+        self.assertEqual(response.json(), {'id': self.sale.id, 'cashier_name': 'Ada Obi'})
+    
+    def test_include_embeds_payments(self):
+        default = self.client.get('/api/sales/sales/').json()
+        self.assertNotIn('payments', default[0])
+        
+        with self.assertNumQueries(3):  # Sales, items, payments
+            response = self.client.get('/api/sales/sales/', {'include': 'payments'})
+        sales = Sale.objects.filter(business=self.business)
+        expected = SaleSerializer(sales, many=True, fields=SaleSerializer.select_fields(include=['payments'])).data
+        self.assertEqual(response.content, JSONRenderer().render(expected))
+        self.assertEqual(response.json()[0]['payments'][0]['sale_receipt'], 'R1')
+    
+    def test_unknown_names_rejected(self):
+        response = self.client.get('/api/sales/sales/', {'fields': 'id,secret', 'include': 'refunds'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()), {'fields', 'include'})
+
+class SaleAggregateTests(TestCase):
+    def setUp(self):
+        self.business = Business.objects.create(name='Shop')
+        self.user = User.objects.create_user('owner@example.com', 'password123', first_name='Ada',
+                                             last_name='Obi', role='owner', business=self.business)
+        self.soap = Product.objects.create(business=self.business, sku='SOAP', name='Soap', cost_price=Decimal('10.00'),
+                                           selling_price=Decimal('15.50'), current_stock=50, barcode='B-SOAP')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+    
+    def test_checkout_sets_aggregates_and_notifies_after_commit(self):
+        items = [
+            {'product': self.soap.id, 'quantity': 3, 'unit_price': '15.50', 'cost_price': '10.00'},
+            {'product': self.soap.id, 'quantity': 1, 'unit_price': '12.00', 'cost_price': '10.00'},
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/sales/sales/', {
+                'receipt_number': 'R1', 'subtotal': '58.50', 'total_amount': '58.50', 'amount_paid': '60.00',
+                'items': items,
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['items_count'], response.data['total_cost'], response.data['gross_profit']),
+                         (2, '40.00', '18.50'))
+        
+        sale = Sale.objects.get(receipt_number='R1')
+        Sale.objects.filter(pk=sale.pk).update(items_count=0, total_cost=0, gross_profit=0)
+        Sale.objects.filter(pk=sale.pk).refresh_aggregates()
+        sale.refresh_from_db()
+        self.assertEqual((sale.items_count, sale.total_cost, sale.gross_profit), (2, Decimal('40.00'), Decimal('18.50')))
+        
+        notification = Notification.objects.get(notification_type='sale')
+        self.assertEqual(notification.data['items_count'], 2)
+    
+    def test_dashboard_profit_reads_sales_only(self):
+        Sale.objects.create(business=self.business, receipt_number='R1', total_amount=Decimal('50.00'),
+                            items_count=1, total_cost=Decimal('30.00'), gross_profit=Decimal('20.00'))
+        with self.assertNumQueries(4):  # Sales totals, expenses, low stock, recent sales
+            dashboard = build_dashboard(self.business, self.user)
+        self.assertEqual(dashboard['today_gross_profit'], Decimal('20.00'))
+
+class RefundTests(TestCase):
+    def setUp(self):
+        self.business = Business.objects.create(name='Shop')
+        self.owner = User.objects.create_user('owner@example.com', 'password123', first_name='Ada',
+                                              last_name='Obi', role='owner', business=self.business)
+        self.soap = Product.objects.create(business=self.business, sku='SOAP', name='Soap', cost_price=Decimal('10.00'),
+                                           selling_price=Decimal('20.00'), current_stock=10, barcode='B-SOAP')
+        self.bread = Product.objects.create(business=self.business, sku='BREAD', name='Bread', cost_price=Decimal('30.00'),
+                                            selling_price=Decimal('50.00'), current_stock=0, barcode='B-BREAD')
+        self.shift = Shift.objects.create(business=self.business, cashier=self.owner, shift_number='S1',
+                                          start_time=timezone.now(), starting_cash=Decimal('100.00'))
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+        
+        # 3 soap + 2 bread = 160.00 of items, sold for 144.00 after a 10% discount
+        self.sale = Sale.objects.create(business=self.business, receipt_number='R1', shift=self.shift,
+                                        subtotal=Decimal('160.00'), discount_amount=Decimal('16.00'),
+                                        total_amount=Decimal('144.00'), amount_paid=Decimal('144.00'),
+                                        items_count=2, total_cost=Decimal('90.00'), gross_profit=Decimal('70.00'))
+        self.soap_item = SaleItem.objects.create(sale=self.sale, product=self.soap, product_name='Soap', quantity=3,
+                                                 unit_price=Decimal('20.00'), cost_price=Decimal('10.00'))
+        self.bread_item = SaleItem.objects.create(sale=self.sale, product=self.bread, product_name='Bread', quantity=2,
+                                                  unit_price=Decimal('50.00'), cost_price=Decimal('30.00'))
+        cash = PaymentMethod.objects.create(business=self.business, name='Cash', method_type='cash')
+        self.payment = Payment.objects.create(business=self.business, sale=self.sale, payment_method=cash,
+                                              amount=Decimal('144.00'), transaction_fee=Decimal('0.00'),
+                                              status='completed')
+        self.day = self.business.local_today()
+        DailySummary.objects.create(business=self.business, date=self.day, total_sales=Decimal('144.00'),
+                                    total_expenses=Decimal('0.00'), low_stock_items=7, out_of_stock_items=3)
+    
+    def refund(self, path='refund', **body):
+        return self.client.post(f'/api/sales/sales/{self.sale.id}/{path}/', body, format='json')
+    
+    def test_partial_then_full_refund(self):
+        response = self.refund(items=[{'item': self.soap_item.id, 'quantity': 1}, {'item': self.bread_item.id, 'quantity': 2}],
+                               reason='Damaged')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['refund']['amount'], '108.00')  # 120.00 of items less the 10% discount
+        self.assertEqual(response.data['sale']['status'], 'completed')
+        
+        self.sale.refresh_from_db()
+        self.assertEqual((self.sale.refunded_amount, self.sale.items_count, self.sale.total_cost, self.sale.gross_profit),
+                         (Decimal('108.00'), 1, Decimal('20.00'), Decimal('20.00')))
+        self.soap.refresh_from_db()
+        self.bread.refresh_from_db()
+        self.assertEqual((self.soap.current_stock, self.bread.current_stock, self.bread.status), (11, 2, 'active'))
+        self.assertEqual(
+            sorted(StockMovement.objects.values_list('product__sku', 'movement_type', 'quantity', 'new_quantity')),
+            [('BREAD', 'return', 2, 2), ('SOAP', 'return', 1, 11)]
+        )
+        
+        # The day's facts and stored summary are restated in the same transaction
+        facts = dict(ProductDailySales.objects.filter(business=self.business, date=self.day).values_list('product_name', 'quantity'))
+        self.assertEqual(facts, {'Soap': 2})
+        summary = DailySummary.objects.get(business=self.business, date=self.day)
+        self.assertEqual(summary.total_sales, Decimal('36.00'))
+        self.assertEqual((summary.low_stock_items, summary.out_of_stock_items), (7, 3))  # The day's snapshot stands
+        self.assertEqual(build_dashboard(self.business, self.owner)['today_sales'], Decimal('36.00'))
+        
+        # No items: refund everything left, to the cent
+        response = self.refund()
+        self.assertEqual((response.data['refund']['amount'], response.data['sale']['status']), ('36.00', 'refunded'))
+        self.payment.refresh_from_db()
+        self.assertEqual((self.payment.status, self.payment.refunded_amount), ('refunded', Decimal('144.00')))
+        self.assertEqual(self.refund().status_code, 400)
+        
+        # Cash handed back comes out of the refunder's drawer
+        self.assertEqual(set(Refund.objects.values_list('shift', flat=True)), {self.shift.id})
+        self.assertEqual(self.shift.calculate_expected_cash(), Decimal('100.00'))
+    
+    def test_void_whole_sale_on_open_day(self):
+        response = self.refund('void', reason='Wrong till')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['refund']['kind'], response.data['sale']['status']), ('void', 'cancelled'))
+        self.soap.refresh_from_db()
+        self.assertEqual(self.soap.current_stock, 13)
+        self.assertEqual(DailySummary.objects.get(business=self.business, date=self.day).total_sales, 0)
+        self.assertEqual(self.refund().data['error'], 'Sale is cancelled')
+    
+    def test_rejected_refunds(self):
+        self.assertEqual(self.refund(items=[{'item': self.soap_item.id, 'quantity': 4}]).status_code, 400)
+        self.assertEqual(self.refund(items=[{'item': 999999, 'quantity': 1}]).status_code, 400)
+        self.assertEqual(self.client.post('/api/sales/sales/999999/refund/', {}, format='json').status_code, 404)
+        
+        DailySummary.objects.filter(business=self.business, date=self.day).update(closed_at=timezone.now())
+        self.assertEqual(self.refund('void').data['error'], 'Sales on a closed day can only be refunded')
+        
+        self.owner.role = 'cashier'
+        self.owner.save()
+        self.assertEqual(self.refund().status_code, 403)
+        self.assertFalse(Refund.objects.exists())
+        self.assertFalse(StockMovement.objects.exists())
+
+# The POS header count is async and reads on pool threads with their own connections, so data must be committed
+class TodayCountTests(TransactionTestCase):
+    def test_counts_completed_sales_of_the_local_day(self):
+        patcher = mock.patch.dict(connections.settings['default'], {'CONN_MAX_AGE': 0})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        business = Business.objects.create(name='Shop')
+        user = User.objects.create_user('owner@example.com', 'password123', role='owner', business=business)
+        start, end = business.day_bounds(business.local_today())
+        for number, created_at, status in [('R1', start, 'completed'), ('R2', end - timedelta(seconds=1), 'completed'),
+                                           ('R3', start, 'cancelled'), ('R4', start - timedelta(seconds=1), 'completed')]:
+            Sale.objects.create(business=business, receipt_number=number, status=status, created_at=created_at)
+        
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+        response = client.get('/api/sales/sales/today-count/').json()
+        self.assertEqual((response['date'], response['sales_count']), (business.local_today().isoformat(), 2))
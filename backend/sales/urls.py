@@ -1,14 +1,18 @@
 from django.urls import path
 from .views import (
-    SaleListCreateView, SaleDetailView,
+    SaleListCreateView, SaleDetailView, SaleRefundView, SaleVoidView,
     ShiftListCreateView, ShiftDetailView,
     OpenShiftView, CloseShiftView
 )
+from .views_async import today_sales_count
 
 urlpatterns = [
     # Sales
     path('sales/', SaleListCreateView.as_view(), name='sale-list'),
+    path('sales/today-count/', today_sales_count, name='sale-today-count'),
     path('sales/<int:pk>/', SaleDetailView.as_view(), name='sale-detail'),
+    path('sales/<int:pk>/refund/', SaleRefundView.as_view(), name='sale-refund'),
+    path('sales/<int:pk>/void/', SaleVoidView.as_view(), name='sale-void'),
     
     # Shifts
     path('shifts/', ShiftListCreateView.as_view(), name='shift-list'),
@@ -3,16 +3,21 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from django.db import transaction
 from django.utils import timezone
-from .models import Sale, SaleItem, Shift
-from .serializers import SaleSerializer, CreateSaleSerializer, ShiftSerializer
+from .models import Sale, SaleItem, Shift, send_sale_notification
+from .refunds import refund_sale
+from .serializers import SaleSerializer, CreateSaleSerializer, RefundSerializer, ShiftSerializer, sale_read_plan
 from inventory.models import Product
 
 # Import notification helper
 from notifications.views import send_business_notification
+from imanage.db_router import ReplicaReadMixin
+from imanage.fieldsets import SparseFieldsViewMixin
+from imanage.read_serializers import ReadPlanListMixin
 
 # Sale views
-class SaleListCreateView(generics.ListCreateAPIView):
+class SaleListCreateView(ReplicaReadMixin, SparseFieldsViewMixin, ReadPlanListMixin, generics.ListCreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
+    read_plan = sale_read_plan
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -62,6 +67,9 @@ class SaleListCreateView(generics.ListCreateAPIView):
                         }
                     )
         
+        # The sale notification carries items_count, so it goes out once everything is committed
+        transaction.on_commit(lambda: send_sale_notification(sale))
+        
         # Send WebSocket notification for real-time update
         try:
             from channels.layers import get_channel_layer
@@ -85,13 +93,45 @@ class SaleListCreateView(generics.ListCreateAPIView):
         
         return Response(SaleSerializer(sale).data, status=status.HTTP_201_CREATED)
 
-class SaleDetailView(generics.RetrieveAPIView):
+class SaleDetailView(SparseFieldsViewMixin, generics.RetrieveAPIView):
     serializer_class = SaleSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
         return Sale.objects.filter(business=self.request.user.business)
 
+# Refund some or all of a sale (body: items [{"item": id, "quantity": n}], omitted for everything left)
+class SaleRefundView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    void = False
+    
+    def post(self, request, pk):
+        if request.user.role not in ['owner', 'manager']:
+            return Response({'error': 'Only owners and managers can refund or void sales'},
+                          status=status.HTTP_403_FORBIDDEN)
+        try:
+            refund = refund_sale(
+                pk,
+                request.user.business,
+                request.user,
+                items=request.data.get('items'),
+                reason=request.data.get('reason', ''),
+                void=self.void,
+            )
+        except Sale.DoesNotExist:
+            return Response({'error': 'Sale not found'}, status=status.HTTP_404_NOT_FOUND)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({
+            'refund': RefundSerializer(refund).data,
+            'sale': SaleSerializer(Sale.objects.get(pk=pk)).data,
+        }, status=status.HTTP_201_CREATED)
+
+# Cancel a whole sale on the day it was made, before the day is closed
+class SaleVoidView(SaleRefundView):
+    void = True
+
 # Shift management
 class ShiftListCreateView(generics.ListCreateAPIView):
     serializer_class = ShiftSerializer
@@ -0,0 +1,28 @@
+from django.utils import timezone
+from imanage.async_api import async_api_view, json_response, run_db
+from .models import Sale
+
+def count_today_sales(business):
+    today = business.local_today()
+    start, end = business.day_bounds(today)
+    count = Sale.objects.filter(
+        business=business,
+        created_at__gte=start,
+        created_at__lt=end,
+        status='completed'
+    ).count()
+    return today, count
+
+# Today's completed sales count (business-local day), polled by the POS header
+@async_api_view
+async def today_sales_count(request):
+    business = request.user.business
+    if business is None:
+        return json_response({'error': 'User not assigned to a business'}, status=400)
+    
+    today, count = await run_db(count_today_sales, business)
+    return json_response({
+        'date': today.isoformat(),
+        'sales_count': count,
+        'last_updated': timezone.now().isoformat()
+    })